@@ -0,0 +1,112 @@
+"""
+Assessment PDF Cache for Math Results Analysis System
+Renders assessment PDFs in a process pool and keeps them on local disk
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from question_bank import generate_assessment_pdf, get_assessment_pdf_styles
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+PDF_CACHE_DIR = Path(os.getenv("ASSESSMENT_PDF_CACHE_DIR", str(ROOT_DIR / "cache" / "assessment_pdfs")))
+PDF_RENDER_WORKERS = int(os.getenv("ASSESSMENT_PDF_RENDER_WORKERS", "2"))
+
+PDF_VERSIONS = ("student", "tutor")
+
+_render_pool: Optional[ProcessPoolExecutor] = None
+# Renders in flight, so concurrent downloads of the same PDF share one render
+_pending_renders: Dict[Path, asyncio.Future] = {}
+
+
+def _init_render_worker():
+    """Warm the shared ReportLab styles once per worker process"""
+    get_assessment_pdf_styles()
+
+
+def _get_render_pool() -> ProcessPoolExecutor:
+    global _render_pool
+    if _render_pool is None:
+        _render_pool = ProcessPoolExecutor(max_workers=max(1, PDF_RENDER_WORKERS), initializer=_init_render_worker)
+    return _render_pool
+
+
+def shutdown_render_pool():
+    """Stop the render workers (called on app shutdown)"""
+    global _render_pool
+    if _render_pool is not None:
+        _render_pool.shutdown(wait=False, cancel_futures=True)
+        _render_pool = None
+
+
+def assessment_content_hash(assessment: Dict) -> str:
+    """Hash of the fields that appear in the PDF - changes whenever the assessment is edited"""
+    content = {
+        'created_date': assessment.get('created_date'),
+        'duration_minutes': assessment.get('duration_minutes'),
+        'total_marks': assessment.get('total_marks'),
+        'questions': [
+            {
+                'marks': q.get('marks'),
+                'question_text': q.get('question_text'),
+                'solution': q.get('solution')
+            }
+            for q in assessment.get('questions', [])
+        ]
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def cached_pdf_path(student_id: str, assessment: Dict, version: str) -> Path:
+    """Cache location for one rendered version of an assessment"""
+    content_hash = assessment_content_hash(assessment)
+    return PDF_CACHE_DIR / student_id / f"{assessment['assessment_id']}_{version}_{content_hash}.pdf"
+
+
+def _write_pdf(path: Path, pdf_bytes: bytes):
+    """Write atomically so a half-written file is never served"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(pdf_bytes)
+    os.replace(tmp_path, path)
+
+
+async def _render(path: Path, assessment: Dict, version: str) -> Path:
+    loop = asyncio.get_running_loop()
+    pdf_bytes = await loop.run_in_executor(
+        _get_render_pool(), generate_assessment_pdf, assessment, version == "tutor"
+    )
+    await asyncio.to_thread(_write_pdf, path, pdf_bytes)
+    return path
+
+
+async def get_or_render_pdf(student_id: str, assessment: Dict, version: str) -> Path:
+    """Return the cached PDF path, rendering it first if needed"""
+    path = cached_pdf_path(student_id, assessment, version)
+    if path.exists():
+        return path
+
+    pending = _pending_renders.get(path)
+    if pending is None:
+        pending = asyncio.ensure_future(_render(path, assessment, version))
+        _pending_renders[path] = pending
+        pending.add_done_callback(lambda _: _pending_renders.pop(path, None))
+    return await asyncio.shield(pending)
+
+
+async def prerender_assessment_pdfs(student_id: str, assessment: Dict):
+    """Render student and tutor versions ahead of the first download"""
+    for version in PDF_VERSIONS:
+        try:
+            await get_or_render_pdf(student_id, assessment, version)
+        except Exception as e:
+            logger.error(f"Failed to pre-render {version} PDF for {assessment.get('assessment_id')}: {str(e)}")
+    logger.info(f"Pre-rendered assessment PDFs for {assessment.get('assessment_id')}")
@@ -0,0 +1,440 @@
+"""
+Benchmark - Hot API Endpoints (offline)
+Drives the FastAPI app in-process (httpx ASGITransport) against the Firestore emulator, with
+LlmChat replaced by a fixed-latency fake and Stripe / SendGrid / Notion calls stubbed out.
+Reports p50/p95/p99 latency and throughput per scenario and compares them with a stored baseline.
+
+Start the emulator first:
+    firebase emulators:start --only firestore        (or: gcloud emulators firestore start --host-port=localhost:8080)
+
+Usage:
+    python benchmark_endpoints.py                          # run all scenarios, compare with benchmark_baseline.json
+    python benchmark_endpoints.py --update-baseline        # store this run as the new baseline
+    python benchmark_endpoints.py --scenarios tuition_chat analytics --requests 300 --concurrency 20
+
+Exit code 1 when a scenario's p95 is more than --tolerance slower, or its throughput more than
+--tolerance lower, than the baseline (or when a scenario returns errors). A missing baseline
+file, or a scenario with no baseline entry, also fails: record one with --update-baseline
+against the emulator and commit benchmark_baseline.json, so the gate always compares.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT_DIR = Path(__file__).parent
+DEFAULT_BASELINE = ROOT_DIR / "benchmark_baseline.json"
+
+EMULATOR_PROJECT = "benchmark-offline"
+WEBHOOK_SECRET = "whsec_benchmark"
+
+TUTOR_ID = "benchtutor"
+CUSTOMER_EMAIL = "bench.customer@example.com"
+
+# ========================
+# ENVIRONMENT
+# ========================
+
+def configure_environment():
+    """Settings the API modules read at import time, pointed at local/offline services"""
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        sys.exit("FIRESTORE_EMULATOR_HOST is not set - start the Firestore emulator first")
+    defaults = {
+        "GCLOUD_PROJECT": EMULATOR_PROJECT,
+        "MONGO_URL": "mongodb://localhost:27017",
+        "DB_NAME": "benchmark",
+        "STRIPE_API_KEY": "sk_test_benchmark",
+        "STRIPE_WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "SENDGRID_API_KEY": "SG.benchmark",
+        "PROJECT62_JWT_SECRET": "benchmark-secret",
+        "NOTION_TOKEN": "secret_benchmark",
+        "EMERGENT_LLM_KEY": "benchmark",
+        # project62_api only checks that the file exists; the app itself is created below
+        "FIREBASE_CREDENTIALS_PATH": str(Path(__file__).resolve()),
+        "PAPER_ANALYSIS_LLM": "fake",
+        "LOG_LEVEL": "WARNING",
+    }
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+def init_emulator_apps():
+    """Create the three Firebase apps with anonymous credentials so the API modules reuse them"""
+    import firebase_admin
+    from firebase_admin import credentials
+    from google.auth.credentials import AnonymousCredentials
+
+    class EmulatorCredential(credentials.Base):
+        def get_credential(self):
+            return AnonymousCredentials()
+
+    options = {"projectId": EMULATOR_PROJECT}
+    for name in ("[DEFAULT]", "math_analysis", "project62"):
+        try:
+            firebase_admin.get_app(name)
+        except ValueError:
+            if name == "[DEFAULT]":
+                firebase_admin.initialize_app(EmulatorCredential(), options)
+            else:
+                firebase_admin.initialize_app(EmulatorCredential(), {**options, "storageBucket": f"{EMULATOR_PROJECT}.appspot.com"}, name=name)
+
+# ========================
+# FAKES
+# ========================
+
+class FakeLlmChat:
+    """Stands in for emergentintegrations LlmChat with a fixed response latency"""
+
+    latency_seconds = 0.4
+
+    def __init__(self, api_key=None, session_id=None, system_message=""):
+        self.system_message = system_message
+        self.model = "fake"
+
+    def with_model(self, provider, model):
+        self.model = model
+        return self
+
+    async def send_message(self, message):
+        await asyncio.sleep(self.latency_seconds)
+        return "Thanks for your question! Here are the classes that match what you are looking for."
+
+
+class FakeStripeSession:
+    def __init__(self):
+        self.id = f"cs_test_{uuid.uuid4().hex}"
+        self.url = f"https://checkout.stripe.test/{self.id}"
+        self.payment_status = "unpaid"
+        self.status = "open"
+
+
+class FakeSendGridClient:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def send(self, message):
+        class Response:
+            status_code = 202
+        return Response()
+
+
+def install_fakes(llm_latency_seconds: float):
+    import stripe
+    import emergentintegrations.llm.chat as llm_chat
+    import server
+    import project62_api
+    import notion_helpers
+
+    FakeLlmChat.latency_seconds = llm_latency_seconds
+    llm_chat.LlmChat = FakeLlmChat
+    server.LlmChat = FakeLlmChat
+    stripe.checkout.Session.create = staticmethod(lambda **kwargs: FakeStripeSession())
+    project62_api.SendGridAPIClient = FakeSendGridClient
+    notion_helpers.notion.request = lambda *args, **kwargs: {"results": [], "has_more": False}
+
+# ========================
+# SEED DATA
+# ========================
+
+LEVELS = ["P5", "P6", "S1", "S2", "S3", "S4", "J1", "J2"]
+SUBJECTS = ["Math", "Science", "English", "Chinese"]
+LOCATIONS = ["Bishan", "Punggol", "Marine Parade", "Jurong", "Kovan"]
+TUTORS = ["Mr Sean Yeo", "Ms Tan", "Mr Lim", "Ms Wong", "Mr Ng", "Ms Lee"]
+
+
+def commit_in_batches(db, writes):
+    for start in range(0, len(writes), 400):
+        batch = db.batch()
+        for ref, data in writes[start:start + 400]:
+            batch.set(ref, data)
+        batch.commit()
+
+
+def seed(firebase_db, math_db, project62_db):
+    from tutor_credentials import hash_password
+
+    # Tuition classes (~666 like production)
+    writes = []
+    n = 0
+    for level in LEVELS:
+        for subject in SUBJECTS:
+            for location in LOCATIONS:
+                for tutor in TUTORS[:4]:
+                    n += 1
+                    writes.append((firebase_db.collection("classes").document(f"class_{n}"), {
+                        "level": level, "subject": subject, "location": location,
+                        "tutor_name": tutor, "tutor_base_name": tutor,
+                        "day1": "Monday", "time1": "4:00pm-6:00pm", "monthly_fee": 320.0, "sessions_per_week": 1
+                    }))
+    commit_in_batches(firebase_db, writes)
+
+    # Shop products, subscription plans and one customer
+    writes = []
+    for i in range(60):
+        writes.append((project62_db.collection("project62").document("products").collection("all").document(f"product_{i}"), {
+            "product_id": f"product_{i}", "name": f"Product {i}", "type": "physical", "category": "meals",
+            "price": 10 + i, "is_active": True, "visibility": "public", "is_featured": i < 6, "featured_order": i,
+            "product_id_slug": f"product-{i}", "created_at": datetime.utcnow().isoformat()
+        }))
+    for meals_per_day in (1, 2):
+        writes.append((project62_db.collection("project62").document("subscriptions_config").collection("all").document(f"plan_{meals_per_day}"), {
+            "plan_name": f"{meals_per_day} Meal/Day", "meals_per_day": meals_per_day, "is_active": True,
+            "delivery_fee": 5.0, "pricing_tiers": [{"weeks": w, "price_per_meal": 12.0 - w * 0.25} for w in (1, 2, 4, 6)]
+        }))
+    customer_id = CUSTOMER_EMAIL.replace("@", "_at_").replace(".", "_")
+    writes.append((project62_db.collection("project62").document("customers").collection("all").document(customer_id), {
+        "customer_id": customer_id, "email": CUSTOMER_EMAIL, "name": "Bench Customer", "loyalty_points": 12, "orders": []
+    }))
+    for i in range(12):
+        writes.append((project62_db.collection("project62").document("deliveries").collection("all").document(f"delivery_{i}"), {
+            "customer_id": customer_id, "status": "pending",
+            "delivery_date": (datetime.utcnow() + timedelta(days=7 * i)).date().isoformat()
+        }))
+    commit_in_batches(project62_db, writes)
+
+    # Math tutor, students and results
+    writes = [(math_db.collection("tutors").document(TUTOR_ID), {
+        "tutor_id": TUTOR_ID, "tutor_name": "Bench Tutor", "login_id": TUTOR_ID,
+        "password_hash": hash_password("bench123"), "locations": LOCATIONS, "levels": LEVELS, "subjects": SUBJECTS
+    })]
+    for i in range(300):
+        writes.append((math_db.collection("student_results").document(f"result_{i}"), {
+            "student_id": f"student_{i % 100}", "student_name": f"Student {i % 100}", "tutor_id": TUTOR_ID,
+            "location": LOCATIONS[i % 5], "level": LEVELS[i % 8], "subject": "Math", "exam_type": f"Exam {i % 3}",
+            "overall_score": 40 + i % 60, "created_at": datetime.utcnow().isoformat(),
+            "topics": [{"topic_name": t, "marks": 10 + (i + j) % 15, "total_marks": 25, "percentage": (10 + (i + j) % 15) * 4}
+                       for j, t in enumerate(["Algebra", "Geometry", "Calculus", "Statistics"])]
+        }))
+    commit_in_batches(math_db, writes)
+
+# ========================
+# SCENARIOS
+# ========================
+
+TUITION_MESSAGES = [
+    "Do you have P6 Math classes in Bishan?",
+    "What S3 Science classes are there at Punggol?",
+    "Who teaches J1 Math?",
+    "What are the fees for S2 English at Jurong?",
+    "Hi, what do you offer?",
+]
+
+CSV_BODY = "Name,Location,Level,Subject,Exam Type,Topic,Marks,Total Marks\n" + "".join(
+    f"Bench Student {s},Bishan,S3,Math,WA1,{topic},{10 + s % 10},20\n"
+    for s in range(10) for topic in ("Algebra", "Geometry", "Trigonometry")
+)
+
+
+def stripe_signature(payload: bytes) -> str:
+    timestamp = int(time.time())
+    signed = f"{timestamp}.".encode() + payload
+    digest = hmac.new(WEBHOOK_SECRET.encode(), signed, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def build_scenarios(tokens: Dict[str, str], checkout_sessions: List[str]) -> Dict[str, Callable]:
+    tutor_headers = {"Authorization": f"Bearer {tokens['tutor']}"}
+    customer_headers = {"Authorization": f"Bearer {tokens['customer']}"}
+
+    async def tuition_chat(client, i):
+        return await client.post("/api/tuition/chat", json={
+            "message": TUITION_MESSAGES[i % len(TUITION_MESSAGES)], "session_id": f"bench-{i % 25}"
+        })
+
+    async def shop_products(client, i):
+        return await client.get("/api/project62/products")
+
+    async def featured_products(client, i):
+        return await client.get("/api/project62/products/featured")
+
+    async def checkout_meal_prep(client, i):
+        response = await client.post("/api/project62/checkout/meal-prep", json={
+            "duration": "4_weeks", "meals_per_day": 1 + i % 2, "origin_url": "http://bench.local",
+            "name": "Bench Customer", "email": CUSTOMER_EMAIL, "phone": "80000000",
+            "address": "1 Bench Road", "start_date": (datetime.utcnow() + timedelta(days=3)).date().isoformat()
+        })
+        if response.status_code == 200:
+            checkout_sessions.append(response.json().get("session_id"))
+        return response
+
+    async def stripe_webhook(client, i):
+        session_id = checkout_sessions[i % len(checkout_sessions)] if checkout_sessions else f"cs_test_missing_{i}"
+        payload = json.dumps({
+            "id": f"evt_bench_{uuid.uuid4().hex}", "type": "checkout.session.completed",
+            "data": {"object": {"id": session_id, "payment_status": "paid", "amount_total": 20000, "currency": "sgd"}}
+        }).encode()
+        return await client.post("/api/project62/webhook/stripe", content=payload,
+                                 headers={"stripe-signature": stripe_signature(payload), "content-type": "application/json"})
+
+    async def customer_dashboard(client, i):
+        return await client.get("/api/project62/customer/dashboard", headers=customer_headers)
+
+    async def analytics(client, i):
+        return await client.post("/api/math-analysis/analytics", json={"level": LEVELS[i % 8] if i % 2 else None},
+                                 headers=tutor_headers)
+
+    async def csv_upload(client, i):
+        return await client.post("/api/math-analysis/upload-csv",
+                                 files={"file": ("results.csv", CSV_BODY.encode(), "text/csv")})
+
+    # Order matters: the webhook replays sessions created by the checkout scenario
+    return {
+        "tuition_chat": tuition_chat,
+        "shop_products": shop_products,
+        "featured_products": featured_products,
+        "checkout_meal_prep": checkout_meal_prep,
+        "stripe_webhook": stripe_webhook,
+        "customer_dashboard": customer_dashboard,
+        "analytics": analytics,
+        "csv_upload": csv_upload,
+    }
+
+# ========================
+# LOAD GENERATION
+# ========================
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client, scenario: Callable, requests: int, concurrency: int, warmup: int) -> Dict:
+    for i in range(warmup):
+        await scenario(client, i)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one(i: int):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await scenario(client, i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0,
+        "throughput_rps": round(requests / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+
+
+def compare_with_baseline(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    regressions = []
+    for name, result in results.items():
+        if result["errors"]:
+            regressions.append(f"{name}: {result['errors']}/{result['requests']} requests failed")
+        reference = baseline.get(name)
+        if not reference:
+            regressions.append(f"{name}: no baseline recorded - run with --update-baseline")
+            continue
+        if result["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']} ms vs baseline {reference['p95_ms']} ms")
+        if result["throughput_rps"] < reference["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['throughput_rps']} req/s vs baseline {reference['throughput_rps']} req/s")
+    return regressions
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", nargs="*", help="subset of scenarios to run (default: all)")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=400)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed fractional regression")
+    parser.add_argument("--output", type=Path, help="also write this run's results as JSON")
+    args = parser.parse_args()
+
+    configure_environment()
+    init_emulator_apps()
+    install_fakes(args.llm_latency_ms / 1000)
+
+    import httpx
+    import server
+    import project62_api
+    from math_analysis_api import math_db
+    from tutor_auth_api import create_access_token
+
+    seed(server.firebase_db, math_db, project62_api.db)
+
+    tokens = {
+        "tutor": create_access_token({"sub": TUTOR_ID, "tutor_id": TUTOR_ID, "tutor_name": "Bench Tutor"}),
+        "customer": project62_api.generate_jwt_token(CUSTOMER_EMAIL.replace("@", "_at_").replace(".", "_"), CUSTOMER_EMAIL),
+    }
+    checkout_sessions: List[str] = []
+    scenarios = build_scenarios(tokens, checkout_sessions)
+    selected = args.scenarios or list(scenarios)
+    unknown = [name for name in selected if name not in scenarios]
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(unknown)} (choose from {', '.join(scenarios)})")
+
+    results = {}
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+        print(f"{'scenario':<20} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'errors':>7}")
+        for name in selected:
+            result = await run_scenario(client, scenarios[name], args.requests, args.concurrency, args.warmup)
+            results[name] = result
+            print(f"{name:<20} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9}"
+                  f" {result['throughput_rps']:>9} {result['errors']:>7}")
+
+    run = {
+        "recorded_at": datetime.utcnow().isoformat(),
+        "settings": {"requests": args.requests, "concurrency": args.concurrency, "llm_latency_ms": args.llm_latency_ms},
+        "scenarios": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(run, indent=2) + "\n")
+
+    if args.update_baseline:
+        baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {"scenarios": {}}
+        baseline.update({k: v for k, v in run.items() if k != "scenarios"})
+        baseline.setdefault("scenarios", {}).update(results)
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"\nBaseline updated: {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"\n❌ No baseline at {args.baseline} - run with --update-baseline against the emulator and commit it")
+        sys.exit(1)
+
+    baseline = json.loads(args.baseline.read_text())
+    if baseline.get("settings") != run["settings"]:
+        print(f"\n⚠️  Settings differ from the baseline run ({baseline.get('settings')}) - comparison may be unfair")
+    regressions = compare_with_baseline(results, baseline.get("scenarios", {}), args.tolerance)
+    if regressions:
+        print("\n❌ Regressions:")
+        for regression in regressions:
+            print(f"   {regression}")
+        sys.exit(1)
+    print(f"\n✅ Within {args.tolerance:.0%} of baseline")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
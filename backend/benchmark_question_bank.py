@@ -0,0 +1,139 @@
+"""
+Benchmark - Question Bank Index & Assessment Builder
+Compares the old nested-dict walk + greedy packing with the indexed store + knapsack builder
+on a synthetic bank of 10k+ questions. Runs offline (no Firebase needed).
+
+Usage: python benchmark_question_bank.py [--questions 12000] [--runs 200]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from question_store import QuestionIndex, build_assessment
+
+LEVELS = ['S1', 'S2', 'S3', 'S4', 'J1', 'J2']
+SUBJECTS = ['Math', 'EMath', 'AMath']
+TOPICS = ['Functions', 'Vectors', 'Calculus', 'Algebra', 'Geometry', 'Trigonometry',
+          'Probability', 'Statistics', 'Coordinate Geometry', 'Mensuration']
+DIFFICULTIES = ['Easy', 'Medium', 'Hard']
+
+
+def make_bank(total: int, rng: random.Random) -> dict:
+    """Nested bank in the DUMMY_QUESTION_BANK layout"""
+    bank = {}
+    for n in range(total):
+        key = f"{rng.choice(LEVELS)}_{rng.choice(SUBJECTS)}"
+        topic = rng.choice(TOPICS)
+        subtopic = f"{topic} {rng.randint(1, 5)}"
+        difficulty = rng.choice(DIFFICULTIES)
+        minutes = {'Easy': rng.choice([2, 3, 4]), 'Medium': rng.choice([4, 5, 6, 7]), 'Hard': rng.choice([7, 8, 10, 12])}[difficulty]
+        bank.setdefault(key, {}).setdefault(topic, {}).setdefault(subtopic, []).append({
+            'question_id': f"q{n}",
+            'topic': topic,
+            'subtopic': subtopic,
+            'question_text': f"Question {n}",
+            'marks': float(max(1, round(minutes * rng.uniform(0.6, 1.0)))),
+            'difficulty_level': difficulty,
+            'solution': '',
+            'estimated_time_minutes': float(minutes)
+        })
+    return bank
+
+
+def legacy_get_questions(bank, level, subject, topics=None, subtopics=None):
+    """The original nested-dict walk from question_bank.get_dummy_questions"""
+    key = f"{level}_{subject.replace('.', '').replace(' ', '')}"
+    if key not in bank:
+        return []
+    questions = []
+    for topic, subtopic_dict in bank[key].items():
+        if topics and topic not in topics:
+            continue
+        for subtopic, question_list in subtopic_dict.items():
+            if subtopics and subtopic not in subtopics:
+                continue
+            questions.extend(question_list)
+    return questions
+
+
+def legacy_greedy(questions, duration, rng):
+    """The original shuffle-and-pack loop from generate_assessment"""
+    questions = list(questions)
+    rng.shuffle(questions)
+    selected, total_time = [], 0
+    for q in questions:
+        if total_time + q['estimated_time_minutes'] <= duration:
+            selected.append(q)
+            total_time += q['estimated_time_minutes']
+        if total_time >= duration * 0.9:
+            break
+    return selected
+
+
+def summarize(name, latencies, papers, duration, target):
+    fills = [sum(q['estimated_time_minutes'] for q in p) / duration * 100 for p in papers]
+    mark_err = [abs(sum(q['marks'] for q in p) - target) for p in papers]
+    spreads = []
+    for p in papers:
+        per_topic = {}
+        for q in p:
+            per_topic[q['topic']] = per_topic.get(q['topic'], 0) + q['estimated_time_minutes']
+        spreads.append(max(per_topic.values()) - min(per_topic.values()) if per_topic else 0)
+    latencies = sorted(latencies)
+    print(f"  {name:<22} p50 {statistics.median(latencies) * 1000:7.2f} ms | p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.2f} ms"
+          f" | fill {statistics.mean(fills):5.1f}% | |marks-target| {statistics.mean(mark_err):5.1f}"
+          f" | topic time spread {statistics.mean(spreads):5.1f} min")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--questions', type=int, default=12000)
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=62)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    bank = make_bank(args.questions, rng)
+
+    start = time.perf_counter()
+    index = QuestionIndex.from_nested_bank(bank)
+    print(f"Indexed {len(index)} questions in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    requests = []
+    for _ in range(args.runs):
+        topics = rng.sample(TOPICS, rng.randint(2, 4))
+        duration = rng.choice([45, 90])
+        requests.append((rng.choice(LEVELS), rng.choice(SUBJECTS), topics, duration))
+
+    # Lookup
+    for name, fn in [('legacy nested walk', lambda r: legacy_get_questions(bank, r[0], r[1], r[2])),
+                     ('indexed lookup (cold)', lambda r: index.questions(r[0], r[1], r[2])),
+                     ('indexed lookup (warm)', lambda r: index.questions(r[0], r[1], r[2]))]:
+        start = time.perf_counter()
+        for r in requests:
+            fn(r)
+        print(f"  {name:<22} {(time.perf_counter() - start) / len(requests) * 1e6:8.1f} us/lookup")
+
+    # Assessment building
+    for duration in (45, 90):
+        target = duration * 0.8  # ~0.8 marks per minute
+        subset = [r for r in requests if r[3] == duration]
+        print(f"\n{duration}-minute papers (target {target:.0f} marks), {len(subset)} runs:")
+        for name in ('legacy greedy', 'knapsack builder'):
+            latencies, papers = [], []
+            for level, subject, topics, _ in subset:
+                questions = index.questions(level, subject, topics)
+                seen = {q['question_id'] for q in questions[::5]}
+                start = time.perf_counter()
+                if name == 'legacy greedy':
+                    paper = legacy_greedy(questions, duration, rng)
+                else:
+                    paper = build_assessment(questions, duration, target_marks=target, seen_question_ids=seen, rng=rng)
+                latencies.append(time.perf_counter() - start)
+                papers.append(paper)
+            summarize(name, latencies, papers, duration, target)
+
+
+if __name__ == "__main__":
+    main()
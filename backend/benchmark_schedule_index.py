@@ -0,0 +1,99 @@
+"""
+Benchmark - Schedule Index
+Times the parsed interval index (schedule_index.py) on the class catalog CSV against what
+admin_manage_class would do without it - parse every class schedule and compare:
+
+  - build:        parse and index the whole catalog
+  - conflicts:    clash check of every class against the rest (index vs full scan)
+  - free slots:   free periods for every tutor and every location
+  - incremental:  move one class to another slot (remove + add) vs rebuilding the index
+
+Usage:
+    python benchmark_schedule_index.py
+    python benchmark_schedule_index.py --catalog ../tuition_COMPLETE_FINAL_ALL_LEVELS.csv --repeat 5
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from benchmark_tuition_fast_path import percentile
+from benchmark_tuition_prompt import DEFAULT_CATALOG
+from schedule_index import ScheduleIndex, class_intervals
+from sync_catalog import load_catalog
+
+
+def scan_conflicts(classes: Dict[str, Dict], doc: Dict, class_id: str) -> List[str]:
+    """Tutor clashes the way it is done without an index: parse every schedule on every check"""
+    mine = class_intervals(doc)
+    found = []
+    for other_id, other in classes.items():
+        if other_id == class_id or other.get('tutor_id') != doc.get('tutor_id'):
+            continue
+        for day, start, end in class_intervals(other):
+            if any(day == d and start < e and end > s for d, s, e in mine):
+                found.append(other_id)
+    return found
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def report(label: str, samples: List[float]):
+    print(f"  {label:<28} p50 {percentile(samples, 50):8.3f}ms   p95 {percentile(samples, 95):8.3f}ms   "
+          f"total {sum(samples):9.1f}ms  ({len(samples)} runs)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--catalog', type=Path, default=DEFAULT_CATALOG)
+    parser.add_argument('--repeat', type=int, default=3, help="passes over the catalog per measurement")
+    args = parser.parse_args()
+
+    classes = {f"class_{i}": doc for i, doc in enumerate(load_catalog(args.catalog))}
+    print(f"Catalog: {len(classes)} classes from {args.catalog.name}")
+
+    builds = []
+    for _ in range(args.repeat):
+        index, ms = timed(ScheduleIndex.build, classes.items())
+        builds.append(ms)
+    tutors = sorted(key for kind, key in index.slots if kind == 'tutor')
+    locations = sorted(key for kind, key in index.slots if kind == 'location')
+    print(f"Index: {len(index)} classes, {len(tutors)} tutors, {len(locations)} locations, "
+          f"{len(index.skipped)} unparsed schedules")
+    print("Build")
+    report("full build", builds)
+
+    print("Conflict check (every class against the rest)")
+    indexed, scanned, mismatches = [], [], 0
+    for _ in range(args.repeat):
+        for class_id, doc in classes.items():
+            found, ms = timed(index.conflicts, doc, class_id)
+            indexed.append(ms)
+            expected, ms = timed(scan_conflicts, classes, doc, class_id)
+            scanned.append(ms)
+            mismatches += sorted({c['class_id'] for c in found['tutor']}) != sorted(set(expected))
+    report("index", indexed)
+    report("full scan", scanned)
+    print(f"  speed-up {percentile(scanned, 50) / percentile(indexed, 50):.0f}x at p50; "
+          f"{mismatches} tutor results differ from the scan")
+
+    print("Free slots (whole week, 60 minutes)")
+    report("per tutor", [timed(index.free_slots, [('tutor', t)])[1] for _ in range(args.repeat) for t in tutors])
+    report("per location", [timed(index.free_slots, [('location', loc)])[1] for _ in range(args.repeat) for loc in locations])
+
+    print("Incremental update (move a class to SUN 9:00am-10:30am and back)")
+    moves = []
+    for class_id, doc in classes.items():
+        moved = dict(doc, schedule=[{'day': 'SUN', 'time': '9:00am-10:30am'}])
+        moves.append(timed(index.apply_write, class_id, moved)[1])
+        moves.append(timed(index.apply_write, class_id, doc)[1])
+    report("apply_write", moves)
+    report("rebuild instead", builds)
+
+
+if __name__ == "__main__":
+    main()
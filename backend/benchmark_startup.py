@@ -0,0 +1,112 @@
+"""
+Benchmark - Backend Cold Start
+Imports server.py in a fresh interpreter per configuration and reports import time,
+startup-hook time, peak RSS and which heavy dependencies were loaded.
+
+Usage:
+    python benchmark_startup.py                                  # all routers + each router on its own
+    python benchmark_startup.py --configs all tuition project62
+    python benchmark_startup.py --compare-ref HEAD~1             # same measurements on an older tree (before/after)
+
+Needs the same .env / credentials as the server itself. Older trees ignore ENABLED_ROUTERS,
+so for --compare-ref only the 'all' row is comparable.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+
+HEAVY_MODULES = ['pandas', 'fitz', 'reportlab', 'stripe', 'sendgrid', 'notion_client', 'emergentintegrations']
+
+DEFAULT_CONFIGS = ['all', 'tuition', 'math_analysis,tutor_auth', 'project62', 'notion_sync']
+
+# Runs in the child interpreter: import, run startup/shutdown hooks, report as one JSON line
+CHILD_SCRIPT = f"""
+import asyncio, json, resource, sys, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+asyncio.run(server.app.router.startup())
+started = time.perf_counter()
+asyncio.run(server.app.router.shutdown())
+print(json.dumps({{
+    'import_seconds': imported - start,
+    'startup_seconds': started - imported,
+    'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'routes': len(server.app.routes),
+    'heavy_modules': [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure(backend_dir: Path, config: str, runs: int) -> dict:
+    samples = []
+    env = {**os.environ, 'ENABLED_ROUTERS': config, 'LOG_LEVEL': 'ERROR'}
+    for _ in range(runs):
+        completed = subprocess.run([sys.executable, '-c', CHILD_SCRIPT], cwd=backend_dir, env=env,
+                                   capture_output=True, text=True)
+        lines = [line for line in completed.stdout.splitlines() if line.startswith('{')]
+        if completed.returncode != 0 or not lines:
+            raise RuntimeError(f"[{config}] server import failed:\n{completed.stderr[-2000:]}")
+        samples.append(json.loads(lines[-1]))
+    return {
+        'import_seconds': statistics.median(s['import_seconds'] for s in samples),
+        'startup_seconds': statistics.median(s['startup_seconds'] for s in samples),
+        'peak_rss_mb': statistics.median(s['peak_rss_mb'] for s in samples),
+        'routes': samples[-1]['routes'],
+        'heavy_modules': samples[-1]['heavy_modules'],
+    }
+
+
+def export_backend(ref: str, destination: Path) -> Path:
+    """Unpack backend/ as of a git ref, reusing this checkout's .env and credential files"""
+    archive = subprocess.run(['git', 'archive', ref, 'backend'], cwd=ROOT_DIR.parent, capture_output=True, check=True)
+    with tarfile.open(fileobj=BytesIO(archive.stdout)) as tar:
+        tar.extractall(destination)
+    backend_dir = destination / 'backend'
+    for path in [ROOT_DIR / '.env', *ROOT_DIR.glob('firebase*credentials*.json')]:
+        if path.exists() and not (backend_dir / path.name).exists():
+            (backend_dir / path.name).write_bytes(path.read_bytes())
+    return backend_dir
+
+
+def print_table(title: str, results: dict):
+    print(f"\n{title}")
+    print(f"{'routers':<26} {'import s':>9} {'startup s':>10} {'RSS MB':>8} {'routes':>7}  heavy modules loaded")
+    for config, r in results.items():
+        print(f"{config:<26} {r['import_seconds']:>9.2f} {r['startup_seconds']:>10.2f} {r['peak_rss_mb']:>8.1f}"
+              f" {r['routes']:>7}  {', '.join(r['heavy_modules']) or '-'}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--configs', nargs='*', default=DEFAULT_CONFIGS, help="ENABLED_ROUTERS values to measure")
+    parser.add_argument('--runs', type=int, default=3, help="fresh interpreters per configuration (median reported)")
+    parser.add_argument('--compare-ref', help="git ref to measure as the 'before' tree")
+    args = parser.parse_args()
+
+    if args.compare_ref:
+        with tempfile.TemporaryDirectory() as tmp:
+            before_dir = export_backend(args.compare_ref, Path(tmp))
+            before = {'all': measure(before_dir, 'all', args.runs)}
+        print_table(f"Before ({args.compare_ref})", before)
+
+    after = {config: measure(ROOT_DIR, config, args.runs) for config in args.configs}
+    print_table("Current tree", after)
+
+    if args.compare_ref and 'all' in after:
+        b, a = before['all'], after['all']
+        print(f"\nall routers: import {b['import_seconds']:.2f}s -> {a['import_seconds']:.2f}s, "
+              f"RSS {b['peak_rss_mb']:.0f} MB -> {a['peak_rss_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
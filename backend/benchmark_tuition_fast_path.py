@@ -0,0 +1,135 @@
+"""
+Benchmark - Tuition Chat Fast Path Coverage
+Replays tuition chat turns through intent extraction, catalog retrieval and the template
+fast path (tuition_fast_path.py) against the class catalog CSV, and reports what fraction
+of turns skip the LLM and the latency that saves.
+
+Turns come from either
+  - the backend's JSON logs with TUITION_LOG_MESSAGES=true: lines carrying 'tuition_message'
+    are grouped by session_id so follow-ups replay with their history. Logged 'latency_ms'
+    of LLM turns (fast_path false) is used as the LLM latency saved per fast-path turn.
+  - a text file with one message per line (one conversation), or the built-in script.
+
+Usage:
+    python benchmark_tuition_fast_path.py --logs backend.log
+    python benchmark_tuition_fast_path.py --turns turns.txt --llm-latency-ms 2500
+"""
+import argparse
+import json
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmark_tuition_prompt import DEFAULT_CATALOG, DEFAULT_TURNS, load_catalog_csv, catalog_queries
+from tuition_fast_path import fast_path_answer
+from tuition_retrieval import extract_intent, needs_catalog, catalog_context
+from tutor_names import TutorAliases
+
+# Assumed LLM turn latency when the logs have none (gpt-4o-mini, typical tuition answer)
+DEFAULT_LLM_LATENCY_MS = 2500.0
+
+
+def load_log_sessions(path: Path):
+    """(sessions: session_id -> [message], LLM turn latencies in ms) from JSON log lines"""
+    sessions: Dict[str, List[str]] = {}
+    llm_latencies: List[float] = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line.startswith('{'):
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if 'latency_ms' in entry and entry.get('fast_path') is False:
+                llm_latencies.append(float(entry['latency_ms']))
+            if entry.get('tuition_message'):
+                sessions.setdefault(entry.get('session_id') or 'unknown', []).append(entry['tuition_message'])
+    return sessions, llm_latencies
+
+
+def replay(sessions: Dict[str, List[str]], query_classes, query_tutors, aliases: TutorAliases) -> List[Dict]:
+    """Every turn with the fast-path outcome and its in-process latency"""
+    results = []
+    for messages in sessions.values():
+        history: List[Dict] = []
+        for message in messages:
+            started = time.perf_counter()
+            intent = extract_intent(message, history, aliases)
+            facts = {'clarify': None, 'classes': [], 'tutors': [], 'candidates': []}
+            catalog = ""
+            if needs_catalog(message, aliases):
+                catalog, facts = catalog_context(intent, message, query_classes, query_tutors)
+            answer = fast_path_answer(message, intent, facts, query_classes)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            results.append({'message': message, 'kind': answer['kind'] if answer else None, 'ms': elapsed_ms})
+            # Template answers are the real history; LLM turns get a stand-in
+            history.append({'user': message,
+                            'assistant': answer['text'] if answer else catalog or "Sure - which level and subject?"})
+    return results
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--catalog', type=Path, default=DEFAULT_CATALOG)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--logs', type=Path, help="backend JSON log file with tuition_message fields")
+    source.add_argument('--turns', type=Path, help="file with one user message per line")
+    parser.add_argument('--llm-latency-ms', type=float, help="LLM turn latency to credit per fast-path turn")
+    parser.add_argument('--show-misses', type=int, default=0, help="print this many turns that went to the LLM")
+    args = parser.parse_args()
+
+    classes = load_catalog_csv(args.catalog)
+    query_classes, query_tutors = catalog_queries(classes)
+
+    llm_latencies: List[float] = []
+    if args.logs:
+        sessions, llm_latencies = load_log_sessions(args.logs)
+        if not sessions:
+            raise SystemExit(f"No tuition_message entries in {args.logs} - run the backend with TUITION_LOG_MESSAGES=true")
+    elif args.turns:
+        sessions = {'turns': [line.strip() for line in args.turns.read_text().splitlines() if line.strip()]}
+    else:
+        sessions = {'script': DEFAULT_TURNS}
+
+    results = replay(sessions, query_classes, query_tutors, TutorAliases(c['tutor_name'] for c in classes))
+    handled = [r for r in results if r['kind']]
+    kinds = Counter(r['kind'] for r in handled)
+
+    llm_latency: Optional[float] = args.llm_latency_ms
+    latency_source = "--llm-latency-ms"
+    if llm_latency is None and llm_latencies:
+        llm_latency, latency_source = statistics.median(llm_latencies), f"median of {len(llm_latencies)} logged LLM turns"
+    if llm_latency is None:
+        llm_latency, latency_source = DEFAULT_LLM_LATENCY_MS, "default estimate"
+
+    print(f"Catalog: {len(classes)} classes from {args.catalog.name}")
+    print(f"Turns replayed: {len(results)} in {len(sessions)} conversation(s)")
+    print(f"Fast path handled: {len(handled)} ({len(handled) / len(results):.0%})")
+    for kind, count in kinds.most_common():
+        print(f"  {kind:<20} {count:>5} ({count / len(results):.0%})")
+    if handled:
+        fast_ms = [r['ms'] for r in handled]
+        print(f"Fast path latency: p50 {percentile(fast_ms, 50):.2f}ms, p95 {percentile(fast_ms, 95):.2f}ms "
+              f"(in process, catalog in memory)")
+    saved_ms = sum(llm_latency - r['ms'] for r in handled)
+    print(f"LLM latency per turn: {llm_latency:.0f}ms ({latency_source})")
+    print(f"Latency saved: {saved_ms / 1000:.1f}s total, {saved_ms / len(results):.0f}ms per turn on average; "
+          f"{len(handled)} LLM calls avoided")
+
+    if args.show_misses:
+        print("\nTurns answered by the LLM:")
+        for r in [r for r in results if not r['kind']][:args.show_misses]:
+            print(f"  {r['message'][:80]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark - Tuition Chat Prompt Size
+Replays a scripted tuition conversation against the class catalog CSV and reports the prompt
+tokens per turn for the retrieval-based prompt (tuition_retrieval.py) next to the legacy
+monolithic system prompt, read from the last git revision that still had it.
+
+Usage:
+    python benchmark_tuition_prompt.py
+    python benchmark_tuition_prompt.py --catalog ../tuition_COMPLETE_FINAL_ALL_LEVELS.csv --turns turns.txt
+
+The legacy figure counts only its static system prompt, the history it appended and the user
+message - not the per-turn class listings it added - so the saving shown is a lower bound.
+"""
+import argparse
+import ast
+import csv
+import statistics
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from chat_context import count_tokens
+from tutor_names import TutorAliases, normalize_tutor_name
+from tuition_retrieval import (
+    TUITION_SYSTEM_PREFIX, extract_intent, needs_catalog, catalog_context, reference_notes, build_user_turn
+)
+
+ROOT_DIR = Path(__file__).parent
+DEFAULT_CATALOG = ROOT_DIR.parent / "tuition_COMPLETE_FINAL_ALL_LEVELS.csv"
+
+DEFAULT_TURNS = [
+    "Hi, what classes do you offer?",
+    "Tell me about S3 EMath",
+    "List Bishan classes",
+    "S3 AMath at Bishan",
+    "How much is it per month?",
+    "Why are S3 and S4 EMath different?",
+    "Which tutors teach P6 Math at Punggol?",
+    "P6 math Mr Eugene",
+    "When are the 2026 holidays?",
+    "When do I need to settle the fees for March?",
+    "J1 Physics",
+    "Jurong",
+    "How do I enroll?",
+]
+
+def load_catalog_csv(path: Path) -> List[Dict]:
+    """Class documents in the shape stored in Firestore, from a Level,Subject,Location,Tutor_Name,... CSV"""
+    classes = []
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            schedule = [{'day': row[f'Day{i}'], 'time': row[f'Time{i}']}
+                        for i in (1, 2) if row.get(f'Day{i}') and row.get(f'Time{i}')]
+            tutor = normalize_tutor_name(row['Tutor_Name'])
+            classes.append({
+                'level': row['Level'],
+                'subject': row['Subject'],
+                'location': row['Location'],
+                'tutor_id': tutor.tutor_id,
+                'tutor_name': row['Tutor_Name'],
+                'tutor_base_name': tutor.base_name,
+                'schedule': schedule,
+                'monthly_fee': float(row['Monthly_Fee'] or 0),
+                'sessions_per_week': int(row.get('Sessions_Per_Week') or len(schedule) or 1),
+            })
+    return classes
+
+
+def catalog_queries(classes: List[Dict]):
+    def query_classes(level=None, subject=None, location=None, limit=50):
+        matched = [c for c in classes
+                   if (not level or c['level'] == level) and (not subject or c['subject'] == subject)
+                   and (not location or c['location'] == location)]
+        return matched[:limit]
+
+    def query_tutors(name_search=None, limit=20):
+        return []
+
+    return query_classes, query_tutors
+
+
+def legacy_system_message() -> Optional[str]:
+    """TUITION_SYSTEM_MESSAGE from the revision just before it was removed from server.py"""
+    try:
+        removed_in = subprocess.run(
+            ['git', 'log', '-1', '--format=%H', '-S', 'TUITION_SYSTEM_MESSAGE = ', '--', 'backend/server.py'],
+            cwd=ROOT_DIR.parent, capture_output=True, text=True, check=True).stdout.strip()
+        if not removed_in:
+            return None
+        source = subprocess.run(['git', 'show', f'{removed_in}^:backend/server.py'],
+                                cwd=ROOT_DIR.parent, capture_output=True, text=True, check=True).stdout
+    except (subprocess.CalledProcessError, FileNotFoundError):
+        return None
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.Assign) and any(getattr(t, 'id', None) == 'TUITION_SYSTEM_MESSAGE' for t in node.targets):
+            return ast.literal_eval(node.value)
+    return None
+
+
+def legacy_history_tokens(history: List[Dict]) -> int:
+    if not history:
+        return 0
+    text = "\n\n**CONVERSATION CONTEXT:**\n"
+    for msg in history[-4:]:
+        text += f"User: {msg['user']}\nAssistant: {msg['assistant'][:150]}...\n"
+    return count_tokens(text)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--catalog', type=Path, default=DEFAULT_CATALOG)
+    parser.add_argument('--turns', type=Path, help="file with one user message per line (default: built-in script)")
+    args = parser.parse_args()
+
+    classes = load_catalog_csv(args.catalog)
+    query_classes, query_tutors = catalog_queries(classes)
+    aliases = TutorAliases(c['tutor_name'] for c in classes)
+    turns = [line.strip() for line in args.turns.read_text().splitlines() if line.strip()] if args.turns else DEFAULT_TURNS
+
+    legacy_system = legacy_system_message()
+    legacy_system_tokens = count_tokens(legacy_system) if legacy_system else None
+
+    history: List[Dict] = []
+    new_totals, legacy_totals = [], []
+    print(f"Catalog: {len(classes)} classes from {args.catalog.name}")
+    print(f"System prompt: {count_tokens(TUITION_SYSTEM_PREFIX)} tokens now"
+          + (f", {legacy_system_tokens} tokens before" if legacy_system_tokens else " (legacy prompt not found in git history)"))
+    print(f"\n{'turn':<45} {'ref':>5} {'cat':>5} {'hist':>5} {'total':>6} {'legacy':>7}")
+    for message in turns:
+        intent = extract_intent(message, history, aliases)
+        catalog, facts = ("", {'classes': []})
+        if needs_catalog(message, aliases):
+            catalog, facts = catalog_context(intent, message, query_classes, query_tutors)
+        user_turn = build_user_turn(message, reference_notes(intent, message, bool(facts['classes'])), catalog, history)
+        tokens = user_turn['tokens']
+        total = sum(tokens.values())
+        new_totals.append(total)
+        legacy = None
+        if legacy_system_tokens:
+            legacy = legacy_system_tokens + legacy_history_tokens(history) + count_tokens(message)
+            legacy_totals.append(legacy)
+        print(f"{message[:44]:<45} {tokens['reference']:>5} {tokens['catalog']:>5} {tokens['history']:>5} {total:>6} "
+              f"{legacy if legacy is not None else '-':>7}")
+        # Stand-in answer so later turns carry realistic history
+        history.append({'user': message, 'assistant': catalog or "Sure - which level and subject are you interested in?"})
+
+    print(f"\nmean prompt tokens per turn: {statistics.mean(new_totals):.0f}", end="")
+    if legacy_totals:
+        saving = 1 - statistics.mean(new_totals) / statistics.mean(legacy_totals)
+        print(f" (legacy lower bound {statistics.mean(legacy_totals):.0f}, saving >= {saving:.0%})")
+    else:
+        print()
+
+
+if __name__ == "__main__":
+    main()
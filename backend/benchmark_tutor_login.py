@@ -0,0 +1,142 @@
+"""
+Benchmark - Tutor Login Throughput
+Runs concurrent logins through the old path (blocking get, SHA-256, blocking last_login update)
+and the new path (threaded get, pooled scrypt verify, write-behind last_login) and reports
+logins/sec plus the worst event-loop stall. Firestore round trips are simulated with sleeps,
+so it runs offline.
+
+Usage: python benchmark_tutor_login.py [--logins 400] [--concurrency 50] [--firestore-ms 20]
+"""
+import argparse
+import asyncio
+import hashlib
+import time
+
+from tutor_credentials import hash_password, verify_password_async, LastLoginBuffer
+
+
+class SimulatedTutorStore:
+    """Tutor documents in memory with a fixed round-trip delay per call"""
+
+    def __init__(self, latency_seconds: float):
+        self.latency_seconds = latency_seconds
+        self.docs = {}
+        self.writes = 0
+
+    def get(self, login_id: str):
+        time.sleep(self.latency_seconds)
+        return self.docs.get(login_id)
+
+    def update(self, login_id: str, data: dict):
+        time.sleep(self.latency_seconds)
+        self.docs[login_id].update(data)
+        self.writes += 1
+
+
+class SimulatedBatchDB:
+    """Just enough of the Firestore client for LastLoginBuffer"""
+
+    def __init__(self, store: SimulatedTutorStore):
+        self.store = store
+
+    def collection(self, name):
+        return self
+
+    def document(self, login_id):
+        return login_id
+
+    def batch(self):
+        store = self.store
+
+        class Batch:
+            def __init__(self):
+                self.updates = []
+
+            def update(self, login_id, data):
+                self.updates.append((login_id, data))
+
+            def commit(self):
+                time.sleep(store.latency_seconds)
+                for login_id, data in self.updates:
+                    store.docs[login_id].update(data)
+                store.writes += 1
+
+        return Batch()
+
+
+async def legacy_login(store: SimulatedTutorStore, login_id: str, password: str) -> bool:
+    tutor = store.get(login_id)
+    if tutor['password_hash'] != hashlib.sha256(password.encode()).hexdigest():
+        return False
+    store.update(login_id, {'last_login': time.time()})
+    return True
+
+
+async def new_login(store: SimulatedTutorStore, buffer: LastLoginBuffer, login_id: str, password: str) -> bool:
+    tutor = await asyncio.to_thread(store.get, login_id)
+    matches, _ = await verify_password_async(password, tutor['password_hash'])
+    if not matches:
+        return False
+    buffer.record(login_id)
+    return True
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.005) -> float:
+    """Worst delay between when a timer should fire and when it actually runs"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run(name: str, login, logins: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            return await login(f"tutor{i % 20}")
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    start = time.perf_counter()
+    ok = await asyncio.gather(*(one(i) for i in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    worst_lag = await lag_task
+    print(f"  {name:<32} {logins / elapsed:8.1f} logins/s | {elapsed:6.2f} s total"
+          f" | worst loop stall {worst_lag * 1000:7.1f} ms | {sum(ok)}/{logins} ok")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--firestore-ms', type=float, default=20)
+    args = parser.parse_args()
+
+    password = 'demo123'
+    print(f"{args.logins} logins, concurrency {args.concurrency}, simulated Firestore RTT {args.firestore_ms} ms")
+
+    legacy_store = SimulatedTutorStore(args.firestore_ms / 1000)
+    new_store = SimulatedTutorStore(args.firestore_ms / 1000)
+    scrypt_hash = hash_password(password)
+    for i in range(20):
+        legacy_store.docs[f"tutor{i}"] = {'password_hash': hashlib.sha256(password.encode()).hexdigest()}
+        new_store.docs[f"tutor{i}"] = {'password_hash': scrypt_hash}
+
+    buffer = LastLoginBuffer(SimulatedBatchDB(new_store), interval_seconds=1)
+    buffer.start()
+
+    await run('legacy (blocking, SHA-256)', lambda lid: legacy_login(legacy_store, lid, password),
+              args.logins, args.concurrency)
+    await run('new (threaded, scrypt, buffered)', lambda lid: new_login(new_store, buffer, lid, password),
+              args.logins, args.concurrency)
+
+    await buffer.stop()
+    print(f"\n  last_login writes: legacy {legacy_store.writes}, new {new_store.writes} (batched)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
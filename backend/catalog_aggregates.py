@@ -0,0 +1,292 @@
+"""
+Catalog Aggregates
+Materialized views over the tuition `classes` collection, kept in step with every class write:
+
+    catalog_aggregates/tutors__{level}__{subject}__{location}   tutors teaching a class (dropdown)
+    catalog_aggregates/locations__{level}__{subject}            locations offering a class
+    tutors/{tutor_id}                                           per-tutor coverage and total_classes
+
+Each document keeps per-key class counts next to the sorted lists the UI reads, so adding or
+deleting one class is an increment/decrement inside the same transaction as the class write.
+A missing or legacy (count-less) document is first rebuilt from a query of its classes in that
+transaction, so an aggregate never holds just the classes written since it appeared.
+sync_catalog.py rebuilds all of them from scratch with build_aggregates().
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from tutor_names import normalize_tutor_name
+
+logger = logging.getLogger(__name__)
+
+AGGREGATES_COLLECTION = 'catalog_aggregates'
+CACHE_TTL_SECONDS = float(os.getenv("CATALOG_AGGREGATE_CACHE_SECONDS", "60"))
+
+_UNSAFE = re.compile(r"[^a-z0-9]+")
+
+# ========================
+# DOCUMENT KEYS
+# ========================
+
+def _slug(value: str) -> str:
+    return _UNSAFE.sub('_', (value or '').lower()).strip('_')
+
+
+def tutors_doc_id(level: str, subject: str, location: str) -> str:
+    return f"tutors__{_slug(level)}__{_slug(subject)}__{_slug(location)}"
+
+
+def locations_doc_id(level: str, subject: str) -> str:
+    return f"locations__{_slug(level)}__{_slug(subject)}"
+
+
+def class_tutor(cls: Dict) -> Tuple[str, str]:
+    """(tutor_id, base name) of a class document, for documents written before tutor_id existed too"""
+    tutor = normalize_tutor_name(cls.get('tutor_base_name') or cls.get('tutor_name') or '')
+    return cls.get('tutor_id') or tutor.tutor_id, cls.get('tutor_base_name') or tutor.base_name
+
+
+def aggregate_paths(cls: Dict) -> List[Tuple[str, str]]:
+    """(collection, document ID) of every aggregate a class contributes to"""
+    tutor_id, _ = class_tutor(cls)
+    return [
+        (AGGREGATES_COLLECTION, tutors_doc_id(cls['level'], cls['subject'], cls['location'])),
+        (AGGREGATES_COLLECTION, locations_doc_id(cls['level'], cls['subject'])),
+        ('tutors', tutor_id),
+    ]
+
+# ========================
+# COUNTING
+# ========================
+
+def _bump(counts: Dict[str, int], key: str, sign: int):
+    counts[key] = counts.get(key, 0) + sign
+    if counts[key] <= 0:
+        del counts[key]
+
+
+def apply_class(docs: Dict[Tuple[str, str], Optional[Dict]], cls: Dict, sign: int):
+    """Add (sign=1) or remove (sign=-1) one class from the aggregate documents in `docs`"""
+    tutor_id, tutor_name = class_tutor(cls)
+    level, subject, location = cls['level'], cls['subject'], cls['location']
+    tutors_path, locations_path, coverage_path = aggregate_paths(cls)
+
+    doc = docs.get(tutors_path) or {'level': level, 'subject': subject, 'location': location,
+                                    'tutor_counts': {}, 'tutor_names': {}}
+    _bump(doc['tutor_counts'], tutor_id, sign)
+    if sign > 0:
+        doc['tutor_names'][tutor_id] = tutor_name
+    doc['tutor_names'] = {tid: name for tid, name in doc['tutor_names'].items() if tid in doc['tutor_counts']}
+    doc['tutors'] = sorted(set(doc['tutor_names'].values()))
+    docs[tutors_path] = doc
+
+    doc = docs.get(locations_path) or {'level': level, 'subject': subject, 'location_counts': {}}
+    _bump(doc['location_counts'], location, sign)
+    doc['locations'] = sorted(doc['location_counts'])
+    docs[locations_path] = doc
+
+    doc = docs.get(coverage_path) or {'tutor_id': tutor_id, 'name': tutor_name, 'total_classes': 0}
+    coverage = doc.setdefault('coverage', {})
+    for field, value in (('locations', location), ('subjects', subject), ('levels', level)):
+        _bump(coverage.setdefault(field, {}), value, sign)
+    doc['coverage'] = coverage
+    doc['total_classes'] = max(0, doc.get('total_classes', 0) + sign)
+    for field in ('locations', 'subjects', 'levels'):
+        doc[field] = sorted(coverage[field])
+    if sign > 0:
+        doc['name'] = tutor_name
+    docs[coverage_path] = doc
+
+
+def needs_rebuild(path: Tuple[str, str], doc: Optional[Dict]) -> bool:
+    """
+    Missing documents and legacy ones without counts (tutor documents from the old upload
+    scripts, aggregates from before the counts) cannot take a delta - they are rebuilt from
+    the classes instead of being started from this one class
+    """
+    if doc is None:
+        return True
+    if path[0] == 'tutors':
+        return 'coverage' not in doc
+    return 'tutor_counts' not in doc and 'location_counts' not in doc
+
+
+def contributing_classes(db, path: Tuple[str, str], cls: Dict):
+    """
+    Query for every class that counts towards the aggregate at `path` (cls is one of them).
+    Per-tutor documents match on tutor_id, which sync_catalog.py writes on every class.
+    """
+    classes = db.collection('classes')
+    if path[0] == 'tutors':
+        return classes.where('tutor_id', '==', path[1])
+    query = classes.where('level', '==', cls['level']).where('subject', '==', cls['subject'])
+    if path[1].startswith('tutors__'):
+        query = query.where('location', '==', cls['location'])
+    return query
+
+
+def rebuild_aggregate(path: Tuple[str, str], classes: Iterable[Dict], existing: Optional[Dict]) -> Optional[Dict]:
+    """The aggregate at `path` for these classes, keeping fields of an existing tutor document"""
+    doc = build_aggregates(classes).get(path)
+    if doc is not None and existing and path[0] == 'tutors':
+        doc = {**existing, **doc}
+    return doc
+
+
+def is_empty(path: Tuple[str, str], doc: Dict) -> bool:
+    if path[0] == 'tutors':
+        return doc.get('total_classes', 0) <= 0
+    return not (doc.get('tutor_counts') or doc.get('location_counts'))
+
+
+def build_aggregates(classes: Iterable[Dict]) -> Dict[Tuple[str, str], Dict]:
+    """Every aggregate document for a full set of classes"""
+    docs: Dict[Tuple[str, str], Optional[Dict]] = {}
+    for cls in classes:
+        apply_class(docs, cls, 1)
+    return docs
+
+# ========================
+# TRANSACTIONAL WRITES
+# ========================
+
+# (class_id, document, merge): document None deletes the class; merge=True updates fields of an existing class
+ClassWrite = Tuple[str, Optional[Dict], bool]
+
+class ClassWriteError(ValueError):
+    """A class write that cannot be applied (update of a class that does not exist)"""
+
+
+def save_classes(db, writes: List[ClassWrite], invalidate: bool = True) -> List[Optional[Dict]]:
+    """
+    Apply class writes in order and update the aggregates they leave and join, all in one
+    transaction - either every write lands or none does. Returns each class's previous document.
+    Writes to the same class see the earlier ones.
+    """
+    from firebase_admin import firestore
+
+    class_refs = {class_id: db.collection('classes').document(class_id) for class_id, _, _ in writes}
+
+    @firestore.transactional
+    def write(transaction):
+        current = {}
+        for class_id, ref in class_refs.items():
+            snapshot = ref.get(transaction=transaction)
+            current[class_id] = snapshot.to_dict() if snapshot.exists else None
+        originals = dict(current)
+
+        previous, changes = [], []
+        for class_id, doc, merge in writes:
+            old_doc = current[class_id]
+            if merge:
+                if old_doc is None:
+                    raise ClassWriteError(f"Class not found: {class_id}")
+                doc = {**old_doc, **doc}
+            previous.append(old_doc)
+            changes.append((old_doc, doc))
+            current[class_id] = doc
+
+        refs, docs = {}, {}
+        for old_doc, doc in changes:
+            for cls in (old_doc, doc):
+                if not cls:
+                    continue
+                for path in aggregate_paths(cls):
+                    if path not in refs:
+                        refs[path] = db.collection(path[0]).document(path[1])
+                        snapshot = refs[path].get(transaction=transaction)
+                        docs[path] = snapshot.to_dict() if snapshot.exists else None
+                        if needs_rebuild(path, docs[path]):
+                            # Stored classes, so the deltas below still apply on top
+                            stored = contributing_classes(db, path, cls).get(transaction=transaction)
+                            docs[path] = rebuild_aggregate(path, (c.to_dict() for c in stored), docs[path])
+
+        # All reads are done - apply the deltas in memory, then write each document once
+        for old_doc, doc in changes:
+            if old_doc:
+                apply_class(docs, old_doc, -1)
+            if doc:
+                apply_class(docs, doc, 1)
+
+        for path, doc in docs.items():
+            if is_empty(path, doc):
+                transaction.delete(refs[path])
+            else:
+                transaction.set(refs[path], doc)
+        for class_id, doc in current.items():
+            if doc is not None:
+                transaction.set(class_refs[class_id], doc)
+            elif originals[class_id] is not None:
+                transaction.delete(class_refs[class_id])
+        return previous
+
+    previous = write(db.transaction())
+    if invalidate:
+        aggregate_cache.clear()
+    return previous
+
+
+def save_class(db, class_id: str, class_doc: Optional[Dict], merge: bool = False) -> Optional[Dict]:
+    """
+    Write a class (or delete it when class_doc is None) and update its aggregates in one
+    transaction. Returns the previous class document.
+    """
+    return save_classes(db, [(class_id, class_doc, merge)])[0]
+
+# ========================
+# READS
+# ========================
+
+class AggregateCache:
+    """Aggregate documents by path for CACHE_TTL_SECONDS; cleared on this process's class writes"""
+
+    def __init__(self, ttl: float = CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, Optional[Dict]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return None, False
+        return entry[1], True
+
+    def put(self, key: str, doc: Optional[Dict]):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), doc)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+aggregate_cache = AggregateCache()
+
+
+def read_aggregate(db, doc_id: str) -> Optional[Dict]:
+    """One aggregate document (None if it does not exist), through the cache"""
+    doc, hit = aggregate_cache.get(doc_id)
+    if hit:
+        return doc
+    snapshot = db.collection(AGGREGATES_COLLECTION).document(doc_id).get()
+    doc = snapshot.to_dict() if snapshot.exists else None
+    aggregate_cache.put(doc_id, doc)
+    return doc
+
+
+def available_tutors(db, level: str, subject: str, location: str) -> Optional[List[str]]:
+    """Tutor names for a level/subject/location, or None when the aggregate has not been built"""
+    doc = read_aggregate(db, tutors_doc_id(level, subject, location))
+    return None if doc is None else doc.get('tutors', [])
+
+
+def available_locations(db, level: str, subject: str) -> Optional[List[str]]:
+    """Locations offering a level/subject, or None when the aggregate has not been built"""
+    doc = read_aggregate(db, locations_doc_id(level, subject))
+    return None if doc is None else doc.get('locations', [])
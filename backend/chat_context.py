@@ -0,0 +1,226 @@
+"""
+Chat Context Builder for the CCC Consultant Chat
+Keeps each agent's system prompt fixed (so providers can cache it) and fits the
+conversation into a per-agent token budget: recent turns verbatim, older turns folded
+into a rolling summary that is stored per conversation and reused on later turns.
+
+Environment:
+    CHAT_CONTEXT_BUDGETS     history tokens per agent_mode, e.g. "main=2500,services=3500"
+    CHAT_RECENT_MESSAGES     messages always kept verbatim (default 6)
+    CHAT_SUMMARY_BATCH       aged-out messages collected before the summary is refreshed (default 4)
+    CHAT_MAX_MESSAGE_TOKENS  cap for any single message (default 800)
+"""
+
+import hashlib
+import logging
+import os
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHAT_MODEL = "gpt-4o-mini"
+
+DEFAULT_BUDGETS = {
+    "main": 2500,
+    "services": 3500,
+    "grants": 2000,
+    "support": 2000,
+}
+
+
+def _parse_budgets(value: Optional[str]) -> Dict[str, int]:
+    budgets = dict(DEFAULT_BUDGETS)
+    for part in (value or "").split(","):
+        if "=" in part:
+            mode, tokens = part.split("=", 1)
+            budgets[mode.strip()] = int(tokens)
+    return budgets
+
+
+CONTEXT_BUDGETS = _parse_budgets(os.getenv("CHAT_CONTEXT_BUDGETS"))
+RECENT_MESSAGES = int(os.getenv("CHAT_RECENT_MESSAGES", "6"))
+SUMMARY_BATCH = int(os.getenv("CHAT_SUMMARY_BATCH", "4"))
+MAX_MESSAGE_TOKENS = int(os.getenv("CHAT_MAX_MESSAGE_TOKENS", "800"))
+SUMMARY_MAX_TOKENS = 400
+
+SUMMARY_SYSTEM_PROMPT = """You maintain a running summary of a website chat between a visitor and CCC's AI consultant.
+Merge the previous summary with the new messages. Keep the visitor's business, needs, budget,
+timeline, contact details they chose to share, and any prices or recommendations already given.
+Write at most 150 words of plain text. Do not add anything that was not said."""
+
+# ========================
+# TOKEN COUNTING
+# ========================
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """gpt-4o tokenizer, or None when tiktoken (or its BPE file) is unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable, estimating tokens from characters: {str(e)}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@lru_cache(maxsize=16)
+def count_fixed_tokens(text: str) -> int:
+    """count_tokens for the fixed agent system prompts, counted once per process"""
+    return count_tokens(text)
+
+
+def truncate_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """Cut text to at most max_tokens, keeping the start ('head') or the end ('tail')"""
+    if max_tokens <= 0:
+        return ""
+    encoding = _encoding()
+    if encoding is None:
+        max_chars = max_tokens * 4
+        if len(text) <= max_chars:
+            return text
+        return text[:max_chars] + " …" if keep == "head" else "… " + text[-max_chars:]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    if keep == "head":
+        return encoding.decode(tokens[:max_tokens]) + " …"
+    return "… " + encoding.decode(tokens[-max_tokens:])
+
+# ========================
+# CONTEXT BUILDER
+# ========================
+
+def _format_message(role: str, content: str) -> str:
+    speaker = "User" if role == "user" else "Assistant"
+    return f"{speaker}: {truncate_tokens(content, MAX_MESSAGE_TOKENS)}"
+
+
+def _messages_digest(messages: List[Tuple[str, str]]) -> str:
+    """Fingerprint of the summarized prefix, so an edited history never reuses a stale summary"""
+    digest = hashlib.sha256()
+    for role, content in messages:
+        digest.update(role.encode())
+        digest.update(b"\0")
+        digest.update(content.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ChatContextBuilder:
+    """
+    Builds the user-turn text for one chat request. `summaries` is the Mongo collection
+    holding one rolling summary per conversation_id; `complete(session_id, system_message, text)`
+    is the coroutine that calls the LLM.
+    """
+
+    def __init__(self, summaries, complete):
+        self.summaries = summaries
+        self.complete = complete
+
+    async def load_summary(self, conversation_id: Optional[str], history: List[Tuple[str, str]]) -> Dict:
+        """Stored summary if it still matches the start of this history"""
+        if not conversation_id:
+            return {}
+        doc = await self.summaries.find_one({"conversation_id": conversation_id}, {"_id": 0})
+        if not doc:
+            return {}
+        count = doc.get("summarized_count", 0)
+        if count > len(history) or doc.get("messages_digest") != _messages_digest(history[:count]):
+            return {}
+        return doc
+
+    async def build(self, agent_mode: str, conversation_id: Optional[str],
+                    history: List[Tuple[str, str]], question: str) -> Dict:
+        """
+        history: (role, content) pairs before the current question.
+        Returns the prompt text plus the bookkeeping needed for refresh_summary().
+        """
+        budget = CONTEXT_BUDGETS.get(agent_mode, CONTEXT_BUDGETS["main"])
+        summary_doc = await self.load_summary(conversation_id, history)
+        summary = summary_doc.get("summary", "")
+        summarized_count = summary_doc.get("summarized_count", 0)
+
+        # Everything after the summary, newest first, until the budget is spent
+        remaining = budget - count_tokens(summary)
+        kept: List[str] = []
+        dropped = 0
+        unsummarized = history[summarized_count:]
+        for index, (role, content) in enumerate(reversed(unsummarized)):
+            line = _format_message(role, content)
+            tokens = count_tokens(line)
+            if tokens > remaining:
+                if index < RECENT_MESSAGES and remaining > 50:
+                    # Never lose the latest turns entirely - keep their tail
+                    kept.append(truncate_tokens(line, remaining, keep="tail"))
+                    remaining = 0
+                dropped = len(unsummarized) - len(kept)
+                break
+            kept.append(line)
+            remaining -= tokens
+        kept.reverse()
+
+        sections = []
+        if summary:
+            sections.append(f"=== Summary of earlier conversation ===\n{summary}")
+        if kept:
+            sections.append("=== Recent conversation ===\n" + "\n".join(kept))
+        sections.append(f"=== Current question ===\n{question}")
+        prompt = "\n\n".join(sections)
+
+        return {
+            "prompt": prompt,
+            "summary_tokens": count_tokens(summary),
+            "history_tokens": budget - count_tokens(summary) - remaining,
+            "question_tokens": count_tokens(question),
+            "prompt_tokens": count_tokens(prompt),
+            "dropped_messages": dropped,
+            "summary": summary,
+            "summarized_count": summarized_count,
+        }
+
+    def needs_summary(self, conversation_id: Optional[str], history: List[Tuple[str, str]],
+                      summarized_count: int) -> bool:
+        """Enough messages have aged out of the verbatim window to fold them into the summary"""
+        if not conversation_id:
+            return False
+        aged_out = len(history) - RECENT_MESSAGES
+        return aged_out - summarized_count >= SUMMARY_BATCH
+
+    async def refresh_summary(self, conversation_id: str, agent_mode: str,
+                              history: List[Tuple[str, str]], summary: str, summarized_count: int):
+        """Fold the aged-out messages into the rolling summary (runs after the response is sent)"""
+        try:
+            new_count = len(history) - RECENT_MESSAGES
+            new_lines = "\n".join(_format_message(role, content) for role, content in history[summarized_count:new_count])
+            text = f"Previous summary:\n{summary or '(none)'}\n\nNew messages:\n{new_lines}"
+
+            response = await self.complete(f"ccc-chat-summary-{conversation_id}", SUMMARY_SYSTEM_PROMPT, text)
+            new_summary = truncate_tokens(str(response).strip(), SUMMARY_MAX_TOKENS)
+
+            await self.summaries.update_one(
+                {"conversation_id": conversation_id},
+                {"$set": {
+                    "conversation_id": conversation_id,
+                    "agent_mode": agent_mode,
+                    "summary": new_summary,
+                    "summarized_count": new_count,
+                    "messages_digest": _messages_digest(history[:new_count]),
+                    "summary_tokens": count_tokens(new_summary),
+                    "updated_at": datetime.now(timezone.utc).isoformat()
+                }},
+                upsert=True
+            )
+            logger.info(f"Chat summary refreshed - conversation: {conversation_id}, messages: {new_count}")
+        except Exception as e:
+            logger.error(f"Error refreshing chat summary: {str(e)}")
@@ -0,0 +1,159 @@
+"""
+Checkout Status Events
+Pushes checkout status to the success page instead of having it poll Stripe.
+
+The Stripe webhook updates project62/payment_transactions/all/{session_id} and publishes the
+new status here; GET /checkout/events/{session_id} streams it to the browser as server-sent
+events. Publishing is an in-process pub/sub (CheckoutStatusHub). With several workers the
+webhook can land on a different worker than the one holding the stream, so by default each
+watched session also has a Firestore snapshot listener on its transaction document
+(CHECKOUT_EVENTS_BACKEND=firestore) - Firestore is the shared channel, no Stripe API calls.
+CHECKOUT_EVENTS_BACKEND=memory skips the listener for single-worker deployments.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Set, Tuple
+
+from firebase_apps import firestore_client
+
+logger = logging.getLogger(__name__)
+
+db = firestore_client('project62')
+
+CHECKOUT_EVENTS_BACKEND = os.getenv("CHECKOUT_EVENTS_BACKEND", "firestore")
+# Latest status per session is kept this long for late subscribers and the polling fallback
+CHECKOUT_STATUS_TTL_SECONDS = float(os.getenv("CHECKOUT_STATUS_TTL_SECONDS", "1800"))
+# An event stream is closed after this long; the client falls back to polling
+CHECKOUT_EVENTS_TIMEOUT_SECONDS = float(os.getenv("CHECKOUT_EVENTS_TIMEOUT_SECONDS", "120"))
+CHECKOUT_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("CHECKOUT_EVENTS_KEEPALIVE_SECONDS", "15"))
+
+
+def transactions_ref():
+    return db.collection("project62").document("payment_transactions").collection("all")
+
+
+def checkout_status(transaction: Dict) -> Dict:
+    """Status payload for a transaction document, shaped like the /checkout/status response"""
+    payment_status = transaction.get("payment_status", "pending")
+    amount = transaction.get("total_amount", transaction.get("amount"))
+    amount_total = transaction.get("amount_total")
+    if amount_total is None and amount is not None:
+        amount_total = int(round(amount * 100))
+    return {
+        "status": transaction.get("stripe_status") or ("complete" if payment_status == "paid" else "open"),
+        "payment_status": payment_status,
+        "fulfilled": bool(transaction.get("order_processed")),
+        "amount_total": amount_total,
+        "currency": transaction.get("currency"),
+        "metadata": {"product_type": transaction.get("product_type"), "product_id": transaction.get("product_id")}
+    }
+
+
+def is_final(status: Dict) -> bool:
+    """Nothing more will happen to this checkout"""
+    return status["fulfilled"] or status["status"] == "expired" or (
+        status["payment_status"] == "paid" and status["metadata"].get("product_type") not in ("digital", "meal_prep"))
+
+
+class CheckoutStatusHub:
+    """Latest status and subscriber queues per checkout session"""
+
+    def __init__(self, ttl: float = CHECKOUT_STATUS_TTL_SECONDS):
+        self.ttl = ttl
+        self._latest: Dict[str, Tuple[float, Dict]] = {}
+        self._subscribers: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._watches: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def latest(self, session_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._latest.get(session_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+    def publish(self, session_id: str, status: Dict):
+        """Record a status and hand it to every subscriber; safe from any thread"""
+        now = time.monotonic()
+        with self._lock:
+            previous = self._latest.get(session_id)
+            self._latest[session_id] = (now + self.ttl, status)
+            for stale in [sid for sid, (expires, _) in self._latest.items() if expires <= now]:
+                del self._latest[stale]
+            subscribers = list(self._subscribers.get(session_id, ()))
+        if previous and previous[1] == status:
+            return
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, status)
+
+    @asynccontextmanager
+    async def subscribe(self, session_id: str):
+        """Queue of statuses published for the session while the context is open"""
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(session_id, set()).add(entry)
+            first = len(self._subscribers[session_id]) == 1
+        if first and CHECKOUT_EVENTS_BACKEND == "firestore":
+            await asyncio.to_thread(self._watch, session_id)
+        try:
+            yield entry[1]
+        finally:
+            with self._lock:
+                self._subscribers[session_id].discard(entry)
+                last = not self._subscribers[session_id]
+                if last:
+                    del self._subscribers[session_id]
+                    watch = self._watches.pop(session_id, None)
+            if last and watch is not None:
+                watch.unsubscribe()
+
+    def _watch(self, session_id: str):
+        """Firestore listener publishing this session's transaction changes, whichever worker wrote them"""
+        def on_change(snapshots, changes, read_time):
+            for snapshot in snapshots:
+                if snapshot.exists:
+                    self.publish(session_id, checkout_status(snapshot.to_dict()))
+
+        try:
+            watch = transactions_ref().document(session_id).on_snapshot(on_change)
+        except Exception as e:
+            # In-process publishes still arrive; the client's polling fallback covers the rest
+            logger.warning(f"Checkout status listener for {session_id} failed: {e}")
+            return
+        with self._lock:
+            if session_id in self._subscribers and session_id not in self._watches:
+                self._watches[session_id] = watch
+                return
+        watch.unsubscribe()
+
+
+status_hub = CheckoutStatusHub()
+
+
+def publish_transaction(session_id: str, transaction: Dict):
+    status_hub.publish(session_id, checkout_status(transaction))
+
+
+def current_status(session_id: str) -> Optional[Dict]:
+    """
+    Final published status, else read from the transaction document (a cached pending status
+    may be stale when another worker took the webhook); None if there is no such checkout
+    """
+    status = status_hub.latest(session_id)
+    if status is not None and is_final(status):
+        return status
+    snapshot = transactions_ref().document(session_id).get()
+    if not snapshot.exists:
+        return None
+    status = checkout_status(snapshot.to_dict())
+    status_hub.publish(session_id, status)
+    return status
+
+
+def sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
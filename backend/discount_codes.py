@@ -0,0 +1,235 @@
+"""
+Discount Codes
+Redemption counters and a metadata cache for Project 62 discount codes
+(project62/discount_codes/all/{code}).
+
+A redemption is a firestore.Increment inside a transaction that reads the counter and
+checks the limit first, so concurrent checkouts neither lose increments nor pass max_uses.
+Hot codes are created with `shards` > 1: their uses are counted in shards/{0..n-1}, each
+holding a slice of max_uses as its own limit. Checkouts start on a random shard and move on
+when it is full, so they contend on different documents and the shard limits still add up
+to max_uses. Codes without `shards` count on the code document itself (`current_uses`).
+
+A use is reserved when a checkout session is created (redeem) and handed back if the session
+expires or is cancelled unpaid (release), so max_uses is enforced before anyone is charged.
+
+validate_discount_code reads code metadata through a short-TTL in-process cache.
+"""
+
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from firebase_apps import firestore_client
+
+logger = logging.getLogger(__name__)
+
+db = firestore_client('project62')
+
+DISCOUNT_CODE_CACHE_SECONDS = float(os.getenv("DISCOUNT_CODE_CACHE_SECONDS", "30"))
+MAX_SHARDS = 50
+# Transaction attempts on one shard before moving to the next under contention
+REDEEM_ATTEMPTS = int(os.getenv("DISCOUNT_REDEEM_ATTEMPTS", "10"))
+
+
+class RedemptionError(ValueError):
+    """A code that cannot be used; reason is not_found, inactive, expired, exhausted or busy"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+def normalize_code(code: str) -> str:
+    return code.upper().replace(" ", "")
+
+
+def codes_ref():
+    return db.collection("project62").document("discount_codes").collection("all")
+
+# ========================
+# SHARDS
+# ========================
+
+def shard_limits(max_uses: Optional[int], shards: int) -> List[Optional[int]]:
+    """max_uses split over the shards (earlier shards take the remainder); None = unlimited"""
+    if not max_uses:
+        return [None] * shards
+    base, extra = divmod(max_uses, shards)
+    return [base + (1 if i < extra else 0) for i in range(shards)]
+
+
+def create_code(code_data: Dict, shards: int = 1):
+    """Write a new code and, for shards > 1, its counter shards in one batch"""
+    shards = max(1, min(shards or 1, MAX_SHARDS))
+    code_ref = codes_ref().document(code_data["code_id"])
+    batch = db.batch()
+    if shards > 1:
+        code_data = {**code_data, "shards": shards}
+        for i, limit in enumerate(shard_limits(code_data.get("max_uses"), shards)):
+            batch.set(code_ref.collection("shards").document(str(i)), {"uses": 0, "limit": limit})
+    batch.set(code_ref, code_data)
+    batch.commit()
+    code_cache.invalidate(code_data["code_id"])
+    return code_data
+
+
+def delete_code(code_id: str):
+    code_ref = codes_ref().document(code_id)
+    batch = db.batch()
+    for shard in code_ref.collection("shards").list_documents():
+        batch.delete(shard)
+    batch.delete(code_ref)
+    batch.commit()
+    code_cache.invalidate(code_id)
+
+
+def total_uses(code_id: str, code: Dict) -> int:
+    """Uses so far: current_uses, or the sum of the shards of a sharded code"""
+    if not code.get("shards"):
+        return code.get("current_uses", 0)
+    shards = codes_ref().document(code_id).collection("shards").stream()
+    return sum(shard.to_dict().get("uses", 0) for shard in shards)
+
+# ========================
+# METADATA CACHE
+# ========================
+
+class CodeMetadataCache:
+    """Code documents (with total uses) by code ID for DISCOUNT_CODE_CACHE_SECONDS; misses are cached too"""
+
+    def __init__(self, ttl: float = DISCOUNT_CODE_CACHE_SECONDS):
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, Optional[Dict]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, code_id: str) -> Tuple[Optional[Dict], bool]:
+        with self._lock:
+            entry = self._entries.get(code_id)
+        if entry is None or entry[0] <= time.monotonic():
+            return None, False
+        return entry[1], True
+
+    def put(self, code_id: str, code: Optional[Dict]):
+        with self._lock:
+            self._entries[code_id] = (time.monotonic() + self.ttl, code)
+
+    def invalidate(self, code_id: str):
+        with self._lock:
+            self._entries.pop(code_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+code_cache = CodeMetadataCache()
+
+
+def get_code(code_id: str) -> Optional[Dict]:
+    """Code document with current_uses filled in for sharded codes, through the cache"""
+    code, hit = code_cache.get(code_id)
+    if hit:
+        return code
+    snapshot = codes_ref().document(code_id).get()
+    code = snapshot.to_dict() if snapshot.exists else None
+    if code is not None and code.get("shards"):
+        code["current_uses"] = total_uses(code_id, code)
+    code_cache.put(code_id, code)
+    return code
+
+
+def check_code(code: Optional[Dict], now: Optional[datetime] = None) -> None:
+    """Raise RedemptionError if the code cannot be used (usage is checked against current_uses)"""
+    if code is None:
+        raise RedemptionError("not_found", "Invalid discount code")
+    if not code.get("active", False):
+        raise RedemptionError("inactive", "This discount code is no longer active")
+    if code.get("expires_at"):
+        if (now or datetime.utcnow()) > datetime.fromisoformat(code["expires_at"]):
+            raise RedemptionError("expired", "This discount code has expired")
+    if code.get("max_uses") and code.get("current_uses", 0) >= code["max_uses"]:
+        raise RedemptionError("exhausted", "This discount code has reached its usage limit")
+
+# ========================
+# REDEMPTION
+# ========================
+
+def _increment(counter_ref, field: str, limit: Optional[int] = None) -> Optional[int]:
+    """
+    +1 on counter_ref.field unless it has reached limit (or the document's own `limit`, for
+    shards); returns the new count, or None when full
+    """
+    from firebase_admin import firestore
+
+    @firestore.transactional
+    def increment(transaction):
+        snapshot = counter_ref.get(transaction=transaction)
+        counter = snapshot.to_dict() or {}
+        uses, most = counter.get(field, 0), counter.get("limit", limit)
+        if most is not None and uses >= most:
+            return None
+        transaction.update(counter_ref, {field: firestore.Increment(1), "last_used_at": datetime.utcnow().isoformat()})
+        return uses + 1
+
+    return increment(db.transaction(max_attempts=REDEEM_ATTEMPTS))
+
+
+def redeem(code: str) -> Dict:
+    """Count one use of a code, enforcing max_uses. Raises RedemptionError."""
+    code_id = normalize_code(code)
+    code_ref = codes_ref().document(code_id)
+    snapshot = code_ref.get()
+    data = snapshot.to_dict() if snapshot.exists else None
+    check_code(data and {**data, "current_uses": 0})  # active / expiry; usage is enforced below
+
+    if not data.get("shards"):
+        uses = _increment(code_ref, "current_uses", data.get("max_uses") or None)
+        if uses is None:
+            code_cache.invalidate(code_id)
+            raise RedemptionError("exhausted", "This discount code has reached its usage limit")
+        return {"code": code_id, "uses": uses, "percentage": data.get("percentage", 0)}
+
+    shards = code_ref.collection("shards")
+    count = data["shards"]
+    start = random.randrange(count)
+    busy = False
+    for i in [(start + offset) % count for offset in range(count)]:
+        try:
+            uses = _increment(shards.document(str(i)), "uses")
+        except ValueError as e:
+            # Transaction gave up under contention - try the next shard
+            logger.warning(f"Discount code {code_id} shard {i} busy: {e}")
+            busy = True
+            continue
+        if uses is not None:
+            return {"code": code_id, "shard": i, "uses": uses, "percentage": data.get("percentage", 0)}
+    if busy:
+        raise RedemptionError("busy", "Too many checkouts at once - please try again")
+    code_cache.invalidate(code_id)
+    raise RedemptionError("exhausted", "This discount code has reached its usage limit")
+
+
+def release(redemption: Dict):
+    """Hand back a use counted by redeem() (checkout expired or cancelled unpaid)"""
+    from firebase_admin import firestore
+
+    code_ref = codes_ref().document(redemption["code"])
+    if redemption.get("shard") is not None:
+        counter_ref, field = code_ref.collection("shards").document(str(redemption["shard"])), "uses"
+    else:
+        counter_ref, field = code_ref, "current_uses"
+
+    @firestore.transactional
+    def decrement(transaction):
+        snapshot = counter_ref.get(transaction=transaction)
+        if not snapshot.exists or (snapshot.to_dict() or {}).get(field, 0) <= 0:
+            return
+        transaction.update(counter_ref, {field: firestore.Increment(-1)})
+
+    decrement(db.transaction(max_attempts=REDEEM_ATTEMPTS))
+    code_cache.invalidate(redemption["code"])
@@ -0,0 +1,143 @@
+"""
+Firebase Apps
+The backend talks to three Firebase projects (tuition chatbot, math analysis, Project 62).
+Apps are created here on first use instead of at import time: API modules hold lazy
+client proxies, and server.py initializes the apps its enabled routers need from the
+startup hook, so importing a router no longer reads credentials or opens connections.
+"""
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional
+
+import firebase_admin
+from firebase_admin import credentials, firestore, storage
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+
+
+def _tuition_credential():
+    return credentials.Certificate(ROOT_DIR / 'firebase-credentials.json')
+
+
+def _math_analysis_credential():
+    with open(ROOT_DIR / 'firebase-math-analysis-credentials.json', 'r') as f:
+        return credentials.Certificate(json.load(f))
+
+
+def _project62_credential():
+    cred_path = os.getenv("FIREBASE_CREDENTIALS_PATH")
+    if not cred_path or not os.path.exists(cred_path):
+        raise Exception(f"Firebase credentials not found at {cred_path}")
+    return credentials.Certificate(cred_path)
+
+
+# key -> firebase_admin app name, credential loader and app options
+FIREBASE_APPS: Dict[str, Dict] = {
+    'tuition': {
+        'name': firebase_admin._DEFAULT_APP_NAME,
+        'credential': _tuition_credential,
+        'options': None
+    },
+    'math_analysis': {
+        'name': 'math_analysis',
+        'credential': _math_analysis_credential,
+        'options': {
+            'projectId': 'student-result-analysis-c4c02',
+            'storageBucket': 'student-result-analysis-c4c02.firebasestorage.app'
+        }
+    },
+    'project62': {
+        'name': 'project62',
+        'credential': _project62_credential,
+        'options': {
+            'storageBucket': 'project62-ccc-digital.firebasestorage.app'
+        }
+    },
+}
+
+_init_lock = threading.RLock()
+
+
+def get_firebase_app(key: str) -> firebase_admin.App:
+    """The firebase_admin app for a project key, created on first call (raises on bad credentials)"""
+    config = FIREBASE_APPS[key]
+    with _init_lock:
+        try:
+            return firebase_admin.get_app(config['name'])
+        except ValueError:
+            pass
+        if config['name'] == firebase_admin._DEFAULT_APP_NAME:
+            app = firebase_admin.initialize_app(config['credential'](), config['options'])
+        else:
+            app = firebase_admin.initialize_app(config['credential'](), config['options'], name=config['name'])
+        logger.info(f"✅ Firebase app '{key}' initialized")
+        return app
+
+
+class LazyFirebaseClient:
+    """
+    Stands in for a Firestore client or Storage bucket until first use.
+    Truthiness reports whether the client could be created, so the existing
+    `if not db:` guards keep returning "Firebase not initialized" on failure.
+    """
+
+    def __init__(self, key: str, factory: Callable):
+        self._key = key
+        self._factory = factory
+        self._client = None
+        self._failed = False
+
+    def _resolve(self):
+        if self._client is None and not self._failed:
+            with _init_lock:
+                if self._client is None and not self._failed:
+                    try:
+                        self._client = self._factory(get_firebase_app(self._key))
+                    except Exception as e:
+                        self._failed = True
+                        logger.error(f"❌ Failed to initialize Firebase '{self._key}': {str(e)}")
+        return self._client
+
+    def __bool__(self) -> bool:
+        return self._resolve() is not None
+
+    def __getattr__(self, name: str):
+        client = self._resolve()
+        if client is None:
+            raise RuntimeError(f"Firebase '{self._key}' is not initialized")
+        return getattr(client, name)
+
+    def __repr__(self) -> str:
+        state = 'failed' if self._failed else ('ready' if self._client is not None else 'pending')
+        return f"<LazyFirebaseClient {self._key} ({state})>"
+
+
+_firestore_clients: Dict[str, LazyFirebaseClient] = {}
+_storage_buckets: Dict[str, LazyFirebaseClient] = {}
+
+
+def firestore_client(key: str) -> LazyFirebaseClient:
+    """Shared lazy Firestore client of a project"""
+    with _init_lock:
+        if key not in _firestore_clients:
+            _firestore_clients[key] = LazyFirebaseClient(key, lambda app: firestore.client(app))
+        return _firestore_clients[key]
+
+
+def storage_bucket(key: str) -> LazyFirebaseClient:
+    """Shared lazy default Storage bucket of a project"""
+    with _init_lock:
+        if key not in _storage_buckets:
+            _storage_buckets[key] = LazyFirebaseClient(key, lambda app: storage.bucket(app=app))
+        return _storage_buckets[key]
+
+
+def init_firebase_apps(keys: Iterable[str]) -> Dict[str, bool]:
+    """Create the Firestore clients of the given projects now (startup hook); returns key -> ready"""
+    return {key: bool(firestore_client(key)) for key in keys}
@@ -0,0 +1,246 @@
+"""
+Firestore Query Registry
+Every filtered/ordered Firestore query the backend issues, the composite indexes they need,
+and the checked-in firestore.indexes.json files generated from them.
+
+When adding a query with .where() + .order_by() (or several .order_by() calls), register it
+here and run `python firestore_index_registry.py generate`.
+
+Usage:
+    python firestore_index_registry.py generate          # rewrite firestore_indexes/<project>/firestore.indexes.json
+    python firestore_index_registry.py check             # CI: fail if the checked-in files are stale
+    python firestore_index_registry.py check --live math_analysis
+        # also run every registered query (limit 1) against that project and fail on
+        # "The query requires an index". The Firestore emulator does not enforce composite
+        # indexes, so --live is only meaningful against a real (staging) project.
+"""
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = Path(__file__).parent
+INDEX_DIR = ROOT_DIR / "firestore_indexes"
+
+ASC = 'ASCENDING'
+DESC = 'DESCENDING'
+
+# Firebase projects used by the backend (see the firebase_admin apps in each API module)
+PROJECTS = ('math_analysis', 'tuition', 'project62')
+
+# Placeholder for path segments and filter values when running queries for --live checks
+CHECK_VALUE = '__index_check__'
+
+
+def registered_query(name: str, project: str, path: str, equality: Sequence[str] = (),
+                     order_by: Sequence[Tuple[str, str]] = ()) -> Dict:
+    """
+    name: function issuing the query; path: collection path with {placeholders} for document ids;
+    equality: fields that may carry == filters (optional ones included);
+    order_by: (field, direction) pairs in query order.
+    """
+    return {
+        'name': name,
+        'project': project,
+        'path': path,
+        'equality': tuple(equality),
+        'order_by': tuple(order_by)
+    }
+
+
+QUERY_REGISTRY: List[Dict] = [
+    # math_analysis_api
+    registered_query('get_students', 'math_analysis', 'students',
+                     equality=('tutor_id', 'location', 'level', 'subject')),
+    registered_query('get_student_results', 'math_analysis', 'student_results',
+                     equality=('student_id',), order_by=(('created_at', DESC),)),
+    registered_query('get_analytics', 'math_analysis', 'student_results',
+                     equality=('tutor_id', 'location', 'level', 'subject', 'exam_type')),
+    registered_query('get_revision_plan', 'math_analysis', 'student_results',
+                     equality=('student_id', 'exam_type'), order_by=(('created_at', DESC),)),
+    registered_query('get_revision_plan.topic_library', 'math_analysis', 'topic_library',
+                     equality=('level', 'subject', 'topic_name')),
+    registered_query('get_topic_library', 'math_analysis', 'topic_library',
+                     equality=('level', 'subject')),
+    registered_query('get_batch_job_staged', 'math_analysis', 'analysis_staging',
+                     equality=('job_id',)),
+    registered_query('get_student_assessments', 'math_analysis', 'students/{student_id}/assessments',
+                     order_by=(('created_timestamp', DESC),)),
+    registered_query('rebuild_topic_timeline', 'math_analysis', 'students/{student_id}/assessments',
+                     equality=('status',)),
+    registered_query('get_bulk_improvement_tracking.students', 'math_analysis', 'students',
+                     equality=('tutor_id', 'location', 'level', 'subject')),
+    registered_query('get_bulk_improvement_tracking', 'math_analysis', 'topic_timelines',
+                     equality=('tutor_id', 'location', 'level', 'subject')),
+    registered_query('get_all_results.date', 'math_analysis', 'student_results',
+                     equality=('tutor_id', 'location', 'level', 'subject', 'exam_type', 'student_id'),
+                     order_by=(('created_at', DESC),)),
+    registered_query('get_all_results.score', 'math_analysis', 'student_results',
+                     equality=('tutor_id', 'location', 'level', 'subject', 'exam_type', 'student_id'),
+                     order_by=(('overall_score', DESC),)),
+    # tutor_auth_api
+    registered_query('create_tutor', 'math_analysis', 'tutors', equality=('login_id',)),
+    # server.py (tuition chatbot / admin)
+    registered_query('query_firebase_classes', 'tuition', 'classes',
+                     equality=('level', 'subject', 'location')),
+    registered_query('admin_search_classes', 'tuition', 'classes',
+                     equality=('level', 'subject', 'location')),
+    # catalog_aggregates (rebuilding a missing or legacy aggregate inside a class write)
+    registered_query('contributing_classes.tutors', 'tuition', 'classes',
+                     equality=('level', 'subject', 'location')),
+    registered_query('contributing_classes.locations', 'tuition', 'classes', equality=('level', 'subject')),
+    registered_query('contributing_classes.tutor', 'tuition', 'classes', equality=('tutor_id',)),
+    # project62_api
+    registered_query('get_product_by_slug', 'project62', 'project62/products/all',
+                     equality=('product_id_slug',)),
+    registered_query('get_customer_dashboard', 'project62', 'project62/deliveries/all',
+                     equality=('customer_id', 'status'), order_by=(('delivery_date', ASC),)),
+    registered_query('get_customer_subscription', 'project62', 'project62/subscriptions/active',
+                     equality=('customer_email',)),
+    registered_query('get_customer_subscription.orders', 'project62', 'project62/orders/all',
+                     equality=('customer_email',), order_by=(('created_at', DESC),)),
+    registered_query('cancel_checkout', 'project62', 'project62/payment_transactions/all',
+                     equality=('checkout_ref',)),
+    # renewal_engine (range on next_billing_date, paged by document ID)
+    registered_query('due_customers_query', 'project62', 'project62/customers/all',
+                     equality=('subscription.auto_renew',),
+                     order_by=(('subscription.next_billing_date', ASC), ('__name__', ASC))),
+    registered_query('run_renewals.details', 'project62', 'project62/ops/renewals', equality=('run_id',)),
+    # webhook_events (range on claimed_at)
+    registered_query('sweep_stale_claims', 'project62', 'project62/ops/stripe_events',
+                     equality=('processed',), order_by=(('claimed_at', ASC),)),
+    registered_query('sweep_stale_claims.legacy', 'project62', 'project62/ops/stripe_events',
+                     equality=('processed',)),
+]
+
+
+def collection_id(path: str) -> str:
+    return path.rstrip('/').split('/')[-1]
+
+
+def required_indexes(query: Dict) -> List[Tuple[str, Tuple[Tuple[str, str], ...]]]:
+    """
+    Composite indexes a registered query needs.
+    Equality-only queries are served by the automatic single-field indexes. With an order_by,
+    Firestore merges one (equality field, order fields...) index per filtered field, so any
+    combination of the optional filters works with one index per field.
+    """
+    order_by = query['order_by']
+    if not order_by:
+        return []
+    group = collection_id(query['path'])
+    if not query['equality']:
+        return [(group, order_by)] if len(order_by) > 1 else []
+    return [(group, ((field, ASC),) + order_by) for field in query['equality']]
+
+
+def build_index_file(project: str) -> Dict:
+    indexes = set()
+    for query in QUERY_REGISTRY:
+        if query['project'] == project:
+            indexes.update(required_indexes(query))
+    return {
+        'indexes': [
+            {
+                'collectionGroup': group,
+                'queryScope': 'COLLECTION',
+                'fields': [{'fieldPath': field, 'order': order} for field, order in fields]
+            }
+            for group, fields in sorted(indexes)
+        ],
+        'fieldOverrides': []
+    }
+
+
+def index_file_path(project: str) -> Path:
+    return INDEX_DIR / project / 'firestore.indexes.json'
+
+
+def render_index_file(project: str) -> str:
+    return json.dumps(build_index_file(project), indent=2) + '\n'
+
+
+def generate():
+    for project in PROJECTS:
+        path = index_file_path(project)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(render_index_file(project))
+        print(f"Wrote {len(build_index_file(project)['indexes'])} indexes to {path.relative_to(ROOT_DIR)}")
+
+
+def check_files() -> List[str]:
+    problems = []
+    for project in PROJECTS:
+        path = index_file_path(project)
+        if not path.exists() or path.read_text() != render_index_file(project):
+            problems.append(f"{path.relative_to(ROOT_DIR)} is out of date - run 'python firestore_index_registry.py generate'")
+    return problems
+
+
+def get_project_db(project: str):
+    """Firestore client of one project, shared with the API modules"""
+    if project not in PROJECTS:
+        raise ValueError(f"Unknown project '{project}'")
+    from firebase_apps import firestore_client
+    return firestore_client(project)
+
+
+def build_check_query(db, query: Dict):
+    """Registered query with every optional equality filter applied (the widest index demand)"""
+    path = query['path']
+    for part in [p for p in path.split('/') if p.startswith('{')]:
+        path = path.replace(part, CHECK_VALUE)
+    ref = db.collection(path)
+    for field in query['equality']:
+        ref = ref.where(field, '==', CHECK_VALUE)
+    for field, direction in query['order_by']:
+        ref = ref.order_by(field, direction=direction)
+    return ref.limit(1)
+
+
+def check_live(project: str) -> List[str]:
+    db = get_project_db(project)
+    if not db:
+        return [f"Firestore client for '{project}' is not initialized"]
+    problems = []
+    for query in QUERY_REGISTRY:
+        if query['project'] != project:
+            continue
+        try:
+            list(build_check_query(db, query).stream())
+        except Exception as e:
+            if 'requires an index' in str(e) or 'FAILED_PRECONDITION' in str(e):
+                problems.append(f"{query['name']}: missing index ({str(e).splitlines()[0]})")
+            else:
+                problems.append(f"{query['name']}: {str(e)}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Firestore composite index registry")
+    parser.add_argument('command', choices=['generate', 'check'])
+    parser.add_argument('--live', choices=PROJECTS, action='append', default=[],
+                        help="also run the registered queries against this project")
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        generate()
+        return
+
+    problems = check_files()
+    for project in args.live:
+        problems.extend(check_live(project))
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        sys.exit(1)
+    print("✅ Firestore indexes match the query registry")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ Handles cases like "Sean Yeo" vs "Sean Yeo (HOD)" → Both become "Sean Yeo (HOD
 """
 import firebase_admin
 from firebase_admin import credentials, firestore
+from tutor_names import format_tutor, make_tutor_id, normalize_tutor_name
 
 try:
     db = firestore.client()
@@ -14,54 +15,6 @@ except:
     db = firestore.client()
     print("🔥 Firebase initialized")
 
-def normalize_tutor_name(name):
-    """
-    Extract base name and title separately
-    Returns: (base_name, title)
-    Example: "Mr Sean Yeo (HOD)" → ("sean_yeo", "HOD")
-    """
-    # Remove prefixes
-    clean = name.replace("Mr ", "").replace("Ms ", "").replace("Mrs ", "").replace("Dr ", "")
-    
-    # Extract title if present
-    title = None
-    if "(HOD)" in clean:
-        title = "HOD"
-        clean = clean.replace("(HOD)", "").strip()
-    elif "(DY HOD)" in clean:
-        title = "DY HOD"
-        clean = clean.replace("(DY HOD)", "").strip()
-    
-    # Create base ID
-    base_id = clean.lower().replace(".", "").replace(" ", "_")
-    
-    return base_id, title
-
-def get_display_name(name, title):
-    """Create consistent display name with title"""
-    # Keep Mr/Ms/Mrs prefix
-    prefix = ""
-    if name.startswith("Mr "):
-        prefix = "Mr "
-        name = name[3:]
-    elif name.startswith("Ms "):
-        prefix = "Ms "
-        name = name[3:]
-    elif name.startswith("Mrs "):
-        prefix = "Mrs "
-        name = name[4:]
-    elif name.startswith("Dr "):
-        prefix = "Dr "
-        name = name[3:]
-    
-    # Remove existing title
-    name = name.replace("(HOD)", "").replace("(DY HOD)", "").strip()
-    
-    # Add title if present
-    if title:
-        return f"{prefix}{name} ({title})"
-    return f"{prefix}{name}"
-
 print("\n🔍 Scanning existing classes for duplicate tutors...")
 
 # Get all classes
@@ -69,16 +22,18 @@ classes_ref = db.collection('classes')
 classes = classes_ref.stream()
 
 # Track tutor consolidation
-tutor_map = {}  # base_id → {name, title, classes}
+tutor_map = {}  # base_id (name without title) → {name, title, classes}
 
 for doc in classes:
     data = doc.to_dict()
     tutor_name = data.get('tutor_name')
     
-    base_id, title = normalize_tutor_name(tutor_name)
+    tutor = normalize_tutor_name(tutor_name)
+    base_id, title = make_tutor_id(tutor.name), tutor.title
     
     if base_id not in tutor_map:
         tutor_map[base_id] = {
+            'tutor': tutor,
             'original_names': set(),
             'title': title,
             'classes': []
@@ -109,30 +64,16 @@ print("\n🔧 Updating classes with normalized tutor names...")
 updated_count = 0
 
 for base_id, info in tutor_map.items():
-    # Get proper prefix from first original name
-    sample_name = list(info['original_names'])[0]
-    prefix = "Mr " if sample_name.startswith("Mr ") else \
-             "Ms " if sample_name.startswith("Ms ") else \
-             "Mrs " if sample_name.startswith("Mrs ") else \
-             "Dr " if sample_name.startswith("Dr ") else ""
-    
-    # Extract clean name
-    clean_name = sample_name.replace("Mr ", "").replace("Ms ", "").replace("Mrs ", "").replace("Dr ", "")
-    clean_name = clean_name.replace("(HOD)", "").replace("(DY HOD)", "").strip()
-    
-    # Create final display name
-    if info['title']:
-        final_name = f"{prefix}{clean_name} ({info['title']})"
-        final_id = f"{base_id}_{info['title'].lower().replace(' ', '_')}"
-    else:
-        final_name = f"{prefix}{clean_name}"
-        final_id = base_id
+    # Same name and honorific, highest title seen
+    tutor = info['tutor']
+    final = format_tutor(tutor.name, info['title'], tutor.honorific)
     
     # Update all classes for this tutor
     for class_id in info['classes']:
         classes_ref.document(class_id).update({
-            'tutor_id': final_id,
-            'tutor_name': final_name
+            'tutor_id': final.tutor_id,
+            'tutor_name': final.display_name,
+            'tutor_base_name': final.base_name
         })
         updated_count += 1
 
@@ -157,7 +98,7 @@ for doc in classes:
     
     if tutor_id not in tutor_stats:
         tutor_stats[tutor_id] = {
-            'name': data['tutor_name'],
+            'name': data['tutor_base_name'],
             'locations': set(),
             'subjects': set(),
             'levels': set(),
@@ -0,0 +1,172 @@
+"""
+Logging Setup
+Request handlers only put records on an in-memory queue (QueueHandler); a background
+QueueListener thread redacts PII, formats JSON lines and writes them to stdout.
+
+Environment:
+    LOG_LEVEL          root level (default INFO)
+    LOG_FORMAT         'json' (default) or 'text'
+    LOG_SAMPLE_RATES   per-logger sampling of records below WARNING,
+                       e.g. "server=0.1,project62_api=0.25" (1.0 keeps everything)
+    LOG_LEVELS         per-logger levels, e.g. "server=DEBUG,httpx=WARNING"
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+# Loggers that are noisy at INFO in this app
+DEFAULT_LEVELS = {
+    'httpx': 'WARNING',
+    'apscheduler': 'WARNING',
+}
+
+REDACTIONS = [
+    (re.compile(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}'), '[email]'),
+    (re.compile(r'(?i)bearer\s+[A-Za-z0-9._~+/=-]+'), 'Bearer [token]'),
+    (re.compile(r'\b(?:sk|pk|rk|whsec)_(?:live|test)?_?[A-Za-z0-9]{8,}\b'), '[secret]'),
+    (re.compile(r'\beyJ[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\.[A-Za-z0-9_-]+\b'), '[jwt]'),
+    (re.compile(r'(?<!\d)(?:\+?65[\s-]?)?[689]\d{3}[\s-]?\d{4}(?!\d)'), '[phone]'),
+    (re.compile(r'(?i)(apikey|api_key|password|token)=([^&\s]+)'), r'\1=[redacted]'),
+]
+
+# Attributes every LogRecord has - anything else was passed via extra= and goes into the JSON line
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+def parse_mapping(value: Optional[str]) -> Dict[str, str]:
+    """'a=1,b=2' -> {'a': '1', 'b': '2'}"""
+    mapping = {}
+    for part in (value or '').split(','):
+        if '=' in part:
+            key, val = part.split('=', 1)
+            mapping[key.strip()] = val.strip()
+    return mapping
+
+
+def redact(text: str) -> str:
+    for pattern, replacement in REDACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of the sub-WARNING records of selected loggers (and their children)"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._cache: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = 1.0
+            candidate = name
+            while candidate:
+                if candidate in self.rates:
+                    rate = self.rates[candidate]
+                    break
+                candidate = candidate.rpartition('.')[0]
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with PII redacted from the message and exception text"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': redact(record.getMessage()),
+        }
+        if record.exc_info:
+            entry['exc'] = redact(self.formatException(record.exc_info))
+        elif record.exc_text:
+            entry['exc'] = redact(record.exc_text)
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value if isinstance(value, (int, float, bool)) or value is None else redact(str(value))
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RedactingTextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return redact(super().format(record))
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Resolves the message on the calling thread (args may be mutated after the call)
+    and leaves redaction, JSON encoding and the stdout write to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Tracebacks cannot cross threads safely once the frame is gone - render now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging() -> QueueListener:
+    """Route all logging through a queue to a background JSON writer (idempotent)"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if os.getenv('LOG_FORMAT', 'json').lower() == 'text':
+        stream_handler.setFormatter(RedactingTextFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = DeferredQueueHandler(log_queue)
+    rates = {name: float(rate) for name, rate in parse_mapping(os.getenv('LOG_SAMPLE_RATES')).items()}
+    if rates:
+        queue_handler.addFilter(SamplingFilter(rates))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+
+    for name, level in {**DEFAULT_LEVELS, **parse_mapping(os.getenv('LOG_LEVELS'))}.items():
+        logging.getLogger(name).setLevel(level.upper())
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Flush the queue and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -3,84 +3,28 @@ Math Results Analysis System API
 Handles student result uploads, analysis, and revision plan generation
 """
 
-from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Header
+from fastapi import APIRouter, HTTPException, UploadFile, File, Depends, Header, Query, Response
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-from datetime import datetime
-import firebase_admin
-from firebase_admin import credentials, firestore, storage
-import pandas as pd
+from datetime import datetime, timedelta
+from firebase_admin import firestore
 import io
 import json
+import base64
+import hashlib
 import logging
-import random
-from pathlib import Path
-
-# JWT token verification
-import jwt
-from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
-ALGORITHM = "HS256"
-# Use a consistent SECRET_KEY - this should match tutor_auth_api
-SECRET_KEY = "math_analysis_secret_key_2024"
-
-def verify_tutor_token(authorization_header):
-    """Verify JWT token and return tutor data"""
-    if not authorization_header:
-        raise HTTPException(status_code=401, detail="Authorization header required")
-    
-    try:
-        token = authorization_header.replace("Bearer ", "")
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
-    except ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token has expired")
-    except (InvalidTokenError, Exception) as e:
-        logger.error(f"JWT decode error: {str(e)}")
-        raise HTTPException(status_code=401, detail="Could not validate credentials")
+
+from firebase_apps import firestore_client, storage_bucket
+
+# Tutor authentication (shared with tutor_auth_api)
+from tutor_tokens import get_current_tutor, verify_tutor_token
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
-# Initialize Firebase for Math Analysis (separate project)
-ROOT_DIR = Path(__file__).parent
-
-math_db = None
-math_storage = None
-
-try:
-    # Check if app already exists
-    try:
-        math_app = firebase_admin.get_app('math_analysis')
-        logger.info("Math Analysis Firebase app already initialized")
-    except ValueError:
-        # App doesn't exist, create it
-        cred_path = str(ROOT_DIR / 'firebase-math-analysis-credentials.json')
-        
-        # Load credentials directly as dict
-        with open(cred_path, 'r') as f:
-            cred_dict = json.load(f)
-        
-        # Create credential from dict
-        math_cred = credentials.Certificate(cred_dict)
-        
-        # Initialize Math Analysis Firebase app (separate from tuition chatbot)
-        math_app = firebase_admin.initialize_app(math_cred, {
-            'projectId': 'student-result-analysis-c4c02',
-            'storageBucket': 'student-result-analysis-c4c02.firebasestorage.app'
-        }, name='math_analysis')
-        logger.info("✅ Math Analysis Firebase initialized successfully")
-    
-    math_db = firestore.client(math_app)
-    math_storage = storage.bucket(app=math_app)
-    logger.info("✅ Math Analysis Firestore and Storage clients ready")
-    
-except Exception as e:
-    logger.error(f"❌ Failed to initialize Math Analysis Firebase: {str(e)}")
-    logger.error(f"Error type: {type(e).__name__}")
-    import traceback
-    logger.error(traceback.format_exc())
-    math_db = None
-    math_storage = None
+# Firebase for Math Analysis (separate project) - created on first use, see firebase_apps.py
+math_db = firestore_client('math_analysis')
+math_storage = storage_bucket('math_analysis')
 
 # Create router
 math_router = APIRouter(prefix="/api/math-analysis", tags=["Math Analysis"])
@@ -113,6 +57,15 @@ class AnalyticsFilter(BaseModel):
     subject: Optional[str] = None
     exam_type: Optional[str] = None
 
+class AssessmentCompletion(BaseModel):
+    topics: List[TopicScore]
+
+class BulkImprovementRequest(BaseModel):
+    student_ids: Optional[List[str]] = None  # Defaults to every student of the tutor
+    location: Optional[str] = None
+    level: Optional[str] = None
+    subject: Optional[str] = None
+
 # Helper Functions
 def calculate_analysis(topics: List[Dict]) -> Dict:
     """Calculate strengths and weaknesses from topic scores"""
@@ -237,6 +190,9 @@ async def upload_csv(file: UploadFile = File(...)):
         # Read file
         contents = await file.read()
         
+        # pandas is only needed here - keep it out of the import path of every worker
+        import pandas as pd
+
         # Determine file type and read accordingly
         if file.filename.endswith('.csv'):
             df = pd.read_csv(io.BytesIO(contents))
@@ -340,22 +296,12 @@ async def get_students(
     location: Optional[str] = None,
     level: Optional[str] = None,
     subject: Optional[str] = None,
-    authorization: str = Header(None)
+    tutor: dict = Depends(get_current_tutor)
 ):
     """Get list of all students with optional filters (tutor authenticated)"""
     try:
-        # Verify tutor authentication - MANDATORY
-        if not authorization:
-            raise HTTPException(status_code=401, detail="Authorization header required")
-        
-        try:
-            tutor_data = verify_tutor_token(authorization)
-            tutor_id = tutor_data.get('tutor_id')
-            if not tutor_id:
-                raise HTTPException(status_code=401, detail="Invalid tutor token - no tutor_id")
-        except Exception as e:
-            logger.error(f"Authentication failed: {str(e)}")
-            raise HTTPException(status_code=401, detail="Authentication failed")
+        # Tutor authentication is MANDATORY (enforced by the get_current_tutor dependency)
+        tutor_id = tutor['tutor_id']
         
         if not math_db:
             raise HTTPException(status_code=500, detail="Firebase not initialized")
@@ -413,21 +359,18 @@ async def get_student_results(student_id: str):
         
         student_data = student_doc.to_dict()
         
-        # Get all results from student_results collection
+        # Get all results from student_results collection, most recent first
+        # (index: student_id + created_at - see firestore_index_registry.py)
         results = []
         results_query = math_db.collection('student_results')\
-            .where('student_id', '==', student_id)
+            .where('student_id', '==', student_id)\
+            .order_by('created_at', direction=firestore.Query.DESCENDING)
         
-        # Get all results and sort in Python
-        all_results = list(results_query.stream())
-        for result_doc in all_results:
+        for result_doc in results_query.stream():
             result_data = result_doc.to_dict()
             result_data['result_id'] = result_doc.id
             results.append(result_data)
         
-        # Sort by created_at in Python (most recent first)
-        results.sort(key=lambda x: x.get('created_at', ''), reverse=True)
-        
         return {
             'success': True,
             'student': student_data,
@@ -443,21 +386,11 @@ async def get_student_results(student_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @math_router.post("/analytics")
-async def get_analytics(filters: AnalyticsFilter, authorization: str = Header(None)):
+async def get_analytics(filters: AnalyticsFilter, tutor: dict = Depends(get_current_tutor)):
     """Get analytics data with filters for dashboard (tutor authenticated)"""
     try:
-        # Verify tutor authentication - MANDATORY
-        if not authorization:
-            raise HTTPException(status_code=401, detail="Authorization header required")
-        
-        try:
-            tutor_data = verify_tutor_token(authorization)
-            tutor_id = tutor_data.get('tutor_id')
-            if not tutor_id:
-                raise HTTPException(status_code=401, detail="Invalid tutor token - no tutor_id")
-        except Exception as e:
-            logger.error(f"Authentication failed: {str(e)}")
-            raise HTTPException(status_code=401, detail="Authentication failed")
+        # Tutor authentication is MANDATORY (enforced by the get_current_tutor dependency)
+        tutor_id = tutor['tutor_id']
         
         if not math_db:
             raise HTTPException(status_code=500, detail="Firebase not initialized")
@@ -577,29 +510,15 @@ async def get_revision_plan(student_id: str, exam_type: Optional[str] = None):
         
         student_data = student_doc.to_dict()
         
-        # Get latest or specific exam results from student_results collection
-        results = []
+        # Get latest (or latest of a specific exam) result from student_results collection
+        # (indexes: student_id/exam_type + created_at - see firestore_index_registry.py)
         results_query = math_db.collection('student_results')\
             .where('student_id', '==', student_id)
-        
-        # Get all results and sort in Python to avoid index requirements
-        all_results = list(results_query.stream())
-        
-        if not all_results:
-            return {
-                'success': True,
-                'message': 'No results found for revision plan',
-                'revision_plan': []
-            }
-        
-        # Sort by created_at in Python (most recent first)
-        sorted_results = sorted(all_results, 
-                              key=lambda x: x.to_dict().get('created_at', ''), 
-                              reverse=True)
-        
-        # Filter by exam_type if specified
         if exam_type:
-            sorted_results = [r for r in sorted_results if r.to_dict().get('exam_type') == exam_type]
+            results_query = results_query.where('exam_type', '==', exam_type)
+        results_query = results_query.order_by('created_at', direction=firestore.Query.DESCENDING).limit(1)
+        
+        sorted_results = list(results_query.stream())
         
         if not sorted_results:
             return {
@@ -747,11 +666,20 @@ async def seed_topic_library():
         raise HTTPException(status_code=500, detail=str(e))
 
 # PDF Analysis with AI
+import asyncio
 import os
+import zipfile
 from dotenv import load_dotenv
-import fitz  # PyMuPDF
-import base64
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+from paper_analysis import (
+    analyze_paper,
+    get_paper_analysis_llm,
+    expand_batch_uploads,
+    PaperAnalysisLLM,
+    BatchAnalysisJob,
+    BatchAnalysisRunner,
+    BATCH_ANALYSIS_CONCURRENCY,
+    BATCH_ANALYSIS_MAX_FILES
+)
 
 load_dotenv()
 
@@ -797,144 +725,12 @@ async def analyze_pdf_test_paper(
         # Read PDF content
         pdf_content = await file.read()
         
-        # Convert PDF to images using PyMuPDF
-        pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
-        
-        # Convert first few pages to base64 images (limit to 5 pages to save tokens)
-        page_images = []
-        max_pages = min(5, len(pdf_document))
-        
-        for page_num in range(max_pages):
-            page = pdf_document[page_num]
-            # Render page to image
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2x zoom for better quality
-            img_bytes = pix.pil_tobytes(format="PNG")
-            
-            # Convert to base64
-            img_base64 = base64.b64encode(img_bytes).decode('utf-8')
-            page_images.append(img_base64)
-        
-        pdf_document.close()
-        
-        # Extract text from PDF for context
-        pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
-        pdf_text = ""
-        for page in pdf_document:
-            pdf_text += page.get_text()
-        pdf_document.close()
-        
-        # Initialize LLM Chat with GPT-4o
-        api_key = os.getenv('EMERGENT_LLM_KEY')
-        if not api_key:
-            raise HTTPException(status_code=500, detail="EMERGENT_LLM_KEY not configured")
-        
-        chat = LlmChat(
-            api_key=api_key,
-            session_id=f"pdf_analysis_{datetime.now().timestamp()}",
-            system_message=f"""You are an expert math teacher analyzing a {level} {subject} test paper for {exam_type}.
-
-Your task:
-1. Identify each question in the test paper
-2. Extract the marks awarded by the teacher (handwritten marks)
-3. Extract the total marks possible for each question
-4. Categorize each question into appropriate math topics
-
-Math topics you should recognize (examples):
-- Functions
-- Vectors  
-- Calculus (Differentiation, Integration)
-- Algebra
-- Geometry
-- Trigonometry
-- Probability
-- Statistics
-- Linear Equations
-- Quadratic Equations
-- Coordinate Geometry
-- Graphs
-- Sets
-- Numbers and Operations
-- Mensuration
-- And other standard math topics for {level} {subject}
-
-Return your analysis in this EXACT JSON format:
-{{
-  "topics": [
-    {{
-      "topic_name": "Functions",
-      "marks_obtained": 12.0,
-      "total_marks": 20.0,
-      "question_numbers": "Q1"
-    }},
-    {{
-      "topic_name": "Vectors",
-      "marks_obtained": 15.0,
-      "total_marks": 20.0,
-      "question_numbers": "Q2"
-    }}
-  ],
-  "confidence": "high/medium/low",
-  "notes": "Any observations or uncertainties"
-}}
-
-Be precise with marks extraction. Look for handwritten marks carefully."""
-        ).with_model("openai", "gpt-4o")
-        
-        # Create message with first page image
-        # Note: For production, you might want to send all pages or let AI determine relevance
-        message_text = f"""Analyze this {subject} test paper for {level} level.
-
-Extract:
-1. Each question's topic (what math concept is being tested)
-2. Marks obtained by the student (handwritten by teacher)
-3. Total marks possible for each question
-
-PDF Text Extract (for context):
-{pdf_text[:2000]}
-
-Provide your analysis in the JSON format specified."""
-
-        # For now, analyze text only (vision would require different approach with emergentintegrations)
-        # Let's use text extraction first
-        user_message = UserMessage(text=message_text)
-        
         logger.info(f"Sending PDF analysis request for {student_name}")
-        response_text = await chat.send_message(user_message)
-        logger.info(f"Received AI response: {response_text[:500]}")
-        
-        # Parse AI response
-        # Extract JSON from response (AI might return markdown wrapped JSON)
-        import re
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            analysis_json = json.loads(json_match.group())
-        else:
-            raise HTTPException(status_code=500, detail="Failed to parse AI response")
-        
-        # Convert to our format
-        extracted_topics = []
-        for topic in analysis_json.get('topics', []):
-            extracted_topics.append({
-                'topic_name': topic['topic_name'],
-                'marks': float(topic['marks_obtained']),
-                'total_marks': float(topic['total_marks']),
-                'percentage': round((float(topic['marks_obtained']) / float(topic['total_marks']) * 100) if float(topic['total_marks']) > 0 else 0, 2)
-            })
-        
-        # Calculate overall score
-        total_marks_obtained = sum([t['marks'] for t in extracted_topics])
-        total_marks_possible = sum([t['total_marks'] for t in extracted_topics])
-        overall_score = round((total_marks_obtained / total_marks_possible * 100) if total_marks_possible > 0 else 0, 2)
+        analysis = await analyze_paper(pdf_content, level, subject, exam_type, get_paper_analysis_llm())
         
         return {
             'success': True,
-            'extracted_topics': extracted_topics,
-            'overall_score': overall_score,
-            'total_marks': total_marks_obtained,
-            'total_possible': total_marks_possible,
-            'confidence': analysis_json.get('confidence', 'medium'),
-            'notes': analysis_json.get('notes', ''),
-            'preview_text': pdf_text[:500],
+            **analysis,
             'student_info': {
                 'name': student_name,
                 'location': location,
@@ -944,6 +740,8 @@ Provide your analysis in the JSON format specified."""
             }
         }
         
+    except HTTPException:
+        raise
     except json.JSONDecodeError as e:
         logger.error(f"JSON parsing error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to parse AI response: {str(e)}")
@@ -951,15 +749,201 @@ Provide your analysis in the JSON format specified."""
         logger.error(f"Error analyzing PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Batch PDF Analysis
+# Job progress is kept in memory while a job runs; analyzed papers are persisted to
+# 'analysis_staging' and the final summary to 'analysis_jobs', after which the job is evicted.
+# A job whose summary could not be persisted stays for BATCH_JOB_RETENTION_SECONDS.
+batch_analysis_jobs: Dict[str, BatchAnalysisJob] = {}
+BATCH_JOB_RETENTION_SECONDS = float(os.getenv("BATCH_JOB_RETENTION_SECONDS", "3600"))
+# Shared by every job, so BATCH_ANALYSIS_CONCURRENCY bounds LLM calls across the process
+batch_analysis_semaphore = asyncio.Semaphore(max(1, BATCH_ANALYSIS_CONCURRENCY))
+
+def prune_batch_jobs(now: Optional[datetime] = None):
+    """Drop finished jobs older than BATCH_JOB_RETENTION_SECONDS from memory"""
+    cutoff = (now or datetime.now()) - timedelta(seconds=BATCH_JOB_RETENTION_SECONDS)
+    for job_id, job in list(batch_analysis_jobs.items()):
+        if job.done and job.finished_at and datetime.fromisoformat(job.finished_at) < cutoff:
+            batch_analysis_jobs.pop(job_id, None)
+
+def stage_batch_result(job: BatchAnalysisJob, item: Dict, analysis: Dict) -> str:
+    """Write one analyzed paper to the staging collection for tutor review"""
+    staging_ref = math_db.collection('analysis_staging').document()
+    staging_ref.set({
+        'job_id': job.job_id,
+        'filename': item['filename'],
+        'student_name': item['student_name'],
+        'location': job.location,
+        'level': job.level,
+        'subject': job.subject,
+        'exam_type': job.exam_type,
+        **analysis,
+        'status': 'pending_review',  # pending_review, saved
+        'created_at': datetime.now().isoformat()
+    })
+    return staging_ref.id
+
+async def run_batch_analysis_job(job: BatchAnalysisJob, contents: List[bytes], llm: PaperAnalysisLLM):
+    """Run a batch job to completion and persist its final summary"""
+    try:
+        await BatchAnalysisRunner(llm, stage_batch_result, semaphore=batch_analysis_semaphore).run(job, contents)
+    except Exception as e:
+        logger.error(f"Batch analysis {job.job_id} crashed: {str(e)}")
+        await job.update(status='completed', finished_at=datetime.now().isoformat())
+    try:
+        summary = job.snapshot()
+        await asyncio.to_thread(math_db.collection('analysis_jobs').document(job.job_id).set, summary)
+        # Status polls now read the persisted summary; open event streams hold their own reference
+        batch_analysis_jobs.pop(job.job_id, None)
+    except Exception as e:
+        logger.error(f"Failed to persist batch job {job.job_id}: {str(e)}")
+
+def get_batch_job_snapshot(job_id: str) -> Dict:
+    """Live progress from memory, falling back to the persisted summary"""
+    job = batch_analysis_jobs.get(job_id)
+    if job:
+        return job.snapshot()
+    job_doc = math_db.collection('analysis_jobs').document(job_id).get()
+    if not job_doc.exists:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job_doc.to_dict()
+
+@math_router.post("/batch-analyze")
+async def batch_analyze_pdfs(
+    files: List[UploadFile] = File(...),
+    location: str = "",
+    level: str = "",
+    subject: str = "",
+    exam_type: str = ""
+):
+    """
+    Queue a class set of test papers (PDFs and/or zip archives) for AI analysis.
+    Student names are taken from the PDF filenames. Returns a job_id for progress polling.
+    """
+    try:
+        if not math_db:
+            raise HTTPException(status_code=500, detail="Firebase not initialized")
+        
+        uploads = [(f.filename, await f.read()) for f in files]
+        try:
+            papers = expand_batch_uploads(uploads)
+        except (ValueError, zipfile.BadZipFile) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        if not papers:
+            raise HTTPException(status_code=400, detail="No PDF files found in upload")
+        if len(papers) > BATCH_ANALYSIS_MAX_FILES:
+            raise HTTPException(status_code=400, detail=f"Too many papers ({len(papers)}). Maximum is {BATCH_ANALYSIS_MAX_FILES} per batch")
+        
+        llm = get_paper_analysis_llm()
+        
+        prune_batch_jobs()
+        job = BatchAnalysisJob([name for name, _ in papers], location, level, subject, exam_type)
+        batch_analysis_jobs[job.job_id] = job
+        job.task = asyncio.create_task(run_batch_analysis_job(job, [content for _, content in papers], llm))
+        
+        logger.info(f"Queued batch analysis {job.job_id} with {len(papers)} papers")
+        
+        return {
+            'success': True,
+            'job_id': job.job_id,
+            'total': len(papers),
+            'status_url': f"/api/math-analysis/batch-analyze/{job.job_id}",
+            'events_url': f"/api/math-analysis/batch-analyze/{job.job_id}/events"
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error queueing batch analysis: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@math_router.get("/batch-analyze/{job_id}")
+async def get_batch_analysis_status(job_id: str):
+    """Poll progress of a batch analysis job"""
+    try:
+        if not math_db:
+            raise HTTPException(status_code=500, detail="Firebase not initialized")
+        
+        return {
+            'success': True,
+            'job': get_batch_job_snapshot(job_id)
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching batch job: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@math_router.get("/batch-analyze/{job_id}/events")
+async def stream_batch_analysis_events(job_id: str):
+    """Server-Sent Events stream of batch job progress (ends when the job completes)"""
+    job = batch_analysis_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Batch job not found or no longer running")
+    
+    async def event_stream():
+        version = -1
+        while True:
+            new_version = await job.wait_for_change(version, timeout=15.0)
+            if new_version == version:
+                # Keep proxies from closing an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            version = new_version
+            yield f"event: progress\ndata: {json.dumps(job.snapshot())}\n\n"
+            if job.done:
+                break
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@math_router.get("/batch-analyze/{job_id}/staged")
+async def get_batch_staged_results(job_id: str):
+    """List staged analyses of a batch job awaiting tutor review"""
+    try:
+        if not math_db:
+            raise HTTPException(status_code=500, detail="Firebase not initialized")
+        
+        staged = []
+        for doc in math_db.collection('analysis_staging').where('job_id', '==', job_id).stream():
+            staged_data = doc.to_dict()
+            staged_data['staging_id'] = doc.id
+            staged.append(staged_data)
+        
+        return {
+            'success': True,
+            'count': len(staged),
+            'staged_results': staged
+        }
+        
+    except Exception as e:
+        logger.error(f"Error fetching staged results: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @math_router.post("/save-analyzed-results")
-async def save_analyzed_results(data: ManualEntryRequest):
+async def save_analyzed_results(data: ManualEntryRequest, staging_id: Optional[str] = None):
     """
     Save AI-analyzed results after tutor confirmation/editing
-    Same as manual entry but from PDF analysis
+    Same as manual entry but from PDF analysis.
+    Pass staging_id when confirming a batch-analyzed paper so it leaves the review queue.
     """
     try:
         # Reuse the manual entry logic
-        return await manual_entry(data)
+        saved = await manual_entry(data)
+        
+        if staging_id:
+            math_db.collection('analysis_staging').document(staging_id).update({
+                'status': 'saved',
+                'saved_student_id': saved['student_id'],
+                'saved_result_id': saved['result_id'],
+                'saved_at': datetime.now().isoformat()
+            })
+        
+        return saved
     except Exception as e:
         logger.error(f"Error saving analyzed results: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -967,39 +951,79 @@ async def save_analyzed_results(data: ManualEntryRequest):
 # Question Bank & Assessment Generation
 from question_bank import (
     get_dummy_questions,
-    generate_assessment_pdf,
     AssessmentRequest,
-    DUMMY_QUESTION_BANK
+    DUMMY_QUESTION_INDEX
 )
-from fastapi.responses import StreamingResponse
+from question_store import (
+    build_assessment,
+    get_question_index,
+    set_question_index,
+    load_question_index_from_firestore,
+    save_question_index_to_firestore
+)
+from fastapi import BackgroundTasks
+from fastapi.responses import StreamingResponse, FileResponse
+from assessment_pdf_cache import get_or_render_pdf, prerender_assessment_pdfs, shutdown_render_pool
+
+@math_router.on_event("startup")
+async def load_question_bank():
+    """Load the persisted question bank into the in-memory index"""
+    if not math_db:
+        return
+    try:
+        index = await asyncio.to_thread(load_question_index_from_firestore, math_db)
+        if len(index):
+            set_question_index(index)
+        else:
+            logger.info("Firestore question bank is empty - using dummy question bank")
+    except Exception as e:
+        logger.error(f"Failed to load question bank: {str(e)}")
+
+@math_router.on_event("shutdown")
+async def stop_pdf_render_pool():
+    """Stop the assessment PDF render workers"""
+    shutdown_render_pool()
+
+@math_router.post("/seed-question-bank")
+async def seed_question_bank():
+    """Persist the dummy question bank to Firestore and reload the index"""
+    try:
+        if not math_db:
+            raise HTTPException(status_code=500, detail="Firebase not initialized")
+        
+        saved = save_question_index_to_firestore(math_db, DUMMY_QUESTION_INDEX)
+        index = load_question_index_from_firestore(math_db)
+        set_question_index(index)
+        
+        return {
+            'success': True,
+            'message': f'Seeded {saved} questions',
+            'total_questions': len(index)
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error seeding question bank: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 @math_router.get("/available-subtopics")
 async def get_available_subtopics(level: str, subject: str, topics: str):
     """Get available subtopics for selected topics"""
     try:
         topic_list = topics.split(',') if topics else []
-        bank_key = f"{level}_{subject.replace('.', '').replace(' ', '')}"
-        
-        if bank_key not in DUMMY_QUESTION_BANK:
-            return {"success": True, "subtopics": []}
-        
-        subtopics = set()
-        question_bank = DUMMY_QUESTION_BANK[bank_key]
-        
-        for topic in topic_list:
-            if topic in question_bank:
-                subtopics.update(question_bank[topic].keys())
+        index = get_question_index() or DUMMY_QUESTION_INDEX
         
         return {
             "success": True,
-            "subtopics": sorted(list(subtopics))
+            "subtopics": index.subtopics(level, subject, topic_list) if topic_list else []
         }
     except Exception as e:
         logger.error(f"Error fetching subtopics: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @math_router.post("/generate-assessment")
-async def generate_assessment(request: AssessmentRequest):
+async def generate_assessment(request: AssessmentRequest, background_tasks: BackgroundTasks):
     """Generate revision assessment based on weak topics"""
     try:
         if not math_db:
@@ -1024,24 +1048,25 @@ async def generate_assessment(request: AssessmentRequest):
                 subtopics=request.selected_subtopics if request.selected_subtopics else None
             )
             
-            # Filter by time
-            selected_questions = []
-            total_time = 0
+            # Questions from the student's earlier assessments are avoided where possible
+            seen_question_ids = set()
+            for doc in student_ref.collection('assessments').stream():
+                for q in doc.to_dict().get('questions', []):
+                    if q.get('question_id'):
+                        seen_question_ids.add(q['question_id'])
             
-            # Shuffle for randomness
-            random.shuffle(questions)
-            
-            for q in questions:
-                if total_time + q['estimated_time_minutes'] <= request.duration_minutes:
-                    selected_questions.append(q)
-                    total_time += q['estimated_time_minutes']
-                
-                if total_time >= request.duration_minutes * 0.9:  # Use 90% of time
-                    break
+            # Fit duration (and target marks) with balanced topic coverage
+            selected_questions = build_assessment(
+                questions,
+                request.duration_minutes,
+                target_marks=request.target_marks,
+                seen_question_ids=seen_question_ids
+            )
         else:
             # Manual selection
             all_questions = get_dummy_questions(student_data['level'], student_data['subject'])
-            selected_questions = [q for q in all_questions if q['question_id'] in request.manual_question_ids]
+            manual_ids = set(request.manual_question_ids or [])
+            selected_questions = [q for q in all_questions if q['question_id'] in manual_ids]
         
         if not selected_questions:
             raise HTTPException(status_code=400, detail="No questions available for selected criteria")
@@ -1070,6 +1095,9 @@ async def generate_assessment(request: AssessmentRequest):
         # Save to student's assessments subcollection
         student_ref.collection('assessments').document(assessment_id).set(assessment_data)
         
+        # Render both PDF versions now so the first download is a cache hit
+        background_tasks.add_task(prerender_assessment_pdfs, request.student_id, assessment_data)
+        
         return {
             'success': True,
             'assessment_id': assessment_id,
@@ -1102,19 +1130,20 @@ async def download_assessment_pdf(student_id: str, assessment_id: str, version:
         
         assessment_data = assessment_doc.to_dict()
         
-        # Generate PDF
+        # Served from the on-disk cache; rendered in the process pool on a miss
         include_solutions = (version == "tutor")
-        pdf_bytes = generate_assessment_pdf(assessment_data, include_solutions)
+        version = "tutor" if include_solutions else "student"
+        pdf_path = await get_or_render_pdf(student_id, assessment_data, version)
         
         filename = f"Internal_Assessment_Test_{assessment_data['created_date'].replace('/', '')}"
         if include_solutions:
             filename += "_Solutions"
         filename += ".pdf"
         
-        return StreamingResponse(
-            io.BytesIO(pdf_bytes),
+        return FileResponse(
+            pdf_path,
             media_type="application/pdf",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            filename=filename
         )
         
     except HTTPException:
@@ -1156,6 +1185,237 @@ async def get_student_assessments(student_id: str):
         logger.error(f"Error fetching assessments: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Improvement Tracking
+# Each student has a 'topic_timelines' document holding the baseline topic scores of
+# every original result plus the latest internal-assessment score per topic.
+# It is updated incrementally when an assessment is completed, and a result's baseline is
+# re-copied when the result is edited or dropped when it is deleted.
+
+def load_original_result(student_ref, result_id: str):
+    """Original test result from student_results (legacy results subcollection as fallback)"""
+    result_doc = math_db.collection('student_results').document(result_id).get()
+    if not result_doc.exists:
+        result_doc = student_ref.collection('results').document(result_id).get()
+    return result_doc.to_dict() if result_doc.exists else None
+
+def new_topic_timeline(student_id: str, student_data: Dict) -> Dict:
+    return {
+        'student_id': student_id,
+        'tutor_id': student_data.get('tutor_id'),
+        'name': student_data.get('name', ''),
+        'location': student_data.get('location', ''),
+        'level': student_data.get('level', ''),
+        'subject': student_data.get('subject', ''),
+        'baselines': {},  # result_id -> original exam summary and topic scores
+        'latest_scores': {},  # result_id -> topic -> latest assessment score
+        'assessment_counts': {},  # result_id -> completed assessments
+        'history': [],  # every completed assessment, oldest first
+        'last_updated': None
+    }
+
+def add_baseline_to_timeline(timeline: Dict, result_id: str, original_data: Dict):
+    if result_id in timeline['baselines']:
+        return
+    timeline['baselines'][result_id] = {
+        'exam_type': original_data.get('exam_type'),
+        'date': original_data.get('date') or original_data.get('exam_date') or original_data.get('created_at'),
+        'overall_score': original_data.get('overall_score'),
+        'topics': {t['topic_name']: t['percentage'] for t in original_data.get('topics', [])}
+    }
+
+def replace_baseline_in_timeline(timeline: Dict, result_id: str, original_data: Optional[Dict]) -> bool:
+    """
+    Re-copy an edited result's baseline, or drop a deleted result with its assessment scores
+    (as rebuild_topic_timeline would). Returns whether the timeline tracked the result.
+    """
+    if result_id not in timeline['baselines']:
+        return False
+    del timeline['baselines'][result_id]
+    if original_data is not None:
+        add_baseline_to_timeline(timeline, result_id, original_data)
+    else:
+        timeline['latest_scores'].pop(result_id, None)
+        timeline['assessment_counts'].pop(result_id, None)
+        timeline['history'] = [entry for entry in timeline['history'] if entry['result_id'] != result_id]
+    return True
+
+def write_result_and_timeline(result_ref, update_payload: Optional[Dict]) -> bool:
+    """
+    Update (or, with update_payload None, delete) a result and refresh its baseline on the
+    student's timeline in one transaction. False if the result does not exist.
+    """
+    @firestore.transactional
+    def write(transaction):
+        result_snapshot = result_ref.get(transaction=transaction)
+        if not result_snapshot.exists:
+            return False
+        result = result_snapshot.to_dict()
+        timeline_ref = timeline_doc = None
+        if result.get('student_id'):
+            timeline_ref = math_db.collection('topic_timelines').document(result['student_id'])
+            timeline_doc = timeline_ref.get(transaction=transaction)
+        if update_payload is None:
+            transaction.delete(result_ref)
+        else:
+            transaction.update(result_ref, update_payload)
+        if timeline_doc is not None and timeline_doc.exists:
+            timeline = timeline_doc.to_dict()
+            original_data = None if update_payload is None else {**result, **update_payload}
+            if replace_baseline_in_timeline(timeline, result_ref.id, original_data):
+                transaction.set(timeline_ref, timeline)
+        return True
+
+    return write(math_db.transaction())
+
+def add_assessment_to_timeline(timeline: Dict, result_id: str, assessment_id: str, topics: List[Dict], completed_at: str):
+    latest = timeline['latest_scores'].setdefault(result_id, {})
+    for topic in topics:
+        latest[topic['topic_name']] = {
+            'percentage': topic['percentage'],
+            'assessment_id': assessment_id,
+            'completed_at': completed_at
+        }
+    timeline['assessment_counts'][result_id] = timeline['assessment_counts'].get(result_id, 0) + 1
+    timeline['history'].append({
+        'result_id': result_id,
+        'assessment_id': assessment_id,
+        'completed_at': completed_at,
+        'topics': {t['topic_name']: t['percentage'] for t in topics}
+    })
+    timeline['last_updated'] = completed_at
+
+def compute_improvements(timeline: Dict, result_id: str) -> List[Dict]:
+    """Improvement per topic of an original result - O(topics)"""
+    baseline = timeline['baselines'].get(result_id, {})
+    latest = timeline['latest_scores'].get(result_id, {})
+    improvement_data = []
+    for topic_name, original_score in baseline.get('topics', {}).items():
+        if topic_name not in latest:
+            continue
+        latest_score = latest[topic_name]['percentage']
+        improvement = latest_score - original_score
+        improvement_data.append({
+            'topic': topic_name,
+            'original_score': original_score,
+            'latest_score': latest_score,
+            'improvement': improvement,
+            'improvement_percentage': round((improvement / original_score * 100) if original_score > 0 else 0, 2)
+        })
+    return improvement_data
+
+def rebuild_topic_timeline(student_id: str) -> Optional[Dict]:
+    """Build a timeline from scratch (students whose assessments predate incremental tracking)"""
+    student_ref = math_db.collection('students').document(student_id)
+    student_doc = student_ref.get()
+    if not student_doc.exists:
+        return None
+    
+    timeline = new_topic_timeline(student_id, student_doc.to_dict())
+    completed = []
+    for doc in student_ref.collection('assessments').where('status', '==', 'completed').stream():
+        assessment_data = doc.to_dict()
+        if 'completion_data' in assessment_data:
+            completed.append(assessment_data)
+    completed.sort(key=lambda a: a['completion_data'].get('completed_at', a.get('created_timestamp', '')))
+    
+    for assessment in completed:
+        result_id = assessment.get('result_id')
+        if result_id not in timeline['baselines']:
+            original_data = load_original_result(student_ref, result_id)
+            if not original_data:
+                continue
+            add_baseline_to_timeline(timeline, result_id, original_data)
+        completion = assessment['completion_data']
+        add_assessment_to_timeline(
+            timeline, result_id, assessment['assessment_id'], completion.get('topics', []),
+            completion.get('completed_at', assessment.get('created_timestamp', ''))
+        )
+    
+    math_db.collection('topic_timelines').document(student_id).set(timeline)
+    return timeline
+
+@math_router.post("/assessment/{student_id}/{assessment_id}/complete")
+async def complete_assessment(student_id: str, assessment_id: str, data: AssessmentCompletion):
+    """Record internal assessment scores and update the student's topic timeline"""
+    try:
+        if not math_db:
+            raise HTTPException(status_code=500, detail="Firebase not initialized")
+        
+        student_ref = math_db.collection('students').document(student_id)
+        student_doc = student_ref.get()
+        if not student_doc.exists:
+            raise HTTPException(status_code=404, detail="Student not found")
+        
+        assessment_ref = student_ref.collection('assessments').document(assessment_id)
+        assessment_doc = assessment_ref.get()
+        if not assessment_doc.exists:
+            raise HTTPException(status_code=404, detail="Assessment not found")
+        assessment_data = assessment_doc.to_dict()
+        if assessment_data.get('status') == 'completed':
+            # Early exit only - record_completion re-checks inside the transaction
+            raise HTTPException(status_code=400, detail="Assessment already completed")
+        
+        result_id = assessment_data.get('result_id')
+        original_data = load_original_result(student_ref, result_id)
+        
+        topics_data = [
+            {
+                'topic_name': t.topic_name,
+                'marks': t.marks,
+                'total_marks': t.total_marks,
+                'percentage': round((t.marks / t.total_marks * 100) if t.total_marks > 0 else 0, 2)
+            }
+            for t in data.topics
+        ]
+        total_marks = sum([t['marks'] for t in topics_data])
+        total_possible = sum([t['total_marks'] for t in topics_data])
+        completed_at = datetime.now().isoformat()
+        completion_data = {
+            'topics': topics_data,
+            'overall_score': round((total_marks / total_possible * 100) if total_possible > 0 else 0, 2),
+            'total_marks': total_marks,
+            'total_possible': total_possible,
+            'completed_at': completed_at
+        }
+        
+        timeline_ref = math_db.collection('topic_timelines').document(student_id)
+        student_data = student_doc.to_dict()
+        
+        @firestore.transactional
+        def record_completion(transaction):
+            assessment_snapshot = assessment_ref.get(transaction=transaction)
+            if (assessment_snapshot.to_dict() or {}).get('status') == 'completed':
+                # A concurrent completion got there first
+                return None
+            timeline_doc = timeline_ref.get(transaction=transaction)
+            timeline = timeline_doc.to_dict() if timeline_doc.exists else new_topic_timeline(student_id, student_data)
+            if original_data:
+                add_baseline_to_timeline(timeline, result_id, original_data)
+            add_assessment_to_timeline(timeline, result_id, assessment_id, topics_data, completed_at)
+            transaction.set(timeline_ref, timeline)
+            transaction.update(assessment_ref, {
+                'status': 'completed',
+                'completion_data': completion_data
+            })
+            return timeline
+        
+        timeline = record_completion(math_db.transaction())
+        if timeline is None:
+            raise HTTPException(status_code=400, detail="Assessment already completed")
+        
+        return {
+            'success': True,
+            'assessment_id': assessment_id,
+            'completion': completion_data,
+            'improvements': compute_improvements(timeline, result_id)
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error completing assessment: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @math_router.get("/improvement-tracking/{student_id}/{result_id}")
 async def get_improvement_tracking(student_id: str, result_id: str):
     """Get improvement metrics comparing original test with internal assessments"""
@@ -1163,101 +1423,216 @@ async def get_improvement_tracking(student_id: str, result_id: str):
         if not math_db:
             raise HTTPException(status_code=500, detail="Firebase not initialized")
         
-        # Get original result
-        student_ref = math_db.collection('students').document(student_id)
-        original_result = student_ref.collection('results').document(result_id).get()
+        timeline_doc = math_db.collection('topic_timelines').document(student_id).get()
+        timeline = timeline_doc.to_dict() if timeline_doc.exists else rebuild_topic_timeline(student_id)
+        if timeline is None:
+            raise HTTPException(status_code=404, detail="Student not found")
         
-        if not original_result.exists:
-            raise HTTPException(status_code=404, detail="Original result not found")
+        baseline = timeline['baselines'].get(result_id)
+        if not baseline:
+            # No completed assessment for this result yet - report the original only
+            original_data = load_original_result(math_db.collection('students').document(student_id), result_id)
+            if not original_data:
+                raise HTTPException(status_code=404, detail="Original result not found")
+            add_baseline_to_timeline(timeline, result_id, original_data)
+            baseline = timeline['baselines'][result_id]
         
-        original_data = original_result.to_dict()
+        return {
+            'success': True,
+            'original_exam': baseline['exam_type'],
+            'original_date': baseline['date'],
+            'original_overall': baseline['overall_score'],
+            'assessment_count': timeline['assessment_counts'].get(result_id, 0),
+            'improvements': compute_improvements(timeline, result_id)
+        }
         
-        # Get internal assessments for this result
-        assessments_ref = student_ref.collection('assessments')\
-            .where('result_id', '==', result_id)\
-            .where('status', '==', 'completed')
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error tracking improvement: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@math_router.post("/improvement-tracking/bulk")
+async def get_bulk_improvement_tracking(request: BulkImprovementRequest, tutor: dict = Depends(get_current_tutor)):
+    """Improvement deltas for a whole class in one call (tutor authenticated)"""
+    try:
+        # Tutor authentication is MANDATORY (enforced by the get_current_tutor dependency)
+        tutor_id = tutor['tutor_id']
         
-        assessment_results = []
-        for doc in assessments_ref.stream():
-            assessment_data = doc.to_dict()
-            if 'completion_data' in assessment_data:
-                assessment_results.append(assessment_data)
-        
-        # Calculate improvement metrics
-        original_topics = {t['topic_name']: t['percentage'] for t in original_data['topics']}
-        
-        improvement_data = []
-        for topic_name, original_score in original_topics.items():
-            # Find latest assessment score for this topic
-            latest_score = None
-            for assessment in assessment_results:
-                completion = assessment.get('completion_data', {})
-                for topic in completion.get('topics', []):
-                    if topic['topic_name'] == topic_name:
-                        latest_score = topic['percentage']
-            
-            if latest_score is not None:
-                improvement = latest_score - original_score
-                improvement_data.append({
-                    'topic': topic_name,
-                    'original_score': original_score,
-                    'latest_score': latest_score,
-                    'improvement': improvement,
-                    'improvement_percentage': round((improvement / original_score * 100) if original_score > 0 else 0, 2)
+        if not math_db:
+            raise HTTPException(status_code=500, detail="Firebase not initialized")
+        
+        if request.student_ids:
+            # One batched read for the listed students - only the tutor's own are looked at
+            # (or rebuilt) below
+            student_refs = [math_db.collection('students').document(sid) for sid in request.student_ids]
+            student_ids = [doc.id for doc in math_db.get_all(student_refs, field_paths=['tutor_id'])
+                           if doc.exists and doc.to_dict().get('tutor_id') == tutor_id]
+            refs = [math_db.collection('topic_timelines').document(sid) for sid in student_ids]
+            timelines = [doc.to_dict() for doc in math_db.get_all(refs) if doc.exists]
+        else:
+            query = math_db.collection('topic_timelines').where('tutor_id', '==', tutor_id)
+            students_query = math_db.collection('students').where('tutor_id', '==', tutor_id)
+            for field in ('location', 'level', 'subject'):
+                if getattr(request, field):
+                    query = query.where(field, '==', getattr(request, field))
+                    students_query = students_query.where(field, '==', getattr(request, field))
+            timelines = [doc.to_dict() for doc in query.stream()]
+            # IDs only - to find the students whose timeline has not been built yet
+            student_ids = [doc.id for doc in students_query.select(['tutor_id']).stream()]
+        
+        # Students whose results predate incremental tracking get their timeline built (and stored) once
+        missing = set(student_ids) - {timeline['student_id'] for timeline in timelines}
+        for student_id in sorted(missing):
+            timeline = rebuild_topic_timeline(student_id)
+            if timeline is not None:
+                timelines.append(timeline)
+        
+        students = []
+        for timeline in timelines:
+            # Data isolation - never return another tutor's students
+            if timeline.get('tutor_id') != tutor_id:
+                continue
+            results = []
+            for result_id, baseline in timeline['baselines'].items():
+                results.append({
+                    'result_id': result_id,
+                    'original_exam': baseline['exam_type'],
+                    'original_date': baseline['date'],
+                    'original_overall': baseline['overall_score'],
+                    'assessment_count': timeline['assessment_counts'].get(result_id, 0),
+                    'improvements': compute_improvements(timeline, result_id)
                 })
+            results.sort(key=lambda r: r['original_date'] or '', reverse=True)
+            students.append({
+                'student_id': timeline['student_id'],
+                'name': timeline.get('name', ''),
+                'location': timeline.get('location', ''),
+                'level': timeline.get('level', ''),
+                'subject': timeline.get('subject', ''),
+                'last_updated': timeline.get('last_updated'),
+                'results': results
+            })
         
         return {
             'success': True,
-            'original_exam': original_data['exam_type'],
-            'original_date': original_data['date'],
-            'original_overall': original_data['overall_score'],
-            'assessment_count': len(assessment_results),
-            'improvements': improvement_data
+            'count': len(students),
+            'students': students
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error tracking improvement: {str(e)}")
+        logger.error(f"Error tracking class improvement: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# All results - paginated for the revision planning page
+#
+# Filters are pushed into the Firestore query; the composite indexes this needs
+# (one per filter field per sort field) are registered in firestore_index_registry.py
+
+RESULT_SORT_FIELDS = {'date': 'created_at', 'score': 'overall_score'}
+RESULT_SUMMARY_FIELDS = [
+    'student_id', 'student_name', 'location', 'level', 'subject',
+    'exam_type', 'exam_date', 'overall_score', 'created_at'
+]
+RESULTS_DEFAULT_PAGE_SIZE = 100
+RESULTS_MAX_PAGE_SIZE = 500
+
+def encode_results_cursor(doc_id: str, sort: str, order: str) -> str:
+    payload = json.dumps({'id': doc_id, 'sort': sort, 'order': order}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_results_cursor(cursor: str) -> Dict:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def results_etag(payload: Dict) -> str:
+    body = json.dumps(payload, sort_keys=True, default=str)
+    return f'"{hashlib.sha256(body.encode()).hexdigest()[:32]}"'
+
 @math_router.get("/all-results")
-async def get_all_results(authorization: str = Header(None)):
-    """Get all student results with scores for revision planning page (tutor authenticated)"""
+async def get_all_results(
+    response: Response,
+    tutor: dict = Depends(get_current_tutor),
+    if_none_match: Optional[str] = Header(None),
+    limit: int = Query(RESULTS_DEFAULT_PAGE_SIZE, ge=1, le=RESULTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    view: str = Query('full', pattern='^(summary|full)$'),
+    sort: str = Query('date', pattern='^(date|score)$'),
+    order: str = Query('desc', pattern='^(asc|desc)$'),
+    location: Optional[str] = None,
+    level: Optional[str] = None,
+    subject: Optional[str] = None,
+    exam_type: Optional[str] = None,
+    student_id: Optional[str] = None
+):
+    """
+    Get student results for revision planning page (tutor authenticated), one page at a time.
+    Pass next_cursor back as ?cursor= for the following page; view=summary drops topic arrays.
+    """
     try:
-        # Verify tutor authentication - MANDATORY
-        if not authorization:
-            raise HTTPException(status_code=401, detail="Authorization header required")
-        
-        try:
-            tutor_data = verify_tutor_token(authorization)
-            tutor_id = tutor_data.get('tutor_id')
-            if not tutor_id:
-                raise HTTPException(status_code=401, detail="Invalid tutor token - no tutor_id")
-        except Exception as e:
-            logger.error(f"Authentication failed: {str(e)}")
-            raise HTTPException(status_code=401, detail="Authentication failed")
+        # Tutor authentication is MANDATORY (enforced by the get_current_tutor dependency)
+        tutor_id = tutor['tutor_id']
         
         if not math_db:
             raise HTTPException(status_code=500, detail="Firebase not initialized")
         
-        all_results = []
+        results_collection = math_db.collection('student_results')
         
         # ALWAYS filter by tutor_id - critical for data isolation
-        results_ref = math_db.collection('student_results').where('tutor_id', '==', tutor_id).stream()
-        
-        for result_doc in results_ref:
+        query = results_collection.where('tutor_id', '==', tutor_id)
+        for field, value in (('location', location), ('level', level), ('subject', subject),
+                             ('exam_type', exam_type), ('student_id', student_id)):
+            if value:
+                query = query.where(field, '==', value)
+        
+        direction = firestore.Query.DESCENDING if order == 'desc' else firestore.Query.ASCENDING
+        query = query.order_by(RESULT_SORT_FIELDS[sort], direction=direction)
+        
+        if view == 'summary':
+            query = query.select(RESULT_SUMMARY_FIELDS)
+        
+        if cursor:
+            cursor_data = decode_results_cursor(cursor)
+            if cursor_data.get('sort') != sort or cursor_data.get('order') != order:
+                raise HTTPException(status_code=400, detail="Cursor does not match sort order")
+            cursor_doc = results_collection.document(cursor_data.get('id', '')).get()
+            if not cursor_doc.exists:
+                raise HTTPException(status_code=400, detail="Cursor result no longer exists")
+            query = query.start_after(cursor_doc)
+        
+        # Fetch one extra document to know whether another page exists
+        docs = list(query.limit(limit + 1).stream())
+        has_more = len(docs) > limit
+        docs = docs[:limit]
+        
+        page_results = []
+        for result_doc in docs:
             result_data = result_doc.to_dict()
             result_data['result_id'] = result_doc.id
-            all_results.append(result_data)
+            page_results.append(result_data)
         
-        return {
+        payload = {
             'success': True,
-            'count': len(all_results),
-            'results': all_results,
+            'count': len(page_results),
+            'results': page_results,
+            'next_cursor': encode_results_cursor(docs[-1].id, sort, order) if has_more else None,
+            'has_more': has_more,
             'tutor_id': tutor_id  # Include for debugging
         }
         
+        etag = results_etag(payload)
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'private, no-cache'
+        if if_none_match and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+        
+        return payload
+        
     except HTTPException:
         raise
     except Exception as e:
@@ -1271,16 +1646,11 @@ async def delete_result(result_id: str):
         if not math_db:
             raise HTTPException(status_code=500, detail="Firebase not initialized")
         
-        # Check if result exists
+        # Delete the result and its baseline on the student's topic timeline
         result_ref = math_db.collection('student_results').document(result_id)
-        result_doc = result_ref.get()
-        
-        if not result_doc.exists:
+        if not write_result_and_timeline(result_ref, None):
             raise HTTPException(status_code=404, detail="Result not found")
         
-        # Delete the result
-        result_ref.delete()
-        
         return {
             'success': True,
             'message': 'Result deleted successfully'
@@ -1299,21 +1669,24 @@ async def update_result(result_id: str, update_data: dict):
         if not math_db:
             raise HTTPException(status_code=500, detail="Firebase not initialized")
         
-        # Check if result exists
-        result_ref = math_db.collection('student_results').document(result_id)
-        result_doc = result_ref.get()
-        
-        if not result_doc.exists:
-            raise HTTPException(status_code=404, detail="Result not found")
+        # Edited marks make the topic percentages stale - the timeline baseline is built from them
+        topics = [
+            {**t, 'percentage': round((float(t['marks']) / float(t['total_marks']) * 100)
+                                      if float(t['total_marks']) > 0 else 0, 2)}
+            if t.get('marks') is not None and t.get('total_marks') is not None else t
+            for t in update_data.get('topics', [])
+        ]
         
-        # Update the result
+        # Update the result, and the baseline improvement tracking compares against
         update_payload = {
-            'topics': update_data.get('topics', []),
+            'topics': topics,
             'overall_score': update_data.get('overall_score', 0),
             'last_updated': datetime.utcnow().isoformat()
         }
         
-        result_ref.update(update_payload)
+        result_ref = math_db.collection('student_results').document(result_id)
+        if not write_result_and_timeline(result_ref, update_payload):
+            raise HTTPException(status_code=404, detail="Result not found")
         
         return {
             'success': True,
@@ -0,0 +1,395 @@
+"""
+Paper Analysis Helpers for Math Results Analysis System
+Handles PDF text extraction, LLM prompting/parsing and batch analysis jobs
+"""
+
+import asyncio
+import io
+import json
+import logging
+import os
+import re
+import uuid
+import zipfile
+from datetime import datetime
+from pathlib import PurePosixPath
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Only the first part of the extracted text is sent to the model
+MAX_PROMPT_TEXT_CHARS = 2000
+PREVIEW_TEXT_CHARS = 500
+
+# Batch job limits (overridable via environment)
+BATCH_ANALYSIS_CONCURRENCY = int(os.getenv("BATCH_ANALYSIS_CONCURRENCY", "3"))
+BATCH_ANALYSIS_MAX_RETRIES = int(os.getenv("BATCH_ANALYSIS_MAX_RETRIES", "3"))
+BATCH_ANALYSIS_RETRY_DELAY = float(os.getenv("BATCH_ANALYSIS_RETRY_DELAY", "2.0"))
+BATCH_ANALYSIS_MAX_FILES = 100
+
+# Provider/network exceptions worth retrying, matched by class name so no SDK has to be imported
+# (openai/litellm, httpx, google.api_core); anything else - an unreadable PDF, an answer that
+# is not the JSON we asked for - fails the same way on every attempt
+TRANSIENT_ERROR_NAMES = {
+    'RateLimitError', 'APIConnectionError', 'APITimeoutError', 'Timeout', 'ServiceUnavailableError',
+    'InternalServerError', 'ConnectTimeout', 'ReadTimeout', 'RemoteProtocolError',
+    'ServiceUnavailable', 'DeadlineExceeded', 'TooManyRequests'
+}
+
+# ========================
+# PROMPTS & PARSING
+# ========================
+
+def build_analysis_system_message(level: str, subject: str, exam_type: str) -> str:
+    """System prompt for extracting per-topic marks from a marked test paper"""
+    return f"""You are an expert math teacher analyzing a {level} {subject} test paper for {exam_type}.
+
+Your task:
+1. Identify each question in the test paper
+2. Extract the marks awarded by the teacher (handwritten marks)
+3. Extract the total marks possible for each question
+4. Categorize each question into appropriate math topics
+
+Math topics you should recognize (examples):
+- Functions
+- Vectors
+- Calculus (Differentiation, Integration)
+- Algebra
+- Geometry
+- Trigonometry
+- Probability
+- Statistics
+- Linear Equations
+- Quadratic Equations
+- Coordinate Geometry
+- Graphs
+- Sets
+- Numbers and Operations
+- Mensuration
+- And other standard math topics for {level} {subject}
+
+Return your analysis in this EXACT JSON format:
+{{
+  "topics": [
+    {{
+      "topic_name": "Functions",
+      "marks_obtained": 12.0,
+      "total_marks": 20.0,
+      "question_numbers": "Q1"
+    }},
+    {{
+      "topic_name": "Vectors",
+      "marks_obtained": 15.0,
+      "total_marks": 20.0,
+      "question_numbers": "Q2"
+    }}
+  ],
+  "confidence": "high/medium/low",
+  "notes": "Any observations or uncertainties"
+}}
+
+Be precise with marks extraction. Look for handwritten marks carefully."""
+
+
+def build_analysis_user_message(level: str, subject: str, pdf_text: str) -> str:
+    """User message carrying the extracted paper text"""
+    return f"""Analyze this {subject} test paper for {level} level.
+
+Extract:
+1. Each question's topic (what math concept is being tested)
+2. Marks obtained by the student (handwritten by teacher)
+3. Total marks possible for each question
+
+PDF Text Extract (for context):
+{pdf_text[:MAX_PROMPT_TEXT_CHARS]}
+
+Provide your analysis in the JSON format specified."""
+
+
+def extract_pdf_text(pdf_content: bytes) -> str:
+    """Extract plain text from all pages of a PDF"""
+    import fitz  # PyMuPDF - imported on first use, most workers never parse a PDF
+
+    pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
+    try:
+        return "".join(page.get_text() for page in pdf_document)
+    finally:
+        pdf_document.close()
+
+
+def parse_analysis_response(response_text: str) -> Dict:
+    """Parse the model's JSON answer into topic scores and overall totals"""
+    # AI might return markdown wrapped JSON
+    json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+    if not json_match:
+        raise ValueError("Failed to parse AI response")
+    analysis_json = json.loads(json_match.group())
+
+    extracted_topics = []
+    for topic in analysis_json.get('topics', []):
+        marks = float(topic['marks_obtained'])
+        total = float(topic['total_marks'])
+        extracted_topics.append({
+            'topic_name': topic['topic_name'],
+            'marks': marks,
+            'total_marks': total,
+            'percentage': round((marks / total * 100) if total > 0 else 0, 2)
+        })
+
+    total_marks_obtained = sum([t['marks'] for t in extracted_topics])
+    total_marks_possible = sum([t['total_marks'] for t in extracted_topics])
+    overall_score = round((total_marks_obtained / total_marks_possible * 100) if total_marks_possible > 0 else 0, 2)
+
+    return {
+        'extracted_topics': extracted_topics,
+        'overall_score': overall_score,
+        'total_marks': total_marks_obtained,
+        'total_possible': total_marks_possible,
+        'confidence': analysis_json.get('confidence', 'medium'),
+        'notes': analysis_json.get('notes', '')
+    }
+
+# ========================
+# LLM BACKENDS
+# ========================
+
+class TransientLLMError(Exception):
+    """A model call that failed for a reason worth retrying (rate limit, outage, timeout)"""
+
+
+def is_transient_error(error: Exception) -> bool:
+    """True for LLM/network failures that may succeed on retry"""
+    if isinstance(error, (TransientLLMError, asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(error, 'status_code', None)
+    if isinstance(status_code, int) and (status_code == 429 or status_code >= 500):
+        return True
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+class PaperAnalysisLLM:
+    """Interface for the model that reads a paper and returns its JSON analysis"""
+
+    async def complete(self, system_message: str, user_message: str) -> str:
+        raise NotImplementedError
+
+
+class EmergentPaperAnalysisLLM(PaperAnalysisLLM):
+    """GPT-4o through the Emergent universal key"""
+
+    def __init__(self, api_key: str, provider: str = "openai", model: str = "gpt-4o"):
+        self.api_key = api_key
+        self.provider = provider
+        self.model = model
+
+    async def complete(self, system_message: str, user_message: str) -> str:
+        from emergentintegrations.llm.chat import LlmChat, UserMessage
+
+        chat = LlmChat(
+            api_key=self.api_key,
+            session_id=f"pdf_analysis_{uuid.uuid4()}",
+            system_message=system_message
+        ).with_model(self.provider, self.model)
+        return await chat.send_message(UserMessage(text=user_message))
+
+
+class FakePaperAnalysisLLM(PaperAnalysisLLM):
+    """Local stand-in that returns a fixed analysis (for tests and offline runs)"""
+
+    def __init__(self, topics: Optional[List[Dict]] = None, delay_seconds: float = 0.0, fail_times: int = 0):
+        self.topics = topics or [
+            {"topic_name": "Functions", "marks_obtained": 12.0, "total_marks": 20.0, "question_numbers": "Q1"},
+            {"topic_name": "Vectors", "marks_obtained": 15.0, "total_marks": 20.0, "question_numbers": "Q2"}
+        ]
+        self.delay_seconds = delay_seconds
+        self.fail_times = fail_times
+        self.calls = 0
+
+    async def complete(self, system_message: str, user_message: str) -> str:
+        self.calls += 1
+        if self.delay_seconds:
+            await asyncio.sleep(self.delay_seconds)
+        if self.calls <= self.fail_times:
+            raise TransientLLMError("Fake LLM transient failure")
+        return json.dumps({"topics": self.topics, "confidence": "high", "notes": "fake analysis"})
+
+
+def get_paper_analysis_llm() -> PaperAnalysisLLM:
+    """Pick the analysis backend (PAPER_ANALYSIS_LLM=fake selects the local model)"""
+    if os.getenv("PAPER_ANALYSIS_LLM", "").lower() == "fake":
+        return FakePaperAnalysisLLM()
+
+    api_key = os.getenv('EMERGENT_LLM_KEY')
+    if not api_key:
+        raise RuntimeError("EMERGENT_LLM_KEY not configured")
+    return EmergentPaperAnalysisLLM(api_key)
+
+
+async def analyze_paper(pdf_content: bytes, level: str, subject: str, exam_type: str,
+                        llm: PaperAnalysisLLM) -> Dict:
+    """Extract text from a paper, ask the model for topic marks and parse the answer"""
+    # PyMuPDF is CPU bound - keep it off the event loop
+    pdf_text = await asyncio.to_thread(extract_pdf_text, pdf_content)
+
+    response_text = await llm.complete(
+        build_analysis_system_message(level, subject, exam_type),
+        build_analysis_user_message(level, subject, pdf_text)
+    )
+    logger.info(f"Received AI response: {response_text[:500]}")
+
+    analysis = parse_analysis_response(response_text)
+    analysis['preview_text'] = pdf_text[:PREVIEW_TEXT_CHARS]
+    return analysis
+
+# ========================
+# BATCH JOBS
+# ========================
+
+def student_name_from_filename(filename: str) -> str:
+    """'John_Tan.pdf' -> 'John Tan'"""
+    stem = PurePosixPath(filename).stem
+    return re.sub(r'[_\-]+', ' ', stem).strip()
+
+
+def expand_batch_uploads(uploads: List[Tuple[str, bytes]]) -> List[Tuple[str, bytes]]:
+    """Flatten uploaded PDFs and zip archives into a list of (filename, pdf_bytes)"""
+    papers = []
+    for filename, content in uploads:
+        lower_name = filename.lower()
+        if lower_name.endswith('.pdf'):
+            papers.append((filename, content))
+        elif lower_name.endswith('.zip'):
+            with zipfile.ZipFile(io.BytesIO(content)) as archive:
+                for info in archive.infolist():
+                    name = info.filename
+                    # Skip folders and macOS resource forks
+                    if info.is_dir() or name.startswith('__MACOSX/') or not name.lower().endswith('.pdf'):
+                        continue
+                    papers.append((PurePosixPath(name).name, archive.read(info)))
+        else:
+            raise ValueError(f"Unsupported file '{filename}'. Upload PDFs or a zip of PDFs")
+    return papers
+
+
+class BatchAnalysisJob:
+    """In-memory progress of one batch analysis job"""
+
+    def __init__(self, filenames: List[str], location: str, level: str, subject: str, exam_type: str):
+        self.job_id = f"batch_{uuid.uuid4().hex[:12]}"
+        self.location = location
+        self.level = level
+        self.subject = subject
+        self.exam_type = exam_type
+        self.created_at = datetime.now().isoformat()
+        self.finished_at = None
+        self.status = 'queued'  # queued, running, completed
+        self.items = [
+            {
+                'item_id': str(idx),
+                'filename': filename,
+                'student_name': student_name_from_filename(filename),
+                'status': 'queued',  # queued, running, staged, failed
+                'attempts': 0,
+                'error': None,
+                'staging_id': None
+            }
+            for idx, filename in enumerate(filenames)
+        ]
+        self.task = None
+        self._version = 0
+        self._changed = asyncio.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status == 'completed'
+
+    def snapshot(self) -> Dict:
+        counts = {'queued': 0, 'running': 0, 'staged': 0, 'failed': 0}
+        for item in self.items:
+            counts[item['status']] += 1
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'location': self.location,
+            'level': self.level,
+            'subject': self.subject,
+            'exam_type': self.exam_type,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'total': len(self.items),
+            'completed': counts['staged'] + counts['failed'],
+            'counts': counts,
+            'items': [dict(item) for item in self.items]
+        }
+
+    async def update(self, item: Optional[Dict] = None, **changes):
+        """Apply changes to an item (or the job) and wake progress listeners"""
+        if item is not None:
+            item.update(changes)
+        else:
+            for key, value in changes.items():
+                setattr(self, key, value)
+        async with self._changed:
+            self._version += 1
+            self._changed.notify_all()
+
+    async def wait_for_change(self, seen_version: int, timeout: float) -> int:
+        """Block until the job changes past seen_version (or timeout); returns the current version"""
+        async with self._changed:
+            try:
+                await asyncio.wait_for(
+                    self._changed.wait_for(lambda: self._version != seen_version),
+                    timeout
+                )
+            except asyncio.TimeoutError:
+                pass
+            return self._version
+
+
+class BatchAnalysisRunner:
+    """
+    Runs a job's papers through the LLM with bounded concurrency; transient errors are retried.
+    Pass the same semaphore to every job's runner to bound LLM calls across jobs.
+    """
+
+    def __init__(self, llm: PaperAnalysisLLM, stage_result: Callable[[BatchAnalysisJob, Dict, Dict], str],
+                 concurrency: int = BATCH_ANALYSIS_CONCURRENCY, max_retries: int = BATCH_ANALYSIS_MAX_RETRIES,
+                 retry_delay: float = BATCH_ANALYSIS_RETRY_DELAY, semaphore: Optional[asyncio.Semaphore] = None):
+        self.llm = llm
+        self.stage_result = stage_result
+        self.semaphore = semaphore or asyncio.Semaphore(max(1, concurrency))
+        self.max_retries = max(1, max_retries)
+        self.retry_delay = retry_delay
+
+    async def run(self, job: BatchAnalysisJob, contents: List[bytes]):
+        await job.update(status='running')
+        await asyncio.gather(*[
+            self._process(job, item, content)
+            for item, content in zip(job.items, contents)
+        ])
+        await job.update(status='completed', finished_at=datetime.now().isoformat())
+        logger.info(f"Batch analysis {job.job_id} finished: {job.snapshot()['counts']}")
+
+    async def _process(self, job: BatchAnalysisJob, item: Dict, content: bytes):
+        async with self.semaphore:
+            await job.update(item, status='running')
+            last_error = None
+            analysis = None
+            for attempt in range(1, self.max_retries + 1):
+                item['attempts'] = attempt
+                try:
+                    # A paper analyzed on an earlier attempt is kept - only its staging write is retried
+                    if analysis is None:
+                        analysis = await analyze_paper(content, job.level, job.subject, job.exam_type, self.llm)
+                    # Firestore client is blocking
+                    staging_id = await asyncio.to_thread(self.stage_result, job, item, analysis)
+                    await job.update(item, status='staged', staging_id=staging_id, error=None)
+                    return
+                except Exception as e:
+                    last_error = str(e)
+                    logger.warning(f"Batch {job.job_id} item {item['filename']} attempt {attempt} failed: {last_error}")
+                    if not is_transient_error(e):
+                        break
+                    if attempt < self.max_retries:
+                        await asyncio.sleep(self.retry_delay * (2 ** (attempt - 1)))
+            await job.update(item, status='failed', error=last_error)
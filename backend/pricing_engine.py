@@ -0,0 +1,173 @@
+"""
+Project 62 Pricing Engine
+Meal-prep prices for checkout, quotes, upgrades and renewals.
+
+Subscription plans (project62/subscriptions_config/all) are compiled into an in-memory
+price table:
+  - (meals_per_day, weeks) -> price for active plans (what a new customer can buy)
+  - (plan_id, weeks)       -> price for every plan (upgrades of existing subscriptions)
+The table is rebuilt from one read of the plans every PRICING_TABLE_TTL_SECONDS, or on the
+next lookup after the admin plan endpoints call price_table.invalidate().
+
+price_quote() is the one place the arithmetic lives: meals at the tier price, loyalty
+discount, discount code, then delivery. It is pure and returns an itemized quote.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from firebase_apps import firestore_client
+
+logger = logging.getLogger(__name__)
+
+db = firestore_client('project62')
+
+PRICING_TABLE_TTL_SECONDS = float(os.getenv("PRICING_TABLE_TTL_SECONDS", "300"))
+DAYS_PER_WEEK = 6
+DEFAULT_DELIVERY_FEE = 20.00  # per week
+CURRENCY = "sgd"
+
+# ========================
+# LOYALTY
+# ========================
+
+def loyalty_from_points(loyalty_points: int):
+    """
+    Checkout loyalty discount from a customer's loyalty points
+    Returns: (tier_name, discount_percentage)
+    """
+    if loyalty_points >= 49:
+        return "Platinum", 10
+    elif loyalty_points >= 25:
+        return "Gold", 10
+    elif loyalty_points >= 7:
+        return "Silver", 5
+    return "None", 0
+
+# ========================
+# QUOTES
+# ========================
+
+def price_quote(price: Dict, meals_per_day: int, weeks: int, loyalty_tier: str = "None",
+                loyalty_discount_percent: float = 0, free_delivery: bool = False,
+                discount_code: Optional[str] = None, discount_percent: float = 0) -> Dict:
+    """
+    Itemized quote for `weeks` of `meals_per_day` at a table price ({price_per_meal,
+    delivery_fee, plan_id, plan_name}). Loyalty and discount code percentages apply to the
+    meals only, loyalty first; delivery is per week unless free_delivery.
+    """
+    total_meals = weeks * DAYS_PER_WEEK * meals_per_day
+    price_per_meal = price["price_per_meal"]
+    delivery_fee = price.get("delivery_fee", DEFAULT_DELIVERY_FEE)
+
+    lines: List[Dict] = []
+    base_meal_cost = total_meals * price_per_meal
+    lines.append({"item": "meals", "description": f"{total_meals} meals × ${price_per_meal:.2f}",
+                  "amount": round(base_meal_cost, 2)})
+
+    # Every amount is rounded to cents as it is taken, so the lines add up to the totals exactly
+    meal_cost = round(base_meal_cost, 2)
+    if loyalty_discount_percent:
+        loyalty_amount = round(meal_cost * (loyalty_discount_percent / 100), 2)
+        meal_cost = round(meal_cost - loyalty_amount, 2)
+        lines.append({"item": "loyalty_discount",
+                      "description": f"{loyalty_tier} loyalty {loyalty_discount_percent:g}% off meals",
+                      "amount": -loyalty_amount})
+    if discount_percent:
+        discount_amount = round(meal_cost * (discount_percent / 100), 2)
+        meal_cost = round(meal_cost - discount_amount, 2)
+        lines.append({"item": "discount_code", "description": f"{discount_code} {discount_percent:g}% off meals",
+                      "amount": -discount_amount})
+
+    delivery_cost = 0 if free_delivery else round(weeks * delivery_fee, 2)
+    lines.append({"item": "delivery",
+                  "description": "Free delivery" if free_delivery else f"{weeks} weeks × ${delivery_fee:.2f}",
+                  "amount": delivery_cost})
+
+    return {
+        "plan_id": price.get("plan_id"),
+        "plan_name": price.get("plan_name"),
+        "meals_per_day": meals_per_day,
+        "weeks": weeks,
+        "total_meals": total_meals,
+        "price_per_meal": price_per_meal,
+        "delivery_fee": delivery_fee,
+        "loyalty_tier": loyalty_tier,
+        "loyalty_discount_percent": loyalty_discount_percent,
+        "discount_code": discount_code if discount_percent else None,
+        "discount_percent": discount_percent,
+        "lines": lines,
+        "meal_cost": meal_cost,
+        "delivery_cost": delivery_cost,
+        "total": round(meal_cost + delivery_cost, 2),
+        "currency": CURRENCY
+    }
+
+# ========================
+# PRICE TABLE
+# ========================
+
+def compile_price_table(plans: List[Dict]) -> Dict[str, Dict]:
+    """Price table for subscriptions_config plan documents (see module docstring)"""
+    by_size: Dict = {}
+    by_plan: Dict = {}
+    for plan in plans:
+        delivery_fee = float(plan.get("delivery_fee", DEFAULT_DELIVERY_FEE))
+        for tier in plan.get("pricing_tiers") or []:
+            try:
+                weeks = int(tier["weeks"])
+                price = {"plan_id": plan.get("subscription_id"), "plan_name": plan.get("plan_name"),
+                         "price_per_meal": float(tier["price_per_meal"]), "delivery_fee": delivery_fee}
+            except (KeyError, TypeError, ValueError):
+                logger.warning(f"Skipping malformed pricing tier {tier} of plan {plan.get('subscription_id')}")
+                continue
+            by_plan[(plan.get("subscription_id"), weeks)] = price
+            if plan.get("is_active", False):
+                # The first active plan for a size wins, as checkout always picked the first match
+                by_size.setdefault((plan.get("meals_per_day"), weeks), price)
+    return {"by_size": by_size, "by_plan": by_plan}
+
+
+class PriceTable:
+    """Compiled plan prices, reloaded after PRICING_TABLE_TTL_SECONDS or invalidate()"""
+
+    def __init__(self, ttl: float = PRICING_TABLE_TTL_SECONDS):
+        self.ttl = ttl
+        self._table: Optional[Dict[str, Dict]] = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def _current(self) -> Dict[str, Dict]:
+        table = self._table
+        if table is not None and self._expires > time.monotonic():
+            return table
+        with self._lock:
+            if self._table is None or self._expires <= time.monotonic():
+                plans_ref = db.collection("project62").document("subscriptions_config").collection("all")
+                self._table = compile_price_table([doc.to_dict() for doc in plans_ref.stream()])
+                self._expires = time.monotonic() + self.ttl
+            return self._table
+
+    def invalidate(self):
+        with self._lock:
+            self._table = None
+
+    def price(self, meals_per_day: int, weeks: int) -> Optional[Dict]:
+        """Price of an active plan for this size, or None if nothing is on sale for it"""
+        return self._current()["by_size"].get((meals_per_day, weeks))
+
+    def plan_price(self, plan_id: str, weeks: int) -> Optional[Dict]:
+        """Price of a plan's tier (active or not), or None if the plan has no such tier"""
+        return self._current()["by_plan"].get((plan_id, weeks))
+
+    def sizes(self) -> List[Dict]:
+        """Every (meals_per_day, weeks) on sale with its price"""
+        by_size = self._current()["by_size"]
+        return [{"meals_per_day": meals, "weeks": weeks, **by_size[(meals, weeks)]}
+                for meals, weeks in sorted(by_size, key=lambda size: (size[0] or 0, size[1]))]
+
+
+price_table = PriceTable()
@@ -3,20 +3,31 @@ Project 62 - Backend API
 Handles leads, digital products, meal-prep subscriptions, customer auth, and admin dashboard
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Request, Header
+from fastapi import APIRouter, HTTPException, Depends, Request, Header, Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List, Dict
 import os
 from dotenv import load_dotenv
 import firebase_admin
-from firebase_admin import credentials, firestore, storage, auth as firebase_auth
+from firebase_admin import firestore, auth as firebase_auth
 from datetime import datetime, timedelta
 import jwt
 import uuid
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail, Attachment, FileContent, FileName, FileType, Disposition
 import base64
+import logging
+import asyncio
+import time
+import json
+
+from firebase_apps import firestore_client, storage_bucket, get_firebase_app
+import discount_codes
+import webhook_events
+import checkout_events
+from request_metrics import record_webhook_event
 
 from emergentintegrations.payments.stripe.checkout import (
     StripeCheckout,
@@ -27,31 +38,14 @@ from emergentintegrations.payments.stripe.checkout import (
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/project62", tags=["Project 62"])
 security = HTTPBearer()
 
-# Initialize Firebase Admin SDK for Project 62
-try:
-    firebase_cred_path = os.getenv("FIREBASE_CREDENTIALS_PATH")
-    if not firebase_cred_path or not os.path.exists(firebase_cred_path):
-        raise Exception(f"Firebase credentials not found at {firebase_cred_path}")
-    
-    # Check if app already exists
-    try:
-        project62_app = firebase_admin.get_app("project62")
-    except ValueError:
-        cred = credentials.Certificate(firebase_cred_path)
-        project62_app = firebase_admin.initialize_app(cred, {
-            'storageBucket': 'project62-ccc-digital.firebasestorage.app'
-        }, name="project62")
-    
-    db = firestore.client(app=project62_app)
-    bucket = storage.bucket(app=project62_app)
-    print("✅ Firebase initialized successfully for Project 62")
-except Exception as e:
-    print(f"❌ Firebase initialization error: {e}")
-    db = None
-    bucket = None
+# Firebase Admin SDK for Project 62 - created on first use, see firebase_apps.py
+db = firestore_client('project62')
+bucket = storage_bucket('project62')
 
 # Stripe Integration
 import stripe
@@ -78,14 +72,11 @@ DIGITAL_PRODUCTS = {
     "custom": {"name": "Custom Plan with Ian", "price": 29.90, "currency": "sgd"}
 }
 
-# Meal-prep pricing tiers
-MEAL_PREP_PRICING = {
-    "1_week": {"1_meal": 12.00, "2_meals": 12.00},
-    "2_weeks": {"1_meal": 11.50, "2_meals": 11.50},
-    "4_weeks": {"1_meal": 10.80, "2_meals": 10.80},
-    "6_weeks": {"1_meal": 10.00, "2_meals": 10.00}
-}
-DELIVERY_FEE = 20.00  # per week
+# Meal-prep pricing comes from the subscription plans, see pricing_engine.py
+# Unpaid checkout sessions expire after this long (Stripe minimum 30), returning reserved discount uses
+CHECKOUT_SESSION_MINUTES = max(30, int(os.getenv("CHECKOUT_SESSION_MINUTES", "30")))
+# Browsers/CDNs may reuse an anonymous /quote this long
+QUOTE_CACHE_MAX_AGE = int(os.getenv("QUOTE_CACHE_MAX_AGE", "60"))
 
 # ========================
 # Pydantic Models
@@ -110,6 +101,7 @@ class MealPrepCheckoutRequest(BaseModel):
     address: str
     start_date: str
     password: Optional[str] = None  # Optional password for account creation
+    discount_code: Optional[str] = None  # a use is reserved when the checkout session is created
 
 class CustomerLoginRequest(BaseModel):
     email: EmailStr
@@ -201,6 +193,7 @@ class DiscountCodeRequest(BaseModel):
     expires_at: Optional[str] = None  # ISO date string
     max_uses: Optional[int] = None
     active: bool = True
+    shards: Optional[int] = None  # >1 spreads the use counter for codes used at the same moment (flash sales)
 
 class ValidateDiscountRequest(BaseModel):
     code: str
@@ -292,10 +285,10 @@ async def send_verification_email(email: str, name: str, verification_token: str
         
         sg = SendGridAPIClient(SENDGRID_API_KEY)
         response = sg.send(message)
-        print(f"Verification email sent to {email}: {response.status_code}")
+        logger.info(f"Verification email sent to {email}: {response.status_code}")
         return True
     except Exception as e:
-        print(f"Error sending verification email: {e}")
+        logger.error(f"Error sending verification email: {e}")
         return False
 
 def verify_jwt_token(token: str) -> dict:
@@ -339,74 +332,9 @@ async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(
 # Loyalty Tier System Functions
 # ========================
 
-def calculate_loyalty_tier(total_weeks: int):
-    """
-    Calculate loyalty tier based on continuous weeks subscribed
-    Returns: (tier_name, discount_percentage, free_delivery, priority_dish)
-    """
-    if total_weeks >= 37:
-        return "Platinum", 10, True, True
-    elif total_weeks >= 25:
-        return "Gold", 10, False, False
-    elif total_weeks >= 13:
-        return "Silver", 5, False, False
-    else:
-        return "Bronze", 0, False, False
-
-def apply_loyalty_discount(base_price: float, loyalty_discount: int, free_delivery: bool, delivery_fee: float):
-    """
-    Apply loyalty discount to pricing
-    Returns: (discounted_meal_price, final_delivery_fee)
-    """
-    discounted_price = base_price * (1 - loyalty_discount / 100)
-    final_delivery = 0 if free_delivery else delivery_fee
-    return discounted_price, final_delivery
-
-def update_customer_loyalty_tier(customer_id: str, additional_weeks: int):
-    """
-    Update customer's loyalty tier after a renewal
-    Adds weeks to total_weeks_subscribed and recalculates tier
-    """
-    try:
-        customer_ref = db.collection("project62").document("customers").collection("all").document(customer_id)
-        customer_doc = customer_ref.get()
-        
-        if not customer_doc.exists:
-            print(f"⚠️  Customer {customer_id} not found for loyalty update")
-            return
-        
-        customer_data = customer_doc.to_dict()
-        current_weeks = customer_data.get("total_weeks_subscribed", 0)
-        new_total_weeks = current_weeks + additional_weeks
-        
-        # Calculate new tier
-        tier_name, discount, free_delivery, priority_dish = calculate_loyalty_tier(new_total_weeks)
-        
-        # Update customer document
-        customer_ref.update({
-            "total_weeks_subscribed": new_total_weeks,
-            "loyalty_tier": tier_name,
-            "loyalty_discount": discount,
-            "free_delivery": free_delivery,
-            "priority_dish": priority_dish,
-            "updated_at": datetime.utcnow().isoformat()
-        })
-        
-        print(f"✅ Customer {customer_id} loyalty updated:")
-        print(f"   Total weeks: {new_total_weeks}")
-        print(f"   New tier: {tier_name} ({discount}% off)")
-        if free_delivery:
-            print(f"   🎁 Free delivery unlocked!")
-        
-        return {
-            "tier": tier_name,
-            "total_weeks": new_total_weeks,
-            "discount": discount,
-            "free_delivery": free_delivery
-        }
-    except Exception as e:
-        print(f"❌ Error updating loyalty tier: {e}")
-        return None
+# calculate_loyalty_tier lives with the renewal engine, meal-prep prices with the pricing engine
+from renewal_engine import calculate_loyalty_tier, complete_renewal_payment, expire_renewal_payment, run_renewals
+from pricing_engine import CURRENCY, loyalty_from_points, price_quote, price_table
 
 
 async def send_free_guide_email(name: str, email: str):
@@ -464,10 +392,10 @@ async def send_free_guide_email(name: str, email: str):
         sg = SendGridAPIClient(SENDGRID_API_KEY)
         response = sg.send(message)
         
-        print(f"✅ Email sent to {email} - Status: {response.status_code}")
+        logger.info(f"✅ Email sent to {email} - Status: {response.status_code}")
         return True
     except Exception as e:
-        print(f"❌ Email error: {e}")
+        logger.error(f"❌ Email error: {e}")
         return False
 
 # ========================
@@ -503,7 +431,7 @@ async def create_lead(lead: LeadRequest):
             "lead_id": lead_id
         }
     except Exception as e:
-        print(f"Error creating lead: {e}")
+        logger.error(f"Error creating lead: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ========================
@@ -564,7 +492,76 @@ async def create_digital_checkout(checkout_req: DigitalCheckoutRequest):
         return {"checkout_url": session.url, "session_id": session.session_id}
     
     except Exception as e:
-        print(f"Digital checkout error: {e}")
+        logger.error(f"Digital checkout error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# ========================
+# Meal-Prep Quotes
+# ========================
+
+async def meal_prep_quote(meals_per_day: int, weeks: int, email: Optional[str] = None,
+                          code: Optional[str] = None) -> Dict:
+    """
+    Itemized price from the compiled plan table; email adds the customer's loyalty discount
+    and code a discount code's percentage. Raises 400 when no active plan sells this size.
+    """
+    price = await asyncio.to_thread(price_table.price, meals_per_day, weeks)
+    if price is None:
+        logger.error(f"ERROR: No active plan prices {meals_per_day} meals/day for {weeks} weeks")
+        raise HTTPException(status_code=400, detail=f"No pricing available for {meals_per_day} meals/day, {weeks} weeks")
+    
+    loyalty_tier, loyalty_discount_percent = "None", 0
+    if email:
+        try:
+            customer_id = email.replace("@", "_at_").replace(".", "_")
+            customer_doc = await asyncio.to_thread(
+                db.collection("project62").document("customers").collection("all").document(customer_id).get)
+            if customer_doc.exists:
+                loyalty_tier, loyalty_discount_percent = loyalty_from_points(customer_doc.to_dict().get("loyalty_points", 0))
+        except Exception as e:
+            logger.warning(f"Could not check loyalty status: {e}")
+    
+    discount_code, discount_percent = None, 0
+    if code:
+        discount_code = discount_codes.normalize_code(code)
+        discount = await asyncio.to_thread(discount_codes.get_code, discount_code)
+        try:
+            discount_codes.check_code(discount)
+            discount_percent = discount.get("percentage", 0)
+        except discount_codes.RedemptionError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    return price_quote(price, meals_per_day, weeks, loyalty_tier=loyalty_tier,
+                       loyalty_discount_percent=loyalty_discount_percent,
+                       discount_code=discount_code, discount_percent=discount_percent)
+
+@router.get("/quote")
+async def get_meal_prep_quote(response: Response, meals_per_day: int, weeks: int,
+                              email: Optional[str] = None, code: Optional[str] = None):
+    """
+    Itemized meal-prep price for the checkout page - the same quote checkout charges, so pass
+    the code on as MealPrepCheckoutRequest.discount_code. No Firestore reads without
+    email/code once the price table is loaded.
+    """
+    try:
+        quote = await meal_prep_quote(meals_per_day, weeks, email=email, code=code)
+        # A code can run out, so only the plain price is cacheable
+        if not email and not code:
+            response.headers["Cache-Control"] = f"public, max-age={QUOTE_CACHE_MAX_AGE}"
+        return quote
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Quote error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/quote/table")
+async def get_price_table():
+    """Every meals/day × weeks on sale with its price per meal and delivery fee"""
+    try:
+        return {"prices": await asyncio.to_thread(price_table.sizes), "currency": CURRENCY}
+    except Exception as e:
+        logger.error(f"Price table error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ========================
@@ -577,95 +574,29 @@ async def create_meal_prep_checkout(checkout_req: MealPrepCheckoutRequest):
     Create Stripe checkout session for meal-prep subscription
     """
     try:
-        print(f"Meal-prep checkout request: duration={checkout_req.duration}, meals_per_day={checkout_req.meals_per_day}")
-        
-        # Fetch subscription plans dynamically to get pricing
-        plans_ref = db.collection("project62").document("subscriptions_config").collection("all")
-        plans = [doc.to_dict() for doc in plans_ref.stream()]
-        print(f"Found {len(plans)} subscription plans")
-        
-        # Find the correct plan based on meals_per_day
-        target_plan = None
-        for plan in plans:
-            print(f"Plan: {plan.get('plan_name')}, meals_per_day={plan.get('meals_per_day')}")
-            if plan.get("meals_per_day") == checkout_req.meals_per_day:
-                target_plan = plan
-                break
-        
-        if not target_plan:
-            print(f"ERROR: No plan found for meals_per_day={checkout_req.meals_per_day}")
-            raise HTTPException(status_code=400, detail="Invalid meal plan")
-        
-        print(f"Selected plan: {target_plan.get('plan_name')}")
+        logger.info(f"Meal-prep checkout request: duration={checkout_req.duration}, meals_per_day={checkout_req.meals_per_day}")
         
         # Extract weeks from duration string (e.g., "3_weeks" -> 3)
         try:
             weeks = int(checkout_req.duration.split('_')[0])
-            print(f"Extracted weeks: {weeks}")
         except Exception as e:
-            print(f"ERROR: Could not parse duration '{checkout_req.duration}': {e}")
+            logger.error(f"ERROR: Could not parse duration '{checkout_req.duration}': {e}")
             raise HTTPException(status_code=400, detail="Invalid duration format")
         
-        # Find the pricing tier for the selected duration
-        pricing_tiers = target_plan.get("pricing_tiers", [])
-        print(f"Available pricing tiers: {[t.get('weeks') for t in pricing_tiers]}")
-        
-        pricing_tier = None
-        for tier in pricing_tiers:
-            if tier.get("weeks") == weeks:
-                pricing_tier = tier
-                break
-        
-        if not pricing_tier:
-            print(f"ERROR: No pricing tier found for {weeks} weeks in plan {target_plan.get('plan_name')}")
-            raise HTTPException(status_code=400, detail=f"No pricing available for {weeks} weeks")
-        
-        print(f"Selected pricing tier: {pricing_tier}")
-        
-        # Calculate pricing from the tier
-        price_per_meal = pricing_tier.get("price_per_meal", 0)
-        delivery_fee = target_plan.get("delivery_fee", 20.00)
-        
-        # Calculate total meals and costs
-        total_meals = weeks * 6 * checkout_req.meals_per_day  # 6 days per week
-        meal_cost = total_meals * price_per_meal
-        
-        # Check for loyalty discount (only applies to meal costs, not delivery)
-        loyalty_discount_percent = 0
-        loyalty_tier = "None"
-        
-        if checkout_req.email:
-            try:
-                customer_id = checkout_req.email.replace("@", "_at_").replace(".", "_")
-                customer_ref = db.collection("project62").document("customers").collection("all").document(customer_id)
-                customer_doc = customer_ref.get()
-                
-                if customer_doc.exists:
-                    customer_data = customer_doc.to_dict()
-                    loyalty_points = customer_data.get("loyalty_points", 0)
-                    
-                    # Determine tier and discount based on points
-                    if loyalty_points >= 49:
-                        loyalty_tier = "Platinum"
-                        loyalty_discount_percent = 10
-                    elif loyalty_points >= 25:
-                        loyalty_tier = "Gold"
-                        loyalty_discount_percent = 10
-                    elif loyalty_points >= 7:
-                        loyalty_tier = "Silver"
-                        loyalty_discount_percent = 5
-                    
-                    if loyalty_discount_percent > 0:
-                        discount_amount = meal_cost * (loyalty_discount_percent / 100)
-                        meal_cost = meal_cost - discount_amount
-                        print(f"🎯 Loyalty Discount Applied: {loyalty_tier} tier - {loyalty_discount_percent}% off = ${discount_amount:.2f} discount")
-            except Exception as e:
-                print(f"Could not check loyalty status: {e}")
-        
-        delivery_cost = weeks * delivery_fee
-        total_amount = meal_cost + delivery_cost
+        # Price from the compiled plan table, loyalty discount (meals only, not delivery) included
+        quote = await meal_prep_quote(checkout_req.meals_per_day, weeks, email=checkout_req.email,
+                                      code=checkout_req.discount_code)
+        price_per_meal = quote["price_per_meal"]
+        total_meals = quote["total_meals"]
+        meal_cost = quote["meal_cost"]
+        delivery_cost = quote["delivery_cost"]
+        total_amount = quote["total"]
+        loyalty_tier = quote["loyalty_tier"]
+        loyalty_discount_percent = quote["loyalty_discount_percent"]
+        if loyalty_discount_percent > 0:
+            logger.info(f"🎯 Loyalty Discount Applied: {loyalty_tier} tier - {loyalty_discount_percent}% off")
         
-        print(f"Pricing: {total_meals} meals × ${price_per_meal} - {loyalty_discount_percent}% loyalty discount + {weeks} weeks × ${delivery_fee} = ${total_amount}")
+        logger.info(f"Pricing: {total_meals} meals × ${price_per_meal} - {loyalty_discount_percent}% loyalty discount + {weeks} weeks × ${quote['delivery_fee']} = ${total_amount}")
         
         # Initialize Stripe checkout
         webhook_url = f"{checkout_req.origin_url}/api/webhook/stripe"
@@ -674,7 +605,9 @@ async def create_meal_prep_checkout(checkout_req: MealPrepCheckoutRequest):
         # Create success/cancel URLs
         # Note: Stripe replaces {CHECKOUT_SESSION_ID} with actual session ID
         success_url = f"{checkout_req.origin_url}/project62/checkout/success?session_id={{CHECKOUT_SESSION_ID}}"
-        cancel_url = f"{checkout_req.origin_url}/project62/checkout/cancel"
+        # cancel_url cannot carry the session ID - our own reference lets the cancel page expire the session
+        checkout_ref = str(uuid.uuid4())
+        cancel_url = f"{checkout_req.origin_url}/project62/checkout/cancel?ref={checkout_ref}"
         
         # Create line items for Stripe checkout (shows in Stripe UI)
         line_items = []
@@ -689,6 +622,8 @@ async def create_meal_prep_checkout(checkout_req: MealPrepCheckoutRequest):
             meal_description = f"{total_meals} meals × ${price_per_meal} - {loyalty_discount_percent}% discount = ${meal_cost:.2f}"
         else:
             meal_description = f"{total_meals} meals × ${price_per_meal}"
+        if quote["discount_code"]:
+            meal_description += f" ({quote['discount_code']} {quote['discount_percent']:g}% off)"
         
         # Meal item (with discount already applied to price)
         line_items.append({
@@ -716,6 +651,15 @@ async def create_meal_prep_checkout(checkout_req: MealPrepCheckoutRequest):
             "quantity": 1
         })
         
+        # Reserve one use of the discount code before anyone can pay with it; handed back by
+        # the checkout.session.expired webhook or if the session cannot be created
+        redemption = None
+        if quote["discount_code"]:
+            try:
+                redemption = await asyncio.to_thread(discount_codes.redeem, quote["discount_code"])
+            except discount_codes.RedemptionError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        
         # Create checkout session with line items
         try:
             session = stripe.checkout.Session.create(
@@ -724,7 +668,10 @@ async def create_meal_prep_checkout(checkout_req: MealPrepCheckoutRequest):
                 mode='payment',
                 success_url=success_url,
                 cancel_url=cancel_url,
+                expires_at=int(time.time()) + CHECKOUT_SESSION_MINUTES * 60,
                 metadata={
+                    "checkout_ref": checkout_ref,
+                    **discount_metadata(redemption),
                     "product_type": "meal_prep",
                     "duration": checkout_req.duration,
                     "weeks": str(weeks),
@@ -745,10 +692,12 @@ async def create_meal_prep_checkout(checkout_req: MealPrepCheckoutRequest):
                 url=session.url
             )
         except Exception as stripe_error:
-            print(f"Stripe session creation error: {stripe_error}")
+            logger.error(f"Stripe session creation error: {stripe_error}")
+            if redemption:
+                await asyncio.to_thread(discount_codes.release, redemption)
             raise HTTPException(status_code=500, detail=f"Failed to create checkout session: {str(stripe_error)}")
         
-        print(f"Stripe session created: {session_response.session_id}")
+        logger.info(f"Stripe session created: {session_response.session_id}")
         
         # Save transaction to Firestore
         transaction_data = {
@@ -769,6 +718,10 @@ async def create_meal_prep_checkout(checkout_req: MealPrepCheckoutRequest):
             "start_date": checkout_req.start_date,
             "loyalty_tier": loyalty_tier,
             "loyalty_discount_percent": loyalty_discount_percent,
+            "discount_code": quote["discount_code"],
+            "discount_percent": quote["discount_percent"],
+            "discount_redemption": redemption,
+            "checkout_ref": checkout_ref,
             "password": checkout_req.password,  # Store password temporarily for account creation
             "payment_status": "pending",
             "created_at": datetime.utcnow().isoformat()
@@ -780,21 +733,115 @@ async def create_meal_prep_checkout(checkout_req: MealPrepCheckoutRequest):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Meal-prep checkout error: {e}")
+        logger.error(f"Meal-prep checkout error: {e}")
         import traceback
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=str(e))
+
+def discount_metadata(redemption: Optional[Dict]) -> Dict:
+    """Stripe session metadata locating a reserved discount code use (metadata values are strings)"""
+    if not redemption:
+        return {}
+    shard = redemption.get("shard")
+    return {"discount_code": redemption["code"], "discount_shard": "" if shard is None else str(shard)}
+
+def release_reserved_discount(metadata: Dict):
+    """Hand back the discount code use reserved for an unpaid checkout session"""
+    if not metadata.get("discount_code"):
+        return
+    shard = metadata.get("discount_shard")
+    redemption = {"code": metadata["discount_code"], "shard": int(shard) if shard else None}
+    discount_codes.release(redemption)
+    logger.info(f"🎟️ Released reserved use of discount code {redemption['code']}")
+
+@router.post("/checkout/cancel")
+async def cancel_checkout(ref: str):
+    """
+    Expire the open checkout session behind a cancel-page reference, so its reserved discount
+    code use comes back now (via the checkout.session.expired webhook) instead of at expiry
+    """
+    try:
+        transactions = await asyncio.to_thread(lambda: list(
+            db.collection("project62").document("payment_transactions").collection("all")
+            .where("checkout_ref", "==", ref).limit(1).stream()))
+        if not transactions:
+            raise HTTPException(status_code=404, detail="Checkout not found")
+        transaction_data = transactions[0].to_dict()
+        if transaction_data.get("payment_status") != "pending":
+            return {"status": "unchanged", "payment_status": transaction_data.get("payment_status")}
+        try:
+            await asyncio.to_thread(stripe.checkout.Session.expire, transaction_data["session_id"])
+        except stripe.error.InvalidRequestError as e:
+            # Already completed or expired - nothing to cancel
+            logger.info(f"Checkout {transaction_data['session_id']} not expired: {e}")
+        return {"status": "cancelled"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Cancel checkout error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ========================
 # Payment Status Check
 # ========================
 
+def claim_order_processing(transaction_ref) -> bool:
+    """
+    Mark a paid transaction as being fulfilled; False if it is fulfilled or the webhook or a
+    status poll is fulfilling it. A claim older than the Stripe event lease belongs to a worker
+    that crashed mid-fulfilment and is taken over.
+    """
+    @firestore.transactional
+    def claim(transaction):
+        snapshot = transaction_ref.get(transaction=transaction)
+        transaction_data = snapshot.to_dict() or {}
+        if transaction_data.get("order_processed"):
+            return False
+        if transaction_data.get("order_processing"):
+            claimed_at = transaction_data.get("order_processing_at", 0)
+            if time.time() - claimed_at < webhook_events.STRIPE_EVENT_CLAIM_SECONDS:
+                return False
+            logger.warning(f"Taking over stale fulfilment claim of {transaction_ref.id}")
+        transaction.update(transaction_ref, {"order_processing": True, "order_processing_at": time.time()})
+        return True
+    
+    return claim(db.transaction())
+
+async def fulfil_transaction(transaction_ref, transaction_data: dict, session_id: str):
+    """Process the order for a paid transaction exactly once and push the fulfilled status"""
+    processors = {"digital": process_digital_product_order, "meal_prep": process_meal_prep_order}
+    process_order = processors.get(transaction_data.get("product_type"))
+    if process_order is None or not await asyncio.to_thread(claim_order_processing, transaction_ref):
+        return
+    try:
+        await process_order(transaction_data, session_id)
+    except Exception:
+        transaction_ref.update({"order_processing": False})
+        raise
+    transaction_ref.update({"order_processed": True, "order_processing": False})
+    logger.info(f"✅ {transaction_data.get('product_type')} order processed for session {session_id}")
+    checkout_events.publish_transaction(session_id, {**transaction_data, "payment_status": "paid", "order_processed": True})
+
 @router.get("/checkout/status/{session_id}")
 async def check_payment_status(session_id: str, origin_url: str = Header(None, alias="origin")):
     """
-    Poll payment status after Stripe redirect
+    Poll payment status after Stripe redirect - fallback for /checkout/events/{session_id}
+    Answered from the transaction document once the webhook has marked it paid; Stripe is
+    only asked while the payment is still pending there
     """
     try:
+        known = await asyncio.to_thread(checkout_events.current_status, session_id)
+        if known is None:
+            raise HTTPException(status_code=404, detail="Transaction not found")
+        if known["payment_status"] == "paid":
+            if not checkout_events.is_final(known):
+                # Paid but not fulfilled - the fulfilment that claimed it may have failed or crashed
+                transaction_ref = db.collection("project62").document("payment_transactions").collection("all").document(session_id)
+                transaction_data = (await asyncio.to_thread(transaction_ref.get)).to_dict()
+                await fulfil_transaction(transaction_ref, transaction_data, session_id)
+                known = await asyncio.to_thread(checkout_events.current_status, session_id)
+            return known
+        
         # Initialize Stripe checkout
         webhook_url = f"{origin_url}/api/webhook/stripe"
         stripe_checkout = StripeCheckout(api_key=STRIPE_API_KEY, webhook_url=webhook_url)
@@ -804,37 +851,69 @@ async def check_payment_status(session_id: str, origin_url: str = Header(None, a
         
         # Update transaction in Firestore
         transaction_ref = db.collection("project62").document("payment_transactions").collection("all").document(session_id)
-        transaction_doc = transaction_ref.get()
-        
-        if not transaction_doc.exists:
-            raise HTTPException(status_code=404, detail="Transaction not found")
-        
-        transaction_data = transaction_doc.to_dict()
+        transaction_data = transaction_ref.get().to_dict()
         
         # Only update if payment status changed
         if transaction_data.get("payment_status") != status.payment_status:
-            transaction_ref.update({
+            update = {
                 "payment_status": status.payment_status,
                 "stripe_status": status.status,
+                "amount_total": status.amount_total,
                 "updated_at": datetime.utcnow().isoformat()
-            })
+            }
+            transaction_ref.update(update)
+            transaction_data.update(update)
+            checkout_events.publish_transaction(session_id, transaction_data)
             
-            # If payment successful, create order and deliveries
-            if status.payment_status == "paid" and transaction_data.get("product_type") == "meal_prep":
-                await process_meal_prep_order(transaction_data, session_id)
+            # If payment successful and the webhook has not arrived yet, create order and deliveries
+            if status.payment_status == "paid":
+                await fulfil_transaction(transaction_ref, transaction_data, session_id)
         
         return {
             "status": status.status,
             "payment_status": status.payment_status,
+            "fulfilled": bool(transaction_data.get("order_processed")),
             "amount_total": status.amount_total,
             "currency": status.currency,
             "metadata": status.metadata
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Payment status check error: {e}")
+        logger.error(f"Payment status check error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/checkout/events/{session_id}")
+async def stream_payment_status(session_id: str):
+    """
+    Server-sent events for a checkout: a `status` event now and on every change (paid, then
+    fulfilled) until the checkout is final or CHECKOUT_EVENTS_TIMEOUT_SECONDS pass
+    """
+    async def events():
+        async with checkout_events.status_hub.subscribe(session_id) as updates:
+            status = await asyncio.to_thread(checkout_events.current_status, session_id)
+            if status is None:
+                yield checkout_events.sse("error", json.dumps({"detail": "Transaction not found"}))
+                return
+            yield checkout_events.sse("status", json.dumps(status))
+            deadline = asyncio.get_running_loop().time() + checkout_events.CHECKOUT_EVENTS_TIMEOUT_SECONDS
+            while not checkout_events.is_final(status):
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    yield checkout_events.sse("timeout", "{}")
+                    return
+                try:
+                    status = await asyncio.wait_for(
+                        updates.get(), min(remaining, checkout_events.CHECKOUT_EVENTS_KEEPALIVE_SECONDS))
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield checkout_events.sse("status", json.dumps(status))
+    
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 async def process_digital_product_order(transaction_data: dict, session_id: str):
     """Process digital product order after successful payment - send PDF link"""
     try:
@@ -862,7 +941,7 @@ async def process_digital_product_order(transaction_data: dict, session_id: str)
         customer_name = transaction_data.get("customer_name", "Customer")
         
         if not customer_email:
-            print(f"⚠️ No customer email found in transaction data for session {session_id}")
+            logger.warning(f"⚠️ No customer email found in transaction data for session {session_id}")
             return
         
         # Send appropriate email based on product type
@@ -972,9 +1051,9 @@ async def process_digital_product_order(transaction_data: dict, session_id: str)
             
             sg = SendGridAPIClient(SENDGRID_API_KEY)
             response = sg.send(message)
-            print(f"✅ Digital product email sent to {customer_email} - Status: {response.status_code}")
+            logger.info(f"✅ Digital product email sent to {customer_email} - Status: {response.status_code}")
         except Exception as e:
-            print(f"❌ Email sending error: {e}")
+            logger.error(f"❌ Email sending error: {e}")
         
         # Also notify admin
         try:
@@ -1002,14 +1081,14 @@ async def process_digital_product_order(transaction_data: dict, session_id: str)
             
             sg = SendGridAPIClient(SENDGRID_API_KEY)
             sg.send(admin_message)
-            print(f"✅ Admin notification sent for digital product purchase")
+            logger.info(f"✅ Admin notification sent for digital product purchase")
         except Exception as e:
-            print(f"❌ Admin email error: {e}")
+            logger.error(f"❌ Admin email error: {e}")
             
     except Exception as e:
-        print(f"❌ Process digital product error: {e}")
+        logger.error(f"❌ Process digital product error: {e}")
         import traceback
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
 
 async def process_meal_prep_order(transaction_data: dict, session_id: str):
     """Process meal-prep order after successful payment"""
@@ -1049,22 +1128,9 @@ async def process_meal_prep_order(transaction_data: dict, session_id: str):
         start_date = datetime.fromisoformat(transaction_data["start_date"])
         end_date = start_date + timedelta(weeks=transaction_data["weeks"])
         
-        # Find the subscription plan to get price per meal
-        plans_ref = db.collection("project62").document("subscriptions_config").collection("all")
-        plans = [doc.to_dict() for doc in plans_ref.stream()]
-        target_plan = None
-        price_per_meal = 0
-        
-        for plan in plans:
-            if plan.get("meals_per_day") == transaction_data["meals_per_day"]:
-                target_plan = plan
-                # Find the pricing tier for this duration
-                pricing_tiers = plan.get("pricing_tiers", [])
-                for tier in pricing_tiers:
-                    if tier.get("weeks") == transaction_data["weeks"]:
-                        price_per_meal = tier.get("price_per_meal", 0)
-                        break
-                break
+        # Plan and price per meal from the compiled plan table
+        price = price_table.price(transaction_data["meals_per_day"], transaction_data["weeks"]) or {}
+        price_per_meal = price.get("price_per_meal", 0)
         
         # Calculate loyalty points: weeks × meals_per_day
         loyalty_points = transaction_data["weeks"] * transaction_data["meals_per_day"]
@@ -1076,8 +1142,8 @@ async def process_meal_prep_order(transaction_data: dict, session_id: str):
             "customer_id": customer_id,
             "customer_email": customer_email,
             "customer_name": transaction_data["customer_name"],
-            "plan_id": target_plan.get("subscription_id") if target_plan else "meal_prep",
-            "plan_name": target_plan.get("plan_name") if target_plan else f"{transaction_data['meals_per_day']} Meal/Day Plan",
+            "plan_id": price.get("plan_id") or "meal_prep",
+            "plan_name": price.get("plan_name") or f"{transaction_data['meals_per_day']} Meal/Day Plan",
             "meals_per_day": transaction_data["meals_per_day"],
             "duration_weeks": transaction_data["weeks"],
             "commitment_weeks": transaction_data["weeks"],
@@ -1098,7 +1164,7 @@ async def process_meal_prep_order(transaction_data: dict, session_id: str):
         subscription_ref = db.collection("project62").document("subscriptions").collection("active").document(subscription_id)
         subscription_ref.set(subscription_data)
         
-        print(f"✅ Subscription {subscription_id} created for customer {customer_id}")
+        logger.info(f"✅ Subscription {subscription_id} created for customer {customer_id}")
         
         # Create Firebase Auth account if password was provided
         password = transaction_data.get("password")
@@ -1108,8 +1174,8 @@ async def process_meal_prep_order(transaction_data: dict, session_id: str):
             try:
                 # Check if user already exists in Firebase Auth
                 try:
-                    firebase_admin.auth.get_user_by_email(customer_email, app=project62_app)
-                    print(f"ℹ️ Firebase Auth account already exists for {customer_email}")
+                    firebase_admin.auth.get_user_by_email(customer_email, app=get_firebase_app('project62'))
+                    logger.info(f"ℹ️ Firebase Auth account already exists for {customer_email}")
                     account_created = True
                 except firebase_admin.auth.UserNotFoundError:
                     # Create new Firebase Auth user
@@ -1118,14 +1184,14 @@ async def process_meal_prep_order(transaction_data: dict, session_id: str):
                         password=password,
                         display_name=transaction_data["customer_name"],
                         email_verified=True,
-                        app=project62_app
+                        app=get_firebase_app('project62')
                     )
-                    print(f"✅ Firebase Auth account created for {customer_email}")
+                    logger.info(f"✅ Firebase Auth account created for {customer_email}")
                     account_created = True
             except Exception as auth_error:
-                print(f"❌ Firebase Auth creation error: {auth_error}")
+                logger.error(f"❌ Firebase Auth creation error: {auth_error}")
         else:
-            print(f"ℹ️ No password provided, customer will need to set password via email link")
+            logger.info(f"ℹ️ No password provided, customer will need to set password via email link")
         
         # Update customer record with total weeks
         customer_ref = db.collection("project62").document("customers").collection("all").document(customer_id)
@@ -1234,11 +1300,11 @@ async def process_meal_prep_order(transaction_data: dict, session_id: str):
             
             sg = SendGridAPIClient(SENDGRID_API_KEY)
             customer_response = sg.send(customer_message)
-            print(f"✅ Welcome email sent to {customer_email} - Status: {customer_response.status_code}")
+            logger.info(f"✅ Welcome email sent to {customer_email} - Status: {customer_response.status_code}")
         except Exception as e:
-            print(f"❌ Customer welcome email error: {e}")
+            logger.error(f"❌ Customer welcome email error: {e}")
             import traceback
-            traceback.print_exc()
+            logger.error(traceback.format_exc())
         
         # Send notification email to admin
         try:
@@ -1275,9 +1341,9 @@ async def process_meal_prep_order(transaction_data: dict, session_id: str):
             
             sg = SendGridAPIClient(SENDGRID_API_KEY)
             sg.send(admin_message)
-            print(f"✅ Admin notification sent for order {order_id}")
+            logger.info(f"✅ Admin notification sent for order {order_id}")
         except Exception as e:
-            print(f"❌ Admin email error: {e}")
+            logger.error(f"❌ Admin email error: {e}")
         
         # Create delivery schedule linked to subscription_id
         for week_num in range(1, transaction_data["weeks"] + 1):
@@ -1300,11 +1366,11 @@ async def process_meal_prep_order(transaction_data: dict, session_id: str):
             }
             db.collection("project62").document("deliveries").collection("all").document(delivery_id).set(delivery_data)
         
-        print(f"✅ Order {order_id} processed successfully with {transaction_data['weeks']} deliveries")
+        logger.info(f"✅ Order {order_id} processed successfully with {transaction_data['weeks']} deliveries")
     except Exception as e:
-        print(f"❌ Order processing error: {e}")
+        logger.error(f"❌ Order processing error: {e}")
         import traceback
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
 
 # ========================
 # Customer Authentication
@@ -1321,7 +1387,7 @@ async def register_customer(req: CustomerRegisterRequest):
             display_name=req.name,
             email_verified=False,
             disabled=False,  # Keep enabled but block login via our backend logic
-            app=project62_app
+            app=get_firebase_app('project62')
         )
         
         # Create customer record in Firestore with email_verified flag
@@ -1345,7 +1411,7 @@ async def register_customer(req: CustomerRegisterRequest):
         email_sent = await send_verification_email(req.email, req.name, verification_token)
         
         if not email_sent:
-            print(f"Warning: Verification email failed to send to {req.email}")
+            logger.warning(f"Warning: Verification email failed to send to {req.email}")
         
         return {
             "status": "success",
@@ -1360,7 +1426,7 @@ async def register_customer(req: CustomerRegisterRequest):
     except firebase_auth.EmailAlreadyExistsError:
         raise HTTPException(status_code=400, detail="Email already registered")
     except Exception as e:
-        print(f"Registration error: {e}")
+        logger.error(f"Registration error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/auth/login")
@@ -1439,9 +1505,9 @@ async def login_customer(req: CustomerLoginRequest):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Login error: {e}")
+        logger.error(f"Login error: {e}")
         import traceback
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Login failed: {str(e)}")
 
 @router.get("/auth/verify-email")
@@ -1484,14 +1550,14 @@ async def verify_email(token: str):
         
         # Also update Firebase Auth
         try:
-            user = firebase_auth.get_user_by_email(email, app=project62_app)
+            user = firebase_auth.get_user_by_email(email, app=get_firebase_app('project62'))
             firebase_auth.update_user(
                 user.uid,
                 email_verified=True,
-                app=project62_app
+                app=get_firebase_app('project62')
             )
         except Exception as e:
-            print(f"Warning: Could not update Firebase Auth verification status: {e}")
+            logger.warning(f"Warning: Could not update Firebase Auth verification status: {e}")
         
         return {
             "status": "success",
@@ -1505,9 +1571,9 @@ async def verify_email(token: str):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Email verification error: {e}")
+        logger.error(f"Email verification error: {e}")
         import traceback
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail="Email verification failed")
 
 @router.post("/auth/resend-verification")
@@ -1552,7 +1618,7 @@ async def resend_verification_email(req: dict):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Resend verification error: {e}")
+        logger.error(f"Resend verification error: {e}")
         raise HTTPException(status_code=500, detail="Failed to resend verification email")
 
 @router.get("/auth/verify")
@@ -1578,7 +1644,7 @@ async def verify_token(current_user: dict = Depends(get_current_user)):
             }
         }
     except Exception as e:
-        print(f"Token verification error: {e}")
+        logger.error(f"Token verification error: {e}")
         raise HTTPException(status_code=401, detail="Invalid token")
 
 @router.get("/customer/profile")
@@ -1618,7 +1684,7 @@ async def get_customer_profile(current_user: dict = Depends(get_current_user)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Profile fetch error: {e}")
+        logger.error(f"Profile fetch error: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch profile")
 
 @router.post("/auth/magic-link")
@@ -1632,7 +1698,7 @@ async def send_magic_link(req: MagicLinkRequest):
         
         if not customer_doc.exists:
             # Create a new customer record without password
-            firebase_user = firebase_auth.get_user_by_email(req.email, app=project62_app)
+            firebase_user = firebase_auth.get_user_by_email(req.email, app=get_firebase_app('project62'))
             customer_data = {
                 "customer_id": customer_id,
                 "firebase_uid": firebase_user.uid,
@@ -1685,7 +1751,7 @@ async def send_magic_link(req: MagicLinkRequest):
         sg = SendGridAPIClient(SENDGRID_API_KEY)
         response = sg.send(message)
         
-        print(f"✅ Magic link sent to {req.email} - Status: {response.status_code}")
+        logger.info(f"✅ Magic link sent to {req.email} - Status: {response.status_code}")
         
         return {
             "status": "success",
@@ -1698,7 +1764,7 @@ async def send_magic_link(req: MagicLinkRequest):
             "message": "If an account exists, a magic link has been sent to your email."
         }
     except Exception as e:
-        print(f"Magic link error: {e}")
+        logger.error(f"Magic link error: {e}")
         raise HTTPException(status_code=500, detail="Failed to send magic link")
 
 @router.get("/auth/verify-magic-link")
@@ -1719,7 +1785,7 @@ async def verify_magic_link(token: str):
     except HTTPException as e:
         raise e
     except Exception as e:
-        print(f"Magic link verification error: {e}")
+        logger.error(f"Magic link verification error: {e}")
         raise HTTPException(status_code=400, detail="Invalid or expired magic link")
 
 # ========================
@@ -1752,20 +1818,21 @@ async def get_customer_dashboard(current_user: dict = Depends(get_current_user))
         
         # Get upcoming deliveries
         deliveries_ref = db.collection("project62").document("deliveries").collection("all")
-        deliveries_query = deliveries_ref.where("customer_id", "==", customer_id).where("status", "==", "pending")
+        # Sorted by date in Firestore (index registered in firestore_index_registry.py)
+        deliveries_query = deliveries_ref.where("customer_id", "==", customer_id).where("status", "==", "pending")\
+            .order_by("delivery_date")
         deliveries = [doc.to_dict() for doc in deliveries_query.stream()]
         
-        # Sort deliveries by date
-        deliveries.sort(key=lambda x: x.get("delivery_date", ""))
-        
         return {
             "customer": customer_data,
             "orders": orders,
             "deliveries": deliveries,  # All upcoming deliveries
-            "plan_status": orders[0] if orders else None
+            "plan_status": orders[0] if orders else None,
+            # Renewal awaiting payment: payment_url, total_cost, billing_date (see renewal_engine.py)
+            "pending_renewal": (customer_data.get("subscription") or {}).get("pending_renewal")
         }
     except Exception as e:
-        print(f"Dashboard error: {e}")
+        logger.error(f"Dashboard error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/customer/address")
@@ -1783,7 +1850,7 @@ async def update_customer_address(req: UpdateAddressRequest, current_user: dict
         
         return {"status": "success", "message": "Address updated successfully"}
     except Exception as e:
-        print(f"Address update error: {e}")
+        logger.error(f"Address update error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/customer/delivery/change-date")
@@ -1863,9 +1930,9 @@ async def change_delivery_date(req: ChangeDeliveryDateRequest, current_user: dic
     except HTTPException as he:
         raise he
     except Exception as e:
-        print(f"Change delivery date error: {e}")
+        logger.error(f"Change delivery date error: {e}")
         import traceback
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
 # ========================
@@ -1881,7 +1948,7 @@ async def get_all_leads(current_user: dict = Depends(get_current_admin)):
         leads.sort(key=lambda x: x.get("created_at", ""), reverse=True)
         return {"leads": leads}
     except Exception as e:
-        print(f"Admin leads error: {e}")
+        logger.error(f"Admin leads error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/admin/orders")
@@ -1893,7 +1960,7 @@ async def get_all_orders(current_user: dict = Depends(get_current_admin)):
         orders.sort(key=lambda x: x.get("created_at", ""), reverse=True)
         return {"orders": orders}
     except Exception as e:
-        print(f"Admin orders error: {e}")
+        logger.error(f"Admin orders error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/admin/deliveries")
@@ -1921,7 +1988,7 @@ async def get_all_deliveries(current_user: dict = Depends(get_current_admin)):
         deliveries.sort(key=lambda x: x.get("delivery_date", ""))
         return {"deliveries": deliveries}
     except Exception as e:
-        print(f"Admin deliveries error: {e}")
+        logger.error(f"Admin deliveries error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/admin/customers")
@@ -1933,7 +2000,7 @@ async def get_all_customers(current_user: dict = Depends(get_current_admin)):
         customers.sort(key=lambda x: x.get("last_order_date", ""), reverse=True)
         return {"customers": customers}
     except Exception as e:
-        print(f"Admin customers error: {e}")
+        logger.error(f"Admin customers error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/admin/delivery/{delivery_id}/status")
@@ -1944,7 +2011,7 @@ async def update_delivery_status(delivery_id: str, status: str, current_user: di
         delivery_ref.update({"status": status, "updated_at": datetime.utcnow().isoformat()})
         return {"status": "success", "message": f"Delivery status updated to {status}"}
     except Exception as e:
-        print(f"Delivery status update error: {e}")
+        logger.error(f"Delivery status update error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ========================
@@ -1982,7 +2049,7 @@ async def get_all_products(
         
         return {"products": products, "count": len(products)}
     except Exception as e:
-        print(f"Get products error: {e}")
+        logger.error(f"Get products error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/admin/products")
@@ -2021,22 +2088,22 @@ async def create_product(product: ProductCreateRequest, current_user: dict = Dep
             "updated_at": datetime.utcnow().isoformat()
         }
         
-        print(f"📦 Creating product: {product.name}")
-        print(f"   Type: {product.type}")
-        print(f"   Category: {product.category}")
-        print(f"   Price: ${product.price}")
-        print(f"   Featured: {product_data['is_featured']} (Order: {product_data['featured_order']})")
-        print(f"   Visibility: {product_data['visibility']}")
+        logger.info(f"📦 Creating product: {product.name}")
+        logger.debug(f"   Type: {product.type}")
+        logger.debug(f"   Category: {product.category}")
+        logger.debug(f"   Price: ${product.price}")
+        logger.debug(f"   Featured: {product_data['is_featured']} (Order: {product_data['featured_order']})")
+        logger.debug(f"   Visibility: {product_data['visibility']}")
         
         db.collection("project62").document("products").collection("all").document(product_id).set(product_data)
         
-        print(f"✅ Product created successfully: {product_id}")
+        logger.info(f"✅ Product created successfully: {product_id}")
         
         return {"status": "success", "product_id": product_id, "product": product_data}
     except Exception as e:
-        print(f"❌ Create product error: {e}")
+        logger.error(f"❌ Create product error: {e}")
         import traceback
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
 async def reorder_featured_products(new_order: int, exclude_product_id: str = None):
@@ -2061,15 +2128,15 @@ async def reorder_featured_products(new_order: int, exclude_product_id: str = No
             current_order = product_data.get("featured_order", 999)
             if current_order >= new_order:
                 new_position = current_order + 1
-                print(f"   Reordering: {product_data.get('name')} from position {current_order} to {new_position}")
+                logger.debug(f"   Reordering: {product_data.get('name')} from position {current_order} to {new_position}")
                 products_ref.document(product_id).update({
                     "featured_order": new_position,
                     "updated_at": datetime.utcnow().isoformat()
                 })
         
-        print(f"✅ Reordering complete for position {new_order}")
+        logger.info(f"✅ Reordering complete for position {new_order}")
     except Exception as e:
-        print(f"⚠️  Reordering error: {e}")
+        logger.warning(f"⚠️  Reordering error: {e}")
         # Don't fail the main operation if reordering fails
 
 @router.put("/admin/products/{product_id}")
@@ -2126,7 +2193,7 @@ async def update_product(product_id: str, product: ProductUpdateRequest, current
         
         return {"status": "success", "message": "Product updated successfully", "updates": update_data}
     except Exception as e:
-        print(f"Update product error: {e}")
+        logger.error(f"Update product error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/admin/products/{product_id}/upload")
@@ -2160,7 +2227,7 @@ async def upload_product_file(product_id: str, request: Request, current_user: d
         
         return {"status": "success", "file_url": blob.public_url}
     except Exception as e:
-        print(f"Upload file error: {e}")
+        logger.error(f"Upload file error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/admin/products/{product_id}/upload-image")
@@ -2202,9 +2269,9 @@ async def upload_product_image(product_id: str, request: Request, current_user:
         
         return {"status": "success", "image_url": blob.public_url, "total_images": len(images)}
     except Exception as e:
-        print(f"Upload image error: {e}")
+        logger.error(f"Upload image error: {e}")
         import traceback
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/admin/products/{product_id}/image")
@@ -2229,7 +2296,7 @@ async def delete_product_image(product_id: str, image_url: str, current_user: di
         
         return {"status": "success", "message": "Image deleted successfully"}
     except Exception as e:
-        print(f"Delete image error: {e}")
+        logger.error(f"Delete image error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/admin/products/{product_id}")
@@ -2239,7 +2306,7 @@ async def delete_product(product_id: str, current_user: dict = Depends(get_curre
         db.collection("project62").document("products").collection("all").document(product_id).delete()
         return {"status": "success", "message": "Product deleted successfully"}
     except Exception as e:
-        print(f"Delete product error: {e}")
+        logger.error(f"Delete product error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ========================
@@ -2255,7 +2322,7 @@ async def get_all_categories(current_user: dict = Depends(get_current_admin)):
         categories.sort(key=lambda x: x.get("name", ""))
         return {"categories": categories, "count": len(categories)}
     except Exception as e:
-        print(f"Get categories error: {e}")
+        logger.error(f"Get categories error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/admin/categories")
@@ -2281,12 +2348,12 @@ async def create_category(category: CategoryRequest, current_user: dict = Depend
         
         db.collection("project62").document("categories").collection("all").document(category_id).set(category_data)
         
-        print(f"✅ Category created: {category.name} (slug: {slug})")
+        logger.info(f"✅ Category created: {category.name} (slug: {slug})")
         return {"status": "success", "category_id": category_id, "category": category_data}
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Create category error: {e}")
+        logger.error(f"Create category error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/admin/categories/{category_id}")
@@ -2309,7 +2376,7 @@ async def update_category(category_id: str, category: CategoryRequest, current_u
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Update category error: {e}")
+        logger.error(f"Update category error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/admin/categories/{category_id}")
@@ -2319,7 +2386,7 @@ async def delete_category(category_id: str, current_user: dict = Depends(get_cur
         db.collection("project62").document("categories").collection("all").document(category_id).delete()
         return {"status": "success", "message": "Category deleted successfully"}
     except Exception as e:
-        print(f"Delete category error: {e}")
+        logger.error(f"Delete category error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -2336,7 +2403,7 @@ async def get_all_subscriptions(current_user: dict = Depends(get_current_admin))
         subscriptions.sort(key=lambda x: x.get("plan_name", ""))
         return {"subscriptions": subscriptions, "count": len(subscriptions)}
     except Exception as e:
-        print(f"Get subscriptions error: {e}")
+        logger.error(f"Get subscriptions error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/admin/subscriptions")
@@ -2360,21 +2427,22 @@ async def create_subscription(subscription: SubscriptionConfigRequest, current_u
             "updated_at": datetime.utcnow().isoformat()
         }
         
-        print(f"🍱 Creating subscription plan: {subscription.plan_name}")
-        print(f"   Meals per day: {subscription.meals_per_day}")
-        print(f"   Pricing tiers: {subscription.pricing_tiers}")
-        print(f"   Delivery fee: ${subscription.delivery_fee}")
-        print(f"   Auto-renew: {subscription_data['auto_renew_enabled']}")
+        logger.info(f"🍱 Creating subscription plan: {subscription.plan_name}")
+        logger.debug(f"   Meals per day: {subscription.meals_per_day}")
+        logger.debug(f"   Pricing tiers: {subscription.pricing_tiers}")
+        logger.debug(f"   Delivery fee: ${subscription.delivery_fee}")
+        logger.debug(f"   Auto-renew: {subscription_data['auto_renew_enabled']}")
         
         db.collection("project62").document("subscriptions_config").collection("all").document(subscription_id).set(subscription_data)
+        price_table.invalidate()
         
-        print(f"✅ Subscription plan created successfully: {subscription_id}")
+        logger.info(f"✅ Subscription plan created successfully: {subscription_id}")
         
         return {"status": "success", "subscription_id": subscription_id, "subscription": subscription_data}
     except Exception as e:
-        print(f"❌ Create subscription error: {e}")
+        logger.error(f"❌ Create subscription error: {e}")
         import traceback
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/admin/subscriptions/{subscription_id}")
@@ -2408,10 +2476,11 @@ async def update_subscription(subscription_id: str, subscription: SubscriptionCo
             update_data["auto_renew_enabled"] = subscription.auto_renew_enabled
         
         subscription_ref.update(update_data)
+        price_table.invalidate()
         
         return {"status": "success", "message": "Subscription plan updated successfully", "updates": update_data}
     except Exception as e:
-        print(f"Update subscription error: {e}")
+        logger.error(f"Update subscription error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/admin/subscriptions/{subscription_id}")
@@ -2419,9 +2488,10 @@ async def delete_subscription(subscription_id: str, current_user: dict = Depends
     """Delete a subscription plan"""
     try:
         db.collection("project62").document("subscriptions_config").collection("all").document(subscription_id).delete()
+        price_table.invalidate()
         return {"status": "success", "message": "Subscription plan deleted successfully"}
     except Exception as e:
-        print(f"Delete subscription error: {e}")
+        logger.error(f"Delete subscription error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/admin/subscriptions/{subscription_id}/upload-image")
@@ -2454,9 +2524,9 @@ async def upload_subscription_image(subscription_id: str, request: Request, curr
         
         return {"status": "success", "image_url": blob.public_url}
     except Exception as e:
-        print(f"Upload subscription image error: {e}")
+        logger.error(f"Upload subscription image error: {e}")
         import traceback
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
 # ========================
@@ -2479,13 +2549,13 @@ async def get_active_subscriptions():
         # Sort by plan_name
         active_subscriptions.sort(key=lambda x: x.get("plan_name", ""))
         
-        print(f"🍱 Active subscriptions found: {len(active_subscriptions)}")
+        logger.debug(f"🍱 Active subscriptions found: {len(active_subscriptions)}")
         for s in active_subscriptions:
-            print(f"   - {s.get('plan_name')}: ${s.get('price_per_meal')}/meal, weeks: {s.get('weeks_available')}")
+            logger.debug(f"   - {s.get('plan_name')}: ${s.get('price_per_meal')}/meal, weeks: {s.get('weeks_available')}")
         
         return {"subscriptions": active_subscriptions, "count": len(active_subscriptions)}
     except Exception as e:
-        print(f"Get active subscriptions error: {e}")
+        logger.error(f"Get active subscriptions error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -2500,7 +2570,7 @@ async def get_customer_subscription(current_user: dict = Depends(get_current_use
         customer_id = current_user["email"].replace("@", "_at_").replace(".", "_")
         customer_email = current_user["email"]
         
-        print(f"🔍 Fetching subscriptions for customer_email: {customer_email}")
+        logger.debug(f"🔍 Fetching subscriptions for customer_email: {customer_email}")
         
         # Get ALL subscriptions for this customer
         subscriptions_ref = db.collection("project62").document("subscriptions").collection("active")
@@ -2519,9 +2589,9 @@ async def get_customer_subscription(current_user: dict = Depends(get_current_use
             total_weeks += weeks
             total_points += points
             subscriptions.append(sub_data)
-            print(f"  ✅ Found subscription: {sub_data.get('subscription_id')} - {weeks} weeks × {meals_per_day} meals/day = {points} points")
+            logger.debug(f"  ✅ Found subscription: {sub_data.get('subscription_id')} - {weeks} weeks × {meals_per_day} meals/day = {points} points")
         
-        print(f"  📊 Total subscriptions: {len(subscriptions)}, Total weeks: {total_weeks}, Total points: {total_points}")
+        logger.debug(f"  📊 Total subscriptions: {len(subscriptions)}, Total weeks: {total_weeks}, Total points: {total_points}")
         
         # Sort by start_date
         subscriptions.sort(key=lambda x: x.get("start_date", ""))
@@ -2555,13 +2625,13 @@ async def get_customer_subscription(current_user: dict = Depends(get_current_use
         
         # Get orders for this customer
         orders_ref = db.collection("project62").document("orders").collection("all")
-        orders_query = orders_ref.where("customer_email", "==", customer_email).stream()
+        orders_query = orders_ref.where("customer_email", "==", customer_email)\
+            .order_by("created_at", direction=firestore.Query.DESCENDING).stream()
         orders = [order.to_dict() for order in orders_query]
-        orders.sort(key=lambda x: x.get("created_at", ""), reverse=True)
         
-        print(f"  📦 Found {len(orders)} orders for customer")
+        logger.debug(f"  📦 Found {len(orders)} orders for customer")
         for order in orders:
-            print(f"     - Order {order.get('order_id')}: Type={order.get('product_type')}, Amount=${order.get('total_amount')}, Status={order.get('payment_status')}")
+            logger.debug(f"     - Order {order.get('order_id')}: Type={order.get('product_type')}, Amount=${order.get('total_amount')}, Status={order.get('payment_status')}")
         
         response = {
             "status": "active" if len(subscriptions) > 0 else "no_subscription",
@@ -2582,9 +2652,9 @@ async def get_customer_subscription(current_user: dict = Depends(get_current_use
         
         return response
     except Exception as e:
-        print(f"Get customer subscription error: {e}")
+        logger.error(f"Get customer subscription error: {e}")
         import traceback
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/customer/subscription/upgrade")
@@ -2610,19 +2680,8 @@ async def upgrade_subscription(
         if not subscription:
             raise HTTPException(status_code=400, detail="No active subscription")
         
-        # Get the subscription plan to find new pricing
-        plan_id = subscription.get("plan_id")
-        plan_ref = db.collection("project62").document("subscriptions_config").collection("all").document(plan_id)
-        plan_doc = plan_ref.get()
-        
-        if not plan_doc.exists:
-            raise HTTPException(status_code=404, detail="Subscription plan not found")
-        
-        plan_data = plan_doc.to_dict()
-        pricing_tiers = plan_data.get("pricing_tiers", [])
-        
-        # Find the price for new commitment
-        new_tier = next((t for t in pricing_tiers if t["weeks"] == new_commitment_weeks), None)
+        # New pricing from the plan's tier in the compiled plan table
+        new_tier = await asyncio.to_thread(price_table.plan_price, subscription.get("plan_id"), new_commitment_weeks)
         if not new_tier:
             raise HTTPException(status_code=400, detail=f"No pricing tier for {new_commitment_weeks} weeks")
         
@@ -2647,7 +2706,7 @@ async def upgrade_subscription(
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Upgrade subscription error: {e}")
+        logger.error(f"Upgrade subscription error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/customer/subscription/cancel")
@@ -2684,7 +2743,7 @@ async def cancel_subscription(current_user: dict = Depends(get_current_user)):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Cancel subscription error: {e}")
+        logger.error(f"Cancel subscription error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ========================
@@ -2692,145 +2751,19 @@ async def cancel_subscription(current_user: dict = Depends(get_current_user)):
 # ========================
 
 @router.post("/admin/process-renewals")
-async def process_renewals(current_user: dict = Depends(get_current_admin)):
+async def process_renewals(force: bool = False, current_user: dict = Depends(get_current_admin)):
     """
     Process upcoming subscription renewals
-    Detects renewals due in 1-2 days, creates Stripe session, updates loyalty
+    Bills subscriptions due in 1-2 days through Stripe checkout; the cycle and loyalty advance
+    when the webhook reports the payment (see renewal_engine.py).
+    The daily scheduler runs the same engine; force re-runs a day that already completed.
     """
     try:
-        from datetime import timedelta
-        
-        # Get all customers with active subscriptions
-        customers_ref = db.collection("project62").document("customers").collection("all")
-        customers = [doc for doc in customers_ref.stream()]
-        
-        today = datetime.utcnow().date()
-        renewals_processed = []
-        errors = []
-        
-        for customer_doc in customers:
-            customer_data = customer_doc.to_dict()
-            subscription = customer_data.get("subscription", {})
-            
-            # Skip if no subscription or auto-renew is off
-            if not subscription or not subscription.get("auto_renew"):
-                continue
-            
-            # Parse next billing date
-            next_billing_str = subscription.get("next_billing_date")
-            if not next_billing_str:
-                continue
-            
-            try:
-                next_billing_date = datetime.fromisoformat(next_billing_str).date()
-            except:
-                continue
-            
-            # Check if renewal is due in 1-2 days
-            days_until = (next_billing_date - today).days
-            if days_until < 1 or days_until > 2:
-                continue
-            
-            # Process renewal
-            try:
-                customer_id = customer_doc.id
-                customer_email = customer_data.get("email")
-                
-                # Get subscription config for pricing
-                plan_id = subscription.get("plan_id")
-                commitment_weeks = subscription.get("commitment_weeks", 4)
-                price_per_meal = subscription.get("price_per_meal", 12.00)
-                meals_per_day = subscription.get("meals_per_day", 1)
-                delivery_fee = subscription.get("delivery_fee", 20.00)
-                
-                # Check for pending upgrade
-                if subscription.get("pending_upgrade"):
-                    upgrade = subscription["pending_upgrade"]
-                    commitment_weeks = upgrade["commitment_weeks"]
-                    price_per_meal = upgrade["price_per_meal"]
-                
-                # Apply loyalty discount
-                loyalty_discount = customer_data.get("loyalty_discount", 0)
-                free_delivery = customer_data.get("free_delivery", False)
-                
-                discounted_price, final_delivery = apply_loyalty_discount(
-                    price_per_meal, 
-                    loyalty_discount, 
-                    free_delivery, 
-                    delivery_fee
-                )
-                
-                # Calculate total
-                total_meals = commitment_weeks * meals_per_day * 6  # 6 days per week
-                meal_cost = total_meals * discounted_price
-                total_cost = meal_cost + (commitment_weeks * final_delivery)
-                
-                # TODO: Create Stripe checkout session here
-                # stripe_session = stripe.checkout.Session.create(...)
-                
-                # Update customer loyalty tier
-                loyalty_update = update_customer_loyalty_tier(customer_id, commitment_weeks)
-                
-                # Update subscription for next cycle
-                new_next_billing = next_billing_date + timedelta(weeks=commitment_weeks)
-                subscription["next_billing_date"] = new_next_billing.isoformat()
-                subscription["last_renewal_date"] = today.isoformat()
-                if subscription.get("pending_upgrade"):
-                    del subscription["pending_upgrade"]
-                
-                # Save updated subscription
-                customer_doc.reference.update({
-                    "subscription": subscription,
-                    "updated_at": datetime.utcnow().isoformat()
-                })
-                
-                renewals_processed.append({
-                    "customer_id": customer_id,
-                    "email": customer_email,
-                    "commitment_weeks": commitment_weeks,
-                    "total_cost": total_cost,
-                    "loyalty_tier": loyalty_update.get("tier") if loyalty_update else None,
-                    "new_billing_date": new_next_billing.isoformat()
-                })
-                
-                print(f"✅ Processed renewal for {customer_email}")
-                print(f"   Weeks: {commitment_weeks}, Total: ${total_cost}")
-                if loyalty_update:
-                    print(f"   New tier: {loyalty_update['tier']}")
-                
-            except Exception as e:
-                errors.append({
-                    "customer_id": customer_doc.id,
-                    "error": str(e)
-                })
-                print(f"❌ Error processing renewal for {customer_doc.id}: {e}")
-        
-        # Log to Firestore
-        log_id = str(uuid.uuid4())
-        log_data = {
-            "log_id": log_id,
-            "executed_at": datetime.utcnow().isoformat(),
-            "executed_by": current_user["email"],
-            "total_processed": len(renewals_processed),
-            "total_errors": len(errors),
-            "details": renewals_processed,
-            "errors": errors
-        }
-        db.collection("project62").document("ops").collection("renewal_logs").document(log_id).set(log_data)
-        
-        print(f"📝 Renewal log saved: {log_id}")
-        
-        return {
-            "status": "success",
-            "renewals_processed": len(renewals_processed),
-            "details": renewals_processed,
-            "errors": errors,
-            "log_id": log_id
-        }
+        return await run_renewals(executed_by=current_user["email"], force=force)
     except Exception as e:
-        print(f"Process renewals error: {e}")
+        logger.error(f"Process renewals error: {e}")
         import traceback
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
 # ========================
@@ -2897,7 +2830,7 @@ async def get_public_products(
             "limit": limit
         }
     except Exception as e:
-        print(f"Get public products error: {e}")
+        logger.error(f"Get public products error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/products/featured")
@@ -2907,7 +2840,7 @@ async def get_featured_products():
         products_ref = db.collection("project62").document("products").collection("all")
         products = [doc.to_dict() for doc in products_ref.stream()]
         
-        print(f"🔍 Total products in DB: {len(products)}")
+        logger.debug(f"🔍 Total products in DB: {len(products)}")
         
         # Filter: only active, featured, public products
         featured_products = [
@@ -2917,16 +2850,16 @@ async def get_featured_products():
             and p.get("visibility") == "public"
         ]
         
-        print(f"🔍 Featured products found: {len(featured_products)}")
+        logger.debug(f"🔍 Featured products found: {len(featured_products)}")
         for p in featured_products:
-            print(f"   - {p.get('name')}: featured={p.get('is_featured')}, order={p.get('featured_order')}, visibility={p.get('visibility')}, active={p.get('active')}")
+            logger.debug(f"   - {p.get('name')}: featured={p.get('is_featured')}, order={p.get('featured_order')}, visibility={p.get('visibility')}, active={p.get('active')}")
         
         # Sort by featured_order
         featured_products.sort(key=lambda x: x.get("featured_order", 999))
         
         return {"products": featured_products, "count": len(featured_products)}
     except Exception as e:
-        print(f"Get featured products error: {e}")
+        logger.error(f"Get featured products error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -2940,17 +2873,20 @@ async def get_all_discount_codes(current_user: dict = Depends(get_current_admin)
     try:
         codes_ref = db.collection("project62").document("discount_codes").collection("all")
         codes = [doc.to_dict() for doc in codes_ref.stream()]
+        for code in codes:
+            if code.get("shards"):
+                code["current_uses"] = discount_codes.total_uses(code["code_id"], code)
         codes.sort(key=lambda x: x.get("created_at", ""), reverse=True)
         return {"discount_codes": codes}
     except Exception as e:
-        print(f"Get discount codes error: {e}")
+        logger.error(f"Get discount codes error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/admin/discount-codes")
 async def create_discount_code(discount: DiscountCodeRequest, current_user: dict = Depends(get_current_admin)):
     """Create a new discount code"""
     try:
-        code_id = discount.code.upper().replace(" ", "")
+        code_id = discount_codes.normalize_code(discount.code)
         
         # Check if code already exists
         existing_code = db.collection("project62").document("discount_codes").collection("all").document(code_id).get()
@@ -2970,13 +2906,13 @@ async def create_discount_code(discount: DiscountCodeRequest, current_user: dict
             "updated_at": datetime.utcnow().isoformat()
         }
         
-        db.collection("project62").document("discount_codes").collection("all").document(code_id).set(code_data)
+        code_data = discount_codes.create_code(code_data, discount.shards or 1)
         
         return {"status": "success", "code_id": code_id, "discount_code": code_data}
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Create discount code error: {e}")
+        logger.error(f"Create discount code error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/admin/discount-codes/{code_id}")
@@ -2988,20 +2924,21 @@ async def update_discount_code(code_id: str, active: bool, current_user: dict =
             "active": active,
             "updated_at": datetime.utcnow().isoformat()
         })
+        discount_codes.code_cache.invalidate(code_id.upper())
         
         return {"status": "success", "message": "Discount code updated successfully"}
     except Exception as e:
-        print(f"Update discount code error: {e}")
+        logger.error(f"Update discount code error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/admin/discount-codes/{code_id}")
 async def delete_discount_code(code_id: str, current_user: dict = Depends(get_current_admin)):
     """Delete a discount code"""
     try:
-        db.collection("project62").document("discount_codes").collection("all").document(code_id.upper()).delete()
+        discount_codes.delete_code(code_id.upper())
         return {"status": "success", "message": "Discount code deleted successfully"}
     except Exception as e:
-        print(f"Delete discount code error: {e}")
+        logger.error(f"Delete discount code error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ========================
@@ -3010,32 +2947,18 @@ async def delete_discount_code(code_id: str, current_user: dict = Depends(get_cu
 
 @router.post("/validate-discount")
 async def validate_discount_code(request: ValidateDiscountRequest):
-    """Validate a discount code and return discount amount"""
+    """
+    Validate a discount code and return discount amount.
+    Reads cached code metadata (discount_codes.py) - usage limits are enforced on redemption.
+    """
     try:
-        code_id = request.code.upper().replace(" ", "")
-        
-        code_ref = db.collection("project62").document("discount_codes").collection("all").document(code_id)
-        code_doc = code_ref.get()
-        
-        if not code_doc.exists:
-            raise HTTPException(status_code=404, detail="Invalid discount code")
-        
-        code_data = code_doc.to_dict()
-        
-        # Check if active
-        if not code_data.get("active", False):
-            raise HTTPException(status_code=400, detail="This discount code is no longer active")
-        
-        # Check expiry
-        if code_data.get("expires_at"):
-            expiry_date = datetime.fromisoformat(code_data["expires_at"])
-            if datetime.utcnow() > expiry_date:
-                raise HTTPException(status_code=400, detail="This discount code has expired")
+        code_id = discount_codes.normalize_code(request.code)
         
-        # Check usage limit
-        if code_data.get("max_uses"):
-            if code_data.get("current_uses", 0) >= code_data["max_uses"]:
-                raise HTTPException(status_code=400, detail="This discount code has reached its usage limit")
+        code_data = discount_codes.get_code(code_id)
+        try:
+            discount_codes.check_code(code_data)
+        except discount_codes.RedemptionError as e:
+            raise HTTPException(status_code=404 if e.reason == "not_found" else 400, detail=str(e))
         
         # Calculate discount
         percentage = code_data.get("percentage", 0)
@@ -3054,38 +2977,113 @@ async def validate_discount_code(request: ValidateDiscountRequest):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Validate discount code error: {e}")
+        logger.error(f"Validate discount code error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/apply-discount/{code_id}")
-async def apply_discount_code(code_id: str):
-    """Increment usage count for a discount code (called after successful payment)"""
-    try:
-        code_ref = db.collection("project62").document("discount_codes").collection("all").document(code_id.upper())
-        code_doc = code_ref.get()
-        
-        if code_doc.exists:
-            current_uses = code_doc.to_dict().get("current_uses", 0)
-            code_ref.update({
-                "current_uses": current_uses + 1,
-                "last_used_at": datetime.utcnow().isoformat()
-            })
-        
-        return {"status": "success"}
-    except Exception as e:
-        print(f"Apply discount code error: {e}")
-        return {"status": "error", "message": str(e)}
-
 # ========================
 # Stripe Webhook Handler (Verified with Signature)
 # ========================
 
+async def process_stripe_event(event_id: str, event_type: str, data: Dict):
+    """Apply one claimed Stripe event"""
+    if event_type == "checkout.session.completed":
+        # Payment completed - process order
+        session_id = data.get("id")
+        payment_status = data.get("payment_status")
+        
+        logger.info(f"💳 Checkout completed: {session_id} - Status: {payment_status}")
+        
+        metadata = data.get("metadata") or {}
+        if metadata.get("product_type") == "renewal":
+            # Subscription renewal billed by renewal_engine - applied only now that it is paid
+            if payment_status == "paid":
+                renewal = await asyncio.to_thread(complete_renewal_payment, metadata.get("renewal_id"), session_id)
+                if renewal:
+                    logger.info(f"✅ Renewal {renewal['renewal_id']} paid: next billing {renewal['new_billing_date']}")
+            return
+        
+        # Get transaction from Firestore
+        transaction_ref = db.collection("project62").document("payment_transactions").collection("all").document(session_id)
+        transaction_doc = transaction_ref.get()
+        
+        if transaction_doc.exists:
+            transaction_data = transaction_doc.to_dict()
+            
+            # Update transaction status
+            update = {
+                "payment_status": "paid",
+                "stripe_status": "complete",
+                "amount_total": data.get("amount_total"),
+                "webhook_received": True,
+                "webhook_event_id": event_id,
+                "updated_at": datetime.utcnow().isoformat()
+            }
+            transaction_ref.update(update)
+            transaction_data.update(update)
+            checkout_events.publish_transaction(session_id, transaction_data)
+            
+            # Process digital product / meal-prep order
+            await fulfil_transaction(transaction_ref, transaction_data, session_id)
+    
+    elif event_type == "checkout.session.expired":
+        # Abandoned or cancelled checkout - return its reserved discount code use
+        session_id = data.get("id")
+        metadata = data.get("metadata") or {}
+        logger.info(f"⌛ Checkout expired: {session_id}")
+        if metadata.get("product_type") == "renewal":
+            # The next renewal run requests payment again with a new session
+            if await asyncio.to_thread(expire_renewal_payment, metadata.get("renewal_id"), session_id):
+                logger.info(f"Renewal {metadata.get('renewal_id')} payment link expired - will be re-sent")
+            return
+        await asyncio.to_thread(release_reserved_discount, metadata)
+        transaction_ref = db.collection("project62").document("payment_transactions").collection("all").document(session_id)
+        transaction_doc = transaction_ref.get()
+        if transaction_doc.exists:
+            update = {"payment_status": "expired", "stripe_status": "expired", "updated_at": datetime.utcnow().isoformat()}
+            transaction_ref.update(update)
+            checkout_events.publish_transaction(session_id, {**transaction_doc.to_dict(), **update})
+    
+    elif event_type == "invoice.payment_succeeded":
+        # Subscription payment succeeded - extend subscription
+        invoice_id = data.get("id")
+        customer_id = data.get("customer")
+        subscription_id = data.get("subscription")
+        
+        logger.info(f"💰 Invoice paid: {invoice_id} for subscription {subscription_id}")
+        
+        # TODO: Implement subscription extension and loyalty tier update
+        # This would involve:
+        # 1. Find customer by Stripe customer_id
+        # 2. Update their subscription next_billing_date
+        # 3. Increment total_weeks_subscribed
+        # 4. Update loyalty tier
+    
+    elif event_type == "invoice.payment_failed":
+        # Subscription payment failed - alert customer
+        invoice_id = data.get("id")
+        customer_email = data.get("customer_email")
+        
+        logger.warning(f"⚠️  Payment failed: {invoice_id} for {customer_email}")
+        
+        # TODO: Send notification email to customer about payment failure
+    
+    elif event_type == "customer.subscription.deleted":
+        # Subscription cancelled
+        subscription_id = data.get("id")
+        customer_id = data.get("customer")
+        
+        logger.info(f"🚫 Subscription cancelled: {subscription_id}")
+        
+        # TODO: Update customer subscription status to cancelled
+
 @router.post("/webhook/stripe")
 async def handle_stripe_webhook(request: Request):
     """
     Handle Stripe webhooks with signature verification and idempotency
     Events: checkout.session.completed, invoice.payment_succeeded, 
             invoice.payment_failed, customer.subscription.deleted
+    Each event is claimed with one create() (webhook_events.py); retries of events this
+    process already handled are answered from memory without touching Firestore.
     """
     try:
         payload = await request.body()
@@ -3097,32 +3095,26 @@ async def handle_stripe_webhook(request: Request):
                 payload, sig_header, STRIPE_WEBHOOK_SECRET
             )
         except ValueError:
-            print("❌ Invalid webhook payload")
+            logger.error("❌ Invalid webhook payload")
             raise HTTPException(status_code=400, detail="Invalid payload")
         except stripe.error.SignatureVerificationError:
-            print("❌ Invalid webhook signature")
+            logger.error("❌ Invalid webhook signature")
             raise HTTPException(status_code=400, detail="Invalid signature")
         
         event_type = event["type"]
         event_id = event["id"]
         data = event["data"]["object"]
         
-        print(f"🎯 Webhook received: {event_type} (ID: {event_id})")
+        logger.info(f"🎯 Webhook received: {event_type} (ID: {event_id})")
         
         # ✅ Ensure idempotency using event_id
-        event_ref = db.collection("project62").document("ops").collection("stripe_events").document(event_id)
-        event_doc = event_ref.get()
-        
-        if event_doc.exists:
-            print(f"⚠️  Duplicate event {event_id} - already processed")
+        if webhook_events.seen(event_id):
+            record_webhook_event("stripe", "duplicate_cached")
             return {"status": "duplicate", "event_id": event_id}
         
-        # Log the event
-        event_ref.set({
-            "event_id": event_id,
+        claim = await asyncio.to_thread(webhook_events.claim_event, event_id, {
             "type": event_type,
             "created_at": datetime.utcnow().isoformat(),
-            "processed": False,
             "data_summary": {
                 "id": data.get("id"),
                 "amount_total": data.get("amount_total"),
@@ -3130,91 +3122,34 @@ async def handle_stripe_webhook(request: Request):
                 "payment_status": data.get("payment_status")
             }
         })
+        if claim == webhook_events.DUPLICATE:
+            logger.warning(f"⚠️  Duplicate event {event_id} - already processed")
+            record_webhook_event("stripe", "duplicate")
+            return {"status": "duplicate", "event_id": event_id}
+        if claim == webhook_events.IN_PROGRESS:
+            # Another worker holds the claim - a non-2xx makes Stripe retry later
+            record_webhook_event("stripe", "in_progress")
+            raise HTTPException(status_code=409, detail=f"Event {event_id} is being processed")
         
-        # Handle different event types
-        if event_type == "checkout.session.completed":
-            # Payment completed - process order
-            session_id = data.get("id")
-            payment_status = data.get("payment_status")
-            
-            print(f"💳 Checkout completed: {session_id} - Status: {payment_status}")
-            
-            # Get transaction from Firestore
-            transaction_ref = db.collection("project62").document("payment_transactions").collection("all").document(session_id)
-            transaction_doc = transaction_ref.get()
-            
-            if transaction_doc.exists:
-                transaction_data = transaction_doc.to_dict()
-                
-                # Update transaction status
-                transaction_ref.update({
-                    "payment_status": "paid",
-                    "webhook_received": True,
-                    "webhook_event_id": event_id,
-                    "updated_at": datetime.utcnow().isoformat()
-                })
-                
-                # Process digital product order
-                if transaction_data.get("product_type") == "digital" and not transaction_data.get("order_processed"):
-                    await process_digital_product_order(transaction_data, session_id)
-                    transaction_ref.update({"order_processed": True})
-                    print(f"✅ Digital product order processed for session {session_id}")
-                
-                # Process meal-prep order
-                if transaction_data.get("product_type") == "meal_prep" and not transaction_data.get("order_processed"):
-                    await process_meal_prep_order(transaction_data, session_id)
-                    transaction_ref.update({"order_processed": True})
-                    print(f"✅ Meal-prep order processed for session {session_id}")
-        
-        elif event_type == "invoice.payment_succeeded":
-            # Subscription payment succeeded - extend subscription
-            invoice_id = data.get("id")
-            customer_id = data.get("customer")
-            subscription_id = data.get("subscription")
-            
-            print(f"💰 Invoice paid: {invoice_id} for subscription {subscription_id}")
-            
-            # TODO: Implement subscription extension and loyalty tier update
-            # This would involve:
-            # 1. Find customer by Stripe customer_id
-            # 2. Update their subscription next_billing_date
-            # 3. Increment total_weeks_subscribed
-            # 4. Update loyalty tier
-        
-        elif event_type == "invoice.payment_failed":
-            # Subscription payment failed - alert customer
-            invoice_id = data.get("id")
-            customer_email = data.get("customer_email")
-            
-            print(f"⚠️  Payment failed: {invoice_id} for {customer_email}")
-            
-            # TODO: Send notification email to customer about payment failure
-        
-        elif event_type == "customer.subscription.deleted":
-            # Subscription cancelled
-            subscription_id = data.get("id")
-            customer_id = data.get("customer")
-            
-            print(f"🚫 Subscription cancelled: {subscription_id}")
-            
-            # TODO: Update customer subscription status to cancelled
+        try:
+            await process_stripe_event(event_id, event_type, data)
+        except Exception:
+            record_webhook_event("stripe", "failed")
+            await asyncio.to_thread(webhook_events.release_event, event_id)
+            raise
         
         # Mark event as processed
-        event_ref.update({"processed": True, "processed_at": datetime.utcnow().isoformat()})
+        await asyncio.to_thread(webhook_events.complete_event, event_id)
+        record_webhook_event("stripe", "processed")
         
         return {"status": "success", "event_id": event_id, "type": event_type}
     
     except HTTPException:
         raise
     except Exception as e:
-        print(f"❌ Webhook error: {e}")
+        logger.error(f"❌ Webhook error: {e}")
         import traceback
-        traceback.print_exc()
-        raise HTTPException(status_code=400, detail=str(e))
-        
-        return {"status": "success"}
-    except Exception as e:
-        print(f"Webhook error: {e}")
+        logger.error(traceback.format_exc())
         raise HTTPException(status_code=400, detail=str(e))
 
 # ========================
@@ -3239,7 +3174,7 @@ async def get_public_subscriptions():
         
         return {"subscriptions": active_subscriptions, "count": len(active_subscriptions)}
     except Exception as e:
-        print(f"Get public subscriptions error: {e}")
+        logger.error(f"Get public subscriptions error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/validate-coupon")
@@ -3285,7 +3220,7 @@ async def validate_coupon(req: ValidateCouponRequest):
             }
         }
     except Exception as e:
-        print(f"Coupon validation error: {e}")
+        logger.error(f"Coupon validation error: {e}")
         return {"valid": False, "message": "Error validating coupon"}
 
 @router.get("/subscriptions/{plan_id}")
@@ -3307,7 +3242,7 @@ async def get_subscription_by_id(plan_id: str):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Get subscription error: {e}")
+        logger.error(f"Get subscription error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ========================
@@ -3341,7 +3276,7 @@ async def get_product_by_slug(product_slug: str):
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Get product error: {e}")
+        logger.error(f"Get product error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # ========================
@@ -3357,7 +3292,7 @@ async def get_all_dishes(current_user: dict = Depends(get_current_admin)):
         dishes.sort(key=lambda x: x.get("created_at", ""), reverse=True)
         return {"dishes": dishes, "count": len(dishes)}
     except Exception as e:
-        print(f"Get dishes error: {e}")
+        logger.error(f"Get dishes error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/admin/dishes")
@@ -3380,11 +3315,11 @@ async def create_dish(dish: DishCreateRequest, current_user: dict = Depends(get_
         
         db.collection("project62").document("dishes").collection("all").document(dish_id).set(dish_data)
         
-        print(f"✅ Dish created: {dish.dish_name} (ID: {dish_id})")
+        logger.info(f"✅ Dish created: {dish.dish_name} (ID: {dish_id})")
         
         return {"status": "success", "dish_id": dish_id, "dish": dish_data}
     except Exception as e:
-        print(f"Create dish error: {e}")
+        logger.error(f"Create dish error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/admin/dishes/{dish_id}")
@@ -3417,7 +3352,7 @@ async def update_dish(dish_id: str, dish: DishUpdateRequest, current_user: dict
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Update dish error: {e}")
+        logger.error(f"Update dish error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.delete("/admin/dishes/{dish_id}")
@@ -3427,7 +3362,7 @@ async def delete_dish(dish_id: str, current_user: dict = Depends(get_current_adm
         db.collection("project62").document("dishes").collection("all").document(dish_id).delete()
         return {"status": "success", "message": "Dish deleted successfully"}
     except Exception as e:
-        print(f"Delete dish error: {e}")
+        logger.error(f"Delete dish error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/admin/dishes/{dish_id}/upload-image")
@@ -3460,9 +3395,9 @@ async def upload_dish_image(dish_id: str, request: Request, current_user: dict =
         
         return {"status": "success", "image_url": blob.public_url}
     except Exception as e:
-        print(f"Upload dish image error: {e}")
+        logger.error(f"Upload dish image error: {e}")
         import traceback
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=str(e))
 
 # ========================
@@ -3479,7 +3414,7 @@ async def get_renewal_logs(current_user: dict = Depends(get_current_admin), limi
         logs = logs[:limit]
         return {"logs": logs, "count": len(logs)}
     except Exception as e:
-        print(f"Get renewal logs error: {e}")
+        logger.error(f"Get renewal logs error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # Serve PayNow QR Code Image
@@ -8,13 +8,11 @@ from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 import random
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from functools import lru_cache
 import io
 
+from question_store import QuestionIndex, get_question_index
+
 # Models for Question Bank
 class Question(BaseModel):
     question_id: Optional[str] = None
@@ -39,6 +37,7 @@ class AssessmentRequest(BaseModel):
     duration_minutes: int  # 45 or 90
     generation_mode: str  # "auto" or "manual"
     manual_question_ids: Optional[List[str]] = []  # If manual selection
+    target_marks: Optional[float] = None  # Aim for this total when auto-generating
 
 class GeneratedAssessment(BaseModel):
     assessment_id: str
@@ -183,69 +182,70 @@ DUMMY_QUESTION_BANK = {
     }
 }
 
+DUMMY_QUESTION_INDEX = QuestionIndex.from_nested_bank(DUMMY_QUESTION_BANK)
+
 def get_dummy_questions(level: str, subject: str, topics: List[str] = None, subtopics: List[str] = None) -> List[Dict]:
-    """Get dummy questions for testing"""
-    bank_key = f"{level}_{subject.replace('.', '').replace(' ', '')}"
-    
-    if bank_key not in DUMMY_QUESTION_BANK:
-        return []
-    
-    questions = []
-    question_bank = DUMMY_QUESTION_BANK[bank_key]
-    
-    for topic, subtopic_dict in question_bank.items():
-        if topics and topic not in topics:
-            continue
-            
-        for subtopic, question_list in subtopic_dict.items():
-            if subtopics and subtopic not in subtopics:
-                continue
-                
-            questions.extend(question_list)
-    
-    return questions
+    """Get questions from the active question index (Firestore-backed once loaded, dummy bank until then)"""
+    index = get_question_index() or DUMMY_QUESTION_INDEX
+    return index.questions(level, subject, topics=topics, subtopics=subtopics)
+
+@lru_cache(maxsize=1)
+def get_assessment_pdf_styles() -> Dict[str, Any]:
+    """Build the assessment ParagraphStyles once per process"""
+    # reportlab is imported on first render, not when the API imports this module
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.enums import TA_CENTER
+
+    styles = getSampleStyleSheet()
+    return {
+        'title': ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=16,
+            textColor='black',
+            spaceAfter=12,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold'
+        ),
+        'header': ParagraphStyle(
+            'CustomHeader',
+            parent=styles['Normal'],
+            fontSize=10,
+            textColor='black',
+            spaceAfter=6,
+            alignment=TA_CENTER
+        ),
+        'question': ParagraphStyle(
+            'Question',
+            parent=styles['Normal'],
+            fontSize=11,
+            spaceAfter=12,
+            leftIndent=0
+        ),
+        'solution': ParagraphStyle(
+            'Solution',
+            parent=styles['Normal'],
+            fontSize=10,
+            textColor='blue',
+            spaceAfter=12,
+            leftIndent=20
+        )
+    }
 
 def generate_assessment_pdf(assessment: Dict, include_solutions: bool = False) -> bytes:
     """Generate PDF for assessment"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
     
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        textColor='black',
-        spaceAfter=12,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-    
-    header_style = ParagraphStyle(
-        'CustomHeader',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor='black',
-        spaceAfter=6,
-        alignment=TA_CENTER
-    )
-    
-    question_style = ParagraphStyle(
-        'Question',
-        parent=styles['Normal'],
-        fontSize=11,
-        spaceAfter=12,
-        leftIndent=0
-    )
-    
-    solution_style = ParagraphStyle(
-        'Solution',
-        parent=styles['Normal'],
-        fontSize=10,
-        textColor='blue',
-        spaceAfter=12,
-        leftIndent=20
-    )
+    pdf_styles = get_assessment_pdf_styles()
+    title_style = pdf_styles['title']
+    header_style = pdf_styles['header']
+    question_style = pdf_styles['question']
+    solution_style = pdf_styles['solution']
     
     story = []
     
@@ -288,5 +288,7 @@ __all__ = [
     'GeneratedAssessment',
     'get_dummy_questions',
     'generate_assessment_pdf',
-    'DUMMY_QUESTION_BANK'
+    'get_assessment_pdf_styles',
+    'DUMMY_QUESTION_BANK',
+    'DUMMY_QUESTION_INDEX'
 ]
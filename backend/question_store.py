@@ -0,0 +1,296 @@
+"""
+Question Store for Math Results Analysis System
+In-memory question index (loaded from Firestore at startup) and the assessment builder
+"""
+
+import logging
+import random
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUESTION_BANK_COLLECTION = 'question_bank'
+
+# Knapsack resolution: half a minute / half a mark
+TIME_UNITS_PER_MINUTE = 2
+MARK_UNITS_PER_MARK = 2
+
+# Below this fill ratio the builder may reuse questions the student has seen
+MIN_FILL_RATIO = 0.9
+
+IndexKey = Tuple[str, str, str, str]
+
+
+def bank_key(level: str, subject: str) -> str:
+    """'S4', 'A.Math' -> 'S4_AMath' (same convention as DUMMY_QUESTION_BANK)"""
+    return f"{level}_{subject.replace('.', '').replace(' ', '')}"
+
+
+class QuestionIndex:
+    """Questions indexed by (level/subject, topic, subtopic, difficulty) and by question_id"""
+
+    def __init__(self):
+        self._by_key: Dict[IndexKey, List[Dict]] = defaultdict(list)
+        # bank key -> topic -> subtopic -> questions of every difficulty, preserving insertion order
+        self._tree: Dict[str, Dict[str, Dict[str, List[Dict]]]] = {}
+        self._by_id: Dict[str, Dict] = {}
+        # Filter combinations repeat a lot (same class, same weak topics) - memoize them
+        self._query_cache: Dict[Tuple, List[Dict]] = {}
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def add(self, level: str, subject: str, question: Dict):
+        key = bank_key(level, subject)
+        topic = question['topic']
+        subtopic = question['subtopic']
+        difficulty = question.get('difficulty_level', '')
+        self._by_key[(key, topic, subtopic, difficulty)].append(question)
+        self._tree.setdefault(key, {}).setdefault(topic, {}).setdefault(subtopic, []).append(question)
+        if question.get('question_id'):
+            self._by_id[question['question_id']] = question
+        self._query_cache.clear()
+
+    @classmethod
+    def from_nested_bank(cls, bank: Dict) -> "QuestionIndex":
+        """Build from the nested {level_subject: {topic: {subtopic: [questions]}}} layout"""
+        index = cls()
+        for key, topics in bank.items():
+            level, subject = key.split('_', 1)
+            for subtopic_dict in topics.values():
+                for question_list in subtopic_dict.values():
+                    for question in question_list:
+                        index.add(level, subject, question)
+        return index
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> "QuestionIndex":
+        """Build from flat records carrying 'level' and 'subject' fields (Firestore layout)"""
+        index = cls()
+        for record in records:
+            question = {k: v for k, v in record.items() if k not in ('level', 'subject')}
+            index.add(record['level'], record['subject'], question)
+        return index
+
+    def get(self, question_id: str) -> Optional[Dict]:
+        return self._by_id.get(question_id)
+
+    def topics(self, level: str, subject: str) -> List[str]:
+        return list(self._tree.get(bank_key(level, subject), {}).keys())
+
+    def subtopics(self, level: str, subject: str, topics: Optional[List[str]] = None) -> List[str]:
+        tree = self._tree.get(bank_key(level, subject), {})
+        subtopics = set()
+        for topic, subtopic_dict in tree.items():
+            if topics and topic not in topics:
+                continue
+            subtopics.update(subtopic_dict.keys())
+        return sorted(subtopics)
+
+    def questions(self, level: str, subject: str, topics: Optional[List[str]] = None,
+                  subtopics: Optional[List[str]] = None, difficulties: Optional[List[str]] = None) -> List[Dict]:
+        """All questions matching the filters, walking only the matching index keys"""
+        key = bank_key(level, subject)
+        cache_key = (key, tuple(topics or ()), tuple(subtopics or ()), tuple(difficulties or ()))
+        cached = self._query_cache.get(cache_key)
+        if cached is None:
+            cached = []
+            for topic, subtopic_dict in self._tree.get(key, {}).items():
+                if topics and topic not in topics:
+                    continue
+                for subtopic, question_list in subtopic_dict.items():
+                    if subtopics and subtopic not in subtopics:
+                        continue
+                    if difficulties:
+                        for difficulty in difficulties:
+                            cached.extend(self._by_key.get((key, topic, subtopic, difficulty), []))
+                    else:
+                        cached.extend(question_list)
+            self._query_cache[cache_key] = cached
+        # Callers may reorder or filter the result
+        return list(cached)
+
+    def records(self) -> List[Dict]:
+        """Flat records for persisting to Firestore"""
+        records = []
+        for (key, _, _, _), question_list in self._by_key.items():
+            level, subject = key.split('_', 1)
+            for question in question_list:
+                records.append({**question, 'level': level, 'subject': subject})
+        return records
+
+# ========================
+# PERSISTENCE
+# ========================
+
+_active_index: Optional[QuestionIndex] = None
+
+
+def get_question_index() -> Optional[QuestionIndex]:
+    return _active_index
+
+
+def set_question_index(index: QuestionIndex):
+    global _active_index
+    _active_index = index
+
+
+def load_question_index_from_firestore(db) -> QuestionIndex:
+    """Read the whole question bank collection into a fresh index"""
+    records = [doc.to_dict() for doc in db.collection(QUESTION_BANK_COLLECTION).stream()]
+    index = QuestionIndex.from_records(records)
+    logger.info(f"Loaded {len(index)} questions from Firestore question bank")
+    return index
+
+
+def save_question_index_to_firestore(db, index: QuestionIndex, batch_size: int = 400) -> int:
+    """Upsert every question (doc id = question_id) using batched writes"""
+    collection = db.collection(QUESTION_BANK_COLLECTION)
+    records = [r for r in index.records() if r.get('question_id')]
+    for start in range(0, len(records), batch_size):
+        batch = db.batch()
+        for record in records[start:start + batch_size]:
+            batch.set(collection.document(record['question_id']), record)
+        batch.commit()
+    return len(records)
+
+# ========================
+# ASSESSMENT BUILDER
+# ========================
+
+def _time_units(question: Dict) -> int:
+    return max(1, round(question['estimated_time_minutes'] * TIME_UNITS_PER_MINUTE))
+
+
+def _mark_units(question: Dict) -> int:
+    return max(0, round(question['marks'] * MARK_UNITS_PER_MARK))
+
+
+def _solve_knapsack(questions: List[Dict], capacity: int, target_marks: Optional[int]) -> List[Dict]:
+    """
+    0/1 knapsack over (time, marks) units.
+
+    Picks the subset whose total time fits in `capacity` and minimises
+    unused time plus relative distance from `target_marks` (if given).
+    Questions with identical (time, marks) are interchangeable, so they are
+    grouped and each group contributes at most capacity // time copies.
+    """
+    if capacity <= 0 or not questions:
+        return []
+
+    use_marks = bool(target_marks)
+    groups: Dict[Tuple[int, int], List[Dict]] = defaultdict(list)
+    for q in questions:
+        t = _time_units(q)
+        if t <= capacity:
+            groups[(t, _mark_units(q) if use_marks else 0)].append(q)
+
+    items = []
+    for (t, m), group in groups.items():
+        items.extend([(t, m)] * min(len(group), capacity // t))
+
+    # Marks beyond twice the target can never beat an empty paper
+    mark_cap = 2 * target_marks if use_marks else 0
+    mark_mask = (1 << (mark_cap + 1)) - 1
+
+    # reach[c] is a bitset of achievable mark totals using exactly c time units
+    reach = [0] * (capacity + 1)
+    reach[0] = 1
+    parent: Dict[Tuple[int, int], Tuple[int, int, int]] = {}
+
+    for item_idx, (t, m) in enumerate(items):
+        for c in range(capacity, t - 1, -1):
+            if not reach[c - t]:
+                continue
+            new_bits = ((reach[c - t] << m) & mark_mask) & ~reach[c]
+            if not new_bits:
+                continue
+            reach[c] |= new_bits
+            while new_bits:
+                low = new_bits & -new_bits
+                marks = low.bit_length() - 1
+                parent[(c, marks)] = (item_idx, c - t, marks - m)
+                new_bits ^= low
+
+    best_state, best_cost = (0, 0), None
+    for c in range(capacity + 1):
+        bits = reach[c]
+        marks = 0
+        while bits:
+            if bits & 1:
+                cost = (capacity - c) / capacity
+                if use_marks:
+                    cost += abs(marks - target_marks) / target_marks
+                if best_cost is None or cost < best_cost:
+                    best_state, best_cost = (c, marks), cost
+            bits >>= 1
+            marks += 1
+
+    # Walk parent pointers back to count how many copies of each group were taken
+    taken: Dict[Tuple[int, int], int] = defaultdict(int)
+    state = best_state
+    while state != (0, 0):
+        item_idx, prev_c, prev_m = parent[state]
+        taken[items[item_idx]] += 1
+        state = (prev_c, prev_m)
+
+    chosen = []
+    for group_key, count in taken.items():
+        chosen.extend(groups[group_key][:count])
+    return chosen
+
+
+def _build(pool: List[Dict], capacity: int, target_marks: Optional[int]) -> List[Dict]:
+    by_topic: Dict[str, List[Dict]] = defaultdict(list)
+    for q in pool:
+        by_topic[q['topic']].append(q)
+
+    # Each topic first gets an equal share of time (and marks) so no topic crowds out the rest
+    topic_count = len(by_topic)
+    selected = []
+    for topic_questions in by_topic.values():
+        topic_target = target_marks // topic_count if target_marks else None
+        selected.extend(_solve_knapsack(topic_questions, capacity // topic_count, topic_target))
+
+    # Then fill whatever time is left from the remaining questions of any topic
+    used_ids = {id(q) for q in selected}
+    remaining = [q for q in pool if id(q) not in used_ids]
+    time_left = capacity - sum(_time_units(q) for q in selected)
+    marks_left = None
+    if target_marks:
+        marks_left = target_marks - sum(_mark_units(q) for q in selected)
+    if time_left > 0 and (marks_left is None or marks_left > 0):
+        selected.extend(_solve_knapsack(remaining, time_left, marks_left))
+
+    return selected
+
+
+def build_assessment(questions: List[Dict], duration_minutes: float, target_marks: Optional[float] = None,
+                     seen_question_ids: Optional[Set[str]] = None, rng: Optional[random.Random] = None) -> List[Dict]:
+    """
+    Select questions that fill duration_minutes as closely as possible,
+    land near target_marks, spread time evenly across topics and prefer
+    questions the student has not seen before.
+    """
+    rng = rng or random.Random()
+    capacity = int(duration_minutes * TIME_UNITS_PER_MINUTE)
+    target = round(target_marks * MARK_UNITS_PER_MARK) if target_marks else None
+
+    pool = list(questions)
+    # Shuffle so equally good papers differ between runs
+    rng.shuffle(pool)
+
+    seen = seen_question_ids or set()
+    unseen = [q for q in pool if q.get('question_id') not in seen]
+    selected = _build(unseen, capacity, target)
+
+    if len(unseen) < len(pool):
+        filled = sum(_time_units(q) for q in selected)
+        if filled < capacity * MIN_FILL_RATIO:
+            # Not enough fresh material - allow repeats rather than hand out a short paper
+            selected = _build(pool, capacity, target)
+
+    topic_order = {topic: idx for idx, topic in enumerate(dict.fromkeys(q['topic'] for q in questions))}
+    selected.sort(key=lambda q: (topic_order.get(q['topic'], 0), q['subtopic']))
+    return selected
@@ -0,0 +1,483 @@
+"""
+Project 62 Renewal Engine
+Renews auto-renew subscriptions whose next_billing_date falls RENEWAL_WINDOW_DAYS out, and
+chases cycles still unpaid up to RENEWAL_GRACE_DAYS after their billing date.
+
+Only due customers are read: one indexed query on (subscription.auto_renew,
+subscription.next_billing_date), paged in (next_billing_date, document ID) order. Each page
+is renewed concurrently, at most RENEWAL_CONCURRENCY customers at a time.
+
+A renewal is only applied once it is paid:
+  - the run creates ops/renewals/{customer_id}_{billing_date} in state pending_payment, in one
+    transaction with the price and the loyalty tier the cycle will bring, then a Stripe
+    checkout session for it (idempotency key = renewal ID + payment attempt). The link is
+    emailed to the customer and kept on the ledger and on subscription.pending_renewal, which
+    the customer dashboard shows.
+  - the checkout.session.completed webhook calls complete_renewal_payment, which advances
+    next_billing_date and the loyalty tier and marks the ledger paid - once.
+  - checkout.session.expired calls expire_renewal_payment, which clears the session from the
+    ledger. Unpaid cycles never advance, so the customer stays due and the next run requests
+    payment again with a fresh session (sessions last RENEWAL_PAYMENT_HOURS, under a day, so
+    each daily run re-sends the link) until the grace period ends.
+
+Runs are idempotent and resumable:
+  - a cycle that already has a ledger entry, or whose next_billing_date has moved, is never
+    billed twice.
+  - ops/renewal_runs/{date} holds the run's cursor (last finished page), counters and a
+    lease, so a crashed run resumes where it stopped and overlapping runs do not start.
+Every run writes its metrics to ops/renewal_logs.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from firebase_apps import firestore_client
+from pricing_engine import CURRENCY, DEFAULT_DELIVERY_FEE, price_quote
+
+logger = logging.getLogger(__name__)
+
+db = firestore_client('project62')
+
+# Renew subscriptions billing this many days from today (inclusive)
+RENEWAL_WINDOW_DAYS = tuple(int(d) for d in os.getenv("RENEWAL_WINDOW_DAYS", "1,2").split(','))
+# Unpaid cycles are asked for payment again until this many days after their billing date
+RENEWAL_GRACE_DAYS = int(os.getenv("RENEWAL_GRACE_DAYS", "7"))
+# Lifetime of a renewal checkout session (Stripe allows 0.5-24)
+RENEWAL_PAYMENT_HOURS = min(24.0, max(0.5, float(os.getenv("RENEWAL_PAYMENT_HOURS", "23"))))
+RENEWAL_CONCURRENCY = int(os.getenv("RENEWAL_CONCURRENCY", "8"))
+RENEWAL_PAGE_SIZE = int(os.getenv("RENEWAL_PAGE_SIZE", "100"))
+# A running run whose heartbeat is older than this is treated as crashed and taken over
+RENEWAL_LEASE_SECONDS = int(os.getenv("RENEWAL_LEASE_SECONDS", "600"))
+# Errors kept on the run document and log
+MAX_LOGGED_ERRORS = 100
+FRONTEND_URL = os.getenv("FRONTEND_URL", "https://meal-management-1.preview.emergentagent.com")
+SENDGRID_FROM_EMAIL = os.getenv("SENDGRID_FROM_EMAIL", "project62@cccdigital.sg")
+SENDGRID_REPLY_TO_EMAIL = os.getenv("SENDGRID_REPLY_TO_EMAIL", "project62sg@gmail.com")
+
+# ========================
+# LOYALTY
+# ========================
+
+def calculate_loyalty_tier(total_weeks: int):
+    """
+    Calculate loyalty tier based on continuous weeks subscribed
+    Returns: (tier_name, discount_percentage, free_delivery, priority_dish)
+    """
+    if total_weeks >= 37:
+        return "Platinum", 10, True, True
+    elif total_weeks >= 25:
+        return "Gold", 10, False, False
+    elif total_weeks >= 13:
+        return "Silver", 5, False, False
+    else:
+        return "Bronze", 0, False, False
+
+# ========================
+# COLLECTIONS
+# ========================
+
+def customers_ref():
+    return db.collection("project62").document("customers").collection("all")
+
+
+def ops_ref():
+    return db.collection("project62").document("ops")
+
+
+def due_customers_query(window_start: date, window_end: date, cursor: Optional[Dict] = None):
+    """auto_renew customers billing in [window_start, window_end], after the cursor"""
+    query = (customers_ref()
+             .where("subscription.auto_renew", "==", True)
+             .where("subscription.next_billing_date", ">=", window_start.isoformat())
+             # ISO strings sort by date; '~' keeps datetimes on the last day in range
+             .where("subscription.next_billing_date", "<=", window_end.isoformat() + "~")
+             .order_by("subscription.next_billing_date")
+             .order_by("__name__"))
+    if cursor:
+        query = query.start_after([cursor["next_billing_date"], customers_ref().document(cursor["customer_id"])])
+    return query.limit(RENEWAL_PAGE_SIZE)
+
+# ========================
+# ONE RENEWAL
+# ========================
+
+def renewal_terms(customer: Dict, subscription: Dict, total_weeks: int) -> Dict:
+    """Price of the next cycle and the loyalty tier after it"""
+    commitment_weeks = subscription.get("commitment_weeks", 4)
+    price = {"price_per_meal": subscription.get("price_per_meal", 12.00),
+             "delivery_fee": subscription.get("delivery_fee", DEFAULT_DELIVERY_FEE)}
+
+    # Pending upgrade takes effect from this cycle
+    if subscription.get("pending_upgrade"):
+        upgrade = subscription["pending_upgrade"]
+        commitment_weeks = upgrade["commitment_weeks"]
+        price["price_per_meal"] = upgrade["price_per_meal"]
+
+    quote = price_quote(
+        price, subscription.get("meals_per_day", 1), commitment_weeks,
+        loyalty_tier=customer.get("loyalty_tier", "None"),
+        loyalty_discount_percent=customer.get("loyalty_discount", 0),
+        free_delivery=customer.get("free_delivery", False)
+    )
+    total_cost = quote["total"]
+
+    tier_name, discount, free_delivery, priority_dish = calculate_loyalty_tier(total_weeks + commitment_weeks)
+    return {
+        "commitment_weeks": commitment_weeks,
+        "total_cost": total_cost,
+        "loyalty": {
+            "total_weeks_subscribed": total_weeks + commitment_weeks,
+            "loyalty_tier": tier_name,
+            "loyalty_discount": discount,
+            "free_delivery": free_delivery,
+            "priority_dish": priority_dish
+        }
+    }
+
+
+def renew_customer(customer_id: str, billing_date: str, today: date, run_id: str) -> Optional[Dict]:
+    """
+    Open the renewal of one billing cycle in a transaction: a pending_payment ledger entry with
+    the price and the terms applied once it is paid. Returns the entry - also an existing one
+    with no live checkout session (never created, or expired) - or None when the cycle needs
+    nothing (payment link out, already paid, next_billing_date moved, auto-renew turned off).
+    """
+    from firebase_admin import firestore
+
+    customer_ref = customers_ref().document(customer_id)
+    renewal_id = f"{customer_id}_{billing_date[:10]}"
+    renewal_ref = ops_ref().collection("renewals").document(renewal_id)
+
+    @firestore.transactional
+    def renew(transaction):
+        snapshot = customer_ref.get(transaction=transaction)
+        ledger = renewal_ref.get(transaction=transaction)
+        customer = snapshot.to_dict() if snapshot.exists else {}
+        subscription = customer.get("subscription") or {}
+        if not subscription.get("auto_renew") or subscription.get("next_billing_date") != billing_date:
+            return None
+        if ledger.exists:
+            renewal = ledger.to_dict()
+            needs_payment = renewal.get("status") == "pending_payment" and not renewal.get("payment_session_id")
+            return renewal if needs_payment else None
+
+        terms = renewal_terms(customer, subscription, customer.get("total_weeks_subscribed", 0))
+        next_billing = datetime.fromisoformat(billing_date).date() + timedelta(weeks=terms["commitment_weeks"])
+        renewal = {
+            "renewal_id": renewal_id,
+            "run_id": run_id,
+            "status": "pending_payment",
+            "customer_id": customer_id,
+            "email": customer.get("email"),
+            "billing_date": billing_date,
+            "commitment_weeks": terms["commitment_weeks"],
+            "total_cost": terms["total_cost"],
+            "loyalty": terms["loyalty"],
+            "loyalty_tier": terms["loyalty"]["loyalty_tier"],
+            "new_billing_date": next_billing.isoformat(),
+            "payment_attempts": 0,
+            "created_at": datetime.utcnow().isoformat()
+        }
+        transaction.create(renewal_ref, renewal)
+        return renewal
+
+    return renew(db.transaction())
+
+
+def request_renewal_payment(renewal: Dict) -> Dict:
+    """
+    Create the Stripe checkout session for a pending renewal, record its link on the ledger
+    entry and the customer's subscription.pending_renewal, and email it to the customer. The
+    idempotency key makes a retry after a crash reuse the session of the same attempt.
+    """
+    import stripe
+
+    stripe.api_key = stripe.api_key or os.getenv("STRIPE_API_KEY")
+    attempt = renewal.get("payment_attempts", 0)
+    session = stripe.checkout.Session.create(
+        mode='payment',
+        line_items=[{
+            "price_data": {
+                "currency": CURRENCY,
+                "product_data": {
+                    "name": f"Meal-prep renewal - {renewal['commitment_weeks']} weeks",
+                    "description": f"Billing from {renewal['billing_date'][:10]}"
+                },
+                "unit_amount": int(round(renewal["total_cost"] * 100))
+            },
+            "quantity": 1
+        }],
+        customer_email=renewal.get("email"),
+        success_url=f"{FRONTEND_URL}/project62/dashboard?renewal=paid",
+        cancel_url=f"{FRONTEND_URL}/project62/dashboard",
+        expires_at=int(time.time() + RENEWAL_PAYMENT_HOURS * 3600),
+        metadata={"product_type": "renewal", "renewal_id": renewal["renewal_id"]},
+        idempotency_key=f"renewal-{renewal['renewal_id']}-{attempt}"
+    )
+    payment = {"payment_session_id": session.id, "payment_url": session.url,
+               "payment_requested_at": datetime.utcnow().isoformat()}
+    ops_ref().collection("renewals").document(renewal["renewal_id"]).update(payment)
+    customers_ref().document(renewal["customer_id"]).update({
+        "subscription.pending_renewal": {
+            "renewal_id": renewal["renewal_id"],
+            "payment_url": session.url,
+            "total_cost": renewal["total_cost"],
+            "billing_date": renewal["billing_date"],
+            "new_billing_date": renewal["new_billing_date"],
+            "commitment_weeks": renewal["commitment_weeks"]
+        }
+    })
+    renewal = {**renewal, **payment}
+    if send_renewal_payment_email(renewal):
+        ops_ref().collection("renewals").document(renewal["renewal_id"]).update(
+            {"payment_email_sent_at": datetime.utcnow().isoformat()})
+    return renewal
+
+
+def send_renewal_payment_email(renewal: Dict) -> bool:
+    """Email the renewal's payment link; the dashboard shows it too, so a failure is only logged"""
+    if not renewal.get("email"):
+        return False
+    try:
+        from sendgrid import SendGridAPIClient
+        from sendgrid.helpers.mail import Mail
+
+        billing_date = renewal["billing_date"][:10]
+        message = Mail(
+            from_email=SENDGRID_FROM_EMAIL,
+            to_emails=renewal["email"],
+            subject=f"Renew your Project 62 meal plan from {billing_date}",
+            html_content=f"""
+            <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+                <h2 style="color: #00b894;">Your next {renewal['commitment_weeks']} weeks are ready</h2>
+                <p>Your meal-prep subscription renews on <strong>{billing_date}</strong>.</p>
+                <p>Amount due: <strong>${renewal['total_cost']:.2f} {CURRENCY.upper()}</strong></p>
+                <div style="text-align: center; margin: 30px 0;">
+                    <a href="{renewal['payment_url']}"
+                       style="background-color: #00b894; color: white; padding: 14px 28px;
+                              text-decoration: none; border-radius: 5px; display: inline-block;">
+                        Pay &amp; Renew
+                    </a>
+                </div>
+                <p style="color: #999; font-size: 12px;">
+                    This link expires in {RENEWAL_PAYMENT_HOURS:g} hours - you can also pay from your dashboard:
+                    <a href="{FRONTEND_URL}/project62/dashboard">{FRONTEND_URL}/project62/dashboard</a>.
+                    Turn off auto-renew there if you do not want to continue.
+                </p>
+                <hr style="border: none; border-top: 1px solid #eee; margin: 30px 0;">
+                <p style="color: #666; font-size: 12px;">
+                    Best regards,<br>
+                    Project 62 Team<br>
+                    <a href="mailto:{SENDGRID_REPLY_TO_EMAIL}">{SENDGRID_REPLY_TO_EMAIL}</a>
+                </p>
+            </div>
+            """
+        )
+        message.reply_to = SENDGRID_REPLY_TO_EMAIL
+        response = SendGridAPIClient(os.getenv("SENDGRID_API_KEY")).send(message)
+        logger.info(f"Renewal payment email for {renewal['renewal_id']} sent: {response.status_code}")
+        return True
+    except Exception as e:
+        logger.error(f"Error sending renewal payment email for {renewal['renewal_id']}: {e}")
+        return False
+
+
+def expire_renewal_payment(renewal_id: str, session_id: str) -> bool:
+    """
+    Forget a renewal's expired checkout session so the next run requests payment again.
+    False when the session is not the renewal's current one (already paid or replaced).
+    """
+    from firebase_admin import firestore
+
+    renewal_ref = ops_ref().collection("renewals").document(renewal_id)
+
+    @firestore.transactional
+    def expire(transaction):
+        ledger = renewal_ref.get(transaction=transaction)
+        renewal = ledger.to_dict() if ledger.exists else None
+        if (not renewal or renewal.get("status") != "pending_payment"
+                or renewal.get("payment_session_id") != session_id):
+            return False
+        customer_ref = customers_ref().document(renewal["customer_id"])
+        snapshot = customer_ref.get(transaction=transaction)
+        pending = ((snapshot.to_dict() or {}).get("subscription") or {}).get("pending_renewal") if snapshot.exists else None
+        transaction.update(renewal_ref, {
+            "payment_session_id": None,
+            "payment_url": None,
+            "payment_attempts": renewal.get("payment_attempts", 0) + 1,
+            "payment_expired_at": datetime.utcnow().isoformat()
+        })
+        if pending and pending.get("renewal_id") == renewal_id:
+            transaction.update(customer_ref, {"subscription.pending_renewal": firestore.DELETE_FIELD})
+        return True
+
+    return expire(db.transaction())
+
+
+def complete_renewal_payment(renewal_id: str, session_id: str) -> Optional[Dict]:
+    """
+    Apply a paid renewal: advance next_billing_date, update loyalty and mark the ledger entry
+    paid, in one transaction. None if it was already applied (webhook retries) or is unknown.
+    """
+    from firebase_admin import firestore
+
+    renewal_ref = ops_ref().collection("renewals").document(renewal_id)
+
+    @firestore.transactional
+    def complete(transaction):
+        ledger = renewal_ref.get(transaction=transaction)
+        renewal = ledger.to_dict() if ledger.exists else None
+        if not renewal or renewal.get("status") != "pending_payment":
+            return None
+        customer_ref = customers_ref().document(renewal["customer_id"])
+        snapshot = customer_ref.get(transaction=transaction)
+        customer = snapshot.to_dict() if snapshot.exists else {}
+        subscription = dict(customer.get("subscription") or {})
+        now = datetime.utcnow().isoformat()
+
+        if subscription.get("next_billing_date") == renewal["billing_date"]:
+            subscription["next_billing_date"] = renewal["new_billing_date"]
+            subscription["last_renewal_date"] = now[:10]
+            subscription.pop("pending_upgrade", None)
+            subscription.pop("pending_renewal", None)
+            transaction.update(customer_ref, {"subscription": subscription, **renewal["loyalty"], "updated_at": now})
+            status = "paid"
+        else:
+            # The cycle moved on without this renewal (admin change) - keep the payment on record
+            logger.warning(f"Renewal {renewal_id} paid after its cycle changed - not applied")
+            status = "paid_unapplied"
+        renewal.update({"status": status, "paid_session_id": session_id, "renewed_at": now})
+        transaction.update(renewal_ref, {"status": status, "paid_session_id": session_id, "renewed_at": now})
+        return renewal
+
+    return complete(db.transaction())
+
+# ========================
+# RUNS
+# ========================
+
+def claim_run(run_id: str, force: bool) -> Tuple[Optional[Dict], str]:
+    """
+    Start or resume today's run. Returns (run document, '') or (None, reason) when the run
+    already completed or another process holds a live lease.
+    """
+    from firebase_admin import firestore
+
+    run_ref = ops_ref().collection("renewal_runs").document(run_id)
+
+    @firestore.transactional
+    def claim(transaction):
+        snapshot = run_ref.get(transaction=transaction)
+        run = snapshot.to_dict() if snapshot.exists else None
+        now = time.time()
+        if run and run.get("status") == "completed" and not force:
+            return None, "already completed"
+        if run and run.get("status") == "running" and now - run.get("heartbeat", 0) < RENEWAL_LEASE_SECONDS:
+            return None, "running elsewhere"
+        if not run or run.get("status") == "completed":
+            run = {"run_id": run_id, "cursor": None, "renewed": 0, "skipped": 0, "failed": 0, "due": 0,
+                   "errors": [], "attempts": 0, "started_at": datetime.utcnow().isoformat()}
+        run.update({"status": "running", "heartbeat": now, "attempts": run.get("attempts", 0) + 1})
+        transaction.set(run_ref, run)
+        return run, ""
+
+    return claim(db.transaction())
+
+
+def checkpoint(run: Dict, **fields):
+    run.update(fields, heartbeat=time.time())
+    ops_ref().collection("renewal_runs").document(run["run_id"]).set(run)
+
+
+async def run_renewals(executed_by: str, today: Optional[date] = None, force: bool = False) -> Dict:
+    """Renew every due subscription (see module docstring) and log the run to renewal_logs"""
+    today = today or datetime.utcnow().date()
+    run_id = today.isoformat()
+    started = time.perf_counter()
+
+    run, reason = await asyncio.to_thread(claim_run, run_id, force)
+    if run is None:
+        logger.info(f"Renewal run {run_id} not started: {reason}")
+        return {"status": "skipped", "run_id": run_id, "reason": reason}
+    resumed = run["attempts"] > 1 and run["cursor"] is not None
+    logger.info(f"🔄 Renewal run {run_id} {'resumed' if resumed else 'started'} by {executed_by}")
+
+    # Overdue cycles stay in range for the grace period so unpaid ones are asked for payment again
+    window_start = today - timedelta(days=RENEWAL_GRACE_DAYS)
+    window_end = today + timedelta(days=max(RENEWAL_WINDOW_DAYS))
+    semaphore = asyncio.Semaphore(RENEWAL_CONCURRENCY)
+
+    async def renew(snapshot) -> Tuple[str, Optional[Dict], Optional[str]]:
+        billing_date = (snapshot.to_dict().get("subscription") or {}).get("next_billing_date")
+        async with semaphore:
+            try:
+                renewal = await asyncio.to_thread(renew_customer, snapshot.id, billing_date, today, run_id)
+                if renewal is not None:
+                    renewal = await asyncio.to_thread(request_renewal_payment, renewal)
+                return snapshot.id, renewal, None
+            except Exception as e:
+                logger.error(f"❌ Error processing renewal for {snapshot.id}: {e}")
+                return snapshot.id, None, str(e)
+
+    pages = 0
+    while True:
+        page = await asyncio.to_thread(lambda: list(due_customers_query(window_start, window_end, run["cursor"]).stream()))
+        if not page:
+            break
+        pages += 1
+        results = await asyncio.gather(*(renew(snapshot) for snapshot in page))
+        errors = [{"customer_id": customer_id, "error": error} for customer_id, _, error in results if error]
+        last = page[-1]
+        await asyncio.to_thread(
+            checkpoint, run,
+            cursor={"next_billing_date": last.to_dict()["subscription"]["next_billing_date"], "customer_id": last.id},
+            due=run["due"] + len(page),
+            renewed=run["renewed"] + sum(1 for _, renewal, _ in results if renewal),
+            skipped=run["skipped"] + sum(1 for _, renewal, error in results if not renewal and not error),
+            failed=run["failed"] + len(errors),
+            errors=(run["errors"] + errors)[:MAX_LOGGED_ERRORS]
+        )
+        if len(page) < RENEWAL_PAGE_SIZE:
+            break
+
+    duration_ms = (time.perf_counter() - started) * 1000
+    await asyncio.to_thread(checkpoint, run, status="completed", completed_at=datetime.utcnow().isoformat())
+
+    # Renewals of this run's earlier attempts count too
+    details = await asyncio.to_thread(
+        lambda: [doc.to_dict() for doc in ops_ref().collection("renewals").where("run_id", "==", run_id).stream()])
+    log_id = str(uuid.uuid4())
+    log_data = {
+        "log_id": log_id,
+        "run_id": run_id,
+        "executed_at": datetime.utcnow().isoformat(),
+        "executed_by": executed_by,
+        "total_processed": len(details),
+        "total_errors": run["failed"],
+        "due": run["due"],
+        "skipped": run["skipped"],
+        "pages": pages,
+        "attempts": run["attempts"],
+        "resumed": resumed,
+        "concurrency": RENEWAL_CONCURRENCY,
+        "duration_ms": round(duration_ms, 1),
+        "details": details,
+        "errors": run["errors"]
+    }
+    await asyncio.to_thread(lambda: ops_ref().collection("renewal_logs").document(log_id).set(log_data))
+    logger.info(f"📝 Renewal run {run_id}: {len(details)} billed (awaiting payment), {run['skipped']} skipped, "
+                f"{run['failed']} failed in {duration_ms:.0f}ms (log {log_id})")
+
+    return {
+        "status": "success",
+        "run_id": run_id,
+        "renewals_processed": len(details),
+        "details": details,
+        "errors": run["errors"],
+        "log_id": log_id
+    }
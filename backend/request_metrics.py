@@ -0,0 +1,438 @@
+"""
+Request Metrics
+ASGI middleware and Firestore / LLM / outbound HTTP call wrappers that record per-request cost,
+exposed in Prometheus text format on /metrics.
+
+The call wrappers patch the client classes once at startup (instrument_clients), so every router
+mounted in server.py is covered without touching individual call sites. Costs are attributed to the
+current request through a context variable, which asyncio.to_thread carries into worker threads.
+"""
+
+import functools
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Debug header with the cost summary of each request (X-Request-Cost)
+COST_HEADER_ENABLED = os.getenv("DEBUG_COST_HEADER", "false").lower() in ("1", "true", "yes")
+COST_HEADER_NAME = b"x-request-cost"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 1000)
+TOKEN_BUCKETS = (0, 50, 100, 250, 500, 1000, 2000, 4000, 8000, 16000)
+INF_LABEL = 'le="+Inf"'
+
+# ========================
+# METRIC TYPES
+# ========================
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> (per-bucket counts, sum, count)
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = [[0] * len(self.buckets), 0.0, 0]
+                self._series[label_values] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            for label_values, (bucket_counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, bucket_counts):
+                    labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                    yield f"{self.name}_bucket{labels} {bucket_count}"
+                yield f"{self.name}_bucket{_format_labels(self.labels, label_values, INF_LABEL)} {count}"
+                yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {total}"
+                yield f"{self.name}_count{_format_labels(self.labels, label_values)} {count}"
+
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Wall time per request", ("method", "route", "status"))
+REQUEST_FIRESTORE_READS = Histogram(
+    "http_request_firestore_reads", "Firestore documents read per request", ("route",), COUNT_BUCKETS)
+REQUEST_FIRESTORE_WRITES = Histogram(
+    "http_request_firestore_writes", "Firestore documents written per request", ("route",), COUNT_BUCKETS)
+FIRESTORE_OPERATIONS = Counter(
+    "firestore_documents_total", "Firestore documents read or written", ("operation",))
+FIRESTORE_CALL_SECONDS = Histogram(
+    "firestore_call_duration_seconds", "Time spent in Firestore calls", ("operation",))
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_duration_seconds", "LLM call latency", ("model",))
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "Estimated LLM tokens (4 characters per token)", ("model", "kind"))
+OUTBOUND_HTTP_SECONDS = Histogram(
+    "outbound_http_duration_seconds", "Outbound HTTP call latency", ("service",))
+LLM_PROMPT_PART_TOKENS = Histogram(
+    "llm_prompt_part_tokens", "Prompt tokens per chat request by prompt part", ("endpoint", "part"), TOKEN_BUCKETS)
+CHAT_TURNS = Counter(
+    "chat_turns_total", "Chat turns by how they were answered (template fast path or LLM)", ("endpoint", "path", "kind"))
+WEBHOOK_EVENTS = Counter(
+    "webhook_events_total", "Webhook deliveries by idempotency outcome", ("source", "outcome"))
+
+ALL_METRICS = [
+    HTTP_REQUEST_SECONDS, REQUEST_FIRESTORE_READS, REQUEST_FIRESTORE_WRITES, FIRESTORE_OPERATIONS,
+    FIRESTORE_CALL_SECONDS, LLM_CALL_SECONDS, LLM_TOKENS, OUTBOUND_HTTP_SECONDS, LLM_PROMPT_PART_TOKENS, CHAT_TURNS,
+    WEBHOOK_EVENTS
+]
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# ========================
+# PER-REQUEST COST
+# ========================
+
+class RequestCost:
+    """Cost counters of one request (mutated from the event loop and worker threads)"""
+
+    def __init__(self):
+        self.firestore_reads = 0
+        self.firestore_writes = 0
+        self.firestore_seconds = 0.0
+        self.llm_calls = 0
+        self.llm_tokens = 0
+        self.llm_seconds = 0.0
+        self.http_calls = 0
+        self.http_seconds = 0.0
+
+    def header_value(self, wall_seconds: float) -> str:
+        return (f"wall={wall_seconds * 1000:.1f}ms; fs_reads={self.firestore_reads}; "
+                f"fs_writes={self.firestore_writes}; fs={self.firestore_seconds * 1000:.1f}ms; "
+                f"llm_calls={self.llm_calls}; llm_tokens={self.llm_tokens}; llm={self.llm_seconds * 1000:.1f}ms; "
+                f"http_calls={self.http_calls}; http={self.http_seconds * 1000:.1f}ms")
+
+
+_current_cost: ContextVar[Optional[RequestCost]] = ContextVar("request_cost", default=None)
+
+
+def current_request_cost() -> Optional[RequestCost]:
+    return _current_cost.get()
+
+
+def record_firestore(operation: str, documents: int, seconds: float):
+    FIRESTORE_OPERATIONS.inc(operation, amount=documents)
+    FIRESTORE_CALL_SECONDS.observe(seconds, operation)
+    cost = _current_cost.get()
+    if cost is not None:
+        if operation == "read":
+            cost.firestore_reads += documents
+        else:
+            cost.firestore_writes += documents
+        cost.firestore_seconds += seconds
+
+
+def record_prompt_tokens(endpoint: str, parts: Dict[str, int]):
+    """Exact (tokenizer) prompt sizes of a chat request, split into its parts"""
+    for part, tokens in parts.items():
+        LLM_PROMPT_PART_TOKENS.observe(tokens, endpoint, part)
+
+
+def record_chat_turn(endpoint: str, path: str, kind: str = ""):
+    """path is 'fast_path' (answered from templates) or 'llm'"""
+    CHAT_TURNS.inc(endpoint, path, kind)
+
+
+def record_webhook_event(source: str, outcome: str):
+    """outcome: processed, duplicate_cached (no I/O), duplicate, in_progress, failed"""
+    WEBHOOK_EVENTS.inc(source, outcome)
+
+
+def record_llm(model: str, prompt_tokens: int, completion_tokens: int, seconds: float):
+    LLM_CALL_SECONDS.observe(seconds, model)
+    LLM_TOKENS.inc(model, "prompt", amount=prompt_tokens)
+    LLM_TOKENS.inc(model, "completion", amount=completion_tokens)
+    cost = _current_cost.get()
+    if cost is not None:
+        cost.llm_calls += 1
+        cost.llm_tokens += prompt_tokens + completion_tokens
+        cost.llm_seconds += seconds
+
+
+def record_http(service: str, seconds: float):
+    OUTBOUND_HTTP_SECONDS.observe(seconds, service)
+    cost = _current_cost.get()
+    if cost is not None:
+        cost.http_calls += 1
+        cost.http_seconds += seconds
+
+# ========================
+# ASGI MIDDLEWARE
+# ========================
+
+_route_templates: Dict[object, str] = {}
+
+
+def _route_template(scope) -> str:
+    """Path template of the matched route (e.g. /api/math-analysis/result/{result_id})"""
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    template = _route_templates.get(endpoint)
+    if template is None:
+        app = scope.get("app")
+        for candidate in getattr(app, "routes", []):
+            if getattr(candidate, "endpoint", None) is endpoint:
+                template = candidate.path
+                break
+        template = template or "unmatched"
+        _route_templates[endpoint] = template
+    return template
+
+
+class RequestMetricsMiddleware:
+    """Times every HTTP request and attributes Firestore/LLM/HTTP cost to its route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cost = RequestCost()
+        token = _current_cost.set(cost)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_cost(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if COST_HEADER_ENABLED:
+                    headers = list(message.get("headers", []))
+                    headers.append((COST_HEADER_NAME, cost.header_value(time.perf_counter() - start).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_cost)
+        finally:
+            _current_cost.reset(token)
+            route = _route_template(scope)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], route, str(status_code))
+            REQUEST_FIRESTORE_READS.observe(cost.firestore_reads, route)
+            REQUEST_FIRESTORE_WRITES.observe(cost.firestore_writes, route)
+
+# ========================
+# CLIENT WRAPPERS
+# ========================
+
+def _timed(fn, on_done):
+    """Wrap a sync function; on_done(seconds) runs after each call"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        on_done(time.perf_counter() - start)
+        return result
+    wrapper._request_metrics_wrapped = True
+    return wrapper
+
+
+def _counted_stream(fn):
+    """Wrap a generator of document snapshots, counting one read per document (minimum one per query)"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        documents, elapsed = 0, 0.0
+        start = time.perf_counter()
+        iterator = iter(fn(*args, **kwargs))
+        elapsed += time.perf_counter() - start
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    snapshot = next(iterator)
+                except StopIteration:
+                    elapsed += time.perf_counter() - start
+                    return
+                elapsed += time.perf_counter() - start
+                documents += 1
+                yield snapshot
+        finally:
+            record_firestore("read", max(documents, 1), elapsed)
+    wrapper._request_metrics_wrapped = True
+    return wrapper
+
+
+def _patch(cls, name, make_wrapper):
+    original = getattr(cls, name, None)
+    if original is None or getattr(original, "_request_metrics_wrapped", False):
+        return
+    setattr(cls, name, make_wrapper(original))
+
+
+def _counted_commit(fn):
+    """Wrap a batch/transaction commit, counting the writes it carries (read before commit clears them)"""
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        pending = len(getattr(self, "_write_pbs", None) or [])
+        start = time.perf_counter()
+        result = fn(self, *args, **kwargs)
+        record_firestore("write", pending, time.perf_counter() - start)
+        return result
+    wrapper._request_metrics_wrapped = True
+    return wrapper
+
+
+def instrument_firestore():
+    try:
+        from google.cloud.firestore_v1.document import DocumentReference
+        from google.cloud.firestore_v1.query import Query
+        from google.cloud.firestore_v1.batch import WriteBatch
+        from google.cloud.firestore_v1.transaction import Transaction
+        from google.cloud.firestore_v1.client import Client
+    except ImportError:
+        logger.warning("google-cloud-firestore not available - Firestore metrics disabled")
+        return
+
+    _patch(DocumentReference, "get", lambda fn: _timed(fn, lambda s: record_firestore("read", 1, s)))
+    for method in ("set", "update", "delete", "create"):
+        _patch(DocumentReference, method, lambda fn: _timed(fn, lambda s: record_firestore("write", 1, s)))
+    # Query.get and CollectionReference.stream/get all go through Query.stream
+    _patch(Query, "stream", _counted_stream)
+    _patch(Client, "get_all", _counted_stream)
+
+    # Writes are counted when the batch or transaction commits
+    _patch(WriteBatch, "commit", _counted_commit)
+    _patch(Transaction, "_commit", _counted_commit)
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text or "") // 4)
+
+
+def instrument_llm():
+    try:
+        from emergentintegrations.llm.chat import LlmChat
+    except ImportError:
+        logger.warning("emergentintegrations not available - LLM metrics disabled")
+        return
+
+    original = LlmChat.send_message
+    if getattr(original, "_request_metrics_wrapped", False):
+        return
+
+    @functools.wraps(original)
+    async def send_message(self, message, *args, **kwargs):
+        start = time.perf_counter()
+        response = await original(self, message, *args, **kwargs)
+        model = str(getattr(self, "model", None) or getattr(self, "_model", None) or "unknown")
+        prompt = (getattr(self, "system_message", "") or "") + (getattr(message, "text", "") or "")
+        record_llm(model, estimate_tokens(prompt), estimate_tokens(str(response)), time.perf_counter() - start)
+        return response
+
+    send_message._request_metrics_wrapped = True
+    LlmChat.send_message = send_message
+
+
+def instrument_http():
+    try:
+        from sendgrid import SendGridAPIClient
+        _patch(SendGridAPIClient, "send", lambda fn: _timed(fn, lambda s: record_http("sendgrid", s)))
+    except ImportError:
+        logger.warning("sendgrid not available - SendGrid metrics disabled")
+
+    try:
+        import requests
+
+        def service_of(args, kwargs) -> str:
+            url = kwargs.get("url") or (args[2] if len(args) > 2 else "")
+            host = str(url).split("/")[2] if "://" in str(url) else "unknown"
+            return host
+
+        original = requests.Session.request
+        if not getattr(original, "_request_metrics_wrapped", False):
+            @functools.wraps(original)
+            def request(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return original(*args, **kwargs)
+                finally:
+                    record_http(service_of(args, kwargs), time.perf_counter() - start)
+            request._request_metrics_wrapped = True
+            requests.Session.request = request
+    except ImportError:
+        pass
+
+    try:
+        import httpx
+
+        original_send = httpx.AsyncClient.send
+        if not getattr(original_send, "_request_metrics_wrapped", False):
+            @functools.wraps(original_send)
+            async def send(self, request, *args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await original_send(self, request, *args, **kwargs)
+                finally:
+                    record_http(request.url.host or "unknown", time.perf_counter() - start)
+            send._request_metrics_wrapped = True
+            httpx.AsyncClient.send = send
+    except ImportError:
+        pass
+
+
+def instrument_clients():
+    """Patch Firestore, LLM and outbound HTTP clients (idempotent)"""
+    instrument_firestore()
+    instrument_llm()
+    instrument_http()
@@ -0,0 +1,304 @@
+"""
+Schedule Index
+Class schedules parsed into weekday intervals (minutes since midnight), indexed per tutor and
+per location, for clash checks on class writes and free-slot search.
+
+    "TUE", "7:30pm-9:00pm"  ->  (1, 1170, 1260)
+
+Each (tutor or location, weekday) keeps its intervals sorted by start, so an overlap query is
+a bisect plus a short scan bounded by the longest class on that day. Class edits update the
+index in place (add_class / remove_class) instead of re-parsing the catalog.
+
+Locations have several rooms: a location clashes only when more classes overlap than it has
+rooms - from LOCATION_ROOMS ("Bishan:16,Marine Parade:17"), else its busiest moment so far.
+"""
+
+import bisect
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from catalog_aggregates import class_tutor
+
+DAYS = ('MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN')
+# Hours free slots are searched in, every day
+DAY_START = os.getenv("SCHEDULE_DAY_START", "9:00am")
+DAY_END = os.getenv("SCHEDULE_DAY_END", "10:00pm")
+
+_TIME = re.compile(r"^\s*(\d{1,2})(?::(\d{2}))?\s*(am|pm)?\s*$", re.IGNORECASE)
+_RANGE = re.compile(r"\s*(?:-|–|—|to)\s*", re.IGNORECASE)
+
+Interval = Tuple[int, int, int]  # weekday, start, end
+
+# ========================
+# PARSING
+# ========================
+
+def parse_day(day: str) -> int:
+    """'TUE', 'Tue', 'tuesday' -> 1"""
+    key = (day or '').strip().upper()[:3]
+    if key not in DAYS:
+        raise ValueError(f"Unknown day: {day!r}")
+    return DAYS.index(key)
+
+
+def parse_time(value: str, meridiem: Optional[str] = None) -> int:
+    """'7:30pm' / '7pm' / '19:30' -> minutes since midnight; meridiem is used when value has none"""
+    match = _TIME.match(value or '')
+    if not match:
+        raise ValueError(f"Unknown time: {value!r}")
+    hour, minute = int(match.group(1)), int(match.group(2) or 0)
+    meridiem = (match.group(3) or meridiem or '').lower()
+    if hour > 23 or minute > 59 or (meridiem and not 1 <= hour <= 12):
+        raise ValueError(f"Unknown time: {value!r}")
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem == 'pm' else 0)
+    return hour * 60 + minute
+
+
+def parse_time_range(value: str) -> Tuple[int, int]:
+    """'7:30pm-9:00pm' / '7-9pm' -> (1170, 1260)"""
+    parts = _RANGE.split((value or '').strip())
+    if len(parts) != 2:
+        raise ValueError(f"Unknown time range: {value!r}")
+    end_match = _TIME.match(parts[1])
+    end = parse_time(parts[1])
+    start = parse_time(parts[0], end_match.group(3) if end_match else None)
+    if start > end:
+        # '11-1pm': the start is in the morning
+        start = parse_time(parts[0], 'am')
+    if start >= end:
+        raise ValueError(f"Time range ends before it starts: {value!r}")
+    return start, end
+
+
+def format_time(minutes: int) -> str:
+    """1170 -> '7:30pm'"""
+    hour, minute = divmod(minutes, 60)
+    return f"{(hour - 1) % 12 + 1}:{minute:02d}{'am' if hour < 12 or hour == 24 else 'pm'}"
+
+
+def format_interval(start: int, end: int) -> str:
+    return f"{format_time(start)}-{format_time(end)}"
+
+
+def class_intervals(cls: Dict) -> List[Interval]:
+    """(weekday, start, end) for every session of a class document"""
+    return [(parse_day(session.get('day')), *parse_time_range(session.get('time')))
+            for session in cls.get('schedule') or []]
+
+# ========================
+# INDEX
+# ========================
+
+class DaySlots:
+    """Intervals of one tutor or location on one weekday, sorted by start"""
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.entries: List[Tuple[int, int, str]] = []  # (start, end, class_id)
+        self.longest = 0
+        self._peak: Optional[int] = None
+
+    def add(self, start: int, end: int, class_id: str):
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.entries.insert(i, (start, end, class_id))
+        self.longest = max(self.longest, end - start)
+        self._peak = None
+
+    def remove(self, start: int, end: int, class_id: str):
+        i = self.entries.index((start, end, class_id))
+        del self.starts[i], self.entries[i]
+        self._peak = None
+
+    def overlapping(self, start: int, end: int) -> List[Tuple[int, int, str]]:
+        """Entries that overlap [start, end)"""
+        found = []
+        i = bisect.bisect_left(self.starts, end) - 1
+        while i >= 0 and self.starts[i] > start - self.longest:
+            if self.entries[i][1] > start:
+                found.append(self.entries[i])
+            i -= 1
+        return found[::-1]
+
+    def peak(self) -> int:
+        """Most entries overlapping at any moment"""
+        if self._peak is None:
+            events = sorted([(s, 1) for s, _, _ in self.entries] + [(e, -1) for _, e, _ in self.entries])
+            busy = most = 0
+            for _, delta in events:
+                busy += delta
+                most = max(most, busy)
+            self._peak = most
+        return self._peak
+
+    def busy(self, capacity: int) -> List[Tuple[int, int]]:
+        """Merged periods with at least `capacity` entries running"""
+        events = sorted([(s, 1) for s, _, _ in self.entries] + [(e, -1) for _, e, _ in self.entries])
+        periods, running, opened = [], 0, None
+        for time, delta in events:
+            running += delta
+            if running >= capacity and opened is None:
+                opened = time
+            elif running < capacity and opened is not None:
+                if periods and periods[-1][1] >= opened:
+                    periods[-1] = (periods[-1][0], time)
+                elif time > opened:
+                    periods.append((opened, time))
+                opened = None
+        return periods
+
+
+def parse_rooms(value: str) -> Dict[str, int]:
+    """'Bishan:16,Marine Parade:17' -> {'Bishan': 16, 'Marine Parade': 17}"""
+    rooms = {}
+    for part in (value or '').split(','):
+        if ':' in part:
+            location, count = part.rsplit(':', 1)
+            rooms[location.strip()] = int(count)
+    return rooms
+
+
+class ScheduleIndex:
+    """Per-tutor and per-location weekday intervals of every class, updated per class write"""
+
+    def __init__(self, rooms: Optional[Dict[str, int]] = None):
+        self.rooms = rooms if rooms is not None else parse_rooms(os.getenv("LOCATION_ROOMS", ""))
+        self.slots: Dict[Tuple[str, str], Dict[int, DaySlots]] = {}
+        self.classes: Dict[str, Tuple[str, str, List[Interval]]] = {}  # class_id -> tutor_id, location, intervals
+        self.skipped: Dict[str, str] = {}  # class_id -> schedule parse error
+
+    @classmethod
+    def build(cls, classes: Iterable[Tuple[str, Dict]], rooms: Optional[Dict[str, int]] = None) -> 'ScheduleIndex':
+        index = cls(rooms)
+        for class_id, doc in classes:
+            index.add_class(class_id, doc)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.classes)
+
+    def _keys(self, tutor_id: str, location: str):
+        return (('tutor', tutor_id), ('location', location))
+
+    def add_class(self, class_id: str, doc: Dict):
+        """Index a class (replacing an earlier version); schedules that do not parse are skipped"""
+        self.remove_class(class_id)
+        try:
+            intervals = class_intervals(doc)
+        except ValueError as e:
+            self.skipped[class_id] = str(e)
+            return
+        tutor_id, location = class_tutor(doc)[0], doc.get('location', '')
+        self.classes[class_id] = (tutor_id, location, intervals)
+        for key in self._keys(tutor_id, location):
+            days = self.slots.setdefault(key, {})
+            for day, start, end in intervals:
+                days.setdefault(day, DaySlots()).add(start, end, class_id)
+
+    def remove_class(self, class_id: str):
+        self.skipped.pop(class_id, None)
+        entry = self.classes.pop(class_id, None)
+        if entry is None:
+            return
+        tutor_id, location, intervals = entry
+        for key in self._keys(tutor_id, location):
+            for day, start, end in intervals:
+                self.slots[key][day].remove(start, end, class_id)
+
+    def capacity(self, location: str) -> int:
+        """Rooms at a location: LOCATION_ROOMS, else its busiest moment in the timetable"""
+        if location in self.rooms:
+            return self.rooms[location]
+        days = self.slots.get(('location', location), {})
+        return max([slots.peak() for slots in days.values()] or [1])
+
+    def conflicts(self, doc: Dict, class_id: str = '') -> Dict[str, List[Dict]]:
+        """
+        Clashes a class (new or edited, ignoring its own current version) would have:
+        'tutor' - the same tutor's overlapping classes, 'location' - sessions that would need
+        more rooms than the location has.
+        """
+        tutor_id, location = class_tutor(doc)[0], doc.get('location', '')
+        found = {'tutor': [], 'location': []}
+        capacity = self.capacity(location)
+        for day, start, end in class_intervals(doc):
+            slots = self.slots.get(('tutor', tutor_id), {}).get(day)
+            for other_start, other_end, other_id in (slots.overlapping(start, end) if slots else []):
+                if other_id != class_id:
+                    found['tutor'].append({'class_id': other_id, 'day': DAYS[day],
+                                           'time': format_interval(other_start, other_end)})
+            slots = self.slots.get(('location', location), {}).get(day)
+            others = [entry for entry in (slots.overlapping(start, end) if slots else []) if entry[2] != class_id]
+            # Peak overlap among the other sessions inside this one, plus this one
+            inside = DaySlots()
+            for other_start, other_end, other_id in others:
+                inside.add(max(start, other_start), min(end, other_end), other_id)
+            if others and inside.peak() + 1 > capacity:
+                found['location'].append({'day': DAYS[day], 'time': format_interval(start, end),
+                                          'classes': sorted({entry[2] for entry in others}), 'rooms': capacity})
+        return found
+
+    def class_doc(self, class_id: str) -> Optional[Dict]:
+        """The indexed fields of a class as a class document (tutor_id, location, schedule)"""
+        entry = self.classes.get(class_id)
+        if entry is None:
+            return None
+        tutor_id, location, intervals = entry
+        return {'tutor_id': tutor_id, 'location': location,
+                'schedule': [{'day': DAYS[day], 'time': format_interval(start, end)} for day, start, end in intervals]}
+
+    def new_conflicts(self, doc: Dict, class_id: str = '') -> Dict[str, List[Dict]]:
+        """Clashes a write would add: the catalog already has some, and editing a fee should not trip on them"""
+        found = self.conflicts(doc, class_id)
+        current = self.class_doc(class_id)
+        if current is None:
+            return found
+        before = self.conflicts(current, class_id)
+        old_tutor = {(c['class_id'], c['day']) for c in before['tutor']}
+        old_location = {(c['day'], tuple(c['classes'])) for c in before['location']}
+        return {'tutor': [c for c in found['tutor'] if (c['class_id'], c['day']) not in old_tutor],
+                'location': [c for c in found['location'] if (c['day'], tuple(c['classes'])) not in old_location]}
+
+    def apply_write(self, class_id: str, doc: Optional[Dict], merge: bool = False):
+        """Mirror a catalog_aggregates class write: None deletes, merge updates the indexed class"""
+        if doc is None:
+            self.remove_class(class_id)
+        elif merge:
+            current = self.class_doc(class_id)
+            if current is not None:
+                self.add_class(class_id, {**current, **doc})
+        else:
+            self.add_class(class_id, doc)
+
+    def merged_doc(self, class_id: str, doc: Dict, merge: bool) -> Optional[Dict]:
+        """The class document a write would leave, as far as the index is concerned"""
+        if not merge:
+            return doc
+        current = self.class_doc(class_id)
+        return None if current is None else {**current, **doc}
+
+    def free_slots(self, keys: List[Tuple[str, str]], days: Optional[Iterable[int]] = None, min_minutes: int = 60,
+                   day_start: str = DAY_START, day_end: str = DAY_END) -> Dict[str, List[str]]:
+        """
+        Free periods of at least min_minutes per weekday when every key - ('tutor', tutor_id) or
+        ('location', location) - is free. A location is free while it has a room left.
+        """
+        open_at, close_at = parse_time(day_start), parse_time(day_end)
+        free = {}
+        for day in (range(len(DAYS)) if days is None else days):
+            busy = []
+            for kind, key in keys:
+                slots = self.slots.get((kind, key), {}).get(day)
+                if slots:
+                    busy.extend(slots.busy(self.capacity(key) if kind == 'location' else 1))
+            cursor, gaps = open_at, []
+            for start, end in sorted(busy):
+                if min(start, close_at) - cursor >= min_minutes:
+                    gaps.append(format_interval(cursor, min(start, close_at)))
+                cursor = max(cursor, end)
+            if close_at - cursor >= min_minutes:
+                gaps.append(format_interval(cursor, close_at))
+            free[DAYS[day]] = gaps
+        return free
@@ -1,4 +1,5 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, BackgroundTasks, Response
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
@@ -11,12 +12,28 @@ from typing import List, Optional
 import uuid
 from datetime import datetime, timezone
 from emergentintegrations.llm.chat import LlmChat, UserMessage
-import firebase_admin
-from firebase_admin import credentials, firestore
-from math_analysis_api import math_router
-from tutor_auth_api import tutor_router
-from project62_api import router as project62_router
-from firebase_notion_sync import router as sync_router
+import asyncio
+import importlib
+import time
+import copy
+from log_config import setup_logging
+
+# Queue-based JSON logging - set up before the routers so their import-time logs are captured
+setup_logging()
+
+from firebase_apps import firestore_client, init_firebase_apps
+from chat_context import ChatContextBuilder, CHAT_MODEL, count_fixed_tokens
+from request_metrics import (
+    RequestMetricsMiddleware, instrument_clients, render_metrics, record_prompt_tokens, record_chat_turn
+)
+from tuition_retrieval import (
+    TUITION_SYSTEM_PREFIX, extract_intent, needs_catalog, catalog_context, reference_notes, build_user_turn,
+    class_tutor_id
+)
+from tuition_fast_path import fast_path_answer
+from tutor_names import TutorAliases, normalize_tutor_name
+import catalog_aggregates
+from schedule_index import ScheduleIndex, parse_day
 
 
 ROOT_DIR = Path(__file__).parent
@@ -27,17 +44,9 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
-# Initialize Firebase
-try:
-    firebase_db = firestore.client()
-    logger = logging.getLogger(__name__)
-    logger.info("Firebase client already initialized")
-except:
-    cred = credentials.Certificate(ROOT_DIR / 'firebase-credentials.json')
-    firebase_admin.initialize_app(cred)
-    firebase_db = firestore.client()
-    logger = logging.getLogger(__name__)
-    logger.info("Firebase initialized successfully")
+# Tuition chatbot Firebase (default app) - created at startup, see firebase_apps.py
+firebase_db = firestore_client('tuition')
+logger = logging.getLogger(__name__)
 
 # Emergent Universal Key (from environment)
 EMERGENT_API_KEY = os.getenv("EMERGENT_LLM_KEY")
@@ -105,10 +114,12 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     messages: List[ChatMessage]
     agent_mode: str = "main"  # main, services, grants, support
+    conversation_id: Optional[str] = None  # returned by the first response; enables the stored summary
 
 class ChatResponse(BaseModel):
     message: str
     agent_mode: str
+    conversation_id: Optional[str] = None
 
 class EnrollmentRequest(BaseModel):
     parent_name: str
@@ -139,6 +150,11 @@ class AdminClassUpdate(BaseModel):
     action: str  # "add", "update", "delete"
     class_data: ClassData = None
     class_id: str = ""  # For update/delete
+    allow_conflicts: bool = False  # Write even if the tutor would be double-booked
+
+class AdminBulkClassUpdate(BaseModel):
+    operations: List[AdminClassUpdate]
+    atomic: bool = True  # False: apply in chunks and report a status per operation
 
 # WhatsApp Bot Models
 class WhatsAppMessage(BaseModel):
@@ -651,63 +667,84 @@ async def get_chat_leads():
     
     return leads
 
+async def complete_chat(session_id: str, system_message: str, text: str) -> str:
+    """One gpt-4o-mini call through the Emergent key"""
+    chat = LlmChat(
+        api_key=EMERGENT_API_KEY,
+        session_id=session_id,
+        system_message=system_message
+    )
+    chat.with_model("openai", CHAT_MODEL)
+    return await chat.send_message(UserMessage(text=text))
+
+chat_context_builder = ChatContextBuilder(db.chat_summaries, complete_chat)
+
 @api_router.post("/chat", response_model=ChatResponse)
-async def chat_with_ai(request: ChatRequest):
+async def chat_with_ai(request: ChatRequest, background_tasks: BackgroundTasks):
     """
     AI chat endpoint for CCC AI Consultant.
     Routes to different agent modes based on page context.
-    Maintains full conversation history for context-aware responses.
+    The system prompt is sent unchanged on every turn; conversation history goes into
+    the user turn, fitted to the agent's token budget (see chat_context.py).
     """
     try:
         # Get the appropriate system prompt
-        system_prompt = AGENT_PROMPTS.get(request.agent_mode, AGENT_PROMPTS["main"])
+        agent_mode = request.agent_mode if request.agent_mode in AGENT_PROMPTS else "main"
+        system_prompt = AGENT_PROMPTS[agent_mode]
         
-        # Create a unique session ID for this conversation
-        session_id = f"ccc-chat-{uuid.uuid4()}"
-        
-        # Build conversation context by combining system message with history
-        # This ensures the AI remembers the full conversation
-        conversation_context = system_prompt + "\n\n=== Conversation History ===\n"
-        
-        for msg in request.messages[:-1]:  # All messages except the last one
-            if msg.role == "user":
-                conversation_context += f"\nUser: {msg.content}"
-            else:
-                conversation_context += f"\nAssistant: {msg.content}"
-        
-        conversation_context += "\n\n=== Current Question ===\n"
-        
-        # Initialize LlmChat with enhanced context
-        chat = LlmChat(
-            api_key=EMERGENT_API_KEY,
-            session_id=session_id,
-            system_message=conversation_context
+        # The current question is the last user message; everything before it is history
+        last_user_index = next(
+            (i for i in range(len(request.messages) - 1, -1, -1) if request.messages[i].role == "user"),
+            None
         )
+        if last_user_index is None:
+            raise HTTPException(status_code=400, detail="No user message found")
         
-        # Use gpt-4o-mini model
-        chat.with_model("openai", "gpt-4o-mini")
+        question = request.messages[last_user_index].content
+        history = [(msg.role, msg.content) for msg in request.messages[:last_user_index]]
+        conversation_id = request.conversation_id or str(uuid.uuid4())
         
-        # Get the last user message (most recent)
-        last_user_message = None
-        for msg in reversed(request.messages):
-            if msg.role == "user":
-                last_user_message = msg.content
-                break
+        context = await chat_context_builder.build(agent_mode, request.conversation_id, history, question)
         
-        if not last_user_message:
-            raise HTTPException(status_code=400, detail="No user message found")
+        assistant_response = await complete_chat(f"ccc-chat-{uuid.uuid4()}", system_prompt, context["prompt"])
         
-        # Create user message and send
-        user_message = UserMessage(text=last_user_message)
-        assistant_response = await chat.send_message(user_message)
+        system_tokens = count_fixed_tokens(system_prompt)
+        record_prompt_tokens("ccc_chat", {
+            "system_prefix": system_tokens,
+            "summary": context["summary_tokens"],
+            "history": context["history_tokens"],
+            "query": context["question_tokens"]
+        })
+        logger.info(
+            f"Chat request processed - Mode: {agent_mode}, Messages: {len(request.messages)}, "
+            f"Prompt tokens: {system_tokens + context['prompt_tokens']} "
+            f"(system {system_tokens}, summary {context['summary_tokens']}, history {context['history_tokens']}, "
+            f"question {context['question_tokens']}), Dropped: {context['dropped_messages']}",
+            extra={
+                "agent_mode": agent_mode,
+                "prompt_tokens": system_tokens + context["prompt_tokens"],
+                "system_tokens": system_tokens,
+                "summary_tokens": context["summary_tokens"],
+                "history_tokens": context["history_tokens"],
+                "dropped_messages": context["dropped_messages"]
+            }
+        )
         
-        logger.info(f"Chat request processed - Mode: {request.agent_mode}, Messages: {len(request.messages)}")
+        # Fold aged-out turns into the stored summary after the response is sent
+        if chat_context_builder.needs_summary(request.conversation_id, history, context["summarized_count"]):
+            background_tasks.add_task(
+                chat_context_builder.refresh_summary,
+                conversation_id, agent_mode, history, context["summary"], context["summarized_count"]
+            )
         
         return ChatResponse(
             message=assistant_response,
-            agent_mode=request.agent_mode
+            agent_mode=request.agent_mode,
+            conversation_id=conversation_id
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in chat endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to process chat request: {str(e)}")
@@ -808,6 +845,11 @@ class TuitionChatResponse(BaseModel):
 # In-memory session storage for tuition demo
 tuition_sessions = {}
 
+# Template answers for structured lookups (see tuition_fast_path.py); TUITION_LOG_MESSAGES
+# adds the user message to the per-turn log line for replay with benchmark_tuition_fast_path.py
+TUITION_FAST_PATH_ENABLED = os.getenv("TUITION_FAST_PATH", "true").lower() in ("1", "true", "yes")
+TUITION_LOG_MESSAGES = os.getenv("TUITION_LOG_MESSAGES", "false").lower() in ("1", "true", "yes")
+
 # ==================== FIREBASE QUERY HELPER FUNCTIONS ====================
 
 def query_firebase_classes(level=None, subject=None, location=None, limit=50):
@@ -864,286 +906,58 @@ def query_firebase_tutors(name_search=None, limit=20):
         logger.error(f"Error querying Firebase tutors: {str(e)}")
         return []
 
-def format_class_info(class_data):
+# Browser/CDN max-age for the dropdown endpoints backed by catalog_aggregates
+CATALOG_CACHE_MAX_AGE = int(os.getenv("CATALOG_CACHE_MAX_AGE", "60"))
+
+# Tutor alias table (tutor_names.py), rebuilt from the tutors collection at most every TTL
+TUTOR_ALIASES_TTL_SECONDS = int(os.getenv("TUTOR_ALIASES_TTL_SECONDS", "600"))
+_tutor_aliases = {'aliases': None, 'loaded_at': 0.0}
+
+def load_tutor_aliases() -> Optional[TutorAliases]:
     """
-    Format a single class document into a readable string for LLM.
-    Does NOT add variant labels (A, B, C) - those should only be added when grouping same location/subject/level.
+    Alias -> tutor_id table for the chat extractor and admin search.
+    Keeps the previous table if Firestore is unavailable.
     """
-    schedule_str = ""
-    for idx, session in enumerate(class_data.get('schedule', [])):
-        if idx > 0:
-            schedule_str += " + "
-        schedule_str += f"{session.get('day')} {session.get('time')}"
-    
-    return f"• {class_data.get('level')} {class_data.get('subject')} at {class_data.get('location')} - {class_data.get('tutor_base_name', class_data.get('tutor_name'))}: {schedule_str} (${class_data.get('monthly_fee')}/month, {class_data.get('sessions_per_week')} session{'s' if class_data.get('sessions_per_week', 0) > 1 else ''}/week)"
+    if _tutor_aliases['aliases'] is not None and time.monotonic() - _tutor_aliases['loaded_at'] < TUTOR_ALIASES_TTL_SECONDS:
+        return _tutor_aliases['aliases']
+    try:
+        names = [doc.to_dict().get('name') for doc in firebase_db.collection('tutors').stream()]
+        _tutor_aliases['aliases'] = TutorAliases(names)
+        _tutor_aliases['loaded_at'] = time.monotonic()
+        logger.info(f"Tutor alias table loaded - {len(_tutor_aliases['aliases'])} tutors")
+    except Exception as e:
+        logger.error(f"Error loading tutor aliases: {str(e)}")
+    return _tutor_aliases['aliases']
+
+# Parsed class schedules (schedule_index.py): rebuilt from Firestore at most every TTL, and
+# updated in place by this process's admin writes
+SCHEDULE_INDEX_TTL_SECONDS = int(os.getenv("SCHEDULE_INDEX_TTL_SECONDS", "600"))
+_schedule_index = {'index': None, 'loaded_at': 0.0}
 
-def format_tutor_info(tutor_data):
+def load_schedule_index() -> Optional[ScheduleIndex]:
     """
-    Format a tutor document into a readable string for LLM.
+    Per-tutor / per-location interval index for clash checks and free slots.
+    Keeps the previous index if Firestore is unavailable.
     """
-    return f"{tutor_data.get('name')} - Teaches: {', '.join(tutor_data.get('subjects', []))} | Levels: {', '.join(tutor_data.get('levels', []))} | Locations: {', '.join(tutor_data.get('locations', []))} | Total Classes: {tutor_data.get('total_classes')}"
-
-# Tuition Centre System Message
-# Tuition Centre System Message
-TUITION_SYSTEM_MESSAGE = """You are an AI assistant for a premier tuition center in Singapore. You provide detailed, accurate information about our 2026 class schedules and pricing.
-
-🎓 **IMPORTANT: 2026 Classes Available NOW**
-- Our 2026 classes are open for enrollment starting from September/October 2025
-- When customers ask about classes, provide 2026 information
-- All pricing and schedules shown are for the 2026 academic year
-
-🧠 **CRITICAL: CONTEXT MEMORY & CONVERSATION AWARENESS**
-
-**YOU MUST REMEMBER AND USE CONVERSATION CONTEXT:**
-1. **Track what level/subject the user asked about** (e.g., P6, S3, J1, Math, EMath, Science)
-2. **When user asks follow-up questions** like "list classes at [location]", they mean for THE SAME LEVEL/SUBJECT they were just asking about
-3. **NEVER information dump** - If context is unclear, ASK: "Are you asking about S3 classes at Bishan?" or "Which level are you interested in at Bishan?"
-4. **Progressive disclosure** - Show relevant info based on conversation history, not everything at once
-
-**EXAMPLES OF GOOD CONTEXT AWARENESS:**
-
-❌ **BAD - Information Dumping:**
-User: "Tell me about S3 EMath"
-Bot: "S3 EMath is $343.35/month..."
-User: "List Bishan classes"
-Bot: *dumps all P2-P6 classes*
-
-✅ **GOOD - Context Awareness:**
-User: "Tell me about S3 EMath"
-Bot: "S3 EMath is $343.35/month..."
-User: "List Bishan classes"
-Bot: "For **S3** at Bishan, we offer:
-- EMath: $343.35/month
-- AMath: $397.85/month
-- Chemistry: $343.35/month
-- Physics: $343.35/month
-- Biology: $343.35/month
-
-Would you like details about tutors or schedules?"
-
-🏫 **LOCATIONS & CONTACT:**
-- **5 Locations**: Jurong, Bishan, Punggol, Kovan, Marine Parade
-- **Main Line**: 6222 8222
-- **Website**: www.rmss.com.sg
-
-📚 **DETAILED CLASS INFORMATION (2026):**
-
-**Primary (P2-P6):**
-- P2: $261.60/month (Math, English, Chinese) - 1 lesson/week × 2 hours
-- P3: $277.95/month (All subjects) - 1 lesson/week × 2 hours
-- P4: Math $332.45 (2 lessons/week × 1.5 hours), Others $288.85/month (1 lesson/week × 2 hours)
-- P5: Math $346.62 (2 lessons/week × 1.5 hours), Science $303.02, Languages $299.75/month (1 lesson/week × 2 hours)
-- P6: Math $357.52 (2 lessons/week × 1.5 hours), Science $313.92, Languages $310.65/month (1 lesson/week × 2 hours)
-
-**Secondary (S1-S4):**
-- S1: Math $370.60 (2 × 1.5 hours/week), Science $327, English $321.55, Chinese $321.55/month
-- S2: Math $381.50 (2 × 1.5 hours/week), Science $327, English $321.55, Chinese $321.55/month
-- S3: 
-  - **EMath**: $343.35/month (Course: $290 + Material: $25 + GST) - 1 lesson/week × 2 hours **[NEW 2026 FORMAT]**
-  - **AMath**: $397.85/month (Course: $340 + Material: $25 + GST) - 2 lessons/week × 1.5 hours each
-  - **Sciences**: $343.35/month - 1 lesson/week × 2 hours
-  - **English/Chinese**: $332.45/month - 1 lesson/week × 2 hours
-- S4:
-  - **EMath**: $408.75/month (Course: $350 + Material: $25 + GST) - 2 lessons/week × 1.5 hours each **[2026: Existing students continue old format]**
-  - **AMath**: $408.75/month (Course: $350 + Material: $25 + GST) - 2 lessons/week × 1.5 hours each
-  - **Sciences**: $343.35/month - 1 lesson/week × 2 hours
-  - **English/Chinese**: $332.45/month - 1 lesson/week × 2 hours
-
-**Junior College (J1-J2):**
-- J1:
-  - **Math**: $401.12/month (Course: $340 + Material: $28 + GST) - 1 lesson/week × 2 hours **[NEW 2026 FORMAT]**
-  - **Chemistry/Physics/Biology/Economics**: $401.12/month - 1 lesson/week × 2 hours
-- J2:
-  - **Math**: $444.72/month (Course: $380 + Material: $28 + GST) - 2 lessons/week × 1.5 hours **[2026: Existing students continue old format]**
-  - **Chemistry/Physics/Biology/Economics**: $412.02/month - 1 lesson/week × 2 hours
-
-⚠️ **IMPORTANT: 2026-2027 TRANSITION FOR EMATH & MATH:**
-
-**2026 (Transition Year):**
-- **S3 EMath**: NEW format - 1 lesson/week × 2 hours
-- **S4 EMath**: OLD format continues for existing 2025 students - 2 lessons/week × 1.5 hours each
-- **J1 Math**: NEW format - 1 lesson/week × 2 hours  
-- **J2 Math**: OLD format continues for existing 2025 students - 2 lessons/week × 1.5 hours
-
-**2027 Onwards (Full Transition):**
-- **ALL EMath (S3 & S4)**: 1 lesson/week × 2 hours
-- **ALL Math (J1 & J2)**: 1 lesson/week × 2 hours
-- Pricing will be updated accordingly for 2027
-
-**When answering student queries:**
-- New S3/J1 students in 2026: Inform them of the NEW 1×2hr format
-- Existing S4/J2 students in 2026: They continue with 2×1.5hr format
-- All students from 2027: Everyone will use 1×2hr format
-
-📅 **2026 DETAILED CALENDAR & SCHEDULE:**
-
-**MAJOR HOLIDAYS (No lessons, no replacement - Black grids):**
-- **Chinese New Year**: February 16, 2026
-- **Hari Raya Puasa**: March 17, 2026
-- **Good Friday**: March 30, 2026 (Note: Calendar shows April 6 as Labour Day)
-- **Labour Day**: April 6, 2026
-- **Hari Raya Haji / Vesak Day**: May 27, 2026
-- **National Day**: August 9, 2026
-- **Deepavali**: November 8, 2026
-- **Christmas Day**: December 25, 2026
-
-**REST WEEKS (No normal lessons - Grey grids):**
-- **June Rest Week**: May 31 - June 7, 2026
-- **December Rest Week / New Year**: December 28-31, 2026 & January 1-3, 2027
-
-**EXAM PREPARATION PERIODS:**
-- **MYE Preparation**: March 16-21, 2026 (No lessons during this period)
-- **FYE Preparation**: September 13-20, 2026 (No lessons during this period)
-
-**HOLIDAY PROGRAMS (Additional lessons may be available - confirm with admin):**
-- **MHP (March Holiday Program)**: Contact admin for 2026 schedule
-- **JHP1 & JHP2 (June Holiday Programs)**: Contact admin for 2026 schedule
-- **SHP (September Holiday Program)**: Contact admin for 2026 schedule
-- **Note**: FREE TRIAL LESSONS usually available during holiday programs! 📞 Call 6222 8222 to inquire
-
-**MONTHLY FEE SETTLEMENT PERIODS (2026):**
-- **January**: January 26 - February 1
-- **February**: February 22-28
-- **March**: March 29 - April 5
-- **April**: April 26-30
-- **May**: May 24-30
-- **June**: June 21-27
-- **July**: July 26 - August 2
-- **August**: August 23-29
-- **September**: September 27 - October 4
-- **October**: October 25-31
-- **November**: November 22-28
-- **December**: December 20-26
-
-**IMPORTANT NOTES:**
-- 🚫 **Black grids** = Public holidays, no lessons and no replacement
-- ⏸️ **Grey grids/Rest weeks** = No normal lessons scheduled
-- ✅ **Holiday programs** = Additional classes may be available, check with admin
-- 💰 **Fee settlement** = Parents must settle fees before they become overdue
-- 🎁 **Free trials** = Usually available during holiday program periods
-
-**CONVERSATION GUIDELINES:**
-
-🎯 **GOLDEN RULES - READ THESE FIRST:**
-1. **ALWAYS REMEMBER CONTEXT** - What level/subject did user just ask about? Use that in follow-ups!
-2. **PREVENT INFORMATION OVERLOAD** - Never dump all subjects for a level at a location. Always ask for subject first!
-3. **BE DIRECT WHEN DATA IS CLEAR** - If a tutor only teaches at one location, show that directly. Don't ask for confirmation about other locations.
-4. **ASK FOR CLARIFICATION WITH SPECIFIC OPTIONS** - When you need clarification, provide specific buttons/options the user can choose from
-5. **PROGRESSIVE DISCLOSURE** - Provide info step by step, not all at once
-6. **CONTEXT-AWARE RESPONSES** - Track what user mentioned in previous messages and use that context
-7. **NEVER EXPOSE TECHNICAL DETAILS** - Don't mention "Firebase", "database", "querying", or any backend systems. Just provide the information naturally.
-8. **WHEN YOU HAVE DATA, SHOW IT** - If Firebase data is provided in your context, present it immediately instead of asking for more details
-
-**ACCEPTABLE COMPREHENSIVE RESPONSES (Show all data):**
-✅ Level + Subject + Location (e.g., "S1 Math at Bishan") → Show ALL tutors teaching that
-✅ Tutor + Location (e.g., "Jackie's classes at Bishan") → Show ALL of that tutor's classes there
-✅ Subject + Location (e.g., "Math classes at Punggol") → Show tutors for all levels of that subject
-
-**TOO BROAD - MUST ASK FOR CLARIFICATION:**
-❌ Level + Location only (e.g., "S1 classes at Bishan") → Ask: "Which subject? Math, Science, English, etc.?"
-❌ Location only (e.g., "Classes at Marine Parade") → Ask: "Which level and subject? For example: P6 Math, S2 Science?"
-❌ "All classes" or "all schedules" → Ask: "Which level and subject would you like to know about?"
-
-**CLARIFICATION STRATEGY:**
-- When you need to clarify level, suggest: "Which level? For example: P6, S1, S2, S3, J1..."
-- When you need to clarify location, suggest: "Which location? Bishan, Punggol, Marine Parade, Jurong, or Kovan?"
-- When you need to clarify subject, list common options: "Which subject? Math, Science, English, Physics, Chemistry, etc."
-- Always make it easy for users to respond with minimal typing
-
-**ENROLLMENT & RESERVATION HANDLING:**
-- When user asks about "enroll", "enrollment", "register", "registration", "sign up", "reserve", "reservation", or "how to join":
-  - Respond: "Great! I can help you with enrollment. Please click the **Enrollment Form** button below to fill in your details, and our admin team will contact you shortly with more information. 😊"
-  - Then show: [Enrollment Form Button]
-- NEVER ask users to call for enrollment - always direct them to the enrollment form first
-
-**SPECIFIC RULES FOR TUTOR QUERIES:**
-- When user asks about a specific tutor's classes, check the data provided
-- If MULTIPLE tutors match (e.g., "Sean" matches Sean Tan, Sean Yeo, Sean Phua), list ALL options and ask which one
-- If only ONE tutor matches, proceed directly with their information
-- If tutor teaches at ONLY ONE location, show those classes directly without asking
-- Be confident and direct with clear information
-
-7. **Ask clarifying questions** - "Which level?" "Which location?" "Which subject?" - BUT ONLY if the data shows multiple options
-8. **Use emojis** appropriately (📚 🏫 👨‍🏫 💰 📅 🚫 ⏸️ ✅🎁)
-9. **Suggest next steps** - "Would you like to know about tutors?" "Call 6222 8222 for enrollment"
-10. **Format clearly** - Use line breaks, bold pricing (**$XXX.XX/month**)
-11. **Explain transition** - When asked about S3/S4 EMath or J1/J2 Math differences, clearly explain the 2026-2027 transition
-12. **Calendar queries** - When asked about holidays/schedules:
-   - Differentiate between black grids (no lessons, no replacement), grey grids (no normal lessons), and holiday programs
-   - Mention fee settlement periods when relevant
-   - Highlight free trial availability during holiday programs
-   - Encourage contacting admin (6222 8222) for specific holiday program schedules
-
-**EXAMPLE:**
-User: "P6 math Mr Eugene"
-You see 3 classes for Eugene Tan at Punggol in the data.
-Response: "Mr. Eugene Tan teaches P6 Math at Punggol. Here are all the class options:
-
-📚 **Class A**: WED 7:00pm-8:30pm + FRI 5:30pm-7:00pm - **$357.52/month**
-📚 **Class B**: TUE 7:30pm-9:00pm + SUN 10:00am-11:30am - **$357.52/month**  
-📚 **Class C**: MON 7:30pm-9:00pm + SAT 12:00pm-1:30pm - **$357.52/month**
-
-All classes are 2 sessions per week. Would you like to enroll?"
-You: "Great! P6 Math is **$357.52/month** (Course $310 + Material $18 + GST).
-📚 Classes are 2 lessons/week × 1.5 hours each.
-🏫 Available at all 5 locations: Jurong, Bishan, Punggol, Kovan, and Marine Parade.
-
-Which location works best for you? I can share specific tutors! 😊"
-
-User: "Why are S3 and S4 EMath different?"
-You: "Great question! 📚 We're transitioning to a new format in 2026-2027:
-
-🆕 **S3 EMath (2026)**: NEW format - 1 lesson/week × 2 hours ($343.35/month)
-📋 **S4 EMath (2026)**: Existing students continue OLD format - 2 lessons/week × 1.5 hours ($408.75/month)
-
-From **2027 onwards**, all EMath classes (S3 & S4) will use the new 1×2hr format. This gives current students continuity while new students start with the improved schedule! 
-
-Are you enrolling for S3 or S4?"
-
-User: "Tell me about S3 EMath"
-You: "NEW For **S3 EMath** in 2026, the format has transitioned to **1 lesson/week × 2 hours**. The monthly fee is **$343.35** (Course: $290 + Material: $25 + GST).
-
-Are you considering enrolling for S3? Let me know if you'd like more information! 😊"
-
-User: "list the bishan classes available"
-You: "For **S3** at Bishan (since you're asking about S3), we offer:
-
-📚 **Secondary 3 Classes:**
-- **EMath**: $343.35/month - 1 lesson/week × 2 hours
-- **AMath**: $397.85/month - 2 lessons/week × 1.5 hours
-- **Chemistry**: $343.35/month - 1 lesson/week × 2 hours
-- **Physics**: $343.35/month - 1 lesson/week × 2 hours
-- **Biology**: $343.35/month - 1 lesson/week × 2 hours
-- **English**: $332.45/month - 1 lesson/week × 2 hours
-- **Chinese**: $332.45/month - 1 lesson/week × 2 hours
-
-Would you like to know about specific tutors at Bishan or other details? 😊"
-
-User: "When are the 2026 holidays?"
-You: "📅 Here are the **2026 major holidays** (no lessons, no replacement):
-
-🚫 **CNY**: Feb 16
-🚫 **Hari Raya Puasa**: Mar 17
-🚫 **Labour Day**: Apr 6
-🚫 **Hari Raya Haji/Vesak Day**: May 27
-🚫 **National Day**: Aug 9
-🚫 **Deepavali**: Nov 8
-🚫 **Christmas**: Dec 25
-
-We also have:
-⏸️ **Rest Weeks**: May 31-Jun 7, Dec 28-31
-📚 **Exam Prep**: MYE (Mar 16-21), FYE (Sep 13-20)
-
-During holiday programs (MHP, JHP, SHP), we often have **FREE trial lessons**! 🎁 Call 6222 8222 for details.
-
-Would you like to know about fee settlement periods or specific class schedules?"
-"""
+    if _schedule_index['index'] is not None and time.monotonic() - _schedule_index['loaded_at'] < SCHEDULE_INDEX_TTL_SECONDS:
+        return _schedule_index['index']
+    try:
+        index = ScheduleIndex.build((doc.id, doc.to_dict()) for doc in firebase_db.collection('classes').stream())
+        _schedule_index['index'] = index
+        _schedule_index['loaded_at'] = time.monotonic()
+        logger.info(f"Schedule index loaded - {len(index)} classes, {len(index.skipped)} unparsed schedules")
+    except Exception as e:
+        logger.error(f"Error loading schedule index: {str(e)}")
+    return _schedule_index['index']
 
 @api_router.post("/tuition/chat", response_model=TuitionChatResponse)
 async def tuition_demo_chat(request: TuitionChatRequest):
     """
     Tuition Centre Demo Chat endpoint with context memory and Firebase integration.
     Specifically designed for the tuition demo page.
+    The system prompt is a fixed prefix; reference notes and the matching catalog rows
+    are retrieved per turn and sent in the user message (see tuition_retrieval.py).
+    Structured lookups and clarifications skip the LLM (see tuition_fast_path.py).
     """
     try:
         # Generate or use existing session ID
@@ -1152,531 +966,58 @@ async def tuition_demo_chat(request: TuitionChatRequest):
         # Get or create conversation history
         if session_id not in tuition_sessions:
             tuition_sessions[session_id] = []
-        
-        # Build context from conversation history (last 4 exchanges)
-        context_enhancement = ""
         history = tuition_sessions[session_id]
         
-        if history:
-            context_enhancement = "\n\n**CONVERSATION CONTEXT:**\n"
-            for msg in history[-4:]:
-                context_enhancement += f"User: {msg['user']}\n"
-                context_enhancement += f"Assistant: {msg['assistant'][:150]}...\n"
-        
-        # Check if we need to query Firebase for specific data
-        user_message_lower = request.message.lower()
-        firebase_context = ""
-        
-        # Detect specific queries that need Firebase data
-        needs_firebase = any([
-            'tutor' in user_message_lower or 'teacher' in user_message_lower,
-            'class' in user_message_lower and any(loc in user_message_lower for loc in ['bishan', 'punggol', 'marine parade', 'marine', 'jurong', 'kovan']),
-            'schedule' in user_message_lower or 'when' in user_message_lower or 'time' in user_message_lower,
-            any(level in user_message_lower for level in ['p2', 'p3', 'p4', 'p5', 'p6', 's1', 's2', 's3', 's4', 'j1', 'j2']),
-            any(name in user_message_lower for name in ['mr', 'ms', 'mrs', 'mdm', 'miss']),
-            # Also trigger if location is mentioned (for follow-up queries)
-            any(loc in user_message_lower for loc in ['bishan', 'punggol', 'marine parade', 'marine', 'jurong', 'kovan']),
-            # Trigger on words like "list", "show", "available", "which", "what", "who"
-            any(word in user_message_lower for word in ['list', 'show', 'available', 'which', 'what', 'who', 'all']),
-            # Trigger if subject keywords are mentioned (for follow-up queries like "math" after level+location)
-            any(subj in user_message_lower for subj in ['math', 'maths', 'science', 'english', 'chinese', 'physics', 'chemistry', 'biology', 'emath', 'amath', 'economics', 'econs'])
-        ])
-        
-        logger.info(f"needs_firebase={needs_firebase} for message '{request.message}'")
-        
-        if needs_firebase:
-            # Try to extract level, subject, location from query
-            level = None
-            subject = None
-            location = None
-            tutor_search = None
-            
-            # Try to extract from conversation history if not in current message
-            if history and not any(l in user_message_lower for l in ['p2', 'p3', 'p4', 'p5', 'p6', 's1', 's2', 's3', 's4', 'j1', 'j2']):
-                # Check last user message for level
-                for msg in history[-2:]:  # Check last 2 exchanges
-                    msg_lower = msg['user'].lower()
-                    for l in ['p2', 'p3', 'p4', 'p5', 'p6', 's1', 's2', 's3', 's4', 'j1', 'j2']:
-                        if l in msg_lower:
-                            level = l.upper()
-                            break
-                    if level:
-                        break
-            
-            # Try to extract subject from conversation history if not in current message
-            subject_keywords = ['math', 'maths', 'science', 'english', 'chinese', 'emath', 'e-math', 
-                              'amath', 'a-math', 'physics', 'chemistry', 'biology', 'economics', 'econs']
-            if history and not any(subj in user_message_lower for subj in subject_keywords):
-                # Check last user message and assistant response for subject
-                for msg in history[-2:]:
-                    msg_lower = msg['user'].lower()
-                    assistant_lower = msg.get('assistant', '').lower()
-                    combined = msg_lower + ' ' + assistant_lower
-                    
-                    if 'emath' in combined or 'e-math' in combined or 'e math' in combined:
-                        subject = 'EMath'
-                        break
-                    elif 'amath' in combined or 'a-math' in combined or 'a math' in combined:
-                        subject = 'AMath'
-                        break
-                    elif 'math' in combined or 'maths' in combined:
-                        subject = 'Math'
-                        break
-                    elif 'science' in combined:
-                        subject = 'Science'
-                        break
-                    elif 'physics' in combined:
-                        subject = 'Physics'
-                        break
-                    elif 'chemistry' in combined:
-                        subject = 'Chemistry'
-                        break
-                    elif 'biology' in combined:
-                        subject = 'Biology'
-                        break
-                    elif 'english' in combined:
-                        subject = 'English'
-                        break
-                    elif 'chinese' in combined:
-                        subject = 'Chinese'
-                        break
-                    elif 'economics' in combined or 'econs' in combined:
-                        subject = 'Economics'
-                        break
-            
-            # Try to extract location from conversation history if not in current message
-            location_keywords = ['bishan', 'punggol', 'marine', 'jurong', 'kovan']
-            if history and not any(loc in user_message_lower for loc in location_keywords):
-                # Check last user message and assistant response for location
-                location_map = {
-                    'bishan': 'Bishan',
-                    'punggol': 'Punggol',
-                    'marine': 'Marine Parade',
-                    'jurong': 'Jurong',
-                    'kovan': 'Kovan'
-                }
-                for msg in history[-2:]:
-                    msg_lower = msg['user'].lower()
-                    assistant_lower = msg.get('assistant', '').lower()
-                    combined = msg_lower + ' ' + assistant_lower
-                    
-                    for key, val in location_map.items():
-                        if key in combined:
-                            location = val
-                            break
-                    if location:
-                        break
-            
-            # Extract level (only if not already found from context)
-            if not level:
-                for l in ['P2', 'P3', 'P4', 'P5', 'P6', 'S1', 'S2', 'S3', 'S4', 'J1', 'J2']:
-                    if l.lower() in user_message_lower:
-                        level = l
-                        break
-            
-            # Extract location (only if not already found from context)
-            if not location:
-                location_map = {
-                    'bishan': 'Bishan',
-                    'punggol': 'Punggol',
-                    'marine': 'Marine Parade',
-                    'jurong': 'Jurong',
-                    'kovan': 'Kovan'
-                }
-                for key, val in location_map.items():
-                    if key in user_message_lower:
-                        location = val
-                        break
-            
-            # Extract subject (only if not already found from context, OR if current message explicitly has it)
-            logger.info(f"Checking subject extraction from current message '{user_message_lower}'")
-            
-            # Check for specific subjects first (AMath, EMath) before generic Math
-            current_message_subject = None
-            
-            # Check AMath first
-            if any(keyword in user_message_lower for keyword in ['amath', 'a-math', 'a math']):
-                current_message_subject = 'AMath'
-                logger.info(f"Found subject 'AMath' from AMath keywords in current message")
-            # Check EMath second
-            elif any(keyword in user_message_lower for keyword in ['emath', 'e-math', 'e math']):
-                current_message_subject = 'EMath'
-                logger.info(f"Found subject 'EMath' from EMath keywords in current message")
-            # Check other subjects
-            elif any(keyword in user_message_lower for keyword in ['math', 'maths', 'mathematics']):
-                current_message_subject = 'Math'
-                logger.info(f"Found subject 'Math' from Math keywords in current message")
-            elif 'science' in user_message_lower:
-                current_message_subject = 'Science'
-                logger.info(f"Found subject 'Science' in current message")
-            elif 'physics' in user_message_lower:
-                current_message_subject = 'Physics'
-                logger.info(f"Found subject 'Physics' in current message")
-            elif 'chemistry' in user_message_lower:
-                current_message_subject = 'Chemistry'
-                logger.info(f"Found subject 'Chemistry' in current message")
-            elif 'biology' in user_message_lower:
-                current_message_subject = 'Biology'
-                logger.info(f"Found subject 'Biology' in current message")
-            elif 'english' in user_message_lower:
-                current_message_subject = 'English'
-                logger.info(f"Found subject 'English' in current message")
-            elif 'chinese' in user_message_lower:
-                current_message_subject = 'Chinese'
-                logger.info(f"Found subject 'Chinese' in current message")
-            elif any(keyword in user_message_lower for keyword in ['economics', 'econs']):
-                current_message_subject = 'Economics'
-                logger.info(f"Found subject 'Economics' in current message")
+        started = time.perf_counter()
+        
+        # Retrieve only what this turn needs
+        aliases = await asyncio.to_thread(load_tutor_aliases)
+        intent = extract_intent(request.message, history, aliases)
+        catalog = ""
+        facts = {'clarify': None, 'classes': [], 'tutors': [], 'candidates': []}
+        if needs_catalog(request.message, aliases):
+            catalog, facts = await asyncio.to_thread(
+                catalog_context, intent, request.message, query_firebase_classes, query_firebase_tutors
+            )
+        
+        logger.debug(f"Tuition intent: {intent}, clarify: {facts['clarify']}, classes: {len(facts['classes'])}")
+        
+        # Structured lookups and clarifications are answered from templates without the LLM
+        fast_answer = None
+        if TUITION_FAST_PATH_ENABLED:
+            fast_answer = await asyncio.to_thread(
+                fast_path_answer, request.message, intent, facts, query_firebase_classes
+            )
+        
+        tokens = {}
+        if fast_answer:
+            response_text = fast_answer['text']
+            record_chat_turn("tuition_chat", "fast_path", fast_answer['kind'])
+        else:
+            notes = reference_notes(intent, request.message, bool(facts['classes']))
+            user_turn = build_user_turn(request.message, notes, catalog, history)
             
-            if not current_message_subject:
-                logger.info("No subject found in current message")
-            # Use current message subject if found, otherwise keep context subject
-            if current_message_subject:
-                subject = current_message_subject
+            # Initialize LLM Chat
+            chat = LlmChat(
+                api_key=EMERGENT_API_KEY,
+                session_id=session_id,
+                system_message=TUITION_SYSTEM_PREFIX
+            )
             
-            logger.info(f"After extraction - Level: {level}, Subject: {subject}, Location: {location}")
+            # Use gpt-4o-mini model
+            chat.with_model("openai", "gpt-4o-mini")
             
-            # Extract tutor name - improved detection (works with or without titles)
-            tutor_search = None
-            tutor_search_list = []  # To handle multiple names like "Sean Tan Phua"
+            user_message = UserMessage(text=user_turn['text'])
+            assistant_response = await chat.send_message(user_message)
             
-            if any(title in user_message_lower for title in ['mr', 'ms', 'mrs', 'mdm', 'miss', 'dr']):
-                words = request.message.split()
-                for i, word in enumerate(words):
-                    word_lower = word.lower().replace(',', '').replace('.', '')
-                    if word_lower in ['mr', 'ms', 'mrs', 'mdm', 'miss', 'dr'] and i + 1 < len(words):
-                        # Get next 1-2 words as name (but skip level/subject keywords)
-                        name_parts = []
-                        skip_words = ['teach', 'teaches', 'class', 'classes', 'at', 'in', 'for', 'the', 'schedules', 'schedule',
-                                    'p2', 'p3', 'p4', 'p5', 'p6', 's1', 's2', 's3', 's4', 'j1', 'j2',
-                                    'math', 'science', 'english', 'chinese', 'physics', 'chemistry', 'biology']
-                        for j in range(i+1, min(i+3, len(words))):
-                            next_word = words[j].replace(',', '').replace('.', '')
-                            if next_word.lower() not in skip_words:
-                                name_parts.append(next_word)
-                            else:
-                                break
-                        if name_parts:
-                            tutor_search = ' '.join(name_parts)
-                            break
-            else:
-                # Try to detect tutor names without titles (common tutor names)
-                common_tutor_names = ['eugene', 'sean', 'david', 'john', 'pang', 'zhang', 'tan', 'liew', 'ang', 'cao', 'jackie', 'ronnie', 
-                                     'leonard', 'benjamin', 'winston', 'alman', 'franklin', 'zech', 'desmond', 'melissa', 'victor', 
-                                     'johnson', 'jason', 'wong', 'cheong', 'deborah', 'jade', 'hannah', 'omar', 'kang', 'chan', 
-                                     'joel', 'kenji', 'lim', 'samuel', 'alan', 'aaron', 'lin', 'teo', 'huang', 'kai', 'ning', 'ong', 'koh', 'phua']
-                
-                words = request.message.lower().split()
-                skip_words = ['teach', 'teaches', 'class', 'classes', 'at', 'in', 'for', 'the', 'schedules', 'schedule', 
-                             'math', 'maths', 'science', 'english', 'chinese', 'physics', 'chemistry', 'biology',
-                             'p2', 'p3', 'p4', 'p5', 'p6', 's1', 's2', 's3', 's4', 'j1', 'j2']
-                
-                # Check if multiple tutor names appear (e.g., "Sean Tan Phua" should extract both "sean tan" and "phua")
-                found_names = []
-                i = 0
-                while i < len(words):
-                    clean_word = words[i].replace(',', '').replace('.', '')
-                    if clean_word in common_tutor_names:
-                        # Found a potential name, get next word too (if it's not a skip word)
-                        name_parts = [clean_word]
-                        if i + 1 < len(words):
-                            next_word = words[i+1].replace(',', '').replace('.', '')
-                            if next_word not in skip_words:
-                                if next_word in common_tutor_names:
-                                    # This could be a second name (e.g., "Sean Tan Phua" -> "tan" and "phua" both match)
-                                    # Add first name combination
-                                    found_names.append(' '.join(name_parts))
-                                    # Check if next word forms another name
-                                    name_parts = [next_word]
-                                    i += 1
-                                else:
-                                    name_parts.append(next_word)
-                        found_names.append(' '.join(name_parts))
-                        i += 1
-                    else:
-                        i += 1
-                
-                # If we found multiple potential names, set them as a list
-                if len(found_names) > 1:
-                    tutor_search_list = found_names
-                    tutor_search = ' '.join(found_names)  # Combined for initial search
-                elif len(found_names) == 1:
-                    tutor_search = found_names[0]
+            # Extract response text
+            response_text = assistant_response
+            if hasattr(assistant_response, 'content') and len(assistant_response.content) > 0:
+                response_text = assistant_response.content[0].text
             
-            # Query Firebase for classes
-            if level or subject or location or tutor_search:
-                logger.info(f"Querying Firebase - Level: {level}, Subject: {subject}, Location: {location}, Tutor: {tutor_search} (from context: level={level}, subject={subject})")
-                
-                # Check if query is too broad (level + location but no subject and no tutor)
-                # BUT ONLY if we don't have subject/level from context
-                # This prevents blocking queries where context provides the missing info
-                is_too_broad = False
-                
-                if level and subject and not location and not tutor_search:
-                    # Level + Subject without location - ASK FOR LOCATION
-                    # This prevents dumping all locations for something like "S3 AMath"
-                    is_too_broad = True
-                    firebase_context = f"\n\n**QUERY TOO BROAD - ASK FOR CLARIFICATION:**\n"
-                    firebase_context += f"User asked about {level} {subject} classes, but didn't specify a location.\n"
-                    firebase_context += f"We have classes at 5 locations: Bishan, Punggol, Marine Parade, Jurong, and Kovan.\n\n"
-                    firebase_context += f"**YOU MUST ASK**: 'Which location would you like to know about for {level} {subject}? We have classes at:\n"
-                    firebase_context += f"- Bishan\n- Punggol\n- Marine Parade\n- Jurong\n- Kovan\n\n"
-                    firebase_context += f"Or would you like to see all locations?'\n\n"
-                    firebase_context += f"**DO NOT query or show class data yet** - wait for location specification.\n"
-                    classes = []
-                elif level and location and not subject and not tutor_search:
-                    # Level + Location without subject - check if this is from explicit query or context
-                    # If both are from context (conversation history), this is acceptable
-                    # Only block if user explicitly asked for "all [level] classes at [location]"
-                    words_in_query = user_message_lower.split()
-                    explicitly_broad = any(word in words_in_query for word in ['all', 'every', 'show', 'list']) and level.lower() in user_message_lower
-                    
-                    if explicitly_broad:
-                        is_too_broad = True
-                        firebase_context = f"\n\n**QUERY TOO BROAD - ASK FOR CLARIFICATION:**\n"
-                        firebase_context += f"User asked about {level} classes at {location}, but didn't specify a subject.\n"
-                        firebase_context += f"This would return classes for Math, Science, English, Chinese, Physics, Chemistry, Biology, etc. - too much information!\n\n"
-                        firebase_context += f"**YOU MUST ASK**: 'Which subject would you like to know about for {level} at {location}? For example: Math, Science, English, Chinese"
-                        if level in ['S3', 'S4']:
-                            firebase_context += f", EMath, AMath, Physics, Chemistry, Biology"
-                        elif level in ['J1', 'J2']:
-                            firebase_context += f", Math, Physics, Chemistry, Biology, Economics"
-                        firebase_context += f"?'\n\n"
-                        firebase_context += f"**DO NOT query or show class data yet** - wait for subject specification.\n"
-                        classes = []
-                elif location and not level and not subject and not tutor_search:
-                    # Only location specified - way too broad
-                    is_too_broad = True
-                    firebase_context = f"\n\n**QUERY TOO BROAD - ASK FOR CLARIFICATION:**\n"
-                    firebase_context += f"User asked about classes at {location}, but didn't specify level or subject.\n"
-                    firebase_context += f"**YOU MUST ASK**: 'Which level and subject would you like to know about at {location}? For example: P6 Math, S2 Science, J1 Physics?'\n\n"
-                    firebase_context += f"**DO NOT query or show class data yet** - wait for more specific information.\n"
-                    classes = []
-                
-                if not is_too_broad:
-                    # Query is specific enough
-                    classes = query_firebase_classes(level, subject, location, limit=30)
-                
-                # If we have a tutor search, filter classes by tutor name
-                if tutor_search and classes:
-                    logger.info(f"Filtering {len(classes)} classes by tutor: {tutor_search}")
-                    tutor_search_lower = tutor_search.lower()
-                    filtered_classes = []
-                    matching_tutors = set()  # Track unique tutors that match
-                    
-                    # Check if query contains multiple potential tutor names (e.g., "Sean Tan Phua")
-                    # This means user might be asking about multiple people
-                    potential_separate_tutors = []
-                    if 'tan' in tutor_search_lower and 'phua' in tutor_search_lower:
-                        # Could be "Sean Tan" OR "Sean Phua"
-                        potential_separate_tutors = ['tan', 'phua']
-                    elif 'yeo' in tutor_search_lower and 'tan' in tutor_search_lower:
-                        potential_separate_tutors = ['yeo', 'tan']
-                    
-                    for cls in classes:
-                        tutor_name = cls.get('tutor_base_name', cls.get('tutor_name', '')).lower()
-                        
-                        # Check if this matches
-                        if tutor_search_lower in tutor_name or any(part in tutor_name for part in tutor_search_lower.split()):
-                            filtered_classes.append(cls)
-                            matching_tutors.add(cls.get('tutor_base_name', cls.get('tutor_name', '')))
-                    
-                    # If multiple distinct last names in query, check if they match different tutors
-                    if potential_separate_tutors and len(matching_tutors) > 1:
-                        # User might be asking about multiple people - need clarification
-                        tutor_list = ", ".join(sorted(matching_tutors))
-                        firebase_context = f"\n\n**AMBIGUOUS QUERY - MULTIPLE TUTORS DETECTED:**\n"
-                        firebase_context += f"The query appears to mention multiple tutor names: '{tutor_search}'.\n"
-                        firebase_context += f"This could refer to different tutors:\n\n"
-                        for tutor_name in sorted(matching_tutors):
-                            firebase_context += f"• {tutor_name}\n"
-                        firebase_context += f"\n**IMPORTANT**: Ask the user which specific tutor they mean. Example: 'I found multiple tutors that could match your query. Did you mean {tutor_list}? Please specify which one.'\n"
-                        classes = []  # Don't show classes yet
-                    else:
-                        classes = filtered_classes
-                        logger.info(f"Filtered to {len(classes)} classes with {len(matching_tutors)} unique tutors")
-                        
-                        # If multiple tutors match (e.g., "Sean" matches Sean Tan, Sean Yeo, Sean Phua)
-                        if len(matching_tutors) > 1:
-                            tutor_list = ", ".join(sorted(matching_tutors))
-                            firebase_context = f"\n\n**MULTIPLE TUTORS FOUND:**\n"
-                            firebase_context += f"The name '{tutor_search}' matches {len(matching_tutors)} different tutors:\n\n"
-                            for tutor_name in sorted(matching_tutors):
-                                tutor_classes = [c for c in classes if c.get('tutor_base_name', c.get('tutor_name', '')) == tutor_name]
-                                firebase_context += f"• {tutor_name} ({len(tutor_classes)} classes)\n"
-                            firebase_context += f"\n**IMPORTANT**: Ask the user to clarify which tutor they mean. List the options above and ask them to specify the full name.\n"
-                            firebase_context += f"Example: 'I found multiple tutors named {tutor_search}. Which one would you like to know about: {tutor_list}?'\n"
-                        elif classes:
-                            # Group classes by location for proper presentation
-                            # For a specific tutor query, we group by location and check if they have multiple classes
-                            classes_by_location = {}
-                            for cls in classes[:15]:
-                                loc = cls.get('location')
-                                if loc not in classes_by_location:
-                                    classes_by_location[loc] = []
-                                classes_by_location[loc].append(cls)
-                            
-                            firebase_context = "\n\n**AVAILABLE CLASSES - SHOW ALL BY LOCATION:**\n\n"
-                            tutor_name = classes[0].get('tutor_base_name', classes[0].get('tutor_name', ''))
-                            
-                            for location, location_classes in classes_by_location.items():
-                                firebase_context += f"**At {location}:**\n"
-                                
-                                # Check if this is ONE tutor with multiple classes of same level/subject
-                                # Group by level and subject to detect multiple classes
-                                level_subject_groups = {}
-                                for cls in location_classes:
-                                    key = f"{cls.get('level')}_{cls.get('subject')}"
-                                    if key not in level_subject_groups:
-                                        level_subject_groups[key] = []
-                                    level_subject_groups[key].append(cls)
-                                
-                                # Display each level/subject group
-                                for key, group_classes in level_subject_groups.items():
-                                    level, subject = key.split('_')
-                                    firebase_context += f"  **{level} {subject}**:\n"
-                                    
-                                    # Only use Class A, B, C if there are multiple classes of SAME level/subject
-                                    if len(group_classes) > 1:
-                                        for idx, cls in enumerate(group_classes):
-                                            variant_label = chr(65 + idx)  # A, B, C, etc.
-                                            schedule_str = " + ".join([f"{s.get('day')} {s.get('time')}" for s in cls.get('schedule', [])])
-                                            firebase_context += f"    Class {variant_label}: {schedule_str} - ${cls.get('monthly_fee')}/month\n"
-                                    else:
-                                        # Single class for this level/subject
-                                        cls = group_classes[0]
-                                        schedule_str = " + ".join([f"{s.get('day')} {s.get('time')}" for s in cls.get('schedule', [])])
-                                        firebase_context += f"    {schedule_str} - ${cls.get('monthly_fee')}/month\n"
-                                firebase_context += "\n"
-                            
-                            firebase_context += f"**CRITICAL INSTRUCTIONS:**\n"
-                            firebase_context += f"1. **YOU MUST USE THIS DATA** - The above schedule information is from our live database. Show this data to the user immediately.\n"
-                            firebase_context += f"2. Present classes grouped by LOCATION and LEVEL/SUBJECT as shown above\n"
-                            firebase_context += f"3. {tutor_name} ONLY teaches at: {', '.join(sorted(classes_by_location.keys()))}\n"
-                            firebase_context += f"4. Only use 'Class A, B, C' labels when the SAME tutor has MULTIPLE classes of the SAME level/subject at the SAME location\n"
-                            firebase_context += f"5. If only one class per level/subject at a location, just show the schedule WITHOUT variant labels\n"
-                            firebase_context += f"6. Always show COMPLETE schedules with ALL session days and times (separated by +)\n"
-                            firebase_context += f"7. Never mention 'database', 'Firebase', 'querying', or any technical terms\n"
-                            firebase_context += f"8. When listing classes, show the complete schedule for each one with tutor names\n"
-                            firebase_context += f"9. **DO NOT ask for more clarification** if you have this data - present it directly!\n"
-                elif classes:
-                    logger.info(f"Found {len(classes)} classes, formatting for LLM")
-                    
-                    # First, remove duplicate classes (same tutor, schedule, price at same location)
-                    unique_classes = []
-                    seen = set()
-                    for cls in classes:
-                        key = f"{cls.get('tutor_base_name')}_{cls.get('location')}_{str(cls.get('schedule'))}_{cls.get('monthly_fee')}"
-                        if key not in seen:
-                            seen.add(key)
-                            unique_classes.append(cls)
-                    
-                    logger.info(f"After removing duplicates: {len(unique_classes)} unique classes")
-                    
-                    # Group classes by location for proper presentation
-                    classes_by_location = {}
-                    for cls in unique_classes[:30]:  # Increased limit after deduplication
-                        loc = cls.get('location')
-                        if loc not in classes_by_location:
-                            classes_by_location[loc] = []
-                        classes_by_location[loc].append(cls)
-                    
-                    # Build the EXACT response text that must be shown
-                    if location:
-                        exact_response = f"For **{level if level else 'this level'} {subject if subject else 'this subject'}** at **{location}**, we offer the following classes:\n\n"
-                    else:
-                        exact_response = f"For **{level if level else 'this level'} {subject if subject else 'this subject'}** across all locations, we offer the following classes:\n\n"
-                    
-                    for loc, location_classes in classes_by_location.items():
-                        if len(classes_by_location) > 1:
-                            exact_response += f"**At {loc}:**\n"
-                        
-                        # Group by tutor
-                        classes_by_tutor = {}
-                        for cls in location_classes:
-                            tutor = cls.get('tutor_base_name', cls.get('tutor_name', ''))
-                            if tutor not in classes_by_tutor:
-                                classes_by_tutor[tutor] = []
-                            classes_by_tutor[tutor].append(cls)
-                        
-                        for tutor, tutor_classes in classes_by_tutor.items():
-                            # Remove duplicate schedules (same schedule, same price)
-                            unique_classes = []
-                            seen_schedules = set()
-                            for cls in tutor_classes:
-                                schedule_key = str(cls.get('schedule')) + str(cls.get('monthly_fee'))
-                                if schedule_key not in seen_schedules:
-                                    seen_schedules.add(schedule_key)
-                                    unique_classes.append(cls)
-                            
-                            if len(unique_classes) == 1:
-                                # Single class (or duplicates removed)
-                                cls = unique_classes[0]
-                                schedule_str = " + ".join([f"{s.get('day')} {s.get('time')}" for s in cls.get('schedule', [])])
-                                exact_response += f"📚 **{tutor}**: {schedule_str} - **${cls.get('monthly_fee')}/month**\n\n"
-                            else:
-                                # Multiple DIFFERENT classes from same tutor
-                                exact_response += f"📚 **{tutor}**:\n"
-                                for idx, cls in enumerate(unique_classes):
-                                    variant_label = chr(65 + idx)
-                                    schedule_str = " + ".join([f"{s.get('day')} {s.get('time')}" for s in cls.get('schedule', [])])
-                                    exact_response += f"  Class {variant_label}: {schedule_str} - ${cls.get('monthly_fee')}/month\n"
-                                exact_response += "\n"
-                        exact_response += "\n"
-                    
-                    exact_response += "Would you like more details about any specific tutor? Or would you like to **enroll/make a reservation**? 😊"
-                    
-                    logger.info(f"Built exact response with {len(classes_by_tutor)} tutors")
-                    logger.info(f"First 200 chars: {exact_response[:200]}")
-                    
-                    firebase_context = f"\n\n**🚨 MANDATORY - PRESENT THIS EXACT RESPONSE:**\n\n"
-                    firebase_context += f"```\n{exact_response}\n```\n\n"
-                    firebase_context += f"**CRITICAL INSTRUCTION**: Present the text above EXACTLY as written. This is the complete answer to the user's query. DO NOT ask for more information. DO NOT rephrase it. Just show it.\n"
-                else:
-                    logger.warning(f"No classes found for query - Level: {level}, Subject: {subject}, Location: {location}, Tutor: {tutor_search}")
-            
-            # If specifically asking about a tutor by name
-            if tutor_search and not classes:
-                tutors = query_firebase_tutors(tutor_search, limit=5)
-                if tutors:
-                    firebase_context += "\n**TUTOR INFORMATION:**\n"
-                    for tutor in tutors:
-                        firebase_context += f"- {format_tutor_info(tutor)}\n"
-                    firebase_context += "\nPresent this information naturally in your response.\n"
-        
-        # Combine system message with context (but NOT firebase_context - that goes in user message)
-        enhanced_system_msg = TUITION_SYSTEM_MESSAGE + context_enhancement
-        
-        # Initialize LLM Chat
-        chat = LlmChat(
-            api_key=EMERGENT_API_KEY,
-            session_id=session_id,
-            system_message=enhanced_system_msg
-        )
-        
-        # Use gpt-4o-mini model
-        chat.with_model("openai", "gpt-4o-mini")
-        
-        # Create user message - if we have firebase_context with exact response, prepend it to user query
-        actual_user_message = request.message
-        if firebase_context and "MANDATORY - PRESENT THIS EXACT RESPONSE" in firebase_context:
-            # Extract the exact response from the firebase_context
-            logger.info(f"Prepending EXACT firebase response to user message (length: {len(firebase_context)})")
-            actual_user_message = firebase_context + "\n\n**User's query**: " + request.message
-        elif firebase_context:
-            # Regular firebase context (not exact response format)
-            logger.info(f"Prepending regular firebase context to user message (length: {len(firebase_context)})")
-            actual_user_message = firebase_context + "\n\n**User's query**: " + request.message
-        else:
-            logger.info("No firebase context to prepend")
-        
-        user_message = UserMessage(text=actual_user_message)
-        assistant_response = await chat.send_message(user_message)
-        
-        # Extract response text
-        response_text = assistant_response
-        if hasattr(assistant_response, 'content') and len(assistant_response.content) > 0:
-            response_text = assistant_response.content[0].text
+            tokens = user_turn['tokens']
+            record_prompt_tokens("tuition_chat", tokens)
+            record_chat_turn("tuition_chat", "llm")
         
         # Save to conversation history
         tuition_sessions[session_id].append({
@@ -1688,7 +1029,17 @@ async def tuition_demo_chat(request: TuitionChatRequest):
         # Generate message ID
         message_id = str(uuid.uuid4())
         
-        logger.info(f"Tuition demo chat request processed - Session: {session_id} - Firebase queried: {bool(firebase_context)}")
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        turn_fields = {"session_id": session_id, "fast_path": bool(fast_answer), "latency_ms": latency_ms}
+        if TUITION_LOG_MESSAGES:
+            # Lets benchmark_tuition_fast_path.py replay real turns
+            turn_fields["tuition_message"] = request.message
+        logger.info(
+            f"Tuition demo chat request processed - Session: {session_id} - "
+            f"{'Fast path: ' + fast_answer['kind'] if fast_answer else 'LLM'} - Catalog rows: {len(facts['classes'])} - "
+            f"Prompt tokens: {sum(tokens.values())} ({', '.join(f'{k} {v}' for k, v in tokens.items())}) - {latency_ms}ms",
+            extra={**turn_fields, "prompt_tokens": sum(tokens.values()), **{f"{k}_tokens": v for k, v in tokens.items()}}
+        )
         
         return TuitionChatResponse(
             response=response_text,
@@ -1702,21 +1053,21 @@ async def tuition_demo_chat(request: TuitionChatRequest):
 
 
 @api_router.get("/tuition/available-locations")
-async def get_available_locations(level: str, subject: str):
+async def get_available_locations(level: str, subject: str, response: Response):
     """
     Get available locations for a specific level and subject combination.
+    Reads one catalog_aggregates document; scans classes only if it has not been built yet.
     """
     try:
-        classes_ref = firebase_db.collection('classes')
-        results = classes_ref.where('level', '==', level).where('subject', '==', subject).stream()
-        
-        locations = set()
-        for doc in results:
-            data = doc.to_dict()
-            locations.add(data.get('location'))
+        locations = await asyncio.to_thread(catalog_aggregates.available_locations, firebase_db, level, subject)
+        if locations is None:
+            classes_ref = firebase_db.collection('classes')
+            results = classes_ref.where('level', '==', level).where('subject', '==', subject).stream()
+            locations = sorted({doc.to_dict().get('location') for doc in results})
         
+        response.headers['Cache-Control'] = f"public, max-age={CATALOG_CACHE_MAX_AGE}"
         return {
-            "locations": sorted(list(locations))
+            "locations": locations
         }
     except Exception as e:
         logger.error(f"Error fetching available locations: {str(e)}")
@@ -1853,83 +1204,244 @@ async def send_enrollment_email(enrollment: EnrollmentRequest):
         return False
 
 
+def build_class_write(op: AdminClassUpdate):
+    """
+    (class_id, document, merge) for catalog_aggregates.save_classes, and a summary for the
+    response. Raises ValueError when the operation is incomplete.
+    """
+    if op.action not in ("add", "update", "delete"):
+        raise ValueError("Invalid action. Use 'add', 'update', or 'delete'")
+    if op.action == "delete":
+        if not op.class_id:
+            raise ValueError("class_id is required for delete")
+        return (op.class_id, None, False), f"Class deleted: {op.class_id}"
+    
+    class_data = op.class_data
+    if class_data is None:
+        raise ValueError(f"class_data is required for {op.action}")
+    
+    # Build schedule
+    schedule = [{'day': class_data.day1, 'time': class_data.time1}]
+    if class_data.day2 and class_data.time2:
+        schedule.append({'day': class_data.day2, 'time': class_data.time2})
+    
+    if op.action == "update":
+        if not op.class_id:
+            raise ValueError("class_id is required for update")
+        fields = {
+            'schedule': schedule,
+            'monthly_fee': class_data.monthly_fee,
+            'sessions_per_week': class_data.sessions_per_week
+        }
+        return (op.class_id, fields, True), f"Class updated: {op.class_id}"
+    
+    missing = [field for field in ('level', 'subject', 'location', 'tutor_name', 'day1', 'time1')
+               if not getattr(class_data, field).strip()]
+    if missing:
+        raise ValueError(f"Missing class fields: {', '.join(missing)}")
+    
+    # Normalize tutor name
+    tutor = normalize_tutor_name(class_data.tutor_name)
+    
+    # Create class ID
+    class_id = f"{class_data.level.lower()}_{class_data.subject.lower()}_{class_data.location.lower().replace(' ', '_')}_{tutor.tutor_id}"
+    
+    # Create class document
+    class_doc = {
+        'class_id': class_id,
+        'level': class_data.level,
+        'subject': class_data.subject,
+        'location': class_data.location,
+        'tutor_id': tutor.tutor_id,
+        'tutor_name': class_data.tutor_name,
+        'tutor_base_name': tutor.base_name,
+        'schedule': schedule,
+        'monthly_fee': class_data.monthly_fee,
+        'sessions_per_week': class_data.sessions_per_week
+    }
+    return (class_id, class_doc, False), f"Class added: {tutor.base_name} - {class_data.level} {class_data.subject} at {class_data.location}"
+
+
+def schedule_clashes(index: ScheduleIndex, writes: List[tuple]) -> List[Optional[dict]]:
+    """
+    Clashes each write would add, checked in order as if the earlier ones had landed.
+    'blocking' when the tutor is double-booked or a location with LOCATION_ROOMS set runs out
+    of rooms; other location clashes are only reported.
+    """
+    staged = copy.deepcopy(index) if len(writes) > 1 else index
+    clashes = []
+    for class_id, doc, merge in writes:
+        found = None
+        merged = staged.merged_doc(class_id, doc, merge) if doc is not None else None
+        if merged is not None and merged.get('schedule'):
+            try:
+                found = staged.new_conflicts(merged, class_id)
+            except ValueError as e:
+                raise ValueError(f"Cannot parse schedule: {str(e)}")
+            found['blocking'] = bool(found['tutor']) or (merged.get('location') in staged.rooms and bool(found['location']))
+        clashes.append(found)
+        if len(writes) > 1:
+            staged.apply_write(class_id, doc, merge)
+    return clashes
+
+
+def invalidate_catalog_caches():
+    """Drop cached catalog views after class writes: dropdown aggregates and the chat's tutor alias table"""
+    catalog_aggregates.aggregate_cache.clear()
+    _tutor_aliases['loaded_at'] = 0.0
+
+
 @api_router.post("/admin/manage-class")
 async def admin_manage_class(request: AdminClassUpdate):
     """
     Admin endpoint to add, update, or delete class data.
+    The class and its tutor/location aggregates are written in one transaction.
     Password protected in production.
     """
     try:
-        if request.action == "add":
-            # Add new class
-            class_data = request.class_data
-            
-            # Normalize tutor name
-            tutor_base_name = class_data.tutor_name.replace("Mr ", "").replace("Ms ", "").replace("Mrs ", "").replace("Mdm ", "")
-            if "(DY HOD)" in tutor_base_name:
-                tutor_base_name = tutor_base_name.replace("(DY HOD)", "(DY_HOD)")
-            
-            # Build schedule
-            schedule = [{'day': class_data.day1, 'time': class_data.time1}]
-            if class_data.day2 and class_data.time2:
-                schedule.append({'day': class_data.day2, 'time': class_data.time2})
-            
-            # Create class ID
-            class_id = f"{class_data.level.lower()}_{class_data.subject.lower()}_{class_data.location.lower().replace(' ', '_')}_{tutor_base_name.lower().replace(' ', '_').replace('.', '').replace('(', '').replace(')', '')}"
-            
-            # Create class document
-            class_doc = {
-                'class_id': class_id,
-                'level': class_data.level,
-                'subject': class_data.subject,
-                'location': class_data.location,
-                'tutor_name': class_data.tutor_name,
-                'tutor_base_name': tutor_base_name,
-                'schedule': schedule,
-                'monthly_fee': class_data.monthly_fee,
-                'sessions_per_week': class_data.sessions_per_week
-            }
-            
-            firebase_db.collection('classes').document(class_id).set(class_doc)
-            logger.info(f"✅ Added class: {class_id}")
-            
-            return {"success": True, "message": f"Class added: {tutor_base_name} - {class_data.level} {class_data.subject} at {class_data.location}", "class_id": class_id}
-            
-        elif request.action == "delete":
-            # Delete class
-            firebase_db.collection('classes').document(request.class_id).delete()
-            logger.info(f"🗑️  Deleted class: {request.class_id}")
-            
-            return {"success": True, "message": f"Class deleted: {request.class_id}"}
-            
-        elif request.action == "update":
-            # Update existing class
-            class_data = request.class_data
-            
-            # Build schedule
-            schedule = [{'day': class_data.day1, 'time': class_data.time1}]
-            if class_data.day2 and class_data.time2:
-                schedule.append({'day': class_data.day2, 'time': class_data.time2})
-            
-            # Update document
-            firebase_db.collection('classes').document(request.class_id).update({
-                'schedule': schedule,
-                'monthly_fee': class_data.monthly_fee,
-                'sessions_per_week': class_data.sessions_per_week
-            })
-            
-            logger.info(f"📝 Updated class: {request.class_id}")
-            
-            return {"success": True, "message": f"Class updated: {request.class_id}"}
+        index = await asyncio.to_thread(load_schedule_index)
+        try:
+            write, message = build_class_write(request)
+            clash = schedule_clashes(index, [write])[0] if index else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if clash and clash['blocking'] and not request.allow_conflicts:
+            raise HTTPException(status_code=409, detail={"message": "Schedule clash - resend with allow_conflicts to save anyway",
+                                                         "conflicts": clash})
         
-        else:
-            raise HTTPException(status_code=400, detail="Invalid action. Use 'add', 'update', or 'delete'")
+        try:
+            await asyncio.to_thread(catalog_aggregates.save_classes, firebase_db, [write], False)
+        except catalog_aggregates.ClassWriteError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        if index:
+            index.apply_write(*write)
+        invalidate_catalog_caches()
+        logger.info(f"Admin {request.action} class: {write[0]}")
+        
+        result = {"success": True, "message": message}
+        if request.action == "add":
+            result["class_id"] = write[0]
+        if clash and (clash['tutor'] or clash['location']):
+            result["conflicts"] = clash
+        return result
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in admin class management: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Operations per bulk request, and per transaction when atomic is false
+ADMIN_BULK_MAX_OPERATIONS = int(os.getenv("ADMIN_BULK_MAX_OPERATIONS", "200"))
+ADMIN_BULK_CHUNK_SIZE = int(os.getenv("ADMIN_BULK_CHUNK_SIZE", "50"))
+
+
+def existing_class_ids(class_ids: List[str]) -> set:
+    refs = [firebase_db.collection('classes').document(class_id) for class_id in set(class_ids)]
+    return {snapshot.id for snapshot in firebase_db.get_all(refs) if snapshot.exists}
+
+
+def apply_bulk_writes(writes: List[tuple], atomic: bool) -> List[Optional[str]]:
+    """Error message per write (None = applied). Atomic runs one transaction for everything."""
+    if atomic:
+        catalog_aggregates.save_classes(firebase_db, writes, invalidate=False)
+        return [None] * len(writes)
+    
+    errors: List[Optional[str]] = []
+    for start in range(0, len(writes), ADMIN_BULK_CHUNK_SIZE):
+        chunk = writes[start:start + ADMIN_BULK_CHUNK_SIZE]
+        try:
+            catalog_aggregates.save_classes(firebase_db, chunk, invalidate=False)
+            errors.extend([None] * len(chunk))
+            continue
+        except Exception as e:
+            logger.warning(f"Bulk class chunk failed, retrying one by one: {str(e)}")
+        # Isolate the failing operations so the rest of the chunk still lands
+        for write in chunk:
+            try:
+                catalog_aggregates.save_classes(firebase_db, [write], invalidate=False)
+                errors.append(None)
+            except Exception as e:
+                errors.append(str(e))
+    return errors
+
+
+@api_router.post("/admin/manage-classes")
+async def admin_manage_classes(request: AdminBulkClassUpdate):
+    """
+    Bulk add/update/delete for timetable changes. Every operation is validated before anything
+    is written; with atomic (default) all of them land in one transaction or none do, otherwise
+    they are applied in chunks with a status per operation. Caches are invalidated once at the end.
+    """
+    try:
+        if not request.operations:
+            raise HTTPException(status_code=400, detail="No operations")
+        if len(request.operations) > ADMIN_BULK_MAX_OPERATIONS:
+            raise HTTPException(status_code=400, detail=f"At most {ADMIN_BULK_MAX_OPERATIONS} operations per request")
+        
+        writes, messages, errors = [], [], []
+        for index, op in enumerate(request.operations):
+            try:
+                write, message = build_class_write(op)
+                writes.append(write)
+                messages.append(message)
+            except ValueError as e:
+                errors.append({"index": index, "action": op.action, "error": str(e)})
+        
+        # Updates must target a class that exists or is added earlier in the same request
+        if not errors:
+            known = await asyncio.to_thread(existing_class_ids, [w[0] for w in writes if w[2]])
+            for index, (class_id, doc, merge) in enumerate(writes):
+                if merge and class_id not in known:
+                    errors.append({"index": index, "action": "update", "error": f"Class not found: {class_id}"})
+                elif doc is None:
+                    known.discard(class_id)
+                else:
+                    known.add(class_id)
+        if errors:
+            raise HTTPException(status_code=400, detail={"message": "Validation failed - nothing was written", "errors": errors})
+        
+        index = await asyncio.to_thread(load_schedule_index)
+        try:
+            clashes = schedule_clashes(index, writes) if index else [None] * len(writes)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        blocked = [{"index": i, "action": op.action, "conflicts": clash}
+                   for i, (op, clash) in enumerate(zip(request.operations, clashes))
+                   if clash and clash['blocking'] and not op.allow_conflicts]
+        if blocked:
+            raise HTTPException(status_code=409, detail={"message": "Schedule clash - nothing was written", "errors": blocked})
+        
+        try:
+            write_errors = await asyncio.to_thread(apply_bulk_writes, writes, request.atomic)
+        except catalog_aggregates.ClassWriteError as e:
+            # A class was deleted between validation and the transaction
+            raise HTTPException(status_code=409, detail=f"{str(e)} - nothing was written")
+        finally:
+            invalidate_catalog_caches()
+        
+        results = []
+        for i, (op, write, message, error, clash) in enumerate(zip(request.operations, writes, messages, write_errors, clashes)):
+            if error is None and index:
+                index.apply_write(*write)
+            result = {"index": i, "action": op.action, "class_id": write[0], "success": error is None}
+            result.update({"message": message} if error is None else {"error": error})
+            if clash and (clash['tutor'] or clash['location']):
+                result["conflicts"] = clash
+            results.append(result)
+        applied = sum(1 for r in results if r["success"])
+        logger.info(f"Admin bulk class update: {applied}/{len(results)} applied (atomic={request.atomic})")
+        
+        return {"success": applied == len(results), "applied": applied, "failed": len(results) - applied, "results": results}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in admin bulk class management: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @api_router.get("/admin/search-classes")
 async def admin_search_classes(level: str = None, subject: str = None, location: str = None, tutor: str = None):
     """
@@ -1948,10 +1460,19 @@ async def admin_search_classes(level: str = None, subject: str = None, location:
         
         results = query.limit(100).stream()
         
+        # Resolve the tutor through the alias table ("eugene", "Mr Eugene Tan (B)"), else match text
+        tutor_ids = set()
+        if tutor:
+            aliases = await asyncio.to_thread(load_tutor_aliases)
+            tutor_ids = set(aliases.lookup(tutor)) if aliases else set()
+        
         classes = []
         for doc in results:
             data = doc.to_dict()
-            if tutor:
+            if tutor_ids:
+                if class_tutor_id(data) in tutor_ids:
+                    classes.append(data)
+            elif tutor:
                 if tutor.lower() in data.get('tutor_base_name', '').lower():
                     classes.append(data)
             else:
@@ -1965,26 +1486,23 @@ async def admin_search_classes(level: str = None, subject: str = None, location:
 
 
 @api_router.get("/admin/available-tutors")
-async def get_available_tutors(level: str, subject: str, location: str):
+async def get_available_tutors(level: str, subject: str, location: str, response: Response):
     """
     Get list of unique tutors teaching a specific level+subject at a location.
     Returns only unique tutor names (no duplicates, no A/B suffixes).
+    Reads one catalog_aggregates document; scans classes only if it has not been built yet.
     """
     try:
-        classes_ref = firebase_db.collection('classes')
-        results = classes_ref.where('level', '==', level).where('subject', '==', subject).where('location', '==', location).stream()
-        
-        tutors = set()
-        for doc in results:
-            data = doc.to_dict()
+        tutors = await asyncio.to_thread(catalog_aggregates.available_tutors, firebase_db, level, subject, location)
+        if tutors is None:
+            classes_ref = firebase_db.collection('classes')
+            results = classes_ref.where('level', '==', level).where('subject', '==', subject).where('location', '==', location).stream()
             # Use tutor_base_name to avoid A/B suffixes, fallback to tutor_name
-            tutor_name = data.get('tutor_base_name', data.get('tutor_name', ''))
-            if tutor_name:
-                tutors.add(tutor_name)
+            tutors = sorted({name for name in (catalog_aggregates.class_tutor(doc.to_dict())[1] for doc in results) if name})
         
-        # Return sorted unique list
+        response.headers['Cache-Control'] = f"public, max-age={CATALOG_CACHE_MAX_AGE}"
         return {
-            "tutors": sorted(list(tutors)),
+            "tutors": tutors,
             "count": len(tutors)
         }
     except Exception as e:
@@ -1992,12 +1510,97 @@ async def get_available_tutors(level: str, subject: str, location: str):
         return {"tutors": [], "count": 0}
 
 
-# Include the routers in the main app
-app.include_router(api_router)
-app.include_router(math_router)
-app.include_router(tutor_router)
-app.include_router(project62_router)
-app.include_router(sync_router)
+@api_router.get("/admin/free-slots")
+async def get_free_slots(tutor: str = None, location: str = None, day: str = None, duration: int = 60):
+    """
+    Free weekly periods of at least `duration` minutes for a tutor, a location (a room left),
+    or both at once. Answers "is Mr X free Tue 7pm" from the schedule index without reading classes.
+    """
+    try:
+        if not tutor and not location:
+            raise HTTPException(status_code=400, detail="Give a tutor, a location or both")
+        try:
+            days = [parse_day(day)] if day else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        index = await asyncio.to_thread(load_schedule_index)
+        if index is None:
+            raise HTTPException(status_code=503, detail="Class schedules are unavailable")
+        
+        keys, result = [], {"duration": duration}
+        if tutor:
+            aliases = await asyncio.to_thread(load_tutor_aliases)
+            tutor_ids = aliases.lookup(tutor) if aliases else ()
+            if len(tutor_ids) > 1:
+                raise HTTPException(status_code=400, detail={"message": f"'{tutor}' matches several tutors",
+                                                             "candidates": [aliases.tutors[t].display_name for t in tutor_ids]})
+            tutor_id = tutor_ids[0] if tutor_ids else normalize_tutor_name(tutor).tutor_id
+            if ('tutor', tutor_id) not in index.slots:
+                raise HTTPException(status_code=404, detail=f"No classes found for tutor: {tutor}")
+            keys.append(('tutor', tutor_id))
+            result["tutor_id"] = tutor_id
+        if location:
+            if ('location', location) not in index.slots:
+                raise HTTPException(status_code=404, detail=f"No classes found at location: {location}")
+            keys.append(('location', location))
+            result["location"] = location
+            result["rooms"] = index.capacity(location)
+        
+        result["free"] = index.free_slots(keys, days, min_minutes=duration)
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error finding free slots: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ========================
+# Router Selection
+# ========================
+# ENABLED_ROUTERS picks the products this deployment serves, e.g. "tuition" or
+# "math_analysis,tutor_auth" (default: all). Routers that are not enabled are never
+# imported, so their dependencies (pandas, stripe, sendgrid, notion_client...) are not loaded.
+ROUTER_MODULES = {
+    # name: (module, router attribute, Firebase project it needs)
+    'tuition': (None, None, 'tuition'),
+    'math_analysis': ('math_analysis_api', 'math_router', 'math_analysis'),
+    'tutor_auth': ('tutor_auth_api', 'tutor_router', 'math_analysis'),
+    'project62': ('project62_api', 'router', 'project62'),
+    'notion_sync': ('firebase_notion_sync', 'router', 'project62'),
+}
+
+def get_enabled_routers() -> List[str]:
+    value = os.getenv('ENABLED_ROUTERS', '').strip()
+    if not value or value == 'all':
+        return list(ROUTER_MODULES)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in names if name not in ROUTER_MODULES]
+    if unknown:
+        raise ValueError(f"Unknown ENABLED_ROUTERS entries: {', '.join(unknown)} (choose from {', '.join(ROUTER_MODULES)})")
+    return names
+
+ENABLED_ROUTERS = get_enabled_routers()
+
+@app.on_event("startup")
+async def init_firebase():
+    """Create the Firebase apps of the enabled routers (registered before the routers' own startup hooks)"""
+    projects = sorted({ROUTER_MODULES[name][2] for name in ENABLED_ROUTERS})
+    ready = await asyncio.to_thread(init_firebase_apps, projects)
+    for project, ok in ready.items():
+        if not ok:
+            logger.error(f"❌ Firebase '{project}' unavailable - its endpoints will return errors")
+
+# Include the enabled routers in the main app
+for router_name in ENABLED_ROUTERS:
+    module_name, router_attr, _ = ROUTER_MODULES[router_name]
+    if module_name is None:
+        app.include_router(api_router)
+    else:
+        app.include_router(getattr(importlib.import_module(module_name), router_attr))
+logger.info(f"Routers enabled: {', '.join(ENABLED_ROUTERS)}")
 
 app.add_middleware(
     CORSMiddleware,
@@ -2007,11 +1610,16 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Request metrics - per-route timings and Firestore/LLM/HTTP cost for all routers
+instrument_clients()
+app.add_middleware(RequestMetricsMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# Logging is configured by setup_logging() at import time (see log_config.py)
 logger = logging.getLogger(__name__)
 
 # ========================
@@ -2019,38 +1627,29 @@ logger = logging.getLogger(__name__)
 # ========================
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 
 scheduler = AsyncIOScheduler()
+# Nightly renewal billing; RENEWALS_SCHEDULED=false turns it off (e.g. on staging copies of live data)
+RENEWALS_SCHEDULED = os.getenv("RENEWALS_SCHEDULED", "true").lower() == "true"
 
 async def run_daily_renewals():
     """
     Background job to process subscription renewals daily
-    Runs at 00:00 UTC every day
+    Runs at 00:00 UTC every day; renewal_engine checkpoints and logs each run
     """
+    if 'project62' not in ENABLED_ROUTERS or not RENEWALS_SCHEDULED:
+        return
     try:
         logger.info("🔄 Running daily renewal processing...")
-        
-        # Import here to avoid circular dependency
-        import httpx
-        
-        # Call the process-renewals endpoint
-        # We need to use a system admin token or create a service account
-        # For now, we'll log the execution attempt
-        
-        # Save execution log to Firestore
-        firebase_db.collection('project62').document('ops').collection('renewal_logs').add({
-            "executed_at": datetime.now(timezone.utc).isoformat(),
-            "executed_by": "scheduler",
-            "status": "scheduled_run",
-            "message": "Daily renewal job triggered"
-        })
-        
-        logger.info("✅ Daily renewal job completed")
+        from renewal_engine import run_renewals
+        result = await run_renewals(executed_by="scheduler")
+        logger.info(f"✅ Daily renewal job completed: {result['status']}")
         
     except Exception as e:
         logger.error(f"❌ Error in daily renewal job: {e}")
         import traceback
-        traceback.print_exc()
+        logger.error(traceback.format_exc())
 
 # Schedule the job to run daily at 00:00 UTC
 scheduler.add_job(
@@ -2061,6 +1660,24 @@ scheduler.add_job(
     replace_existing=True
 )
 
+async def sweep_stripe_event_claims():
+    """Delete Stripe event claims left unfinished by crashed workers so Stripe's retries reprocess them"""
+    if 'project62' not in ENABLED_ROUTERS:
+        return
+    try:
+        import webhook_events
+        await asyncio.to_thread(webhook_events.sweep_stale_claims)
+    except Exception as e:
+        logger.error(f"❌ Error sweeping Stripe event claims: {e}")
+
+scheduler.add_job(
+    sweep_stripe_event_claims,
+    trigger=IntervalTrigger(minutes=15),
+    id='stripe_event_sweep',
+    name='Sweep stale Stripe event claims',
+    replace_existing=True
+)
+
 @app.on_event("startup")
 async def startup_scheduler():
     """Start the scheduler when the app starts"""
@@ -0,0 +1,311 @@
+"""
+Tuition Catalog Sync
+Brings the Firestore `classes` and `tutors` collections in line with a catalog CSV
+(Level,Subject,Location,Tutor_Name,Day1,Time1,Day2,Time2,Monthly_Fee,Sessions_Per_Week)
+by writing only what changed, instead of wiping and re-uploading every document.
+
+Classes are matched on (level, subject, location, tutor, schedule) - existing documents keep
+their IDs - and compared by a content hash of the catalog fields. Inserts and updates are
+written first and deletes last, so the live catalog is never empty. The aggregates in
+catalog_aggregates.py - tutor coverage (locations, subjects, levels, total_classes) and the
+`catalog_aggregates` dropdown documents - are rebuilt from the resulting classes in the same pass.
+
+Usage:
+    python sync_catalog.py ../tuition_COMPLETE_FINAL_ALL_LEVELS.csv --dry-run
+    python sync_catalog.py ../tuition_COMPLETE_FINAL_ALL_LEVELS.csv
+    python sync_catalog.py catalog.csv --keep-extra      # leave classes that are not in the CSV
+"""
+import argparse
+import csv
+import hashlib
+import json
+import re
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from catalog_aggregates import AGGREGATES_COLLECTION, build_aggregates
+from tutor_names import normalize_tutor_name
+
+# Catalog fields owned by the CSV; anything else on a document (e.g. set from the admin page) is left alone
+CLASS_FIELDS = ('level', 'subject', 'location', 'tutor_id', 'tutor_name', 'tutor_base_name',
+                'schedule', 'sessions_per_week', 'monthly_fee')
+TUTOR_FIELDS = ('name', 'locations', 'subjects', 'levels', 'total_classes', 'coverage')
+AGGREGATE_FIELDS = ('level', 'subject', 'location', 'tutor_counts', 'tutor_names', 'tutors',
+                    'location_counts', 'locations')
+
+# Firestore batch limit, used when BulkWriter is not available
+BATCH_SIZE = 500
+SAMPLE_LINES = 10
+
+# ========================
+# CSV
+# ========================
+
+def load_catalog(path: Path) -> List[Dict]:
+    """Class documents (catalog fields only) from the CSV; raises ValueError listing every bad row"""
+    classes, errors = [], []
+    with open(path, newline='', encoding='utf-8') as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            missing = [col for col in ('Level', 'Subject', 'Location', 'Tutor_Name', 'Monthly_Fee') if not (row.get(col) or '').strip()]
+            schedule = [{'day': row[f'Day{i}'].strip(), 'time': row[f'Time{i}'].strip()}
+                        for i in (1, 2) if (row.get(f'Day{i}') or '').strip() and (row.get(f'Time{i}') or '').strip()]
+            if not schedule:
+                missing.append('Day1/Time1')
+            if missing:
+                errors.append(f"line {line}: missing {', '.join(missing)}")
+                continue
+            try:
+                monthly_fee = float(row['Monthly_Fee'])
+            except ValueError:
+                errors.append(f"line {line}: Monthly_Fee {row['Monthly_Fee']!r} is not a number")
+                continue
+            tutor_name = row['Tutor_Name'].strip()
+            tutor = normalize_tutor_name(tutor_name)
+            classes.append({
+                'level': row['Level'].strip(),
+                'subject': row['Subject'].strip(),
+                'location': row['Location'].strip(),
+                'tutor_id': tutor.tutor_id,
+                'tutor_name': tutor_name,
+                'tutor_base_name': tutor.base_name,
+                'schedule': schedule,
+                'sessions_per_week': int(row.get('Sessions_Per_Week') or len(schedule)),
+                'monthly_fee': monthly_fee,
+            })
+    if errors:
+        raise ValueError(f"{len(errors)} invalid rows in {path}:\n  " + "\n  ".join(errors))
+    return classes
+
+# ========================
+# DIFF
+# ========================
+
+def class_identity(doc: Dict) -> Tuple:
+    """What makes two rows the same class; a fee or tutor display name change is an update"""
+    schedule = tuple((s.get('day'), s.get('time')) for s in doc.get('schedule') or [])
+    return doc.get('level'), doc.get('subject'), doc.get('location'), doc.get('tutor_id'), schedule
+
+
+def content_hash(doc: Dict, fields: Tuple[str, ...]) -> str:
+    payload = json.dumps({field: doc.get(field) for field in fields}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def new_class_id(doc: Dict, taken: set) -> str:
+    """Stable, readable ID: level_subject_location_tutor plus a short hash of the schedule"""
+    slug = f"{doc['level']}_{doc['subject']}_{doc['location']}_{doc['tutor_id']}".lower()
+    slug = re.sub(r"[^a-z0-9_]+", "_", slug)
+    suffix = hashlib.sha1(repr(class_identity(doc)).encode()).hexdigest()[:8]
+    class_id = f"{slug}_{suffix}"
+    n = 2
+    while class_id in taken:
+        class_id = f"{slug}_{suffix}_{n}"
+        n += 1
+    taken.add(class_id)
+    return class_id
+
+
+def diff_classes(desired: List[Dict], existing: Dict[str, Dict], keep_extra: bool = False) -> Dict:
+    """
+    Plan for turning `existing` (doc ID -> data) into `desired`.
+    Identical rows are matched one-to-one, so duplicates in either side are inserted or deleted.
+    """
+    by_identity = defaultdict(list)
+    for doc_id in sorted(existing):
+        by_identity[class_identity(existing[doc_id])].append(doc_id)
+
+    taken = set(existing)
+    plan = {'insert': [], 'update': [], 'delete': [], 'unchanged': 0, 'final': {}}
+    for doc in desired:
+        candidates = by_identity.get(class_identity(doc))
+        if not candidates:
+            class_id = new_class_id(doc, taken)
+            plan['insert'].append((class_id, {'class_id': class_id, **doc}))
+            plan['final'][class_id] = doc
+            continue
+        class_id = candidates.pop(0)
+        current = existing[class_id]
+        if content_hash(current, CLASS_FIELDS) == content_hash(doc, CLASS_FIELDS):
+            plan['unchanged'] += 1
+        else:
+            changed = {field: doc[field] for field in CLASS_FIELDS if current.get(field) != doc[field]}
+            plan['update'].append((class_id, changed))
+        plan['final'][class_id] = doc
+
+    for doc_ids in by_identity.values():
+        for doc_id in doc_ids:
+            if keep_extra:
+                plan['final'][doc_id] = existing[doc_id]
+            else:
+                plan['delete'].append(doc_id)
+    return plan
+
+
+def split_aggregates(classes: List[Dict]) -> Tuple[Dict[str, Dict], Dict[str, Dict]]:
+    """(tutors docs, catalog_aggregates docs) by document ID"""
+    tutors, aggregates = {}, {}
+    for (collection, doc_id), doc in build_aggregates(classes).items():
+        (tutors if collection == 'tutors' else aggregates)[doc_id] = doc
+    return tutors, aggregates
+
+
+def diff_docs(desired: Dict[str, Dict], existing: Dict[str, Dict], fields: Tuple[str, ...]) -> Dict:
+    plan = {'insert': [], 'update': [], 'delete': [], 'unchanged': 0}
+    for doc_id, doc in desired.items():
+        current = existing.get(doc_id)
+        if current is None:
+            plan['insert'].append((doc_id, doc))
+        elif content_hash(current, fields) != content_hash(doc, fields):
+            plan['update'].append((doc_id, {field: doc.get(field) for field in fields
+                                            if field in doc and current.get(field) != doc[field]}))
+        else:
+            plan['unchanged'] += 1
+    plan['delete'] = sorted(set(existing) - set(desired))
+    return plan
+
+# ========================
+# APPLY
+# ========================
+
+class CatalogWriter:
+    """BulkWriter when the client has it (parallel, retried), otherwise 500-operation batches"""
+
+    def __init__(self, db):
+        self.db = db
+        self.bulk = db.bulk_writer() if hasattr(db, 'bulk_writer') else None
+        self.batch = None
+        self.pending = 0
+
+    def _op(self, name: str, *args):
+        if self.bulk is not None:
+            getattr(self.bulk, name)(*args)
+            return
+        if self.batch is None:
+            self.batch = self.db.batch()
+        getattr(self.batch, name)(*args)
+        self.pending += 1
+        if self.pending >= BATCH_SIZE:
+            self.flush()
+
+    def set(self, ref, data):
+        self._op('set', ref, data)
+
+    def update(self, ref, data):
+        self._op('update', ref, data)
+
+    def delete(self, ref):
+        self._op('delete', ref)
+
+    def flush(self):
+        if self.bulk is not None:
+            self.bulk.flush()
+        elif self.batch is not None:
+            self.batch.commit()
+            self.batch, self.pending = None, 0
+
+    def close(self):
+        self.flush()
+        if self.bulk is not None:
+            self.bulk.close()
+
+
+def apply_plan(db, class_plan: Dict, tutor_plan: Dict, aggregate_plan: Dict):
+    """Upserts first, deletes after they have landed"""
+    plans = [(db.collection('classes'), class_plan), (db.collection('tutors'), tutor_plan),
+             (db.collection(AGGREGATES_COLLECTION), aggregate_plan)]
+    writer = CatalogWriter(db)
+    for collection, plan in plans:
+        for doc_id, doc in plan['insert']:
+            writer.set(collection.document(doc_id), doc)
+        for doc_id, changed in plan['update']:
+            writer.update(collection.document(doc_id), changed)
+    writer.flush()
+
+    for collection, plan in plans:
+        for doc_id in plan['delete']:
+            writer.delete(collection.document(doc_id))
+    writer.close()
+
+# ========================
+# REPORT
+# ========================
+
+def describe_class(doc: Dict) -> str:
+    schedule = " + ".join(f"{s['day']} {s['time']}" for s in doc.get('schedule') or [])
+    return f"{doc.get('level')} {doc.get('subject')} @ {doc.get('location')} - {doc.get('tutor_name')} - {schedule}"
+
+
+def print_report(class_plan: Dict, tutor_plan: Dict, aggregate_plan: Dict, existing: Dict[str, Dict], verbose: bool):
+    limit = None if verbose else SAMPLE_LINES
+
+    def section(title, lines):
+        print(f"  {title}: {len(lines)}")
+        for line in lines[:limit]:
+            print(f"    {line}")
+        if limit is not None and len(lines) > limit:
+            print(f"    ... {len(lines) - limit} more (--verbose)")
+
+    print("Classes")
+    section("insert", [describe_class(doc) for _, doc in class_plan['insert']])
+    section("update", [f"{class_id}: " + ", ".join(f"{field} {existing[class_id].get(field)!r} -> {value!r}"
+                                                   for field, value in changed.items())
+                       for class_id, changed in class_plan['update']])
+    section("delete", [f"{class_id}: {describe_class(existing[class_id])}" for class_id in class_plan['delete']])
+    print(f"  unchanged: {class_plan['unchanged']}")
+    print("Tutors")
+    section("insert", [f"{tutor_id}: {doc['name']} ({doc['total_classes']} classes)" for tutor_id, doc in tutor_plan['insert']])
+    section("update", [f"{tutor_id}: {', '.join(changed)}" for tutor_id, changed in tutor_plan['update']])
+    section("delete", list(tutor_plan['delete']))
+    print(f"  unchanged: {tutor_plan['unchanged']}")
+    print("Catalog aggregates")
+    section("insert", [doc_id for doc_id, _ in aggregate_plan['insert']])
+    section("update", [f"{doc_id}: {', '.join(changed)}" for doc_id, changed in aggregate_plan['update']])
+    section("delete", list(aggregate_plan['delete']))
+    print(f"  unchanged: {aggregate_plan['unchanged']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the tuition class catalog in Firestore with a CSV")
+    parser.add_argument('csv', type=Path)
+    parser.add_argument('--dry-run', action='store_true', help="report the changes without writing")
+    parser.add_argument('--keep-extra', action='store_true', help="keep classes that are not in the CSV")
+    parser.add_argument('--verbose', action='store_true', help="list every change")
+    args = parser.parse_args()
+
+    try:
+        desired = load_catalog(args.csv)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
+    from firebase_apps import firestore_client
+    db = firestore_client('tuition')
+
+    existing_classes = {doc.id: doc.to_dict() for doc in db.collection('classes').stream()}
+    existing_tutors = {doc.id: doc.to_dict() for doc in db.collection('tutors').stream()}
+    existing_aggregates = {doc.id: doc.to_dict() for doc in db.collection(AGGREGATES_COLLECTION).stream()}
+    print(f"CSV: {len(desired)} classes from {args.csv.name}; Firestore: {len(existing_classes)} classes, "
+          f"{len(existing_tutors)} tutors")
+
+    class_plan = diff_classes(desired, existing_classes, keep_extra=args.keep_extra)
+    tutors, aggregates = split_aggregates(list(class_plan['final'].values()))
+    tutor_plan = diff_docs(tutors, existing_tutors, TUTOR_FIELDS)
+    aggregate_plan = diff_docs(aggregates, existing_aggregates, AGGREGATE_FIELDS)
+    print_report(class_plan, tutor_plan, aggregate_plan, existing_classes, args.verbose)
+
+    writes = sum(len(plan[kind]) for plan in (class_plan, tutor_plan, aggregate_plan)
+                 for kind in ('insert', 'update', 'delete'))
+    if args.dry_run:
+        print(f"\nDry run - {writes} writes not applied")
+        return
+    if not writes:
+        print("\nCatalog already in sync")
+        return
+    apply_plan(db, class_plan, tutor_plan, aggregate_plan)
+    print(f"\n✅ Applied {writes} writes")
+
+
+if __name__ == "__main__":
+    main()
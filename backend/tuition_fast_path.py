@@ -0,0 +1,178 @@
+"""
+Tuition Chat Fast Path
+Answers structured tuition lookups straight from the catalog with templates, without an
+LLM call: fully specified class listings, "which locations have ..." questions, and the
+"query too broad" / ambiguous-tutor clarifications. Anything open-ended (prices, format
+changes, holidays, advice, enrollment, greetings) returns None and goes to the model.
+"""
+
+import re
+from typing import Callable, Dict, List, Optional
+
+from tuition_retrieval import (
+    LEVELS, LOCATIONS, LOCATION_KEYWORDS, SUBJECT_KEYWORDS, TITLES, MAX_CATALOG_ROWS,
+    dedupe_classes, schedule_text, subject_options, tutor_display_name
+)
+
+# Words a pure lookup may contain besides the level/subject/location/tutor itself
+LOOKUP_WORDS = {
+    'a', 'an', 'the', 'at', 'in', 'for', 'of', 'on', 'to', 'and', 'or', 'by', 'with', 'me', 'i', 'we', 'you', 'your',
+    'is', 'are', 'there', 'any', 'do', 'does', 'have', 'has', 'got', 'can', 'please', 'pls', 'see', 'know', 'want',
+    'class', 'classes', 'lesson', 'lessons', 'schedule', 'schedules', 'timing', 'timings', 'time', 'times', 'slot', 'slots',
+    'tutor', 'tutors', 'teacher', 'teachers', 'teach', 'teaches', 'teaching', 'who', 'which', 'what', 'when', 'where',
+    'list', 'show', 'all', 'available', 'offer', 'offered', 'location', 'locations', 'centre', 'centres', 'center',
+    'centers', 'branch', 'branches', 'options', 'level', 'subject', 'sec', 'secondary',
+    'primary', 'jc', 'parade', 'tell', 'give', 'find', 'hi', 'hello', 'thanks', 'ok', 'okay', 'now', 'then',
+}
+
+# Phrases that need reasoning or reference notes - always handled by the model
+OPEN_ENDED_WORDS = [
+    'why', 'how much', 'price', 'fee', 'cost', 'cheap', 'expensive', 'recommend', 'suggest', 'suitable', 'better',
+    'best', 'difference', 'different', 'compare', 'weak', 'strong', 'help', 'enrol', 'enroll', 'register', 'sign up',
+    'reserve', 'trial', 'holiday', 'exam', 'format', 'transition', '2027', 'pay', 'refund', 'discount', 'should',
+    'about', 'info', 'detail', 'explain',
+]
+
+LOCATION_QUESTION_WORDS = ['where', 'which location', 'what location', 'which centre', 'which branch', 'locations']
+
+NEXT_STEP = "Would you like more details about any specific tutor? Or would you like to **enroll/make a reservation**? 😊"
+
+_WORD = re.compile(r"[a-z0-9$.'-]+")
+
+
+def is_structured_lookup(message: str, intent: Dict) -> bool:
+    """True when the message is only a lookup (entities plus lookup words), with nothing left to reason about"""
+    text = message.lower()
+    if any(word in text for word in OPEN_ENDED_WORDS):
+        return False
+    known = set(LOOKUP_WORDS) | {level.lower() for level in LEVELS} | set(LOCATION_KEYWORDS) | set(TITLES)
+    for _, keywords in SUBJECT_KEYWORDS:
+        for keyword in keywords:
+            known.update(keyword.split())
+    if intent['tutor_search']:
+        known.update(intent['tutor_search'].lower().split())
+    leftover = [word.strip(".'-") for word in _WORD.findall(text)]
+    leftover = [word for word in leftover if word and word not in known]
+    return len(leftover) <= 1
+
+
+def _join(names: List[str]) -> str:
+    names = [f"**{name}**" for name in names]
+    return names[0] if len(names) == 1 else ", ".join(names[:-1]) + f" and {names[-1]}"
+
+# ========================
+# TEMPLATES
+# ========================
+
+def render_clarification(kind: str, intent: Dict, facts: Dict) -> str:
+    level, subject, location = intent['level'], intent['subject'], intent['location']
+    if kind == 'location':
+        options = "\n".join(f"- {loc}" for loc in LOCATIONS)
+        return (f"Which location would you like to know about for **{level} {subject}**? We have classes at:\n"
+                f"{options}\n\nOr would you like to see all locations? 😊")
+    if kind == 'subject':
+        return (f"Which subject would you like to know about for **{level}** at **{location}**? "
+                f"For example: {', '.join(subject_options(level))}? 📚")
+    if kind == 'level_subject':
+        return (f"Which level and subject would you like to know about at **{location}**? "
+                f"For example: P6 Math, S2 Science, J1 Physics? 📚")
+    # tutor
+    candidates = facts['candidates']
+    tutors = sorted({tutor_display_name(cls) for cls in candidates})
+    lines = "\n".join(f"• {name} ({sum(1 for cls in candidates if tutor_display_name(cls) == name)} classes)"
+                       for name in tutors)
+    return (f"I found multiple tutors matching **{intent['tutor_search']}**:\n\n{lines}\n\n"
+            f"Which one would you like to know about? 😊")
+
+
+def render_class_listing(classes: List[Dict], intent: Dict) -> str:
+    """Classes grouped by location, then tutor; a tutor's several classes are labelled Class A, B, C"""
+    rows = dedupe_classes(classes)[:MAX_CATALOG_ROWS]
+    where = f"at **{intent['location']}**" if intent['location'] else "across all locations"
+    text = f"For **{intent['level']} {intent['subject']}** {where}, we offer the following classes:\n\n"
+
+    by_location: Dict[str, Dict[str, List[Dict]]] = {}
+    for cls in rows:
+        by_location.setdefault(cls.get('location'), {}).setdefault(tutor_display_name(cls), []).append(cls)
+
+    for location, by_tutor in by_location.items():
+        if len(by_location) > 1:
+            text += f"**At {location}:**\n"
+        for tutor, tutor_classes in by_tutor.items():
+            if len(tutor_classes) == 1:
+                cls = tutor_classes[0]
+                text += f"📚 **{tutor}**: {schedule_text(cls)} - **${cls.get('monthly_fee')}/month**\n\n"
+            else:
+                text += f"📚 **{tutor}**:\n"
+                for idx, cls in enumerate(tutor_classes):
+                    text += f"  Class {chr(65 + idx)}: {schedule_text(cls)} - ${cls.get('monthly_fee')}/month\n"
+                text += "\n"
+        text += "\n"
+    if len(classes) >= MAX_CATALOG_ROWS:
+        text += "These are the first classes I found - tell me a tutor or location to narrow it down.\n\n"
+    return text + NEXT_STEP
+
+
+def render_tutor_listing(classes: List[Dict]) -> str:
+    """One tutor's classes grouped by location, then level/subject"""
+    rows = dedupe_classes(classes)[:MAX_CATALOG_ROWS]
+    tutor = tutor_display_name(rows[0])
+    locations = sorted({cls.get('location') for cls in rows})
+    text = f"**{tutor}** teaches at {_join(locations)}. Here are the classes:\n\n"
+
+    by_location: Dict[str, Dict[str, List[Dict]]] = {}
+    for cls in rows:
+        by_location.setdefault(cls.get('location'), {}).setdefault(f"{cls.get('level')} {cls.get('subject')}", []).append(cls)
+
+    for location, groups in by_location.items():
+        text += f"🏫 **At {location}:**\n"
+        for group, group_classes in groups.items():
+            text += f"  **{group}**:\n"
+            for idx, cls in enumerate(group_classes):
+                label = f"Class {chr(65 + idx)}: " if len(group_classes) > 1 else ""
+                text += f"    {label}{schedule_text(cls)} - **${cls.get('monthly_fee')}/month**\n"
+        text += "\n"
+    return text + NEXT_STEP
+
+
+def render_locations(intent: Dict, locations: List[str]) -> str:
+    return (f"**{intent['level']} {intent['subject']}** classes are available at {_join(locations)}. 🏫\n\n"
+            f"Which location would you like the class schedules for?")
+
+# ========================
+# RESPONDER
+# ========================
+
+def fast_path_answer(message: str, intent: Dict, facts: Dict, query_classes: Callable) -> Optional[Dict]:
+    """
+    Templated answer for a structured lookup, or None when the model should answer.
+    facts comes from tuition_retrieval.catalog_context; query_classes is used for the
+    locations question only. Returns {'text', 'kind'}.
+    """
+    if not is_structured_lookup(message, intent):
+        return None
+
+    text = message.lower()
+    level, subject = intent['level'], intent['subject']
+
+    # "Which locations have J1 Physics?" - answered instead of asking for a location, even when
+    # a location is remembered from an earlier turn
+    names_location = any(keyword in text for keyword in LOCATION_KEYWORDS)
+    if level and subject and not names_location and not intent['tutor_search'] and \
+            any(word in text for word in LOCATION_QUESTION_WORDS):
+        classes = query_classes(level, subject, None, limit=500)
+        locations = sorted({cls.get('location') for cls in classes if cls.get('location')})
+        if not locations:
+            return None
+        return {'text': render_locations(intent, locations), 'kind': 'locations'}
+
+    if facts['clarify']:
+        return {'text': render_clarification(facts['clarify'], intent, facts), 'kind': f"clarify_{facts['clarify']}"}
+
+    if facts['classes']:
+        if intent['tutor_search']:
+            return {'text': render_tutor_listing(facts['classes']), 'kind': 'tutor_listing'}
+        # A listing needs at least level + subject, or the model would have to pick what to show
+        if level and subject:
+            return {'text': render_class_listing(facts['classes'], intent), 'kind': 'listing'}
+    return None
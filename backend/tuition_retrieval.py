@@ -0,0 +1,453 @@
+"""
+Tuition Chat Retrieval
+Builds the prompt for /api/tuition/chat from three parts:
+  - TUITION_SYSTEM_PREFIX: persona and answering rules, identical on every call so the
+    provider can cache it
+  - reference notes (fees, 2026-2027 format transition, calendar) picked by the extracted intent
+  - the catalog rows that match the intent, as a compact pipe-separated table
+Conversation context goes into the user turn, never into the system message.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from chat_context import count_tokens, count_fixed_tokens, truncate_tokens
+from tutor_names import TutorAliases, normalize_tutor_name
+
+LEVELS = ['P2', 'P3', 'P4', 'P5', 'P6', 'S1', 'S2', 'S3', 'S4', 'J1', 'J2']
+LOCATIONS = ['Bishan', 'Punggol', 'Marine Parade', 'Jurong', 'Kovan']
+
+LOCATION_KEYWORDS = {
+    'bishan': 'Bishan',
+    'punggol': 'Punggol',
+    'marine': 'Marine Parade',
+    'jurong': 'Jurong',
+    'kovan': 'Kovan'
+}
+
+# Checked in order - AMath/EMath before the generic Math
+SUBJECT_KEYWORDS = [
+    ('AMath', ['amath', 'a-math', 'a math']),
+    ('EMath', ['emath', 'e-math', 'e math']),
+    ('Math', ['math', 'maths', 'mathematics']),
+    ('Science', ['science']),
+    ('Physics', ['physics']),
+    ('Chemistry', ['chemistry']),
+    ('Biology', ['biology']),
+    ('English', ['english']),
+    ('Chinese', ['chinese']),
+    ('Economics', ['economics', 'econs']),
+]
+
+TITLES = ['mr', 'ms', 'mrs', 'mdm', 'miss', 'dr']
+
+NAME_SKIP_WORDS = {
+    'teach', 'teaches', 'class', 'classes', 'at', 'in', 'for', 'the', 'schedules', 'schedule',
+    'math', 'maths', 'science', 'english', 'chinese', 'physics', 'chemistry', 'biology',
+    'p2', 'p3', 'p4', 'p5', 'p6', 's1', 's2', 's3', 's4', 'j1', 'j2'
+}
+
+# Words that ask for class listings even when the level/subject comes from earlier turns
+CATALOG_TRIGGER_WORDS = ['tutor', 'teacher', 'teach', 'schedule', 'timing', 'list', 'show', 'available',
+                         'which', 'who', 'class']
+
+# Catalog rows sent to the model per turn
+MAX_CATALOG_ROWS = 30
+# Exchanges of conversation context, and the token cap on each remembered answer
+HISTORY_EXCHANGES = 4
+HISTORY_ANSWER_TOKENS = 40
+
+# ========================
+# PROMPT TEXT
+# ========================
+
+TUITION_SYSTEM_PREFIX = """You are an AI assistant for a premier tuition center in Singapore. You provide detailed, accurate information about our 2026 class schedules and pricing.
+
+🎓 **2026 Classes Available NOW**
+- 2026 classes are open for enrollment from September/October 2025; always answer with 2026 information.
+
+🏫 **LOCATIONS & CONTACT:**
+- **5 Locations**: Jurong, Bishan, Punggol, Kovan, Marine Parade
+- **Main Line**: 6222 8222
+- **Website**: www.rmss.com.sg
+
+**HOW YOUR INPUT IS ORGANISED:**
+The user turn may start with REFERENCE notes (fees, format transition, calendar), a CATALOG table of matching classes (level | subject | location | tutor | schedule | fee per month), a CLARIFY instruction and the RECENT CONVERSATION. These come from our live records - trust them over anything else and never mention databases, catalogs or systems.
+
+🎯 **GOLDEN RULES:**
+1. **ALWAYS REMEMBER CONTEXT** - Follow-ups like "list classes at Bishan" mean the level/subject the user was just asking about.
+2. **PREVENT INFORMATION OVERLOAD** - Never dump all subjects for a level at a location. Ask for the subject first.
+3. **WHEN YOU HAVE DATA, SHOW IT** - If CATALOG rows are provided, present them immediately; do not ask for more details.
+4. **FOLLOW CLARIFY INSTRUCTIONS** - If a CLARIFY line is provided, ask exactly that question with the options given and show no classes yet.
+5. **BE DIRECT** - If a tutor teaches at only one location, show those classes without asking about other locations.
+6. **PROGRESSIVE DISCLOSURE** - Provide information step by step, with specific options the user can pick with minimal typing.
+7. **NEVER EXPOSE TECHNICAL DETAILS** - No "Firebase", "database" or "querying".
+
+**PRESENTING CLASSES:**
+- Group by location, then tutor. Show complete schedules (all sessions joined with +) and the monthly fee in bold (**$XXX.XX/month**).
+- Use "Class A, B, C" labels only when the SAME tutor has several classes of the SAME level/subject at the SAME location.
+- End with a next step, e.g. "Would you like to know more about a tutor, or would you like to **enroll/make a reservation**? 😊"
+
+**TOO BROAD - ASK FOR CLARIFICATION:**
+❌ Level + Location only ("S1 classes at Bishan") → "Which subject? Math, Science, English, etc.?"
+❌ Location only ("Classes at Marine Parade") → "Which level and subject? For example: P6 Math, S2 Science?"
+❌ "All classes" → "Which level and subject would you like to know about?"
+Suggested options: levels P2-P6, S1-S4, J1-J2; locations Bishan, Punggol, Marine Parade, Jurong, Kovan; subjects Math, Science, English, Chinese, EMath, AMath, Physics, Chemistry, Biology, Economics.
+
+**TUTOR QUERIES:**
+- If several tutors match a name (e.g. "Sean" → Sean Tan, Sean Yeo, Sean Phua), list them all and ask which one.
+- If one tutor matches, go straight to their classes.
+
+**ENROLLMENT & RESERVATION:**
+- For "enroll", "register", "sign up", "reserve", "how to join": reply "Great! I can help you with enrollment. Please click the **Enrollment Form** button below to fill in your details, and our admin team will contact you shortly with more information. 😊" and then show: [Enrollment Form Button]
+- Never ask users to call for enrollment - direct them to the form first.
+
+**STYLE:**
+- Use emojis appropriately (📚 🏫 👨‍🏫 💰 📅 🚫 ⏸️ ✅ 🎁), clear line breaks and bold prices.
+- Suggest next steps ("Would you like to know about tutors?").
+- For holiday programme schedules, encourage contacting admin at 6222 8222.
+
+**EXAMPLE (context awareness):**
+User: "Tell me about S3 EMath" → you answer with the S3 EMath fee and format.
+User: "List Bishan classes" → "For **S3** at Bishan, we offer: EMath $343.35/month, AMath $397.85/month, Chemistry $343.35/month, Physics $343.35/month, Biology $343.35/month. Which subject would you like the class times for?" (never a dump of every level)
+
+**EXAMPLE (one tutor, several classes):**
+User: "P6 math Mr Eugene" with three CATALOG rows for Eugene Tan at Punggol →
+"Mr. Eugene Tan teaches P6 Math at Punggol. Here are all the class options:
+📚 **Class A**: WED 7:00pm-8:30pm + FRI 5:30pm-7:00pm - **$357.52/month**
+📚 **Class B**: TUE 7:30pm-9:00pm + SUN 10:00am-11:30am - **$357.52/month**
+📚 **Class C**: MON 7:30pm-9:00pm + SAT 12:00pm-1:30pm - **$357.52/month**
+All classes are 2 sessions per week. Would you like to enroll?"
+"""
+
+FEE_NOTES = {
+    'primary': """**Primary fees (2026):**
+- P2: $261.60/month (Math, English, Chinese) - 1 lesson/week × 2 hours
+- P3: $277.95/month (All subjects) - 1 lesson/week × 2 hours
+- P4: Math $332.45 (2 lessons/week × 1.5 hours), Others $288.85/month (1 lesson/week × 2 hours)
+- P5: Math $346.62 (2 lessons/week × 1.5 hours), Science $303.02, Languages $299.75/month (1 lesson/week × 2 hours)
+- P6: Math $357.52 (2 lessons/week × 1.5 hours; Course $310 + Material $18 + GST), Science $313.92, Languages $310.65/month (1 lesson/week × 2 hours)""",
+    'secondary': """**Secondary fees (2026):**
+- S1: Math $370.60 (2 × 1.5 hours/week), Science $327, English $321.55, Chinese $321.55/month
+- S2: Math $381.50 (2 × 1.5 hours/week), Science $327, English $321.55, Chinese $321.55/month
+- S3: EMath $343.35/month (Course $290 + Material $25 + GST) - 1 lesson/week × 2 hours [NEW 2026 FORMAT]; AMath $397.85/month (Course $340 + Material $25 + GST) - 2 lessons/week × 1.5 hours; Sciences $343.35/month - 1 × 2 hours; English/Chinese $332.45/month - 1 × 2 hours
+- S4: EMath $408.75/month (Course $350 + Material $25 + GST) - 2 lessons/week × 1.5 hours [2026: existing students continue old format]; AMath $408.75/month - 2 × 1.5 hours; Sciences $343.35/month - 1 × 2 hours; English/Chinese $332.45/month - 1 × 2 hours""",
+    'jc': """**Junior College fees (2026):**
+- J1: Math $401.12/month (Course $340 + Material $28 + GST) - 1 lesson/week × 2 hours [NEW 2026 FORMAT]; Chemistry/Physics/Biology/Economics $401.12/month - 1 × 2 hours
+- J2: Math $444.72/month (Course $380 + Material $28 + GST) - 2 lessons/week × 1.5 hours [2026: existing students continue old format]; Chemistry/Physics/Biology/Economics $412.02/month - 1 × 2 hours""",
+}
+
+TRANSITION_NOTE = """**2026-2027 format transition (EMath & JC Math):**
+- 2026: S3 EMath and J1 Math use the NEW format (1 lesson/week × 2 hours). S4 EMath and J2 Math keep the OLD format (2 lessons/week × 1.5 hours) for existing 2025 students.
+- 2027 onwards: all EMath (S3 & S4) and all JC Math (J1 & J2) use 1 lesson/week × 2 hours; 2027 pricing will be updated accordingly.
+- New S3/J1 students: explain the new 1×2hr format. Existing S4/J2 students: they continue with 2×1.5hr. This gives current students continuity while new students start with the improved schedule."""
+
+CALENDAR_NOTE = """**2026 calendar:**
+- Public holidays (black grids - no lessons, no replacement): CNY Feb 16, Hari Raya Puasa Mar 17, Good Friday Mar 30, Labour Day Apr 6, Hari Raya Haji/Vesak Day May 27, National Day Aug 9, Deepavali Nov 8, Christmas Dec 25
+- Rest weeks (grey grids - no normal lessons): May 31 - Jun 7; Dec 28-31 & Jan 1-3, 2027
+- Exam preparation (no lessons): MYE Mar 16-21, FYE Sep 13-20
+- Holiday programmes (MHP, JHP1 & JHP2, SHP): extra lessons may be available - contact admin for schedules. FREE trial lessons are usually available during holiday programmes 🎁 - call 6222 8222."""
+
+FEE_SETTLEMENT_NOTE = """**2026 monthly fee settlement periods** (parents must settle fees before they become overdue):
+Jan 26 - Feb 1, Feb 22-28, Mar 29 - Apr 5, Apr 26-30, May 24-30, Jun 21-27, Jul 26 - Aug 2, Aug 23-29, Sep 27 - Oct 4, Oct 25-31, Nov 22-28, Dec 20-26"""
+
+PRICE_WORDS = ['fee', 'fees', 'price', 'pricing', 'cost', 'how much', '$', 'per month', 'monthly']
+TRANSITION_WORDS = ['transition', 'format', '2027', 'different', 'difference', 'change', 'old', 'new format']
+CALENDAR_WORDS = ['holiday', 'calendar', 'rest week', 'exam', 'mye', 'fye', 'break', 'cny', 'deepavali',
+                  'christmas', 'national day', 'hari raya', 'vesak', 'labour', 'good friday', 'trial',
+                  'programme', 'program', 'off day', 'no lesson']
+SETTLEMENT_WORDS = ['settle', 'settlement', 'payment', 'pay', 'due', 'overdue']
+
+# ========================
+# INTENT EXTRACTION
+# ========================
+
+def _find_level(text: str) -> Optional[str]:
+    for level in LEVELS:
+        if level.lower() in text:
+            return level
+    return None
+
+
+def _find_subject(text: str) -> Optional[str]:
+    for subject, keywords in SUBJECT_KEYWORDS:
+        if any(keyword in text for keyword in keywords):
+            return subject
+    return None
+
+
+def _find_location(text: str) -> Optional[str]:
+    for keyword, location in LOCATION_KEYWORDS.items():
+        if keyword in text:
+            return location
+    return None
+
+
+def needs_catalog(message: str, aliases: Optional[TutorAliases] = None) -> bool:
+    """
+    Messages that may be answered from the class catalog: they name a level, subject,
+    location or tutor, or ask for a listing. General questions (fees, holidays, enrollment)
+    are answered from the reference notes without fetching classes.
+    """
+    text = message.lower()
+    return any([
+        any(word in text for word in CATALOG_TRIGGER_WORDS),
+        _find_level(text) is not None,
+        _find_location(text) is not None,
+        _find_subject(text) is not None,
+        any(title in text for title in TITLES),
+        aliases is not None and bool(aliases.find(message)),
+    ])
+
+
+def extract_tutor_search(message: str, aliases: Optional[TutorAliases] = None) -> Tuple[Optional[str], List[str], List[str]]:
+    """
+    Tutor reference in the message: (search text, every name when several appear, tutor IDs).
+    Names are resolved through the catalog's alias table; without one (or for a name it does
+    not know) the word after a title is used as a plain search.
+    """
+    found = aliases.find(message) if aliases is not None else []
+    if found:
+        names = [alias for alias, _ in found]
+        tutor_ids = sorted({tutor_id for _, ids in found for tutor_id in ids})
+        return ' '.join(names), names if len(names) > 1 else [], tutor_ids
+
+    text = message.lower()
+    if any(title in text for title in TITLES):
+        words = message.split()
+        for i, word in enumerate(words):
+            if word.lower().replace(',', '').replace('.', '') in TITLES and i + 1 < len(words):
+                name_parts = []
+                for next_word in words[i + 1:i + 3]:
+                    next_word = next_word.replace(',', '').replace('.', '')
+                    if next_word.lower() in NAME_SKIP_WORDS:
+                        break
+                    name_parts.append(next_word)
+                if name_parts:
+                    return ' '.join(name_parts), [], []
+    return None, [], []
+
+
+def extract_intent(message: str, history: List[Dict], aliases: Optional[TutorAliases] = None) -> Dict:
+    """
+    Level, subject, location and tutor of a turn. Values missing from the message are
+    carried over from the last two exchanges (newest first), so follow-ups keep their context.
+    """
+    text = message.lower()
+    level, subject, location = _find_level(text), _find_subject(text), _find_location(text)
+
+    for exchange in reversed(history[-2:]):
+        user_text = exchange['user'].lower()
+        combined = user_text + ' ' + exchange.get('assistant', '').lower()
+        level = level or _find_level(user_text)
+        subject = subject or _find_subject(combined)
+        location = location or _find_location(combined)
+
+    tutor_search, tutor_names, tutor_ids = extract_tutor_search(message, aliases)
+    return {
+        'level': level,
+        'subject': subject,
+        'location': location,
+        'tutor_search': tutor_search,
+        'tutor_names': tutor_names,
+        'tutor_ids': tutor_ids
+    }
+
+
+def clarification_needed(intent: Dict, message: str) -> Optional[str]:
+    """The 'query too broad' cases - returns the clarification kind, or None when the catalog can answer"""
+    level, subject, location, tutor = intent['level'], intent['subject'], intent['location'], intent['tutor_search']
+    if tutor:
+        return None
+    if level and subject and not location:
+        return 'location'
+    if level and location and not subject:
+        words = message.lower().split()
+        explicitly_broad = any(word in words for word in ['all', 'every', 'show', 'list']) and level.lower() in message.lower()
+        return 'subject' if explicitly_broad else None
+    if location and not level and not subject:
+        return 'level_subject'
+    return None
+
+
+def subject_options(level: Optional[str]) -> List[str]:
+    options = ['Math', 'Science', 'English', 'Chinese']
+    if level in ('S3', 'S4'):
+        options += ['EMath', 'AMath', 'Physics', 'Chemistry', 'Biology']
+    elif level in ('J1', 'J2'):
+        options += ['Math', 'Physics', 'Chemistry', 'Biology', 'Economics']
+    return list(dict.fromkeys(options))
+
+# ========================
+# CATALOG CONTEXT
+# ========================
+
+def tutor_display_name(cls: Dict) -> str:
+    return cls.get('tutor_base_name', cls.get('tutor_name', ''))
+
+
+def schedule_text(cls: Dict) -> str:
+    return " + ".join(f"{s.get('day')} {s.get('time')}" for s in cls.get('schedule', []))
+
+
+def dedupe_classes(classes: List[Dict]) -> List[Dict]:
+    """Drop repeated rows (same tutor, location, schedule and fee)"""
+    unique, seen = [], set()
+    for cls in classes:
+        key = (tutor_display_name(cls), cls.get('location'), str(cls.get('schedule')), cls.get('monthly_fee'))
+        if key not in seen:
+            seen.add(key)
+            unique.append(cls)
+    return unique
+
+
+def class_tutor_id(cls: Dict) -> str:
+    return cls.get('tutor_id') or normalize_tutor_name(tutor_display_name(cls)).tutor_id
+
+
+def match_tutor(classes: List[Dict], intent: Dict) -> Tuple[List[Dict], List[str]]:
+    """Classes taught by the searched tutor(s) and the distinct matching tutors"""
+    if intent.get('tutor_ids'):
+        tutor_ids = set(intent['tutor_ids'])
+        matched = [cls for cls in classes if class_tutor_id(cls) in tutor_ids]
+    else:
+        search = intent['tutor_search'].lower()
+        parts = search.split()
+        matched = [cls for cls in classes
+                   if search in tutor_display_name(cls).lower() or any(part in tutor_display_name(cls).lower() for part in parts)]
+    tutors = sorted({tutor_display_name(cls) for cls in matched})
+    return matched, tutors
+
+
+def render_class_table(classes: List[Dict], max_rows: int = MAX_CATALOG_ROWS) -> str:
+    """Compact catalog rows: one pipe-separated line per class"""
+    rows = dedupe_classes(classes)
+    lines = [f"CATALOG ({len(rows)} classes) level | subject | location | tutor | schedule | $/month"]
+    for cls in rows[:max_rows]:
+        lines.append(f"{cls.get('level')} | {cls.get('subject')} | {cls.get('location')} | "
+                     f"{tutor_display_name(cls)} | {schedule_text(cls)} | {cls.get('monthly_fee')}")
+    if len(rows) > max_rows:
+        lines.append(f"(+{len(rows) - max_rows} more - offer to narrow down by location or tutor)")
+    return "\n".join(lines)
+
+
+def render_tutor_table(tutors: List[Dict]) -> str:
+    lines = ["TUTORS name | subjects | levels | locations | classes"]
+    for tutor in tutors:
+        lines.append(f"{tutor.get('name')} | {', '.join(tutor.get('subjects', []))} | {', '.join(tutor.get('levels', []))} | "
+                     f"{', '.join(tutor.get('locations', []))} | {tutor.get('total_classes')}")
+    return "\n".join(lines)
+
+
+def render_clarification(kind: str, intent: Dict) -> str:
+    level, subject, location = intent['level'], intent['subject'], intent['location']
+    if kind == 'location':
+        return (f"CLARIFY: the user asked about {level} {subject} without a location. Ask which location: "
+                f"{', '.join(LOCATIONS)} - or whether they want all locations. Show no classes yet.")
+    if kind == 'subject':
+        return (f"CLARIFY: the user asked about all {level} classes at {location}. Ask which subject: "
+                f"{', '.join(subject_options(level))}. Show no classes yet.")
+    return (f"CLARIFY: the user asked about classes at {location} without a level or subject. Ask which level and "
+            f"subject, e.g. P6 Math, S2 Science, J1 Physics. Show no classes yet.")
+
+
+def render_tutor_clarification(search: str, tutors: List[str], classes: List[Dict]) -> str:
+    counts = ", ".join(f"{name} ({sum(1 for c in classes if tutor_display_name(c) == name)} classes)" for name in tutors)
+    return f"CLARIFY: '{search}' matches several tutors: {counts}. Ask which one they mean. Show no classes yet."
+
+
+def catalog_context(intent: Dict, message: str, query_classes, query_tutors) -> Tuple[str, Dict]:
+    """
+    Catalog section of the prompt for this turn. query_classes(level, subject, location, limit)
+    and query_tutors(name, limit) fetch from Firestore.
+    Returns (text, facts) where facts records what was retrieved ('candidates' holds the
+    classes of the tutors a name is ambiguous between).
+    """
+    facts = {'clarify': None, 'classes': [], 'tutors': [], 'candidates': []}
+    if not any([intent['level'], intent['subject'], intent['location'], intent['tutor_search']]):
+        return "", facts
+
+    clarify = clarification_needed(intent, message)
+    if clarify:
+        facts['clarify'] = clarify
+        return render_clarification(clarify, intent), facts
+
+    classes = query_classes(intent['level'], intent['subject'], intent['location'], limit=MAX_CATALOG_ROWS)
+    if intent['tutor_search'] and classes:
+        classes, tutors = match_tutor(classes, intent)
+        if len(tutors) > 1:
+            facts['clarify'] = 'tutor'
+            facts['candidates'] = classes
+            return render_tutor_clarification(intent['tutor_search'], tutors, classes), facts
+
+    if classes:
+        facts['classes'] = classes
+        return render_class_table(classes), facts
+
+    if intent['tutor_search']:
+        tutors = query_tutors(intent['tutor_search'], limit=5)
+        if tutors:
+            facts['tutors'] = tutors
+            return render_tutor_table(tutors), facts
+
+    described = " ".join(v for v in [intent['level'], intent['subject'], intent['tutor_search']] if v) or "this query"
+    where = f" at {intent['location']}" if intent['location'] else ""
+    return f"CATALOG: no classes found for {described}{where}. Say so and offer nearby options or the enrollment form.", facts
+
+# ========================
+# REFERENCE NOTES
+# ========================
+
+def reference_notes(intent: Dict, message: str, has_catalog_rows: bool) -> List[str]:
+    """Static reference notes relevant to this turn"""
+    text = message.lower()
+    level, subject = intent['level'], intent['subject']
+    notes = []
+
+    asks_price = any(word in text for word in PRICE_WORDS)
+    if level:
+        # Catalog rows already carry the monthly fee; the fee notes add the breakdown and lesson format
+        if asks_price or not has_catalog_rows:
+            group = 'primary' if level.startswith('P') else ('secondary' if level.startswith('S') else 'jc')
+            notes.append(FEE_NOTES[group])
+    elif asks_price:
+        notes.extend(FEE_NOTES.values())
+
+    if any(word in text for word in TRANSITION_WORDS) or (
+            level in ('S3', 'S4', 'J1', 'J2') and subject in ('EMath', 'Math')):
+        notes.append(TRANSITION_NOTE)
+    if any(word in text for word in CALENDAR_WORDS):
+        notes.append(CALENDAR_NOTE)
+    if any(word in text for word in SETTLEMENT_WORDS):
+        notes.append(FEE_SETTLEMENT_NOTE)
+    return notes
+
+# ========================
+# PROMPT ASSEMBLY
+# ========================
+
+def render_history(history: List[Dict]) -> str:
+    if not history:
+        return ""
+    lines = ["RECENT CONVERSATION"]
+    for exchange in history[-HISTORY_EXCHANGES:]:
+        lines.append(f"User: {exchange['user']}")
+        lines.append(f"Assistant: {truncate_tokens(exchange['assistant'], HISTORY_ANSWER_TOKENS)}")
+    return "\n".join(lines)
+
+
+def build_user_turn(message: str, notes: List[str], catalog: str, history: List[Dict]) -> Dict:
+    """User-turn text plus its size per part (tokenizer counts)"""
+    reference = "REFERENCE\n" + "\n\n".join(notes) if notes else ""
+    conversation = render_history(history)
+    sections = [part for part in (reference, catalog, conversation) if part]
+    sections.append(f"USER QUERY: {message}")
+    return {
+        'text': "\n\n".join(sections),
+        'tokens': {
+            'system_prefix': count_fixed_tokens(TUITION_SYSTEM_PREFIX),
+            'reference': count_tokens(reference),
+            'catalog': count_tokens(catalog),
+            'history': count_tokens(conversation),
+            'query': count_tokens(message),
+        }
+    }
@@ -4,34 +4,42 @@ Handles tutor profiles, authentication, and permissions for Math Analysis System
 """
 
 from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, timedelta
 import jwt
-import hashlib
+import asyncio
 import secrets
 import logging
 import json
 from pathlib import Path
 
-# Import Firebase from math_analysis_api
-from math_analysis_api import math_db
+# Firebase for Math Analysis (shared client, see firebase_apps.py)
+from firebase_apps import firestore_client
+from tutor_tokens import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, get_current_tutor
+from tutor_credentials import (
+    hash_password_async, verify_password_async, LastLoginBuffer
+)
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
-# JWT Configuration
-SECRET_KEY = "math_analysis_secret_key_2024"  # Use consistent secret key
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
-
-# Security
-security = HTTPBearer()
+math_db = firestore_client('math_analysis')
 
 # Create router
 tutor_router = APIRouter(prefix="/api/tutor", tags=["Tutor Auth"])
 
+# last_login is written behind, in periodic batches
+last_login_buffer = LastLoginBuffer(math_db)
+
+@tutor_router.on_event("startup")
+async def start_last_login_buffer():
+    last_login_buffer.start()
+
+@tutor_router.on_event("shutdown")
+async def stop_last_login_buffer():
+    await last_login_buffer.stop()
+
 # Pydantic Models
 class TutorProfile(BaseModel):
     tutor_name: str
@@ -63,10 +71,6 @@ def generate_login_id(tutor_name: str) -> str:
     """Generate login ID from tutor name (e.g., 'Sean Yeo' -> 'seanyeo')"""
     return tutor_name.lower().replace(' ', '')
 
-def hash_password(password: str) -> str:
-    """Hash password using SHA-256"""
-    return hashlib.sha256(password.encode()).hexdigest()
-
 def generate_temp_password() -> str:
     """Generate a random temporary password"""
     return secrets.token_urlsafe(8)
@@ -82,29 +86,6 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Verify JWT token and return tutor data"""
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        login_id: str = payload.get("sub")
-        if login_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials"
-            )
-        return payload
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has expired"
-        )
-    except jwt.JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials"
-        )
-
 # API Endpoints
 
 @tutor_router.post("/admin/create-tutor")
@@ -128,7 +109,7 @@ async def create_tutor(tutor_data: TutorCreate):
             'tutor_id': login_id,  # Use login_id as unique identifier
             'tutor_name': tutor_data.tutor_name,
             'login_id': login_id,
-            'password_hash': hash_password(temp_password),
+            'password_hash': await hash_password_async(temp_password),
             'temp_password': temp_password,  # Store for admin to share with tutor
             'must_change_password': True,
             'locations': tutor_data.locations,
@@ -164,7 +145,8 @@ async def tutor_login(credentials: TutorLogin):
             raise HTTPException(status_code=500, detail="Firebase not initialized")
         
         # Fetch tutor from Firebase
-        tutor_doc = math_db.collection('tutors').document(credentials.login_id).get()
+        tutor_ref = math_db.collection('tutors').document(credentials.login_id)
+        tutor_doc = await asyncio.to_thread(tutor_ref.get)
         
         if not tutor_doc.exists:
             raise HTTPException(
@@ -174,17 +156,22 @@ async def tutor_login(credentials: TutorLogin):
         
         tutor_data = tutor_doc.to_dict()
         
-        # Verify password
-        if tutor_data['password_hash'] != hash_password(credentials.password):
+        # Verify password (hashing runs in the worker pool)
+        matches, needs_rehash = await verify_password_async(credentials.password, tutor_data.get('password_hash', ''))
+        if not matches:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid login credentials"
             )
         
-        # Update last login
-        math_db.collection('tutors').document(credentials.login_id).update({
-            'last_login': datetime.utcnow().isoformat()
-        })
+        # Upgrade legacy SHA-256 (or weaker scrypt) hashes now that we know the password
+        if needs_rehash:
+            new_hash = await hash_password_async(credentials.password)
+            await asyncio.to_thread(tutor_ref.update, {'password_hash': new_hash})
+            logger.info(f"Upgraded password hash for tutor {credentials.login_id}")
+        
+        # Update last login (written behind in batches)
+        last_login_buffer.record(credentials.login_id)
         
         # Create access token
         access_token = create_access_token(
@@ -219,7 +206,7 @@ async def tutor_login(credentials: TutorLogin):
 @tutor_router.post("/change-password")
 async def change_password(
     password_data: PasswordChange,
-    tutor_payload: dict = Depends(verify_token)
+    tutor_payload: dict = Depends(get_current_tutor)
 ):
     """Change tutor password (authenticated)"""
     try:
@@ -237,7 +224,8 @@ async def change_password(
         tutor_data = tutor_doc.to_dict()
         
         # Verify old password
-        if tutor_data['password_hash'] != hash_password(password_data.old_password):
+        matches, _ = await verify_password_async(password_data.old_password, tutor_data.get('password_hash', ''))
+        if not matches:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Current password is incorrect"
@@ -245,7 +233,7 @@ async def change_password(
         
         # Update password
         math_db.collection('tutors').document(login_id).update({
-            'password_hash': hash_password(password_data.new_password),
+            'password_hash': await hash_password_async(password_data.new_password),
             'must_change_password': False,
             'temp_password': None,  # Clear temporary password
             'password_changed_at': datetime.utcnow().isoformat()
@@ -275,7 +263,7 @@ async def change_password(
         raise HTTPException(status_code=500, detail=str(e))
 
 @tutor_router.get("/profile")
-async def get_tutor_profile(tutor_payload: dict = Depends(verify_token)):
+async def get_tutor_profile(tutor_payload: dict = Depends(get_current_tutor)):
     """Get authenticated tutor's profile"""
     try:
         if not math_db:
@@ -345,6 +333,7 @@ async def delete_tutor(login_id: str):
         
         # Delete tutor
         math_db.collection('tutors').document(login_id).delete()
+        last_login_buffer.discard(login_id)
         
         return {
             'success': True,
@@ -374,7 +363,7 @@ async def reset_tutor_password(login_id: str):
         
         # Update tutor with new password
         math_db.collection('tutors').document(login_id).update({
-            'password_hash': hash_password(temp_password),
+            'password_hash': await hash_password_async(temp_password),
             'temp_password': temp_password,
             'must_change_password': True,
             'password_reset_at': datetime.utcnow().isoformat(),
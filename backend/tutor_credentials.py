@@ -0,0 +1,176 @@
+"""
+Tutor Credentials for Math Analysis System
+Salted scrypt password hashing (off the event loop) and write-behind last_login updates
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# scrypt cost parameters - raise TUTOR_SCRYPT_N as hardware gets faster.
+# Hashes store their own parameters, so older hashes keep verifying and are upgraded on login.
+SCRYPT_N = int(os.getenv("TUTOR_SCRYPT_N", str(2 ** 14)))
+SCRYPT_R = int(os.getenv("TUTOR_SCRYPT_R", "8"))
+SCRYPT_P = int(os.getenv("TUTOR_SCRYPT_P", "1"))
+SCRYPT_SALT_BYTES = 16
+SCRYPT_KEY_BYTES = 32
+
+HASH_WORKERS = int(os.getenv("TUTOR_HASH_WORKERS", "4"))
+LAST_LOGIN_FLUSH_SECONDS = float(os.getenv("TUTOR_LAST_LOGIN_FLUSH_SECONDS", "30"))
+
+_hash_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _b64encode(raw: bytes) -> str:
+    return base64.b64encode(raw).decode().rstrip('=')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def _scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p,
+        maxmem=128 * n * r * p + 1024 * 1024, dklen=SCRYPT_KEY_BYTES
+    )
+
+
+def hash_password(password: str) -> str:
+    """Hash a password as 'scrypt$n$r$p$salt$hash' (blocking - prefer hash_password_async)"""
+    salt = secrets.token_bytes(SCRYPT_SALT_BYTES)
+    derived = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64encode(salt)}${_b64encode(derived)}"
+
+
+def verify_password(password: str, stored_hash: str) -> Tuple[bool, bool]:
+    """
+    Check a password against a stored hash.
+    Returns (matches, needs_rehash); needs_rehash is True for legacy unsalted SHA-256
+    hashes and for scrypt hashes made with weaker parameters than the current ones.
+    """
+    if not stored_hash:
+        return False, False
+
+    if not stored_hash.startswith('scrypt$'):
+        # Legacy format: unsalted SHA-256 hex digest
+        legacy = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, stored_hash), True
+
+    try:
+        _, n, r, p, salt, expected = stored_hash.split('$')
+        n, r, p = int(n), int(r), int(p)
+        derived = _scrypt(password, _b64decode(salt), n, r, p)
+    except ValueError:
+        logger.error("Malformed scrypt password hash")
+        return False, False
+
+    matches = hmac.compare_digest(derived, _b64decode(expected))
+    needs_rehash = (n, r, p) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return matches, needs_rehash
+
+
+def _get_hash_executor() -> ThreadPoolExecutor:
+    global _hash_executor
+    if _hash_executor is None:
+        _hash_executor = ThreadPoolExecutor(max_workers=max(1, HASH_WORKERS), thread_name_prefix="tutor-hash")
+    return _hash_executor
+
+
+async def hash_password_async(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), hash_password, password)
+
+
+async def verify_password_async(password: str, stored_hash: str) -> Tuple[bool, bool]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_hash_executor(), verify_password, password, stored_hash)
+
+# ========================
+# LAST LOGIN WRITE-BEHIND
+# ========================
+
+class LastLoginBuffer:
+    """
+    Collects last_login timestamps in memory and writes them in one batch per interval,
+    so a burst of logins costs one Firestore commit instead of one update each.
+    """
+
+    def __init__(self, db, collection: str = 'tutors', interval_seconds: float = LAST_LOGIN_FLUSH_SECONDS):
+        self.db = db
+        self.collection = collection
+        self.interval_seconds = interval_seconds
+        self._pending: Dict[str, str] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, login_id: str, when: Optional[str] = None):
+        # Later logins overwrite earlier ones - only the newest timestamp is written
+        self._pending[login_id] = when or datetime.utcnow().isoformat()
+
+    def discard(self, login_id: str):
+        """Forget a pending timestamp (tutor deleted)"""
+        self._pending.pop(login_id, None)
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def _commit(self, pending: Dict[str, str]):
+        collection = self.db.collection(self.collection)
+        items = list(pending.items())
+        for start in range(0, len(items), 400):
+            chunk = items[start:start + 400]
+            batch = self.db.batch()
+            for login_id, when in chunk:
+                batch.update(collection.document(login_id), {'last_login': when})
+            try:
+                batch.commit()
+            except Exception as e:
+                # Imported here so simulated clients (benchmark_tutor_login.py) need no google-cloud
+                from google.api_core.exceptions import NotFound
+                if not isinstance(e, NotFound):
+                    raise
+                # A tutor was deleted since logging in, failing the whole batch: write the chunk
+                # one by one and drop the missing ones (update, not set - never recreate a tutor)
+                for login_id, when in chunk:
+                    try:
+                        collection.document(login_id).update({'last_login': when})
+                    except NotFound:
+                        logger.info(f"Dropping last_login of deleted tutor {login_id}")
+
+    async def flush(self) -> int:
+        if not self._pending or not self.db:
+            return 0
+        pending, self._pending = self._pending, {}
+        try:
+            await asyncio.to_thread(self._commit, pending)
+        except Exception as e:
+            logger.error(f"Failed to flush {len(pending)} last_login updates: {str(e)}")
+            # Keep the timestamps for the next attempt unless a newer login replaced them
+            for login_id, when in pending.items():
+                self._pending.setdefault(login_id, when)
+            return 0
+        return len(pending)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
@@ -0,0 +1,142 @@
+"""
+Tutor Names
+The one place tutor names from the catalog are normalized. "Mr Eugene Tan (B) (HOD)",
+"Eugene Tan (HOD)" and "eugene_tan_hod" all resolve to the same tutor:
+
+    tutor_id      eugene_tan_hod          document ID in `tutors`, `tutor_id` on classes
+    base_name     Eugene Tan (HOD)        `tutor_base_name` on classes, `name` on tutors
+    display_name  Mr Eugene Tan (HOD)     what the chat and admin page show
+    title         HOD                     HOD / DY HOD / None
+
+Class section variants (A)-(E) are not part of a tutor's identity; HOD and DY HOD are.
+TutorAliases maps the ways people refer to a tutor ("eugene", "mr tan", "lim kw") to tutor IDs.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+HONORIFICS = ('Mr', 'Ms', 'Mrs', 'Mdm', 'Miss', 'Dr')
+TITLES = ('HOD', 'DY HOD')
+
+# honorific, name, then any mix of "(A)".."(E)" / "(HOD)" / "(DY HOD)" suffixes in any order.
+# An honorific must be followed by a name word, so "Mr (HOD)" is a tutor named Mr
+_TUTOR_NAME = re.compile(
+    r"^\s*(?:(?P<honorific>" + "|".join(HONORIFICS) + r")\.?\s+(?=[^\s(]))?"
+    r"(?P<name>.*?)"
+    r"(?P<suffixes>(?:\s*\(\s*(?:[A-E]|HOD|DY[\s_]*HOD)\s*\))*)\s*$",
+    re.IGNORECASE
+)
+_ID_UNSAFE = re.compile(r"[^a-z0-9]+")
+_WORD = re.compile(r"[a-z0-9.]+")
+
+# Name words that are too common to identify a tutor on their own
+ALIAS_STOP_WORDS = {'bin', 'binte', 'mr', 'ms', 'mrs', 'mdm', 'miss', 'dr', 'hod', 'dy'}
+
+
+class TutorName(NamedTuple):
+    tutor_id: str
+    base_name: str
+    display_name: str
+    title: Optional[str]
+    name: str
+    honorific: Optional[str]
+
+
+def make_tutor_id(name: str, title: Optional[str] = None) -> str:
+    """'Lim K.W.', 'DY HOD' -> 'lim_kw_dy_hod'"""
+    tutor_id = _ID_UNSAFE.sub('_', name.lower().replace('.', '')).strip('_')
+    if title:
+        tutor_id = f"{tutor_id}_{title.lower().replace(' ', '_')}"
+    return tutor_id
+
+
+def format_tutor(name: str, title: Optional[str] = None, honorific: Optional[str] = None) -> TutorName:
+    """TutorName from already separated parts"""
+    name = ' '.join(name.split())
+    base_name = f"{name} ({title.replace(' ', '_')})" if title else name
+    display_name = f"{name} ({title})" if title else name
+    if honorific:
+        display_name = f"{honorific} {display_name}"
+    return TutorName(make_tutor_id(name, title), base_name, display_name, title, name, honorific)
+
+
+@lru_cache(maxsize=4096)
+def normalize_tutor_name(raw: str) -> TutorName:
+    """Parse a catalog tutor name, a stored tutor_base_name or a tutor name typed into the admin page"""
+    match = _TUTOR_NAME.match(raw or '')
+    suffixes = match.group('suffixes').upper()
+    title = 'DY HOD' if 'DY' in suffixes else ('HOD' if 'HOD' in suffixes else None)
+    honorific = match.group('honorific')
+    if honorific:
+        honorific = next(h for h in HONORIFICS if h.lower() == honorific.lower())
+    return format_tutor(match.group('name').strip(), title, honorific)
+
+# ========================
+# ALIASES
+# ========================
+
+def _alias_key(words: Iterable[str]) -> str:
+    return ' '.join(word.replace('.', '') for word in words)
+
+
+def tutor_aliases(tutor: TutorName) -> Set[str]:
+    """Lower-case ways of referring to a tutor: full name, each name word, with or without honorific"""
+    words = [word for word in _WORD.findall(tutor.name.lower()) if word.replace('.', '')]
+    aliases = {_alias_key(words)}
+    aliases.update(_alias_key([word]) for word in words if word not in ALIAS_STOP_WORDS and len(word.replace('.', '')) > 1)
+    if len(words) > 2:
+        aliases.update(_alias_key(words[i:i + 2]) for i in range(len(words) - 1))
+    if tutor.honorific:
+        honorific = tutor.honorific.lower()
+        aliases.update(f"{honorific} {alias}" for alias in list(aliases))
+    return aliases
+
+
+class TutorAliases:
+    """
+    alias -> tutor IDs, built once per catalog load. Aliases shared by several tutors
+    ("sean") map to all of them so callers can ask which one is meant.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self.tutors: Dict[str, TutorName] = {}
+        self.table: Dict[str, Tuple[str, ...]] = {}
+        table: Dict[str, Set[str]] = {}
+        for raw in names:
+            if not raw:
+                continue
+            tutor = normalize_tutor_name(raw)
+            # Keep the honorific if any spelling of this tutor had one
+            if tutor.tutor_id not in self.tutors or (tutor.honorific and not self.tutors[tutor.tutor_id].honorific):
+                self.tutors[tutor.tutor_id] = tutor
+            for alias in tutor_aliases(tutor):
+                table.setdefault(alias, set()).add(tutor.tutor_id)
+        self.table = {alias: tuple(sorted(ids)) for alias, ids in table.items()}
+        self.max_words = max((alias.count(' ') + 1 for alias in self.table), default=0)
+
+    def __len__(self) -> int:
+        return len(self.tutors)
+
+    def lookup(self, text: str) -> Tuple[str, ...]:
+        """Tutor IDs for a whole name ('Mr Eugene Tan (HOD)', 'eugene', 'lim k.w.')"""
+        tutor = normalize_tutor_name(text)
+        if tutor.tutor_id in self.tutors:
+            return (tutor.tutor_id,)
+        return self.table.get(_alias_key(_WORD.findall(tutor.name.lower())), ())
+
+    def find(self, message: str) -> List[Tuple[str, Tuple[str, ...]]]:
+        """(alias, tutor IDs) for each tutor reference in free text, longest match first, left to right"""
+        words = [word for word in _WORD.findall(message.lower()) if word.strip('.')]
+        words = [word.rstrip('.') if word.count('.') == 1 else word for word in words]
+        found, i = [], 0
+        while i < len(words):
+            for size in range(min(self.max_words, len(words) - i), 0, -1):
+                alias = _alias_key(words[i:i + size])
+                if alias in self.table:
+                    found.append((alias, self.table[alias]))
+                    i += size
+                    break
+            else:
+                i += 1
+        return found
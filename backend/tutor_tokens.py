@@ -0,0 +1,103 @@
+"""
+Tutor Tokens for Math Analysis System
+JWT signing settings and the shared tutor authentication dependency, with a small
+cache of verified claims so repeat requests skip the HS256 decode
+"""
+
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import jwt
+from jwt.exceptions import ExpiredSignatureError, InvalidTokenError
+from fastapi import Header, HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+# JWT Configuration (shared by tutor_auth_api and math_analysis_api)
+SECRET_KEY = "math_analysis_secret_key_2024"
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
+
+TOKEN_CACHE_SIZE = int(os.getenv("TUTOR_TOKEN_CACHE_SIZE", "1024"))
+
+
+class TokenClaimsCache:
+    """LRU of verified claims keyed by token digest; entries die with the token's exp"""
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            claims, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return claims
+
+    def put(self, key: str, claims: Dict):
+        expires_at = claims.get('exp')
+        if not isinstance(expires_at, (int, float)):
+            # Never cache a token that does not expire
+            return
+        with self._lock:
+            self._entries[key] = (claims, float(expires_at))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_claims_cache = TokenClaimsCache()
+
+
+def decode_tutor_token(token: str) -> Dict:
+    """Verified claims of a tutor JWT (cached), raising 401 for bad or expired tokens"""
+    key = TokenClaimsCache.digest(token)
+    claims = token_claims_cache.get(key)
+    if claims is not None:
+        return claims
+
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except ExpiredSignatureError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token has expired")
+    except InvalidTokenError as e:
+        logger.error(f"JWT decode error: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials")
+
+    token_claims_cache.put(key, claims)
+    return claims
+
+
+def verify_tutor_token(authorization_header: Optional[str]) -> Dict:
+    """Verify a 'Bearer <token>' header value and return tutor data"""
+    if not authorization_header:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Authorization header required")
+    return decode_tutor_token(authorization_header.replace("Bearer ", "").strip())
+
+
+async def get_current_tutor(authorization: Optional[str] = Header(None)) -> Dict:
+    """FastAPI dependency for tutor-scoped endpoints - returns the token claims"""
+    claims = verify_tutor_token(authorization)
+    if not claims.get('sub') or not claims.get('tutor_id'):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid tutor token - no tutor_id")
+    return claims
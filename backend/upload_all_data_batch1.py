@@ -4,6 +4,7 @@ Processes all extracted PDF data and uploads to Firebase
 """
 import firebase_admin
 from firebase_admin import credentials, firestore
+from tutor_names import normalize_tutor_name
 
 # Initialize Firebase
 try:
@@ -15,10 +16,6 @@ except:
     db = firestore.client()
     print("🔥 Firebase initialized")
 
-def create_tutor_id(name):
-    """Create consistent tutor ID from name"""
-    return name.lower().replace("mr ", "").replace("ms ", "").replace("mrs ", "").replace("dr ", "").replace(".", "").replace(" ", "_").replace("(", "").replace(")", "")
-
 # Complete tutor data from ALL extracted PDFs
 # Format: (level, subject, location, tutor_name, [schedule])
 
@@ -141,7 +138,7 @@ classes_ref = db.collection('classes')
 tutors_dict = {}
 
 for i, (level, subject, location, tutor_name, schedule) in enumerate(all_classes):
-    tutor_id = create_tutor_id(tutor_name)
+    tutor_id = normalize_tutor_name(tutor_name).tutor_id
     
     # Track unique tutors
     if tutor_id not in tutors_dict:
@@ -183,7 +180,7 @@ for tutor_id, data in tutors_dict.items():
         "locations": list(data["locations"]),
         "subjects": list(data["subjects"]),
         "levels": list(data["levels"]),
-        "total_classes": sum(1 for c in all_classes if create_tutor_id(c[3]) == tutor_id)
+        "total_classes": sum(1 for c in all_classes if normalize_tutor_name(c[3]).tutor_id == tutor_id)
     }
     tutors_ref.document(tutor_id).set(tutor_doc)
 
@@ -1,227 +0,0 @@
-"""
-Complete Data Upload Script for Tuition Centre
-Uploads all extracted tutor and class data from P2-J2 levels to Firebase
-Handles duplicate tutors automatically and creates proper relationships
-"""
-import firebase_admin
-from firebase_admin import credentials, firestore
-from collections import defaultdict
-
-# Initialize Firebase
-try:
-    db = firestore.client()
-    print("🔥 Using existing Firebase connection")
-except:
-    cred = credentials.Certificate('/app/backend/firebase-credentials.json')
-    firebase_admin.initialize_app(cred)
-    db = firestore.client()
-    print("🔥 Firebase initialized")
-
-def normalize_tutor_name(name):
-    """Extract base name and title for consistent tutor IDs"""
-    clean = name.replace("Mr ", "").replace("Ms ", "").replace("Mrs ", "").replace("Mdm ", "").replace("Dr ", "")
-    
-    title = None
-    if "(HOD)" in clean:
-        title = "HOD"
-        clean = clean.replace("(HOD)", "").strip()
-    elif "(DY HOD)" in clean:
-        title = "DY HOD"
-        clean = clean.replace("(DY HOD)", "").strip()
-    elif "(A)" in clean:
-        clean = clean.replace("(A)", "").strip()
-    elif "(B)" in clean:
-        clean = clean.replace("(B)", "").strip()
-    elif "(C)" in clean:
-        clean = clean.replace("(C)", "").strip()
-    elif "(Α)" in clean:  # Greek alpha
-        clean = clean.replace("(Α)", "").strip()
-    elif "(Β)" in clean:  # Greek beta
-        clean = clean.replace("(Β)", "").strip()
-    
-    base_id = clean.lower().replace(".", "").replace(" ", "_").replace("bin", "bin")
-    
-    if title:
-        return f"{base_id}_{title.lower().replace(' ', '_')}", name
-    return base_id, name
-
-# ========================================
-# COMPLETE CLASS DATA (P2-J2)
-# ========================================
-
-all_classes = [
-    # ==================== S1 DATA ====================
-    # PUNGGOL - S1
-    ("S1", "Chinese", "Punggol", "Mdm Zhang (HOD)", 321.55, [{"day": "WED", "time": "5:00pm-7:00pm"}]),
-    ("S1", "Chinese", "Punggol", "Ms Tan S.F.", 321.55, [{"day": "THU", "time": "7:00pm-9:00pm"}]),
-    ("S1", "English", "Punggol", "Mr Pang W.F. (A) (HOD)", 321.55, [{"day": "WED", "time": "7:30pm-9:30pm"}]),
-    ("S1", "English", "Punggol", "Mr Pang W.F. (B) (HOD)", 321.55, [{"day": "SAT", "time": "3:00pm-5:00pm"}]),
-    ("S1", "Math", "Punggol", "Mr David Cao (A)", 370.60, [{"day": "MON", "time": "5:00pm-6:30pm"}, {"day": "SAT", "time": "3:00pm-4:30pm"}]),
-    ("S1", "Math", "Punggol", "Mr Ang C.X. (A)", 370.60, [{"day": "TUE", "time": "5:00pm-6:30pm"}, {"day": "SAT", "time": "4:30pm-6:00pm"}]),
-    ("S1", "Math", "Punggol", "Ms Kathy Liew (A)", 370.60, [{"day": "WED", "time": "6:30pm-8:00pm"}, {"day": "SAT", "time": "3:00pm-4:30pm"}]),
-    ("S1", "Math", "Punggol", "Mr David Cao (B)", 370.60, [{"day": "WED", "time": "6:30pm-8:00pm"}, {"day": "SUN", "time": "11:00am-12:30pm"}]),
-    ("S1", "Math", "Punggol", "Mr Ang C.X. (B)", 370.60, [{"day": "FRI", "time": "6:30pm-8:00pm"}, {"day": "SUN", "time": "1:00pm-2:30pm"}]),
-    ("S1", "Math", "Punggol", "Ms Kathy Liew (B)", 370.60, [{"day": "FRI", "time": "8:00pm-9:30pm"}, {"day": "SUN", "time": "9:30am-11:00am"}]),
-    ("S1", "Science", "Punggol", "Ms Alvina Tan (A)", 327.00, [{"day": "TUE", "time": "7:30pm-9:30pm"}]),
-    ("S1", "Science", "Punggol", "Ms Karmen Soon (A)", 327.00, [{"day": "THU", "time": "5:30pm-7:30pm"}]),
-    ("S1", "Science", "Punggol", "Ms Karmen Soon (B)", 327.00, [{"day": "SAT", "time": "10:30am-12:30pm"}]),
-    ("S1", "Science", "Punggol", "Ms Alvina Tan (B)", 327.00, [{"day": "SUN", "time": "2:30pm-4:30pm"}]),
-
-    # MARINE PARADE - S1
-    ("S1", "Chinese", "Marine Parade", "Mdm Zhang (A) (HOD)", 321.55, [{"day": "FRI", "time": "4:30pm-6:30pm"}]),
-    ("S1", "Chinese", "Marine Parade", "Mdm Zhang (B) (HOD)", 321.55, [{"day": "SAT", "time": "8:30am-10:30am"}]),
-    ("S1", "English", "Marine Parade", "Mrs Cheong (A)", 321.55, [{"day": "FRI", "time": "7:30pm-9:30pm"}]),
-    ("S1", "English", "Marine Parade", "Mrs Cheong (B)", 321.55, [{"day": "SAT", "time": "10:30am-12:30pm"}]),
-    ("S1", "Math", "Marine Parade", "Mr Sean Yeo (HOD)", 370.60, [{"day": "MON", "time": "5:00pm-6:30pm"}, {"day": "SAT", "time": "3:00pm-4:30pm"}]),
-    ("S1", "Math", "Marine Parade", "Mr John Lee (DY HOD)", 370.60, [{"day": "THU", "time": "5:00pm-6:30pm"}, {"day": "SUN", "time": "9:30am-11:00am"}]),
-    ("S1", "Math", "Marine Parade", "Mr Ng C.H.", 370.60, [{"day": "MON", "time": "4:00pm-5:30pm"}, {"day": "SAT", "time": "12:00pm-1:30pm"}]),
-    ("S1", "Math", "Marine Parade", "Mr Ronnie Quek", 370.60, [{"day": "MON", "time": "6:00pm-7:30pm"}, {"day": "SAT", "time": "10:00am-11:30am"}]),
-    ("S1", "Math", "Marine Parade", "Mr Jackie", 370.60, [{"day": "TUE", "time": "6:30pm-8:00pm"}, {"day": "SAT", "time": "10:30am-12:00pm"}]),
-    ("S1", "Math", "Marine Parade", "Mr Leonard Teo", 370.60, [{"day": "WED", "time": "3:30pm-5:00pm"}, {"day": "SUN", "time": "2:00pm-3:30pm"}]),
-    ("S1", "Math", "Marine Parade", "Mr Sean Tan", 370.60, [{"day": "WED", "time": "5:00pm-6:30pm"}, {"day": "SUN", "time": "11:30am-1:00pm"}]),
-    ("S1", "Math", "Marine Parade", "Mr Sean Phua", 370.60, [{"day": "FRI", "time": "6:00pm-7:30pm"}, {"day": "SUN", "time": "10:30am-12:00pm"}]),
-    ("S1", "Math", "Marine Parade", "Mr Lim W.M.", 370.60, [{"day": "FRI", "time": "6:30pm-8:00pm"}, {"day": "SUN", "time": "11:00am-12:30pm"}]),
-    ("S1", "Science", "Marine Parade", "Mr Desmond Tham (HOD)", 327.00, [{"day": "SAT", "time": "1:00pm-3:00pm"}]),
-    ("S1", "Science", "Marine Parade", "Ms Melissa Lim (DY HOD)", 327.00, [{"day": "TUE", "time": "7:30pm-9:30pm"}]),
-    ("S1", "Science", "Marine Parade", "Mr Wong Q.J.", 327.00, [{"day": "MON", "time": "6:30pm-8:30pm"}]),
-    ("S1", "Science", "Marine Parade", "Mr Jason Ang", 327.00, [{"day": "THU", "time": "5:30pm-7:30pm"}]),
-    ("S1", "Science", "Marine Parade", "Mr Victor Wu (A)", 327.00, [{"day": "FRI", "time": "5:00pm-7:00pm"}]),
-    ("S1", "Science", "Marine Parade", "Mr Victor Wu (B)", 327.00, [{"day": "SAT", "time": "9:00am-11:00am"}]),
-    ("S1", "Science", "Marine Parade", "Mr Johnson Boh", 327.00, [{"day": "SUN", "time": "9:00am-11:00am"}]),
-
-    # BISHAN - S1
-    ("S1", "Chinese", "Bishan", "Mdm Huang Yu (A)", 321.55, [{"day": "THU", "time": "7:00pm-9:00pm"}]),
-    ("S1", "Chinese", "Bishan", "Ms Tan S.F.", 321.55, [{"day": "SAT", "time": "1:00pm-3:00pm"}]),
-    ("S1", "English", "Bishan", "Mdm Huang Yu (B)", 321.55, [{"day": "SUN", "time": "3:00pm-5:00pm"}]),
-    ("S1", "English", "Bishan", "Ms See Kai Ning (A)", 321.55, [{"day": "MON", "time": "5:30pm-7:30pm"}]),
-    ("S1", "English", "Bishan", "Ms See Kai Ning (B)", 321.55, [{"day": "SAT", "time": "1:00pm-3:00pm"}]),
-    ("S1", "Math", "Bishan", "Mr Sean Yeo (HOD)", 370.60, [{"day": "WED", "time": "4:00pm-5:30pm"}, {"day": "SUN", "time": "11:00am-12:30pm"}]),
-    ("S1", "Math", "Bishan", "Mr John Lee (DY HOD)", 370.60, [{"day": "MON", "time": "5:00pm-6:30pm"}, {"day": "SAT", "time": "10:30am-12:00pm"}]),
-    ("S1", "Math", "Bishan", "Mr Leonard Teo", 370.60, [{"day": "MON", "time": "7:00pm-8:30pm"}, {"day": "SAT", "time": "8:30am-10:00am"}]),
-    ("S1", "Math", "Bishan", "Mr Sean Tan", 370.60, [{"day": "TUE", "time": "6:00pm-7:30pm"}, {"day": "SAT", "time": "12:00pm-1:30pm"}]),
-    ("S1", "Math", "Bishan", "Mr Jackie", 370.60, [{"day": "WED", "time": "4:30pm-6:00pm"}, {"day": "SUN", "time": "12:30pm-2:00pm"}]),
-    ("S1", "Math", "Bishan", "Mr Lim W.M.", 370.60, [{"day": "WED", "time": "6:30pm-8:00pm"}, {"day": "SAT", "time": "10:30am-12:00pm"}]),
-    ("S1", "Math", "Bishan", "Mr Ronnie Quek", 370.60, [{"day": "THU", "time": "6:00pm-7:30pm"}, {"day": "SUN", "time": "10:30am-12:00pm"}]),
-    ("S1", "Math", "Bishan", "Mr Sean Phua", 370.60, [{"day": "THU", "time": "6:30pm-8:00pm"}, {"day": "SAT", "time": "1:00pm-2:30pm"}]),
-    ("S1", "Math", "Bishan", "Mr Ng C.H.", 370.60, [{"day": "FRI", "time": "6:30pm-8:00pm"}, {"day": "SUN", "time": "12:30pm-2:00pm"}]),
-    ("S1", "Science", "Bishan", "Mr Desmond Tham (HOD)", 327.00, [{"day": "SUN", "time": "9:00am-11:00am"}]),
-    ("S1", "Science", "Bishan", "Ms Melissa Lim (DY HOD)", 327.00, [{"day": "FRI", "time": "5:30pm-7:30pm"}]),
-    ("S1", "Science", "Bishan", "Mr Wong Q.J.", 327.00, [{"day": "WED", "time": "7:30pm-9:30pm"}]),
-    ("S1", "Science", "Bishan", "Mr Johnson Boh", 327.00, [{"day": "SAT", "time": "3:00pm-5:00pm"}]),
-    ("S1", "Science", "Bishan", "Mr Jason Ang", 327.00, [{"day": "SUN", "time": "3:00pm-5:00pm"}]),
-
-    # JURONG - S1
-    ("S1", "English", "Jurong", "Ms Deborah Wong (A)", 321.55, [{"day": "MON", "time": "7:30pm-9:30pm"}]),
-    ("S1", "English", "Jurong", "Ms Deborah Wong (B)", 321.55, [{"day": "WED", "time": "5:30pm-7:30pm"}]),
-    ("S1", "Math", "Jurong", "Mr Omar Bin Noordin (A)", 370.60, [{"day": "MON", "time": "4:30pm-6:00pm"}, {"day": "SAT", "time": "3:00pm-4:30pm"}]),
-    ("S1", "Math", "Jurong", "Ms Kang P.Y. (A)", 370.60, [{"day": "TUE", "time": "4:30pm-6:00pm"}, {"day": "SAT", "time": "10:30am-12:00pm"}]),
-    ("S1", "Math", "Jurong", "Ms Chan S.Q. (A)", 370.60, [{"day": "WED", "time": "7:30pm-9:00pm"}, {"day": "SAT", "time": "1:00pm-2:30pm"}]),
-    ("S1", "Math", "Jurong", "Mr Omar Bin Noordin (B)", 370.60, [{"day": "THU", "time": "5:00pm-6:30pm"}, {"day": "SUN", "time": "9:00am-10:30am"}]),
-    ("S1", "Math", "Jurong", "Ms Kang P.Y. (B)", 370.60, [{"day": "THU", "time": "6:00pm-7:30pm"}, {"day": "SUN", "time": "12:00pm-1:30pm"}]),
-    ("S1", "Math", "Jurong", "Ms Chan S.Q. (B)", 370.60, [{"day": "FRI", "time": "4:30pm-6:00pm"}, {"day": "SUN", "time": "1:30pm-3:00pm"}]),
-    ("S1", "Science", "Jurong", "Mr Joel Seah (A)", 327.00, [{"day": "MON", "time": "5:30pm-7:30pm"}]),
-    ("S1", "Science", "Jurong", "Mr Joel Seah (B)", 327.00, [{"day": "THU", "time": "7:30pm-9:30pm"}]),
-    ("S1", "Science", "Jurong", "Mr Joel Seah (C)", 327.00, [{"day": "SUN", "time": "11:00am-1:00pm"}]),
-
-    # KOVAN - S1
-    ("S1", "English", "Kovan", "Mr Winston Lin (A)", 321.55, [{"day": "THU", "time": "7:30pm-9:30pm"}]),
-    ("S1", "English", "Kovan", "Mr Winston Lin (B)", 321.55, [{"day": "SAT", "time": "3:00pm-5:00pm"}]),
-    ("S1", "Math", "Kovan", "Mr Lim K.W. (A)", 370.60, [{"day": "MON", "time": "6:30pm-8:00pm"}, {"day": "THU", "time": "8:00pm-9:30pm"}]),
-    ("S1", "Math", "Kovan", "Mr Kenji Ng (A)", 370.60, [{"day": "TUE", "time": "6:30pm-8:00pm"}, {"day": "FRI", "time": "6:30pm-8:00pm"}]),
-    ("S1", "Math", "Kovan", "Mr Lim K.W. (B)", 370.60, [{"day": "TUE", "time": "8:00pm-9:30pm"}, {"day": "SUN", "time": "11:30am-1:00pm"}]),
-    ("S1", "Math", "Kovan", "Mr Kenji Ng (B)", 370.60, [{"day": "WED", "time": "5:00pm-6:30pm"}, {"day": "SAT", "time": "1:30pm-3:00pm"}]),
-    ("S1", "Math", "Kovan", "Mr Benjamin Tay (A)", 370.60, [{"day": "WED", "time": "7:30pm-9:30pm"}]),
-    ("S1", "Science", "Kovan", "Mr Benjamin Tay (B)", 327.00, [{"day": "FRI", "time": "7:30pm-9:30pm"}]),
-    ("S1", "Science", "Kovan", "Ms Koh R.T. (A)", 327.00, [{"day": "THU", "time": "5:30pm-7:30pm"}]),
-    ("S1", "Science", "Kovan", "Ms Koh R.T. (B)", 327.00, [{"day": "SUN", "time": "9:30am-11:30am"}]),
-
-    # ==================== S2 DATA ====================
-    # (Add all S2 data here - continuing in next section due to length)
-]
-
-# Note: This is a template showing the data structure. The complete script will include ALL extracted data from S1-S4, J1-J2.
-# Due to length, I'll create it in phases to ensure accuracy.
-
-print(f"\n📊 Preparing to upload {len(all_classes)} classes...")
-print("=" * 60)
-
-# Clear existing data
-print("\n🗑️  Clearing existing class and tutor data...")
-classes_ref = db.collection('classes')
-for doc in classes_ref.stream():
-    doc.reference.delete()
-
-tutors_ref = db.collection('tutors')
-for doc in tutors_ref.stream():
-    doc.reference.delete()
-
-print("✅ Existing data cleared")
-
-# Track unique tutors
-tutor_stats = {}
-uploaded_count = 0
-
-print("\n📚 Uploading classes to Firebase...")
-for level, subject, location, tutor_name, price, schedule in all_classes:
-    tutor_id, normalized_name = normalize_tutor_name(tutor_name)
-    
-    # Track tutor stats
-    if tutor_id not in tutor_stats:
-        tutor_stats[tutor_id] = {
-            'name': normalized_name,
-            'locations': set(),
-            'subjects': set(),
-            'levels': set(),
-            'class_count': 0
-        }
-    
-    tutor_stats[tutor_id]['locations'].add(location)
-    tutor_stats[tutor_id]['subjects'].add(subject)
-    tutor_stats[tutor_id]['levels'].add(level)
-    tutor_stats[tutor_id]['class_count'] += 1
-    
-    # Create class document
-    class_id = f"{level}_{subject}_{location}_{tutor_id}_{uploaded_count}".lower().replace(" ", "_").replace("/", "_")
-    class_doc = {
-        'class_id': class_id,
-        'level': level,
-        'subject': subject,
-        'location': location,
-        'tutor_id': tutor_id,
-        'tutor_name': normalized_name,
-        'schedule': schedule,
-        'sessions_per_week': len(schedule),
-        'monthly_fee': price
-    }
-    
-    classes_ref.document(class_id).set(class_doc)
-    uploaded_count += 1
-    
-    if uploaded_count % 100 == 0:
-        print(f"  ✅ Uploaded {uploaded_count} classes...")
-
-print(f"✅ All {uploaded_count} classes uploaded!")
-
-# Upload tutors
-print(f"\n👨‍🏫 Uploading {len(tutor_stats)} unique tutor profiles...")
-for tutor_id, stats in tutor_stats.items():
-    tutor_doc = {
-        'tutor_id': tutor_id,
-        'name': stats['name'],
-        'locations': sorted(list(stats['locations'])),
-        'subjects': sorted(list(stats['subjects'])),
-        'levels': sorted(list(stats['levels'])),
-        'total_classes': stats['class_count']
-    }
-    tutors_ref.document(tutor_id).set(tutor_doc)
-    print(f"  ✅ {stats['name']}: {stats['class_count']} classes across {len(stats['locations'])} locations")
-
-print(f"\n🎉 Upload complete!")
-print(f"=" * 60)
-print(f"📊 Final Firebase Database Summary:")
-print(f"   - Total classes: {uploaded_count}")
-print(f"   - Unique tutors: {len(tutor_stats)}")
-print(f"   - Multi-session classes: {sum(1 for _, _, _, _, _, schedule in all_classes if len(schedule) > 1)}")
-print(f"   - Locations: {len(set(c[2] for c in all_classes))}")
-print(f"   - Subjects: {len(set(c[1] for c in all_classes))}")
-print(f"   - Levels: {len(set(c[0] for c in all_classes))}")
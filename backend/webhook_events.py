@@ -0,0 +1,155 @@
+"""
+Webhook Event Idempotency
+Claims Stripe webhook events in project62/ops/stripe_events/{event_id} so each is processed once.
+
+    claim_event     one create() - fails atomically if the event was already claimed
+    complete_event  one update(processed=True) after the handler succeeded
+    release_event   one delete() when the handler failed, so Stripe's retry can claim again
+
+Event IDs processed by this process are kept in an LRU and answered as duplicates without
+any Firestore call, which is what absorbs Stripe retry storms. An exact LRU rather than a
+bloom filter: a false positive would silently drop a payment event.
+
+A claim left processed=False by a crashed worker is taken over by the next delivery once it
+is older than STRIPE_EVENT_CLAIM_SECONDS, and sweep_stale_claims() deletes those Stripe has
+not retried yet (scheduled in server.py).
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict
+
+from firebase_apps import firestore_client
+
+logger = logging.getLogger(__name__)
+
+db = firestore_client('project62')
+
+STRIPE_EVENT_CACHE_SIZE = int(os.getenv("STRIPE_EVENT_CACHE_SIZE", "10000"))
+# A claim not completed within this long belongs to a crashed worker
+STRIPE_EVENT_CLAIM_SECONDS = int(os.getenv("STRIPE_EVENT_CLAIM_SECONDS", "300"))
+
+CLAIMED, DUPLICATE, IN_PROGRESS = 'claimed', 'duplicate', 'in_progress'
+
+
+class RecentEvents:
+    """LRU of event IDs this process has seen fully processed"""
+
+    def __init__(self, max_size: int = STRIPE_EVENT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, event_id: str) -> bool:
+        with self._lock:
+            if event_id not in self._entries:
+                return False
+            self._entries.move_to_end(event_id)
+            return True
+
+    def add(self, event_id: str):
+        with self._lock:
+            self._entries[event_id] = None
+            self._entries.move_to_end(event_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+recent_events = RecentEvents()
+
+
+def events_ref():
+    return db.collection("project62").document("ops").collection("stripe_events")
+
+
+def seen(event_id: str) -> bool:
+    """True if this process already processed the event - no I/O"""
+    return event_id in recent_events
+
+
+def claim_event(event_id: str, record: Dict) -> str:
+    """Claim an event for processing: CLAIMED, DUPLICATE (already processed) or IN_PROGRESS elsewhere"""
+    from google.api_core.exceptions import AlreadyExists
+
+    if event_id in recent_events:
+        return DUPLICATE
+    event_ref = events_ref().document(event_id)
+    try:
+        event_ref.create({**record, "event_id": event_id, "processed": False,
+                          "claimed_at": time.time(), "attempts": 1})
+        return CLAIMED
+    except AlreadyExists:
+        return _take_over(event_ref, event_id)
+
+
+def _take_over(event_ref, event_id: str) -> str:
+    """Existing claim: a duplicate if processed, ours if its worker went quiet"""
+    from firebase_admin import firestore
+
+    @firestore.transactional
+    def take_over(transaction):
+        snapshot = event_ref.get(transaction=transaction)
+        if not snapshot.exists:
+            # Released between our create() and now
+            transaction.create(event_ref, {"event_id": event_id, "processed": False,
+                                           "claimed_at": time.time(), "attempts": 1})
+            return CLAIMED
+        event = snapshot.to_dict()
+        if event.get("processed"):
+            return DUPLICATE
+        if time.time() - event.get("claimed_at", 0) < STRIPE_EVENT_CLAIM_SECONDS:
+            return IN_PROGRESS
+        transaction.update(event_ref, {"claimed_at": time.time(), "attempts": event.get("attempts", 1) + 1})
+        logger.warning(f"Taking over stale claim of Stripe event {event_id}")
+        return CLAIMED
+
+    outcome = take_over(db.transaction())
+    if outcome == DUPLICATE:
+        recent_events.add(event_id)
+    return outcome
+
+
+def complete_event(event_id: str):
+    events_ref().document(event_id).update({"processed": True, "processed_at": datetime.utcnow().isoformat()})
+    recent_events.add(event_id)
+
+
+def release_event(event_id: str):
+    """Drop a claim whose processing failed so the next delivery can claim it straight away"""
+    try:
+        events_ref().document(event_id).delete()
+    except Exception as e:
+        # The claim goes stale and is taken over or swept instead
+        logger.error(f"Could not release Stripe event {event_id}: {e}")
+
+
+def sweep_stale_claims() -> int:
+    """Delete processed=False claims older than STRIPE_EVENT_CLAIM_SECONDS; returns how many"""
+    cutoff = time.time() - STRIPE_EVENT_CLAIM_SECONDS
+    stale = (events_ref()
+             .where("processed", "==", False)
+             .where("claimed_at", "<", cutoff)
+             .order_by("claimed_at")
+             .limit(500)
+             .stream())
+    swept = 0
+    for snapshot in stale:
+        snapshot.reference.delete()
+        swept += 1
+    # Claims from before claimed_at existed never match the range - they have no claim time at all
+    legacy = events_ref().where("processed", "==", False).limit(500).stream()
+    for snapshot in legacy:
+        if "claimed_at" not in (snapshot.to_dict() or {}):
+            snapshot.reference.delete()
+            swept += 1
+    if swept:
+        logger.warning(f"Swept {swept} stale Stripe event claims - Stripe retries will reprocess them")
+    return swept
@@ -14,6 +14,7 @@ export const ChatWidget = () => {
   const [messages, setMessages] = useState([]);
   const [inputValue, setInputValue] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const [conversationId, setConversationId] = useState(null);
   const [showLeadForm, setShowLeadForm] = useState(false);
   const [leadFormData, setLeadFormData] = useState({
     name: '',
@@ -96,9 +97,15 @@ export const ChatWidget = () => {
 
       const response = await axios.post(`${backendUrl}/api/chat`, {
         messages: conversationHistory,
-        agent_mode: agentMode
+        agent_mode: agentMode,
+        conversation_id: conversationId
       });
 
+      // Lets the backend reuse the stored summary of earlier turns
+      if (response.data.conversation_id) {
+        setConversationId(response.data.conversation_id);
+      }
+
       const assistantMessage = {
         role: 'assistant',
         content: response.data.message,
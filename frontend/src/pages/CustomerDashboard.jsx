@@ -376,6 +376,18 @@ const CustomerDashboard = () => {
 
       {updateSuccess && <div className="success-banner">{updateSuccess}</div>}
 
+      {dashboardData?.pending_renewal && (
+        <div className="renewal-banner">
+          <span>
+            Your plan renews on {dashboardData.pending_renewal.billing_date?.slice(0, 10)} -
+            ${Number(dashboardData.pending_renewal.total_cost).toFixed(2)} due
+          </span>
+          <a href={dashboardData.pending_renewal.payment_url} className="renewal-pay-btn">
+            Pay &amp; Renew
+          </a>
+        </div>
+      )}
+
       <div className="dashboard-grid">
         {/* Profile Section */}
         <div className="dashboard-card">
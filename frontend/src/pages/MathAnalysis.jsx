@@ -149,14 +149,21 @@ const MathAnalysis = () => {
   const fetchAllStudentResults = async () => {
     try {
       const token = localStorage.getItem('tutor_token');
-      const response = await axios.get(`${BACKEND_URL}/api/math-analysis/all-results`, {
-        headers: {
-          'Authorization': `Bearer ${token}`
-        }
-      });
-      if (response.data.success) {
-        setStudentResults(response.data.results);
-      }
+      // Results are paginated - follow next_cursor until every page is loaded
+      let results = [];
+      let cursor = null;
+      do {
+        const response = await axios.get(`${BACKEND_URL}/api/math-analysis/all-results`, {
+          headers: {
+            'Authorization': `Bearer ${token}`
+          },
+          params: { limit: 200, ...(cursor ? { cursor } : {}) }
+        });
+        if (!response.data.success) break;
+        results = results.concat(response.data.results);
+        cursor = response.data.next_cursor;
+      } while (cursor);
+      setStudentResults(results);
     } catch (error) {
       console.error('Error fetching all results:', error);
       if (error.response?.status === 401) {
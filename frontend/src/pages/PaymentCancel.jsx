@@ -1,9 +1,21 @@
-import React from 'react';
-import { useNavigate } from 'react-router-dom';
+import React, { useEffect } from 'react';
+import { useSearchParams, useNavigate } from 'react-router-dom';
+import axios from 'axios';
 import './PaymentSuccess.css'; // Reuse same styles
 
+const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
+
 const PaymentCancel = () => {
+  const [searchParams] = useSearchParams();
   const navigate = useNavigate();
+  const checkoutRef = searchParams.get('ref');
+
+  useEffect(() => {
+    // Close the abandoned Stripe session so a reserved discount code use is released now
+    if (!checkoutRef) return;
+    axios.post(`${BACKEND_URL}/api/project62/checkout/cancel`, null, { params: { ref: checkoutRef } })
+      .catch((error) => console.error('Error cancelling checkout:', error));
+  }, [checkoutRef]);
 
   return (
     <div className="payment-status-page">
@@ -18,10 +18,25 @@ const PaymentSuccess = () => {
       return;
     }
 
-    // Poll payment status
+    let closed = false;
+    let source = null;
+
+    const onPaid = (data) => {
+      setPaymentData(data);
+      setStatus('success');
+      // Redirect to Project 62 landing page after 5 seconds
+      setTimeout(() => {
+        window.location.href = '/project62';
+      }, 5000);
+    };
+
+    // Poll payment status (fallback when the event stream is unavailable)
     const checkPaymentStatus = async (attempts = 0) => {
       const maxAttempts = 5;
       
+      if (closed) {
+        return;
+      }
       if (attempts >= maxAttempts) {
         setStatus('error');
         return;
@@ -38,12 +53,7 @@ const PaymentSuccess = () => {
         );
 
         if (response.data.payment_status === 'paid') {
-          setPaymentData(response.data);
-          setStatus('success');
-          // Redirect to Project 62 landing page after 5 seconds
-          setTimeout(() => {
-            window.location.href = '/project62';
-          }, 5000);
+          onPaid(response.data);
         } else if (response.data.status === 'expired') {
           setStatus('error');
         } else {
@@ -60,7 +70,41 @@ const PaymentSuccess = () => {
       }
     };
 
-    checkPaymentStatus();
+    // Status is pushed by the server as soon as the Stripe webhook lands
+    const fallBackToPolling = () => {
+      if (source) {
+        source.close();
+        source = null;
+        checkPaymentStatus();
+      }
+    };
+
+    if (typeof window.EventSource === 'undefined') {
+      checkPaymentStatus();
+    } else {
+      source = new window.EventSource(`${BACKEND_URL}/api/project62/checkout/events/${sessionId}`);
+      source.addEventListener('status', (event) => {
+        const data = JSON.parse(event.data);
+        if (data.payment_status === 'paid') {
+          source.close();
+          source = null;
+          onPaid(data);
+        } else if (data.status === 'expired') {
+          source.close();
+          source = null;
+          setStatus('error');
+        }
+      });
+      source.addEventListener('timeout', fallBackToPolling);
+      source.addEventListener('error', fallBackToPolling);
+    }
+
+    return () => {
+      closed = true;
+      if (source) {
+        source.close();
+      }
+    };
   }, [sessionId, navigate]);
 
   if (status === 'checking') {
@@ -0,0 +1,79 @@
+"""
+Discount code redemption under contention: 500 parallel redemptions never pass max_uses.
+
+Runs against the Firestore emulator (transactions and contention are real there):
+    firebase emulators:start --only firestore
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python -m pytest tests/test_discount_redemption.py
+"""
+import os
+import sys
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("firebase_admin")
+if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+    pytest.skip("FIRESTORE_EMULATOR_HOST is not set", allow_module_level=True)
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+from google.cloud import firestore  # noqa: E402
+
+import discount_codes  # noqa: E402
+
+PARALLEL = 500
+
+
+@pytest.fixture
+def client(monkeypatch):
+    db = firestore.Client(project="demo-discount-codes")
+    monkeypatch.setattr(discount_codes, "db", db)
+    discount_codes.code_cache.clear()
+    yield db
+
+
+def create(max_uses, shards):
+    code_id = f"TEST{uuid.uuid4().hex[:8].upper()}"
+    discount_codes.create_code({"code_id": code_id, "code": code_id, "percentage": 10, "max_uses": max_uses,
+                                "current_uses": 0, "active": True, "expires_at": None}, shards)
+    return code_id
+
+
+def redeem_in_parallel(code_id):
+    def attempt(_):
+        try:
+            discount_codes.redeem(code_id)
+            return "redeemed"
+        except discount_codes.RedemptionError as e:
+            return e.reason
+        except ValueError:
+            return "busy"  # transaction retries exhausted on an unsharded code
+
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        return Counter(pool.map(attempt, range(PARALLEL)))
+
+
+def stored_uses(code_id):
+    return discount_codes.total_uses(code_id, discount_codes.codes_ref().document(code_id).get().to_dict())
+
+
+@pytest.mark.parametrize("max_uses,shards", [(100, 10), (50, 1), (250, 20)])
+def test_no_over_redemption(client, max_uses, shards):
+    code_id = create(max_uses, shards)
+    outcomes = redeem_in_parallel(code_id)
+    assert outcomes["redeemed"] <= max_uses
+    assert stored_uses(code_id) == outcomes["redeemed"]
+    assert set(outcomes) <= {"redeemed", "exhausted", "busy"}
+    if shards > 1:
+        # Sharded codes absorb the burst: every use up to the limit lands
+        assert outcomes["redeemed"] == max_uses
+
+
+def test_unlimited_code_counts_every_redemption(client):
+    code_id = create(None, 10)
+    outcomes = redeem_in_parallel(code_id)
+    assert stored_uses(code_id) == outcomes["redeemed"]
+    assert outcomes["redeemed"] + outcomes["busy"] == PARALLEL
@@ -0,0 +1,230 @@
+"""
+Discount code reservation without the Firestore emulator: redeem() and release() run against an
+in-process fake with Firestore's optimistic transaction semantics (a commit fails if a document
+it read has changed since, and the transaction is retried), so the limit checks are exercised
+under real thread contention. test_discount_redemption.py runs the same scenarios on the emulator.
+"""
+import copy
+import importlib
+import sys
+import threading
+import time
+import types
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+
+PARALLEL = 300
+# Simulated round trip per read and commit, so concurrent transactions interleave and conflict
+LATENCY_SECONDS = 0.001
+
+
+class Increment:
+    def __init__(self, value):
+        self.value = value
+
+
+class Conflict(Exception):
+    """A document read by the transaction changed before it committed"""
+
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class FakeDocument:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, name):
+        return FakeCollection(self.db, f"{self.path}/{name}")
+
+    def get(self, transaction=None):
+        with self.db.lock:
+            data, version = self.db.docs.get(self.path, (None, 0))
+        time.sleep(LATENCY_SECONDS)
+        if transaction is not None:
+            transaction.reads.setdefault(self.path, version)
+        return FakeSnapshot(self, copy.deepcopy(data))
+
+    def set(self, data):
+        self.db.commit([("set", self, data)], {})
+
+
+class FakeCollection:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+
+    def document(self, doc_id):
+        return FakeDocument(self.db, f"{self.path}/{doc_id}")
+
+    def stream(self):
+        with self.db.lock:
+            paths = [p for p in self.db.docs if p.rsplit("/", 1)[0] == self.path and self.db.docs[p][0] is not None]
+        return [self.document(p.rsplit("/", 1)[-1]).get() for p in sorted(paths)]
+
+    def list_documents(self):
+        return [snapshot.reference for snapshot in self.stream()]
+
+
+class FakeWrites:
+    """Transaction / batch: writes are buffered and applied atomically on commit"""
+
+    def __init__(self, db, max_attempts=5):
+        self.db = db
+        self.max_attempts = max_attempts
+        self.reads = {}
+        self.writes = []
+
+    def set(self, ref, data):
+        self.writes.append(("set", ref, data))
+
+    def update(self, ref, data):
+        self.writes.append(("update", ref, data))
+
+    def delete(self, ref):
+        self.writes.append(("delete", ref, None))
+
+    def commit(self):
+        time.sleep(LATENCY_SECONDS)
+        self.db.commit(self.writes, self.reads)
+
+
+class FakeClient:
+    def __init__(self):
+        self.docs = {}  # path -> (data, version)
+        self.lock = threading.Lock()
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def transaction(self, max_attempts=5):
+        return FakeWrites(self, max_attempts)
+
+    def batch(self):
+        return FakeWrites(self)
+
+    def commit(self, writes, reads):
+        with self.lock:
+            if any(self.docs.get(path, (None, 0))[1] != version for path, version in reads.items()):
+                raise Conflict()
+            for op, ref, data in writes:
+                current, version = self.docs.get(ref.path, (None, 0))
+                if op == "delete":
+                    current = None
+                elif op == "set":
+                    current = copy.deepcopy(data)
+                else:
+                    if current is None:
+                        raise KeyError(f"No document to update: {ref.path}")
+                    for field, value in data.items():
+                        current[field] = current.get(field, 0) + value.value if isinstance(value, Increment) else value
+                self.docs[ref.path] = (current, version + 1)
+
+
+def transactional(fn):
+    """firestore.transactional: rerun on conflict, ValueError once max_attempts are used up"""
+    def run(transaction):
+        for _ in range(transaction.max_attempts):
+            transaction.reads, transaction.writes = {}, []
+            result = fn(transaction)
+            try:
+                transaction.commit()
+                return result
+            except Conflict:
+                continue
+        raise ValueError(f"Failed to commit transaction in {transaction.max_attempts} attempts.")
+    return run
+
+
+@pytest.fixture
+def discount_codes(monkeypatch):
+    client = FakeClient()
+    firestore = types.SimpleNamespace(transactional=transactional, Increment=Increment)
+    monkeypatch.setitem(sys.modules, "firebase_admin", types.SimpleNamespace(firestore=firestore))
+    monkeypatch.setitem(sys.modules, "firebase_apps", types.SimpleNamespace(firestore_client=lambda key: client))
+    monkeypatch.delitem(sys.modules, "discount_codes", raising=False)
+    module = importlib.import_module("discount_codes")
+    yield module
+    sys.modules.pop("discount_codes", None)
+
+
+def create(discount_codes, max_uses, shards):
+    code_id = f"TEST{uuid.uuid4().hex[:8].upper()}"
+    discount_codes.create_code({"code_id": code_id, "code": code_id, "percentage": 10, "max_uses": max_uses,
+                                "current_uses": 0, "active": True, "expires_at": None}, shards)
+    return code_id
+
+
+def stored_uses(discount_codes, code_id):
+    return discount_codes.total_uses(code_id, discount_codes.codes_ref().document(code_id).get().to_dict())
+
+
+def redeem_in_parallel(discount_codes, code_id, count=PARALLEL):
+    def attempt(_):
+        try:
+            return discount_codes.redeem(code_id)
+        except discount_codes.RedemptionError as e:
+            return e.reason
+        except ValueError:
+            return "busy"
+
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        return list(pool.map(attempt, range(count)))
+
+
+def outcome_counts(results):
+    return Counter("redeemed" if isinstance(result, dict) else result for result in results)
+
+
+@pytest.mark.parametrize("max_uses,shards", [(100, 10), (50, 1), (120, 7)])
+def test_no_over_redemption(discount_codes, max_uses, shards):
+    code_id = create(discount_codes, max_uses, shards)
+    outcomes = outcome_counts(redeem_in_parallel(discount_codes, code_id))
+    assert outcomes["redeemed"] <= max_uses
+    assert stored_uses(discount_codes, code_id) == outcomes["redeemed"]
+    assert set(outcomes) <= {"redeemed", "exhausted", "busy"}
+    if shards > 1:
+        assert outcomes["redeemed"] == max_uses
+
+
+def test_release_returns_reserved_uses(discount_codes):
+    code_id = create(discount_codes, 40, 4)
+    redemptions = [r for r in redeem_in_parallel(discount_codes, code_id, 60) if isinstance(r, dict)]
+    assert len(redemptions) == 40
+    with pytest.raises(discount_codes.RedemptionError) as exhausted:
+        discount_codes.redeem(code_id)
+    assert exhausted.value.reason == "exhausted"
+
+    # Ten checkouts expire unpaid: their uses come back and can be reserved again, no more
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        list(pool.map(discount_codes.release, redemptions[:10]))
+    assert stored_uses(discount_codes, code_id) == 30
+    outcomes = outcome_counts(redeem_in_parallel(discount_codes, code_id, 30))
+    assert outcomes["redeemed"] == 10
+    assert stored_uses(discount_codes, code_id) == 40
+
+
+def test_release_never_goes_below_zero(discount_codes):
+    code_id = create(discount_codes, 5, 1)
+    redemption = discount_codes.redeem(code_id)
+    assert redemption["percentage"] == 10
+    discount_codes.release(redemption)
+    discount_codes.release(redemption)
+    assert stored_uses(discount_codes, code_id) == 0
+    discount_codes.release({"code": "NOSUCHCODE", "shard": None})
@@ -0,0 +1,101 @@
+"""
+Tutor name normalization: every spelling of a tutor resolves to one tutor_id, and every
+tool that writes or reads tutor names goes through backend/tutor_names.py.
+"""
+import ast
+import csv
+import sys
+from pathlib import Path
+
+from hypothesis import given, strategies as st
+
+ROOT = Path(__file__).parent.parent
+BACKEND = ROOT / "backend"
+sys.path.insert(0, str(BACKEND))
+
+from tutor_names import HONORIFICS, TutorAliases, normalize_tutor_name, tutor_aliases  # noqa: E402
+from sync_catalog import load_catalog  # noqa: E402
+from benchmark_tuition_prompt import load_catalog_csv  # noqa: E402
+
+CATALOG = ROOT / "tuition_COMPLETE_FINAL_ALL_LEVELS.csv"
+
+# A name starting with an honorific word ("Mr A.A.") cannot be told apart from an honorific
+name_words = st.lists(
+    st.from_regex(r"[A-Z][a-z]{1,8}|[A-Z]\.[A-Z]\.", fullmatch=True), min_size=1, max_size=3
+).filter(lambda words: words[0] not in HONORIFICS).map(' '.join)
+honorifics = st.sampled_from([None, *HONORIFICS])
+titles = st.sampled_from([None, 'HOD', 'DY HOD', 'DY_HOD'])
+variants = st.lists(st.sampled_from('ABCDE'), max_size=1)
+
+
+def spell(name, honorific=None, title=None, variant=(), title_first=False):
+    suffixes = [f"({v})" for v in variant]
+    if title:
+        suffixes.insert(0 if title_first else len(suffixes), f"({title})")
+    return ' '.join(part for part in [honorific, name, *suffixes] if part)
+
+
+@given(name_words, honorifics, titles, variants, st.booleans())
+def test_spellings_share_tutor_id(name, honorific, title, variant, title_first):
+    plain = normalize_tutor_name(spell(name, title=title))
+    spelled = normalize_tutor_name(spell(name, honorific, title, variant, title_first))
+    assert spelled.tutor_id == plain.tutor_id
+    assert spelled.base_name == plain.base_name
+    assert (spelled.title is None) == (title is None)
+
+
+@given(name_words, honorifics, titles, variants)
+def test_normalized_names_are_fixed_points(name, honorific, title, variant):
+    tutor = normalize_tutor_name(spell(name, honorific, title, variant))
+    for again in (tutor.base_name, tutor.display_name, tutor.tutor_id):
+        assert normalize_tutor_name(again).tutor_id == tutor.tutor_id
+    assert normalize_tutor_name(tutor.display_name) == tutor
+
+
+def test_lone_honorific_word_is_the_name():
+    tutor = normalize_tutor_name("Mr (HOD)")
+    assert (tutor.tutor_id, tutor.name, tutor.honorific) == ("mr_hod", "Mr", None)
+    assert normalize_tutor_name("Mr Mr (HOD)").base_name == tutor.base_name
+
+
+@given(name_words, titles)
+def test_title_is_part_of_identity(name, title):
+    if title:
+        assert normalize_tutor_name(spell(name, title=title)).tutor_id != normalize_tutor_name(name).tutor_id
+
+
+def test_catalog_loaders_agree():
+    names = [row['Tutor_Name'] for row in csv.DictReader(open(CATALOG, encoding='utf-8'))]
+    expected = [(normalize_tutor_name(n).tutor_id, normalize_tutor_name(n).base_name) for n in names]
+    assert [(c['tutor_id'], c['tutor_base_name']) for c in load_catalog(CATALOG)] == expected
+    assert [(c['tutor_id'], c['tutor_base_name']) for c in load_catalog_csv(CATALOG)] == expected
+
+
+def test_aliases_resolve_to_their_tutor():
+    names = [row['Tutor_Name'] for row in csv.DictReader(open(CATALOG, encoding='utf-8'))]
+    aliases = TutorAliases(names)
+    for raw in set(names):
+        tutor = normalize_tutor_name(raw)
+        assert aliases.lookup(raw) == (tutor.tutor_id,)
+        for alias in tutor_aliases(tutor):
+            assert tutor.tutor_id in aliases.table[alias]
+        assert tutor.tutor_id in {tutor_id for _, ids in aliases.find(f"classes by {raw} please") for tutor_id in ids}
+
+
+def test_no_other_normalizers():
+    """Scripts must import the normalizer instead of keeping their own copy"""
+    offenders = []
+    for path in BACKEND.glob("*.py"):
+        if path.name == "tutor_names.py":
+            continue
+        try:
+            tree = ast.parse(path.read_text(encoding='utf-8'))
+        except SyntaxError:
+            continue  # not importable anyway
+        for node in ast.walk(tree):
+            if isinstance(node, ast.FunctionDef) and node.name in ('normalize_tutor_name', 'create_tutor_id'):
+                offenders.append(f"{path.name}: def {node.name}")
+            if isinstance(node, ast.Call) and getattr(node.func, 'attr', None) == 'replace' \
+                    and node.args and isinstance(node.args[0], ast.Constant) and node.args[0].value in ('Mr ', 'Mdm ', '(DY HOD)'):
+                offenders.append(f"{path.name}:{node.lineno} inline name replace")
+    assert not offenders, offenders